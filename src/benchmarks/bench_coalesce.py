@@ -0,0 +1,141 @@
+# benchmarks/bench_coalesce.py
+"""
+Benchmark gộp ghi (write coalescing) trên một kết nối TLS loopback thật.
+Nhiều thread cùng gửi (giống ClientNetwork: cursor tracker + frame sender + control):
+- legacy: mỗi MCS frame -> TPKTLayer.pack(MCSLite.build(...)) -> sendall dưới 1 lock
+- coalesced: TPKTWriter (1 thread ghi, gộp nhiều frame vào 1 lần sendall)
+Báo cáo: frame/s, số lần sendall/s, bytes/lần sendall, thời gian CPU của tiến trình.
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_coalesce [--cursors 20000] [--frames 200]
+"""
+
+import argparse
+import os
+import socket
+import ssl
+import threading
+import time
+from common_network.pdu_builder import PDUBuilder
+from common_network.mcs_layer import MCSLite
+from common_network.tpkt_layer import TPKTLayer
+from common_network.tpkt_writer import TPKTWriter
+from common_network.security_layer_tls import create_server_context, create_client_context
+from server0.server_constants import CHANNEL_VIDEO, CHANNEL_CURSOR
+
+MAX_BODY_SIZE_PER_FRAGMENT = 64000
+
+
+class LegacySender:
+    """Cách gửi cũ: 1 sendall cho mỗi MCS frame, dưới lock."""
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.bytes = 0
+
+    def send(self, channel_id, payload):
+        packet = TPKTLayer.pack(MCSLite.build(channel_id, payload))
+        with self.lock:
+            self.sock.sendall(packet)
+            self.calls += 1
+            self.bytes += len(packet)
+
+
+def tls_pair():
+    """Tạo cặp socket TLS (client, server) qua loopback."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    server_ctx = create_server_context("server.crt", "server.key")
+    client_ctx = create_client_context(cafile=os.path.join("client", "ca.crt"), check_hostname=False)
+
+    result = {}
+    def accept():
+        raw, _ = listener.accept()
+        result["server"] = server_ctx.wrap_socket(raw, server_side=True)
+    t = threading.Thread(target=accept)
+    t.start()
+    client = client_ctx.wrap_socket(socket.create_connection(listener.getsockname()), server_hostname="localhost")
+    t.join()
+    listener.close()
+    return client, result["server"]
+
+
+def drain(sock, total, done):
+    buf = bytearray(256 * 1024)
+    got = 0
+    while got < total:
+        n = sock.recv_into(buf)
+        if not n:
+            break
+        got += n
+    done.set()
+
+
+def run(mode: str, args):
+    client, server = tls_pair()
+    cursor_pdus = [PDUBuilder.build_cursor_pdu(i, i % 10000, i % 10000) for i in range(args.cursors)]
+    frame = PDUBuilder.build_full_frame_pdu(1, os.urandom(args.frame_kb * 1024), 1920, 1080)
+    frags = [f for _, f in PDUBuilder.fragmentize(frame, MAX_BODY_SIZE_PER_FRAGMENT)]
+
+    wire_bytes = sum(len(p) + 8 for p in cursor_pdus) + args.frames * sum(len(f) + 8 for f in frags)
+    done = threading.Event()
+    reader = threading.Thread(target=drain, args=(server, wire_bytes, done), daemon=True)
+    reader.start()
+
+    if mode == "legacy":
+        sender = LegacySender(client)
+        send = sender.send
+    else:
+        sender = TPKTWriter(client, name="BenchWriter")
+        sender.start()
+        send = sender.send
+
+    def cursor_producer():
+        for p in cursor_pdus:
+            send(CHANNEL_CURSOR, p)
+
+    def frame_producer():
+        for _ in range(args.frames):
+            for f in frags:
+                send(CHANNEL_VIDEO, f)
+
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    producers = [threading.Thread(target=cursor_producer), threading.Thread(target=frame_producer)]
+    for p in producers:
+        p.start()
+    for p in producers:
+        p.join()
+    done.wait(60)
+    elapsed = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+
+    if mode == "legacy":
+        calls, nbytes = sender.calls, sender.bytes
+    else:
+        st = sender.stats.snapshot()
+        calls, nbytes = st["writes"], st["bytes"]
+        sender.stop()
+    client.close()
+    server.close()
+
+    nframes = len(cursor_pdus) + args.frames * len(frags)
+    print(f"  {mode:9s}: {nframes / elapsed:10,.0f} frame/s  {calls / elapsed:9,.0f} sendall/s  "
+          f"{nbytes / max(calls, 1):8,.0f} bytes/sendall  CPU {cpu:5.2f}s  ({elapsed:.2f}s)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--cursors", type=int, default=20000, help="số PDU cursor (~30 byte)")
+    ap.add_argument("--frames", type=int, default=200, help="số FULL frame (được phân mảnh)")
+    ap.add_argument("--frame-kb", type=int, default=150)
+    args = ap.parse_args()
+
+    print(f"TLS loopback: {args.cursors} cursor + {args.frames} frame x {args.frame_kb} KB")
+    for mode in ("legacy", "coalesced"):
+        run(mode, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# benchmarks/bench_decode.py
+"""
+Benchmark đường nhận video của manager: giải mã tuần tự (như _pdu_loop cũ, hàng đợi không giới hạn)
+vs VideoDecodePool (N luồng giải mã, FULL frame mới nhất thắng, hàng đợi có giới hạn).
+Luồng PDU giả lập: FULL frame (ảnh nhiễu, JPEG nặng) mỗi --full-every PDU, xen giữa là các RECT,
+tới đều đặn --rate PDU/s (đặt cao hơn tốc độ giải mã để thấy hàng đợi dồn).
+Báo cáo: số frame hiển thị / bị bỏ, độ sâu hàng đợi lúc nhận (p50/max), độ trễ nhận -> hiển thị (p50/p99 ms).
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_decode [--size 1920x1080] [--rate 60] [--seconds 5] [--workers 0,1,2,4]
+    (--workers 0 = giải mã tuần tự)
+"""
+
+import argparse
+import io
+import os
+import queue
+import threading
+import time
+import numpy as np
+from PIL import Image
+from common_network.constants import PDU_TYPE_FULL, PDU_TYPE_RECT
+from common_network.stats import LatencyHistogram
+from manager.manager_viewer import ManagerViewer
+from manager.manager_decoder import VideoDecodePool
+
+CLIENT_ID = "bench"
+
+
+class FakePDU:
+    def __init__(self, seq, ptype, jpg, size, x=0, y=0):
+        self.seq = seq
+        self.ts_ms = 0
+        self.ptype = ptype
+        self.jpg = jpg
+        self.full_w, self.full_h = size
+        self.x = x
+        self.y = y
+        self.arrived = 0.0
+
+
+def encode(arr: np.ndarray, quality: int) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def make_stream(size, count: int, full_every: int, quality: int):
+    rng = np.random.default_rng(1)
+    w, h = size
+    full_jpg = [encode(rng.integers(0, 256, (h, w, 3), dtype=np.uint8), quality) for _ in range(2)]
+    rect_jpg = [encode(rng.integers(0, 256, (128, 256, 3), dtype=np.uint8), quality) for _ in range(4)]
+    pdus = []
+    for i in range(count):
+        if i % full_every == 0:
+            pdus.append(FakePDU(i + 1, PDU_TYPE_FULL, full_jpg[i % 2], size))
+        else:
+            pdus.append(FakePDU(i + 1, PDU_TYPE_RECT, rect_jpg[i % 4], size, x=(i * 37) % (w - 256), y=(i * 53) % (h - 128)))
+    return pdus
+
+
+class Display:
+    """Giả lập GUI: nhận FrameUpdate theo thứ tự, đo độ trễ nhận -> hiển thị."""
+    def __init__(self):
+        self.lag = LatencyHistogram(max_samples=100_000)
+        self.shown = 0
+        self.dropped = 0
+        self.last_seq = 0
+        self.out_of_order = 0
+
+    def show(self, pdu, update):
+        if update is None:
+            self.dropped += 1
+            return
+        if pdu.seq < self.last_seq:
+            self.out_of_order += 1
+        self.last_seq = pdu.seq
+        self.shown += 1
+        self.lag.record((time.perf_counter() - pdu.arrived) * 1000)
+
+
+def feed(pdus, rate: float, seconds: float, submit):
+    """Phát PDU đều đặn `rate` PDU/s trong `seconds` giây."""
+    start = time.perf_counter()
+    sent = 0
+    for i, pdu in enumerate(pdus):
+        due = start + i / rate
+        now = time.perf_counter()
+        if now - start > seconds:
+            break
+        if due > now:
+            time.sleep(due - now)
+        pdu.arrived = time.perf_counter()
+        submit(pdu)
+        sent += 1
+    return sent
+
+
+def run_sequential(pdus, args):
+    viewer = ManagerViewer()
+    display = Display()
+    q = queue.Queue()
+    depth = LatencyHistogram(max_samples=100_000)
+
+    def loop():
+        while True:
+            pdu = q.get()
+            if pdu is None:
+                return
+            display.show(pdu, viewer.process_video_pdu(CLIENT_ID, pdu))
+
+    t = threading.Thread(target=loop, daemon=True)
+    t.start()
+
+    def submit(pdu):
+        q.put(pdu)
+        depth.record(q.qsize())
+
+    sent = feed(pdus, args.rate, args.seconds, submit)
+    backlog = q.qsize()
+    q.put(None)
+    t.join()
+    report("tuần tự", sent, display, depth.summary(), f"tồn {backlog} PDU khi hết giờ")
+
+
+def run_pool(workers: int, pdus, args):
+    viewer = ManagerViewer()
+    display = Display()
+    pool = VideoDecodePool(
+        viewer.decode_pdu,
+        lambda key, pdu, img, ms: display.show(pdu, viewer.make_update(key, pdu, img, ms) if img is not None else None),
+        workers=workers,
+    )
+    pool.start()
+    sent = feed(pdus, args.rate, args.seconds, lambda pdu: pool.submit(CLIENT_ID, pdu))
+    # Chờ giải mã hết phần còn lại
+    while True:
+        st = pool.stats()
+        if not st["pending"] and not st["in_flight"]:
+            break
+        time.sleep(0.01)
+    pool.stop()
+    extra = (f"max_depth {st['max_depth']}, thay thế {st['superseded']}, tràn {st['overflowed']}, "
+             f"bỏ RECT {st['discarded']}, resync {st['resyncs']}")
+    report(f"{workers} giải mã", sent, display, st["depth"], extra)
+
+
+def report(label, sent, display, depth, extra):
+    lag = display.lag.summary()
+    print(f"  {label:10s}: nhận {sent}, hiển thị {display.shown}, bỏ {sent - display.shown}  "
+          f"độ sâu p50 {depth['p50']:.0f} max {depth['max']:.0f}  "
+          f"trễ p50 {lag['p50']:8.1f}  p99 {lag['p99']:8.1f} ms")
+    print(f"              {extra}")
+    assert display.out_of_order == 0, "frame hiển thị sai thứ tự"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size", default="1920x1080")
+    ap.add_argument("--rate", type=float, default=60.0, help="số PDU video tới mỗi giây")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--full-every", type=int, default=4, help="1 FULL frame mỗi N PDU")
+    ap.add_argument("--quality", type=int, default=75)
+    ap.add_argument("--workers", default="0,1,2,4", help="danh sách số luồng giải mã (0 = tuần tự)")
+    args = ap.parse_args()
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    count = int(args.rate * args.seconds) + 1
+    print(f"{size[0]}x{size[1]}, {args.rate:.0f} PDU/s, FULL mỗi {args.full_every} PDU, "
+          f"{args.seconds:.0f}s, {os.cpu_count()} CPU")
+    for workers in (int(v) for v in args.workers.split(",")):
+        pdus = make_stream(size, count, args.full_every, args.quality)
+        if workers == 0:
+            run_sequential(pdus, args)
+        else:
+            run_pool(workers, pdus, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# benchmarks/bench_delta.py
+"""
+Benchmark phát hiện vùng thay đổi của ClientScreenshot trên một chuỗi frame màn hình:
+- bbox:  cách cũ (compute_delta_bbox): 1 bbox getbbox() bao mọi thay đổi -> 1 RECT
+- tiles: TileDiffDetector (ô 64x64, gộp ô bẩn) trên ảnh PIL đã resize -> nhiều RECT nhỏ
+- bgra:  BGRADeltaEngine trên buffer BGRA thô (như sct_img.bgra của mss) ở độ phân giải gốc,
+         chỉ tạo ảnh PIL khi có vùng thay đổi và chỉ resize đúng các vùng đó (resize(box=...))
+Mỗi frame đi từ buffer BGRA gốc (--size) như ClientScreenshot: "prep+diff" gồm cả frombytes/resize
+về --max-dimension (bbox/tiles luôn phải làm, bgra bỏ qua khi đứng im).
+Báo cáo: bytes JPEG / frame, số RECT / frame, thời gian prep+diff + encode / frame.
+
+Chuỗi frame: đọc các ảnh PNG đã ghi (--frames-dir, sắp theo tên) hoặc tự sinh các kịch bản
+desktop tổng hợp (đứng im, đồng hồ khay + con trỏ ở góc đối diện, gõ chữ, cuộn cửa sổ).
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_delta [--frames 60] [--frames-dir DIR] [--quality 65] [--size 1920x1080]
+"""
+
+import argparse
+import io
+import os
+import random
+import time
+from PIL import Image, ImageChops, ImageDraw
+from client.client_delta import TileDiffDetector, BGRADeltaEngine, scale_rects
+
+WIDTH, HEIGHT = 1280, 720 # toạ độ của kịch bản tổng hợp (được phóng theo --size)
+
+
+class LegacyBBox:
+    """Bản sao logic cũ của ClientScreenshot.compute_delta_bbox (để so sánh)."""
+    def __init__(self):
+        self._prev_image = None
+
+    def update(self, img):
+        if self._prev_image is None:
+            self._prev_image = img.convert("L")
+            return [(0, 0, img.width, img.height)]
+        diff = ImageChops.difference(img.convert("L"), self._prev_image)
+        mask = diff.point(lambda p: 255 if p > 30 else 0)
+        bbox = mask.getbbox()
+        if bbox is not None:
+            self._prev_image = img.convert("L")
+        return [bbox] if bbox else []
+
+
+def _desktop(rnd: random.Random) -> Image.Image:
+    """Ảnh nền giống desktop: nền gradient, vài cửa sổ có 'chữ'."""
+    img = Image.linear_gradient("L").resize((WIDTH, HEIGHT)).convert("RGB")
+    d = ImageDraw.Draw(img)
+    for wx, wy, ww, wh in ((60, 40, 620, 420), (700, 120, 520, 480)):
+        d.rectangle((wx, wy, wx + ww, wy + wh), fill=(245, 245, 245), outline=(90, 90, 90))
+        d.rectangle((wx, wy, wx + ww, wy + 24), fill=(40, 90, 160))
+        for line in range(wy + 34, wy + wh - 14, 16):
+            d.text((wx + 10, line), "".join(rnd.choice("abcdefgh ijklmn opqrs") for _ in range(ww // 8)), fill=(20, 20, 20))
+    d.rectangle((0, HEIGHT - 36, WIDTH, HEIGHT), fill=(30, 30, 30)) # taskbar
+    return img
+
+
+def synth_sequence(name: str, frames: int):
+    rnd = random.Random(7)
+    base = _desktop(rnd)
+    seq = []
+    for i in range(frames):
+        img = base.copy()
+        if name == "idle":
+            seq.append(base)
+            continue
+        d = ImageDraw.Draw(img)
+        # đồng hồ ở khay hệ thống (góc dưới phải) đổi mỗi frame
+        d.text((WIDTH - 70, HEIGHT - 26), f"12:{i // 60:02d}:{i % 60:02d}", fill=(255, 255, 255))
+        # con trỏ chuột di chuyển ở góc trên trái
+        cx, cy = 20 + (i * 7) % 200, 20 + (i * 3) % 100
+        d.polygon([(cx, cy), (cx, cy + 18), (cx + 12, cy + 12)], fill=(0, 0, 0), outline=(255, 255, 255))
+        if name in ("typing", "scroll"):
+            # gõ chữ trong cửa sổ soạn thảo
+            d.text((70, 300), "typed: " + "x" * i, fill=(200, 0, 0))
+        if name == "scroll":
+            # cửa sổ bên phải cuộn nội dung mỗi frame
+            region = base.crop((705, 150, 1215, 595))
+            img.paste(region.crop((0, (i * 16) % 200, region.width, region.height)), (705, 150))
+        seq.append(img)
+    return seq
+
+
+def load_sequence(directory: str):
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith((".png", ".jpg", ".bmp")))
+    return [Image.open(os.path.join(directory, n)).convert("RGB") for n in names]
+
+
+def encode(img, quality: int) -> bytes:
+    bio = io.BytesIO()
+    img.save(bio, format="JPEG", quality=quality)
+    return bio.getvalue()
+
+
+def to_bgra(img, size):
+    """Ảnh -> (buffer BGRA, size) giống sct_img của mss."""
+    if img.size != size:
+        img = img.resize(size, Image.BILINEAR)
+    return img.tobytes("raw", "BGRX"), size
+
+
+def scaled_size(size, max_dimension: int):
+    w, h = size
+    if max_dimension and max(w, h) > max_dimension:
+        scale = max_dimension / max(w, h)
+        return int(w * scale), int(h * scale)
+    return w, h
+
+
+def to_image(raw, max_dimension: int):
+    """Như ClientScreenshot._to_image: frombytes BGRX + resize LANCZOS nếu cạnh dài > max_dimension."""
+    bgra, size = raw
+    img = Image.frombytes("RGB", size, bgra, "raw", "BGRX")
+    out = scaled_size(size, max_dimension)
+    return img.resize(out, Image.LANCZOS) if out != size else img
+
+
+class PILPipeline:
+    """bbox / tiles: mỗi frame đều frombytes + resize rồi mới so sánh."""
+    def __init__(self, detector, max_dimension: int):
+        self.detector = detector
+        self.max_dimension = max_dimension
+
+    def step(self, raw):
+        img = to_image(raw, self.max_dimension)
+        return [img.crop(bbox) for bbox in self.detector.update(img)]
+
+
+class BGRAPipeline:
+    """bgra: như ClientScreenshot._next_frame (engine "bgra")."""
+    def __init__(self, engine, max_dimension: int):
+        self.engine = engine
+        self.max_dimension = max_dimension
+
+    def step(self, raw):
+        bgra, (w, h) = raw
+        native = self.engine.update(bgra, w, h)
+        if not native:
+            return []
+        img = Image.frombytes("RGB", (w, h), bgra, "raw", "BGRX")
+        size = scaled_size((w, h), self.max_dimension)
+        if size == (w, h):
+            return [img.crop(bbox) for bbox in native]
+        fx, fy = w / size[0], h / size[1]
+        return [img.resize((r - l, b - u), Image.LANCZOS, box=(l * fx, u * fy, r * fx, b * fy))
+                for l, u, r, b in scale_rects(native, (w, h), size)]
+
+
+def run(name: str, pipeline, frames, quality: int):
+    total_bytes = total_rects = 0
+    diff_s = enc_s = 0.0
+    for raw in frames[1:]:
+        t0 = time.perf_counter()
+        parts = pipeline.step(raw)
+        t1 = time.perf_counter()
+        for part in parts:
+            total_bytes += len(encode(part, quality))
+        t2 = time.perf_counter()
+        diff_s += t1 - t0
+        enc_s += t2 - t1
+        total_rects += len(parts)
+    n = max(len(frames) - 1, 1)
+    print(f"    {name:6s}: {total_bytes / n / 1024:8.1f} KB/frame  {total_rects / n:5.1f} rect/frame  "
+          f"prep+diff {diff_s / n * 1000:6.2f} ms  encode {enc_s / n * 1000:6.2f} ms  "
+          f"(tổng {(diff_s + enc_s) / n * 1000:6.2f} ms/frame)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frames", type=int, default=60)
+    ap.add_argument("--frames-dir", help="thư mục chứa chuỗi ảnh màn hình đã ghi")
+    ap.add_argument("--quality", type=int, default=65)
+    ap.add_argument("--size", default="1920x1080", help="độ phân giải gốc của buffer BGRA (kịch bản tổng hợp)")
+    ap.add_argument("--max-dimension", type=int, default=1280, help="như ClientScreenshot.max_dimension")
+    args = ap.parse_args()
+
+    if args.frames_dir:
+        images = load_sequence(args.frames_dir)
+        scenarios = {os.path.basename(args.frames_dir.rstrip("/")): [to_bgra(img, img.size) for img in images]}
+    else:
+        size = tuple(int(v) for v in args.size.lower().split("x"))
+        scenarios = {name: [to_bgra(img, size) for img in synth_sequence(name, args.frames)]
+                     for name in ("idle", "clock+cursor", "typing", "scroll")}
+
+    for name, frames in scenarios.items():
+        w, h = frames[0][1]
+        print(f"  {name} ({len(frames)} frame {w}x{h} -> max {args.max_dimension}, JPEG q={args.quality})")
+        pipelines = (
+            ("bbox", PILPipeline(LegacyBBox(), args.max_dimension)),
+            ("tiles", PILPipeline(TileDiffDetector(), args.max_dimension)),
+            ("bgra", BGRAPipeline(BGRADeltaEngine(), args.max_dimension)),
+        )
+        for label, pipeline in pipelines:
+            pipeline.step(frames[0]) # frame đầu: tham chiếu
+            run(label, pipeline, frames, args.quality)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# benchmarks/bench_durable_queue.py
+"""
+Benchmark DurableQueue khi gửi 1 file lớn (mặc định 1 GB, chunk 64 KB) như ClientSender.
+- legacy: mô phỏng thiết kế cũ: mỗi push = 1 INSERT + 1 commit; vòng gửi peek() phần tử đầu
+  rồi xóa từng phần tử (pop) khi được ACK. Trường hợp tốt nhất: không tính time.sleep(0.1) sau mỗi lần gửi
+  của vòng cũ (riêng khoản đó đã giới hạn ~10 chunk / s).
+- batched: DurableQueue hiện tại: push_many (64 chunk / lần), ghi theo lô trên luồng nền;
+  vòng gửi peek_many từ con trỏ, ACK bằng 1 lần ack_through.
+Đo 2 pha:
+1. Xếp hàng: đọc file, đóng gói FILE_CHUNK, đưa vào queue tới khi mọi chunk đã commit (MB/s, chunk/s).
+2. Vòng gửi: đọc lại toàn bộ chunk từ queue theo thứ tự, "gửi" (không có socket) và ACK
+   sau mỗi --ack-every chunk, tới khi queue rỗng (MB/s).
+File tạm và DB tạm nằm trong --dir (mặc định thư mục tạm của hệ thống), xóa khi xong.
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_durable_queue [--size-mb 1024] [--chunk-kb 64] [--ack-every 16]
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from common_network.durable_queue import DurableQueue
+from common_network.file_utils import stream_file_in_chunks
+from common_network.pdu_builder import PDUBuilder
+from common_network.pdu_parser import PDUParser
+
+PUSH_BATCH = 64
+
+
+class LegacyDurableQueue:
+    """Thiết kế cũ: mọi thao tác 1 transaction, đọc phần tử đầu bằng ORDER BY id LIMIT 1."""
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS queue(id INTEGER PRIMARY KEY AUTOINCREMENT, task BLOB, timestamp REAL)")
+        self.conn.commit()
+
+    def push(self, data):
+        self.conn.execute("INSERT INTO queue(task, timestamp) VALUES(?,?)", (data, time.time()))
+        self.conn.commit()
+
+    def peek(self):
+        return self.conn.execute("SELECT id, task FROM queue ORDER BY id LIMIT 1").fetchone()
+
+    def remove(self, qid):
+        self.conn.execute("DELETE FROM queue WHERE id=?", (qid,))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def make_file(path: str, size: int):
+    block = os.urandom(1 << 20)
+    with open(path, "wb") as f:
+        left = size
+        while left > 0:
+            f.write(block[:min(left, len(block))])
+            left -= len(block)
+
+
+def chunk_pdus(path: str, chunk_size: int):
+    for seq, (offset, chunk) in enumerate(stream_file_in_chunks(path, chunk_size)):
+        yield PDUBuilder.build_file_chunk(seq, offset, chunk)
+
+
+def enqueue_legacy(q, path, chunk_size):
+    n = 0
+    for pdu in chunk_pdus(path, chunk_size):
+        q.push(pdu)
+        n += 1
+    return n
+
+
+def enqueue_batched(q, path, chunk_size):
+    n = 0
+    batch = []
+    for pdu in chunk_pdus(path, chunk_size):
+        batch.append(pdu)
+        if len(batch) >= PUSH_BATCH:
+            q.push_many(batch)
+            n += len(batch)
+            batch = []
+    if batch:
+        q.push_many(batch)
+        n += len(batch)
+    q.flush()
+    return n
+
+
+def resend_legacy(q, parser, ack_every):
+    # Vòng cũ luôn peek() phần tử đầu: phần tử kế chỉ được gửi khi phần tử đầu đã bị xóa (ACK).
+    # Trường hợp tốt nhất: ACK về ngay sau mỗi chunk (ack_every không áp dụng), xóa từng phần tử.
+    sent = nbytes = 0
+    while True:
+        entry = q.peek()
+        if entry is None:
+            break
+        qid, pdu = entry
+        parsed = parser.parse(pdu, reassemble=False)
+        nbytes += len(parsed.data)
+        sent += 1
+        q.remove(qid)
+    return sent, nbytes
+
+
+def resend_batched(q, parser, ack_every):
+    sent = nbytes = 0
+    cursor = 0
+    while True:
+        entries = q.peek_many(cursor, PUSH_BATCH)
+        if not entries:
+            break
+        for qid, pdu in entries:
+            parsed = parser.parse(pdu, reassemble=False)
+            nbytes += len(parsed.data)
+            sent += 1
+            if sent % ack_every == 0:
+                q.ack_through(qid)
+        cursor = entries[-1][0]
+    q.ack_through(cursor)
+    q.flush()
+    return sent, nbytes
+
+
+def run(label, make_queue, enqueue, resend, path, args, workdir):
+    db = os.path.join(workdir, f"{label}.db")
+    q = make_queue(db)
+    chunk_size = args.chunk_kb * 1024
+    parser = PDUParser()
+
+    t0 = time.perf_counter()
+    n = enqueue(q, path, chunk_size)
+    t_enq = time.perf_counter() - t0
+    db_mb = sum(os.path.getsize(db + ext) for ext in ("", "-wal") if os.path.exists(db + ext)) / 2**20
+
+    t0 = time.perf_counter()
+    sent, nbytes = resend(q, parser, args.ack_every)
+    t_send = time.perf_counter() - t0
+    q.close()
+
+    mb = nbytes / 2**20
+    extra = ""
+    if isinstance(q, DurableQueue):
+        extra = f"  ({q.commits} commit, push chờ {q.push_waits} lần)"
+    print(f"  {label:8s}: xếp hàng {n:6d} chunk {t_enq:7.2f}s {mb / t_enq:8.1f} MB/s {n / t_enq:8.0f} chunk/s"
+          f" | vòng gửi {sent:6d} chunk {t_send:7.2f}s {mb / t_send:8.1f} MB/s | DB {db_mb:.0f} MB{extra}")
+    for ext in ("", "-wal", "-shm"):
+        if os.path.exists(db + ext):
+            os.remove(db + ext)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size-mb", type=int, default=1024, help="kích thước file (MB)")
+    ap.add_argument("--chunk-kb", type=int, default=64, help="kích thước chunk (KB)")
+    ap.add_argument("--ack-every", type=int, default=16, help="bên nhận ACK sau mỗi N chunk")
+    ap.add_argument("--dir", default=None, help="thư mục chứa file / DB tạm")
+    ap.add_argument("--skip-legacy", action="store_true")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_dq_", dir=args.dir)
+    try:
+        path = os.path.join(workdir, "payload.bin")
+        make_file(path, args.size_mb * 2**20)
+        print(f"File {args.size_mb} MB, chunk {args.chunk_kb} KB, ACK mỗi {args.ack_every} chunk, thư mục {workdir}")
+        if not args.skip_legacy:
+            run("legacy", LegacyDurableQueue, enqueue_legacy, resend_legacy, path, args, workdir)
+        run("batched", DurableQueue, enqueue_batched, resend_batched, path, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
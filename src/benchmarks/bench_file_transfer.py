@@ -0,0 +1,232 @@
+# benchmarks/bench_file_transfer.py
+"""
+Benchmark gửi file đầu-cuối qua loopback TCP: FileSender (client) -> FileReceiver (manager) -> FILE_ACK / FILE_NAK.
+Giữa 2 bên là 1 "đường truyền" giả lập: trễ cố định --rtt-ms (chia đôi mỗi chiều) và mất ngẫu nhiên
+--loss phần FILE_CHUNK (FILE_START / FILE_END / ACK / NAK không bị mất).
+Gói đi trên socket với framing thật TPKT + MCS và được tách bằng PDUFrameDecoder như ở server relay /
+manager / client (PDU có trường theo cờ - SACK, mã transfer, CRC chunk - phải được tách đúng độ dài).
+Các cấu hình:
+- stop-and-wait: cửa sổ = 1 chunk (mỗi chunk chờ ACK của nó, như vòng gửi cũ peek-gửi-chờ).
+- window: cửa sổ --window-mb, bên nhận ACK cộng dồn + SACK, NAK khi thấy lỗ hổng.
+- window-nosack (chỉ khi --loss > 0): bên nhận không gửi SACK: chunk đã tới sau lỗ hổng vẫn bị gửi lại khi hết RTO.
+Đo: thời gian từ send_file tới khi bên nhận kiểm tra xong CRC (MB/s), số chunk gửi lại (do NAK / hết RTO), srtt.
+--crc: so sánh cách tính checksum (cùng cửa sổ --window-mb), thêm thời gian tới chunk đầu tiên ở bên nhận:
+- crc-upfront: đọc cả file tính CRC trước khi gửi FILE_START (đọc đĩa 2 lần).
+- crc-stream: CRC tính dần khi đọc chunk để gửi, FILE_END mang CRC cuối.
+- crc-stream+chunk: như trên, mỗi chunk kèm CRC32 riêng (--corrupt: tỉ lệ chunk bị lật 1 byte trên đường).
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_file_transfer [--size-mb 64] [--chunk-kb 32] [--window-mb 4] [--rtt-ms 20] [--loss 0.01]
+    python -m benchmarks.bench_file_transfer --crc [--size-mb 512] [--corrupt 0.001]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from benchmarks.bench_durable_queue import make_file
+from client.client_network.client_file_sender import FileSender
+from manager.manager_network.manager_file_receiver import FileReceiver
+from common_network.constants import PDU_TYPE_FILE_CHUNK, PDU_TYPE_FILE_ACK
+from common_network.pdu_parser import PDUParser
+from common_network.tpkt_layer import TPKTLayer
+from common_network.tpkt_writer import frame_header
+from common_network.mcs_layer import MCSLite
+from common_network.frame_decoder import PDUFrameDecoder
+from client.client_constants import CHANNEL_FILE
+
+
+class Link:
+    """
+    1 chiều: đọc TPKT từ sock, tách MCS frame và PDU (PDUFrameDecoder theo từng kênh),
+    giữ delay giây rồi giao từng PDU cho handler (theo thứ tự).
+    """
+    def __init__(self, sock, delay, handler, loss=0.0, seed=1, corrupt=0.0):
+        self.sock = sock
+        self.delay = delay
+        self.handler = handler
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.q = deque()
+        self.cond = threading.Condition()
+        self.corrupt = corrupt
+        self.dropped = 0
+        self.corrupted = 0
+        self.mcs = MCSLite()
+        self.decoders = defaultdict(PDUFrameDecoder)
+        self.running = True
+        threading.Thread(target=self._read, daemon=True, name="LinkRead").start()
+        threading.Thread(target=self._deliver, daemon=True, name="LinkDeliver").start()
+
+    def _read(self):
+        try:
+            while self.running:
+                for ch_id, payload in self.mcs.feed_view(TPKTLayer.recv_one_view(self.sock, timeout=600)):
+                    for pdu in self.decoders[ch_id].feed(payload):
+                        self._arrive(pdu)
+        except (ConnectionError, OSError):
+            pass
+
+    def _arrive(self, pdu):
+        if self.loss and pdu[12] == PDU_TYPE_FILE_CHUNK and self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        if self.corrupt and pdu[12] == PDU_TYPE_FILE_CHUNK and self.rng.random() < self.corrupt:
+            # lật 1 byte dữ liệu chunk (sau header 14 + offset/len 12)
+            self.corrupted += 1
+            pdu = bytearray(pdu)
+            pdu[26] ^= 0xFF
+            pdu = bytes(pdu)
+        with self.cond:
+            self.q.append((time.monotonic() + self.delay, pdu))
+            self.cond.notify()
+
+    def _deliver(self):
+        while self.running:
+            with self.cond:
+                while self.running and not self.q:
+                    self.cond.wait(0.1)
+                if not self.q:
+                    continue
+                due, pdu = self.q[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+                self.q.popleft()
+            try:
+                self.handler(pdu)
+            except Exception as e:
+                print(f"[Link] Lỗi xử lý PDU: {e}")
+
+    def dropped_bytes(self) -> int:
+        """Số byte PDUFrameDecoder phải bỏ (PDU bị tách sai độ dài) - phải bằng 0."""
+        return sum(d.dropped_bytes for d in self.decoders.values())
+
+    def stop(self):
+        self.running = False
+
+
+class SocketNet:
+    """Đối tượng network tối thiểu cho FileSender: send_mcs_pdu ghi 1 gói TPKT + MCS vào socket."""
+    def __init__(self, sock):
+        self.sock = sock
+        self.running = True
+        self.client = sock
+        self.ext_framing = False
+        self.lock = threading.Lock()
+
+    def send_mcs_pdu(self, channel, pdu):
+        with self.lock:
+            self.sock.sendall(frame_header(channel, len(pdu)) + pdu)
+
+
+def run(label, path, workdir, args, window, sack, stream_crc=True, chunk_crc=False):
+    a1, b1 = socket.socketpair() # client -> manager
+    a2, b2 = socket.socketpair() # manager -> client
+    out_dir = os.path.join(workdir, f"recv_{label}")
+    delay = args.rtt_ms / 2000
+
+    net = SocketNet(a1)
+    seq = iter(range(1, 1 << 62))
+    sender = FileSender(net, lambda: next(seq), window_bytes=window,
+                        journal_path=os.path.join(workdir, f"journal_{label}.db"))
+    ack_lock = threading.Lock()
+
+    def send_back(pdu):
+        with ack_lock:
+            a2.sendall(frame_header(CHANNEL_FILE, len(pdu)) + pdu)
+
+    receiver = FileReceiver(send_back, save_dir=out_dir, sack=sack)
+    rparser, sparser = PDUParser(), PDUParser()
+    done = threading.Event()
+    first_chunk = []
+
+    def on_manager_pdu(pdu):
+        if not first_chunk and pdu[12] == PDU_TYPE_FILE_CHUNK:
+            first_chunk.append(time.perf_counter())
+        receiver.handle_pdu(rparser.parse(pdu, reassemble=False))
+        if receiver.complete or receiver.files_failed:
+            done.set() # sai CRC cả file: bên gửi bỏ transfer, không chờ hết --timeout
+
+    def on_client_pdu(pdu):
+        parsed = sparser.parse(pdu, reassemble=False)
+        if parsed.ptype == PDU_TYPE_FILE_ACK:
+            sender.handle_file_ack(parsed)
+        else:
+            sender.handle_file_nak(parsed)
+
+    links = [Link(b1, delay, on_manager_pdu, loss=args.loss, corrupt=args.corrupt), Link(b2, delay, on_client_pdu)]
+    sender.start()
+    t0 = time.perf_counter()
+    sender.send_file(path, args.chunk_kb * 1024, stream_crc=stream_crc, chunk_crc=chunk_crc)
+    ok = done.wait(args.timeout) and receiver.complete
+    elapsed = time.perf_counter() - t0
+    st = sender.stats()
+    sender.stop()
+    for link in links:
+        link.stop()
+    for s in (a1, b1, a2, b2):
+        s.close()
+    receiver.close()
+    sender.journal.close()
+
+    size = os.path.getsize(path)
+    if ok:
+        with open(path, "rb") as f1, open(os.path.join(out_dir, os.path.basename(path)), "rb") as f2:
+            ok = f1.read() == f2.read()
+    mb = size / 2**20
+    first_ms = (first_chunk[0] - t0) * 1000 if first_chunk else float("nan")
+    extra = f" hỏng {links[0].corrupted:4d} (NAK chunk_crc {receiver.corrupt_chunks})" if args.corrupt else ""
+    print(f"  {label:16s}: {elapsed:7.2f}s {mb / elapsed:8.1f} MB/s | chunk đầu {first_ms:7.1f} ms | "
+          f"chunk gửi {st['chunks_sent']:6d} gửi lại {st['retransmits']:5d} (NAK {st['fast_retransmits']}, "
+          f"RTO {st['timeouts']} lần) mất {links[0].dropped:4d}{extra} | srtt {st['srtt_ms']} ms | "
+          f"ACK {receiver.acks_sent} NAK {receiver.naks_sent} sai CRC file {receiver.files_failed}"
+          f"{'' if ok else '  [LỖI: chưa nhận đủ / sai nội dung]'}")
+    bad = sum(link.dropped_bytes() for link in links)
+    if bad:
+        print(f"  [LỖI: PDUFrameDecoder bỏ {bad} bytes - độ dài PDU không khớp builder]")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size-mb", type=int, default=64, help="kích thước file (MB)")
+    ap.add_argument("--chunk-kb", type=int, default=32, help="kích thước chunk (KB)")
+    ap.add_argument("--window-mb", type=float, default=4, help="cửa sổ gửi (MB)")
+    ap.add_argument("--rtt-ms", type=float, default=20, help="RTT giả lập (ms)")
+    ap.add_argument("--loss", type=float, default=0.0, help="tỉ lệ mất FILE_CHUNK (0..1)")
+    ap.add_argument("--timeout", type=float, default=600, help="giới hạn thời gian mỗi cấu hình (s)")
+    ap.add_argument("--corrupt", type=float, default=0.0, help="tỉ lệ FILE_CHUNK bị hỏng 1 byte (0..1)")
+    ap.add_argument("--crc", action="store_true", help="so sánh CRC trước / CRC tính dần / CRC từng chunk")
+    ap.add_argument("--skip-stop-and-wait", action="store_true")
+    ap.add_argument("--dir", default=None, help="thư mục chứa file / DB tạm")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_ft_", dir=args.dir)
+    try:
+        path = os.path.join(workdir, "payload.bin")
+        make_file(path, args.size_mb * 2**20)
+        print(f"File {args.size_mb} MB, chunk {args.chunk_kb} KB, cửa sổ {args.window_mb} MB, "
+              f"RTT {args.rtt_ms} ms, mất {args.loss * 100:.1f}% chunk, thư mục {workdir}")
+        window = int(args.window_mb * 2**20)
+        if args.crc:
+            run("crc-upfront", path, workdir, args, window, True, stream_crc=False)
+            run("crc-stream", path, workdir, args, window, True, stream_crc=True)
+            run("crc-stream+chunk", path, workdir, args, window, True, stream_crc=True, chunk_crc=True)
+            return
+        if not args.skip_stop_and_wait:
+            run("stop-and-wait", path, workdir, args, args.chunk_kb * 1024, True)
+        run("window", path, workdir, args, window, True)
+        if args.loss > 0:
+            run("window-nosack", path, workdir, args, window, False)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
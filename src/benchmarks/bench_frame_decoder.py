@@ -0,0 +1,121 @@
+# benchmarks/bench_frame_decoder.py
+"""
+Microbenchmark tách PDU trên buffer kênh: số PDU/giây với traffic hỗn hợp
+cursor / input / video (RECT), so sánh cách cũ (bytes(buf) + del buf[:n] cho mỗi PDU)
+với PDUFrameDecoder (một lượt trên memoryview).
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_frame_decoder [--seconds 2] [--chunk 16384]
+"""
+
+import argparse
+import random
+import struct
+import time
+from common_network.pdu_builder import PDUBuilder
+from common_network.frame_decoder import PDUFrameDecoder
+from common_network.constants import (
+    SHARE_CTRL_HDR_FMT, SHARE_HDR_SIZE, FRAGMENT_FLAG,
+    PDU_TYPE_FULL, PDU_TYPE_RECT, PDU_TYPE_CONTROL, PDU_TYPE_INPUT, PDU_TYPE_CURSOR,
+)
+
+
+class LegacyChannelBuffer:
+    """Bản sao logic cũ của *Receiver._process_channel_buffer (để so sánh)."""
+    def __init__(self):
+        self.buf = bytearray()
+
+    @staticmethod
+    def _get_pdu_total_length(data: bytes) -> int:
+        if len(data) < SHARE_HDR_SIZE:
+            raise ValueError("header")
+        seq, ts_ms, ptype, flags = struct.unpack_from(SHARE_CTRL_HDR_FMT, data)
+        offset = SHARE_HDR_SIZE
+        if flags & FRAGMENT_FLAG:
+            return len(data)
+        try:
+            if ptype == PDU_TYPE_FULL:
+                if len(data) < offset + 12: raise ValueError("FULL")
+                return offset + 12 + struct.unpack_from(">I", data, offset + 8)[0]
+            elif ptype == PDU_TYPE_RECT:
+                if len(data) < offset + 28: raise ValueError("RECT")
+                return offset + 28 + struct.unpack_from(">I", data, offset + 16)[0]
+            elif ptype in (PDU_TYPE_CONTROL, PDU_TYPE_INPUT):
+                if len(data) < offset + 4: raise ValueError("CONTROL/INPUT")
+                return offset + 4 + struct.unpack_from(">I", data, offset)[0]
+            elif ptype == PDU_TYPE_CURSOR:
+                if len(data) < offset + 12: raise ValueError("CURSOR")
+                return offset + 12 + struct.unpack_from(">I", data, offset + 8)[0]
+            raise ValueError(f"ptype {ptype}")
+        except struct.error:
+            raise ValueError("short")
+
+    def feed(self, data: bytes):
+        self.buf.extend(data)
+        out = []
+        buf = self.buf
+        while buf:
+            try:
+                total = self._get_pdu_total_length(bytes(buf))
+            except ValueError:
+                break
+            if len(buf) < total:
+                break
+            out.append(buf[:total])
+            del buf[:total]
+        return out
+
+
+def build_stream(n_groups: int, rect_size: int, burst: int, seed: int = 1):
+    """Sinh traffic: mỗi nhóm gồm 1 RECT (video) theo sau là một loạt cursor/input nhỏ."""
+    rnd = random.Random(seed)
+    jpg = bytes(rnd.getrandbits(8) for _ in range(rect_size))
+    parts = []
+    seq = 0
+    for _ in range(n_groups):
+        seq += 1
+        parts.append(PDUBuilder.build_rect_frame_pdu(seq, jpg, 10, 10, 64, 64, 1280, 720))
+        for i in range(burst):
+            seq += 1
+            if i % 3 == 0:
+                parts.append(PDUBuilder.build_input_pdu(seq, {"type": "mouse_move", "x_norm": 0.5, "y_norm": 0.5}))
+            else:
+                parts.append(PDUBuilder.build_cursor_pdu(seq, rnd.randrange(10000), rnd.randrange(10000)))
+    return b"".join(parts), len(parts)
+
+
+def run(decoder_factory, stream: bytes, chunk: int, seconds: float):
+    pdus = 0
+    elapsed = 0.0
+    rounds = 0
+    while elapsed < seconds:
+        dec = decoder_factory()
+        t0 = time.perf_counter()
+        for off in range(0, len(stream), chunk):
+            pdus += len(dec.feed(stream[off:off + chunk]))
+        elapsed += time.perf_counter() - t0
+        rounds += 1
+    return pdus / elapsed, rounds
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=2.0)
+    ap.add_argument("--chunk", type=int, default=256 * 1024, help="kích thước mỗi lần feed (bytes)")
+    ap.add_argument("--rect-size", type=int, default=60000)
+    ap.add_argument("--burst", type=int, default=200, help="số PDU cursor/input sau mỗi RECT")
+    ap.add_argument("--groups", type=int, default=20)
+    args = ap.parse_args()
+
+    stream, count = build_stream(args.groups, args.rect_size, args.burst)
+    print(f"Traffic: {count} PDU, {len(stream) / 1024:.0f} KB, feed {args.chunk} bytes/lần")
+
+    legacy_rate, _ = run(LegacyChannelBuffer, stream, args.chunk, args.seconds)
+    new_rate, _ = run(PDUFrameDecoder, stream, args.chunk, args.seconds)
+    print(f"  legacy (bytes(buf) mỗi PDU): {legacy_rate:12,.0f} PDU/s")
+    print(f"  PDUFrameDecoder (1 lượt)  : {new_rate:12,.0f} PDU/s")
+    print(f"  tăng tốc: x{new_rate / legacy_rate:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_grabber.py
+"""
+So sánh chi phí mỗi frame khi chụp màn hình bằng mss:
+- per-frame:  cách cũ `with mss() as sct: sct.grab(sct.monitors[1])` ở mỗi frame
+- persistent: ScreenGrabber (1 phiên mss dùng lại, kiểm tra bố cục màn hình định kỳ)
+Báo cáo p50/p99/mean ms mỗi frame và frame/s tối đa (chụp liên tục, không ngủ).
+
+Cần màn hình thật (X11 / Windows / macOS) và thư viện mss. Chạy từ thư mục src:
+    python -m benchmarks.bench_grabber [--frames 200] [--monitor 1]
+"""
+
+import argparse
+import time
+from mss import mss
+from client.client_grabber import ScreenGrabber
+from common_network.stats import LatencyHistogram
+
+
+def per_frame(args) -> LatencyHistogram:
+    hist = LatencyHistogram()
+    for _ in range(args.frames):
+        t0 = time.perf_counter()
+        with mss() as sct:
+            sct.grab(sct.monitors[args.monitor])
+        hist.record((time.perf_counter() - t0) * 1000)
+    return hist
+
+
+def persistent(args) -> LatencyHistogram:
+    hist = LatencyHistogram()
+    with ScreenGrabber(monitor_index=args.monitor) as grabber:
+        for _ in range(args.frames):
+            t0 = time.perf_counter()
+            grabber.grab()
+            hist.record((time.perf_counter() - t0) * 1000)
+        print(f"    ScreenGrabber.stats(): {grabber.stats()}")
+    return hist
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frames", type=int, default=200)
+    ap.add_argument("--monitor", type=int, default=1)
+    args = ap.parse_args()
+
+    for name, fn in (("per-frame", per_frame), ("persistent", persistent)):
+        s = fn(args).summary()
+        fps = 1000.0 / s["mean"] if s["mean"] else 0.0
+        print(f"  {name:10s}: p50 {s['p50']:7.2f} ms  p99 {s['p99']:7.2f} ms  mean {s['mean']:7.2f} ms  "
+              f"(tối đa {fps:6.1f} frame/s)")
+
+
+if __name__ == "__main__":
+    main()
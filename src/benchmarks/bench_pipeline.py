@@ -0,0 +1,104 @@
+# benchmarks/bench_pipeline.py
+"""
+Benchmark gửi màn hình phía client: capture_loop tuần tự vs CapturePipeline (chụp -> N luồng encode -> sender).
+Màn hình giả lập: ClientScreenshot với capture_raw() phát lại một vòng frame BGRA tổng hợp
+(mặc định 4K, kịch bản bench_delta), callback giả lập sender (trả True, đếm byte).
+Báo cáo: fps đạt được so với fps cấu hình, số lượt bị bỏ, độ trễ từng giai đoạn (p50/p99 ms).
+
+Cần các thư viện của client (mss, pyautogui) vì import ClientScreenshot.
+Chạy từ thư mục src:
+    python -m benchmarks.bench_pipeline [--size 3840x2160] [--fps 15] [--seconds 5] [--workers 0,1,2,4]
+    (--workers 0 = capture_loop tuần tự)
+"""
+
+import argparse
+import os
+import threading
+import time
+from types import SimpleNamespace
+from benchmarks.bench_delta import synth_sequence, to_bgra
+from client.client_screenshot import ClientScreenshot
+from client.client_pipeline import CapturePipeline
+
+
+class ReplayScreenshot(ClientScreenshot):
+    """ClientScreenshot chụp từ danh sách buffer BGRA có sẵn (quay vòng) thay vì mss."""
+    def __init__(self, frames, **kwargs):
+        super().__init__(**kwargs)
+        self.frames = frames
+        self.pos = 0
+
+    def capture_raw(self):
+        bgra, (w, h) = self.frames[self.pos % len(self.frames)]
+        self.pos += 1
+        return SimpleNamespace(bgra=bgra, size=(w, h), width=w, height=h)
+
+
+class Sink:
+    """Giả lập ClientSender.enqueue_frame: nhận mọi frame."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.bytes = 0
+        self.seqs = []
+
+    def __call__(self, width, height, jpg_bytes, bbox, img, seq, ts_ms):
+        with self.lock:
+            self.frames += 1
+            self.bytes += len(jpg_bytes)
+            self.seqs.append(seq)
+        return True
+
+
+def run(label: str, workers: int, frames, args):
+    shot = ReplayScreenshot(frames, fps=args.fps, quality=args.quality, max_dimension=args.max_dimension)
+    shot.FULL_FRAME_INTERVAL = args.full_interval
+    sink = Sink()
+    if workers == 0:
+        t = threading.Thread(target=shot.capture_loop, args=(sink,), daemon=True)
+        t.start()
+        time.sleep(args.seconds)
+        shot.stop = True
+        t.join(timeout=5)
+        stats = None
+    else:
+        pipe = CapturePipeline(shot, sink, encode_workers=workers)
+        pipe.start()
+        time.sleep(args.seconds)
+        pipe.stop(timeout=5)
+        stats = pipe.stats()
+
+    assert sink.seqs == sorted(sink.seqs), "frame giao sai thứ tự"
+    captures = shot.pos
+    print(f"  {label:10s}: {captures / args.seconds:5.1f} lượt chụp/s (cấu hình {args.fps})  "
+          f"{sink.frames / args.seconds:6.1f} PDU/s  {sink.bytes / args.seconds / 1e6:6.2f} MB/s")
+    if stats:
+        print(f"              bỏ lượt chụp {stats['skipped']}, idle {stats['idle']}, lỗi {stats['errors']}")
+        for name, h in stats["latency_ms"].items():
+            if h["count"]:
+                print(f"              {name:10s} p50 {h['p50']:7.2f}  p99 {h['p99']:7.2f}  max {h['max']:7.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size", default="3840x2160")
+    ap.add_argument("--fps", type=int, default=15)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--workers", default="0,1,2,4", help="danh sách số luồng encode (0 = tuần tự)")
+    ap.add_argument("--scenario", default="scroll", choices=("idle", "clock+cursor", "typing", "scroll"))
+    ap.add_argument("--ring", type=int, default=6, help="số frame khác nhau phát lại quay vòng")
+    ap.add_argument("--quality", type=int, default=65)
+    ap.add_argument("--max-dimension", type=int, default=1920)
+    ap.add_argument("--full-interval", type=float, default=2.0, help="FULL_FRAME_INTERVAL (s)")
+    args = ap.parse_args()
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    frames = [to_bgra(img, size) for img in synth_sequence(args.scenario, args.ring)]
+    print(f"{args.scenario} {size[0]}x{size[1]} -> max {args.max_dimension}, {args.fps} fps, "
+          f"{args.seconds:.0f}s, {os.cpu_count()} CPU")
+    for workers in (int(v) for v in args.workers.split(",")):
+        run("tuần tự" if workers == 0 else f"{workers} encode", workers, frames, args)
+
+
+if __name__ == "__main__":
+    main()
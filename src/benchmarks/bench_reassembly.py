@@ -0,0 +1,120 @@
+# benchmarks/bench_reassembly.py
+"""
+Microbenchmark lắp ráp fragment (PDUParser.parse, reassemble=True):
+- legacy: logic cũ của PDUParser._store_fragment (dict offset->bytes, quét toàn bộ seq đang chờ
+          và tính lại sum(len) ở mỗi fragment, sắp xếp + nối khi đủ mảnh)
+- reassembler: FragmentReassembler (bytearray cấp phát sẵn, ghi tại chỗ, đếm tăng dần, hết hạn theo deque)
+Các kịch bản: fragment đến theo thứ tự, xáo trộn, có trùng lặp; `--inflight` frame đan xen nhau
+(nhiều seq cùng chờ -> chi phí quét của cách cũ tăng theo).
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_reassembly [--frame-kb 2048] [--frames 40] [--inflight 4] [--frag-bytes 64000]
+"""
+
+import argparse
+import os
+import random
+import struct
+import time
+from common_network.pdu_builder import PDUBuilder
+from common_network.pdu_parser import PDUParser
+from common_network.constants import (
+    SHARE_CTRL_HDR_FMT, SHARE_HDR_SIZE, FRAGMENT_HDR_FMT, FRAGMENT_HDR_SIZE,
+    FRAGMENT_ASSEMBLY_TIMEOUT, MAX_BODY_SIZE_PER_FRAGMENT,
+)
+
+
+class LegacyReassembler:
+    """Bản sao logic cũ của PDUParser._store_fragment / _cleanup_old_fragments (để so sánh)."""
+    def __init__(self):
+        self.fragment_buffer = {}
+
+    def _cleanup_old_fragments(self):
+        now = time.time()
+        to_delete = []
+        for seq, meta in list(self.fragment_buffer.items()):
+            if now - meta.get("first_ts", now) > FRAGMENT_ASSEMBLY_TIMEOUT:
+                to_delete.append(seq)
+        for seq in to_delete:
+            self.fragment_buffer.pop(seq, None)
+
+    def add(self, seq, ts_ms, ptype, frag_offset, total_len, payload):
+        self._cleanup_old_fragments()
+        meta = self.fragment_buffer.get(seq)
+        if meta is None:
+            meta = {"total": total_len, "parts": {}, "ptype": ptype, "ts_ms": ts_ms, "first_ts": time.time()}
+            self.fragment_buffer[seq] = meta
+        current = sum(len(b) for b in meta["parts"].values())
+        if current + len(payload) > 50 * 1024 * 1024:
+            raise MemoryError()
+        meta["parts"][frag_offset] = payload
+        received = sum(len(b) for b in meta["parts"].values())
+        if received >= meta["total"]:
+            parts = meta["parts"]
+            assembled = bytearray()
+            for off in sorted(parts.keys()):
+                assembled.extend(parts[off])
+            del self.fragment_buffer[seq]
+            return struct.pack(SHARE_CTRL_HDR_FMT, seq, meta["ts_ms"], meta["ptype"], 0) + assembled
+        return None
+
+
+def make_stream(args, mode: str):
+    """Sinh danh sách fragment của args.frames frame, mỗi lần args.inflight frame đan xen."""
+    rnd = random.Random(1)
+    jpg = os.urandom(args.frame_kb * 1024)
+    per_frame = []
+    for seq in range(args.frames):
+        pdu = PDUBuilder.build_full_frame_pdu(seq, jpg, 1920, 1080)
+        frags = [f for _, f in PDUBuilder.fragmentize(pdu, args.frag_bytes)]
+        if mode == "shuffled":
+            rnd.shuffle(frags)
+        elif mode == "duplicates":
+            frags = frags + rnd.sample(frags, max(1, len(frags) // 10)) # 10% gửi lại
+            rnd.shuffle(frags)
+        per_frame.append(frags)
+
+    stream = []
+    for base in range(0, args.frames, args.inflight):
+        group = per_frame[base:base + args.inflight]
+        for i in range(max(len(g) for g in group)):
+            for g in group:
+                if i < len(g):
+                    stream.append(g[i])
+    return stream
+
+
+def run(name: str, add, stream, nbytes: int):
+    hdr = struct.Struct(SHARE_CTRL_HDR_FMT)
+    frag_hdr = struct.Struct(FRAGMENT_HDR_FMT)
+    done = 0
+    t0 = time.perf_counter()
+    for frag in stream:
+        seq, ts_ms, ptype, _ = hdr.unpack_from(frag)
+        off, total = frag_hdr.unpack_from(frag, SHARE_HDR_SIZE)
+        if add(seq, ts_ms, ptype, off, total, memoryview(frag)[SHARE_HDR_SIZE + FRAGMENT_HDR_SIZE:]) is not None:
+            done += 1
+    elapsed = time.perf_counter() - t0
+    print(f"    {name:12s}: {done / elapsed:8.1f} frame/s  {nbytes / elapsed / 1e6:8.1f} MB/s  "
+          f"{len(stream) / elapsed:10,.0f} fragment/s  (hoàn tất {done})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frame-kb", type=int, default=2048)
+    ap.add_argument("--frames", type=int, default=40)
+    ap.add_argument("--inflight", type=int, default=4, help="số frame đan xen (seq cùng chờ lắp ráp)")
+    ap.add_argument("--frag-bytes", type=int, default=MAX_BODY_SIZE_PER_FRAGMENT, help="kích thước mỗi fragment")
+    args = ap.parse_args()
+
+    nbytes = args.frames * args.frame_kb * 1024
+    print(f"{args.frames} frame x {args.frame_kb} KB, fragment {args.frag_bytes} B, {args.inflight} frame đan xen")
+    for mode in ("in-order", "shuffled", "duplicates"):
+        stream = make_stream(args, mode)
+        print(f"  {mode} ({len(stream)} fragment)")
+        run("legacy", LegacyReassembler().add, stream, nbytes)
+        run("reassembler", PDUParser().reassembler.add, stream, nbytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/bench_relay.py
+"""
+Benchmark đường chuyển tiếp (relay) của server0: bytes/giây trên mỗi core (thời gian CPU).
+- legacy: TPKT body (bytes) -> MCSLite.feed/read_channel -> tách PDU bằng bytes(buf)
+          -> PDUParser.parse (copy payload) -> MCSLite.build + TPKTLayer.pack (nối buffer)
+- zero-copy: TPKT body (memoryview) -> MCSLite.feed_view -> PDUFrameDecoder -> PDURecord (raw là memoryview)
+          -> FrameBatch (gói nhỏ nối lại, payload lớn gửi thẳng; như worker của ServerBroadcaster)
+Socket đích là một sink rỗng nên chi phí TLS (giống nhau ở cả hai đường) không được tính.
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_relay [--seconds 2] [--frame-kb 150]
+"""
+
+import argparse
+import os
+import time
+from common_network.pdu_builder import PDUBuilder
+from common_network.pdu_parser import PDUParser
+from common_network.mcs_layer import MCSLite
+from common_network.tpkt_layer import TPKTLayer
+from common_network.frame_decoder import PDUFrameDecoder
+from common_network.tpkt_writer import FrameBatch, DEFAULT_MAX_BATCH
+from server0.server_constants import CHANNEL_VIDEO, CHANNEL_CURSOR
+from benchmarks.bench_frame_decoder import LegacyChannelBuffer
+
+MAX_BODY_SIZE_PER_FRAGMENT = 64000
+
+
+class NullSock:
+    """Sink thay cho SSL socket: chỉ đếm số byte."""
+    def __init__(self):
+        self.bytes = 0
+
+    def sendall(self, data):
+        self.bytes += len(data)
+
+
+def build_tpkt_bodies(frame_kb: int, frames: int):
+    """Sinh các TPKT body (MCS frame) như ClientSender gửi: FULL frame phân mảnh + cursor."""
+    jpg = os.urandom(frame_kb * 1024)
+    bodies = []
+    for seq in range(frames):
+        pdu = PDUBuilder.build_full_frame_pdu(seq, jpg, 1280, 720)
+        for _, frag in PDUBuilder.fragmentize(pdu, MAX_BODY_SIZE_PER_FRAGMENT):
+            bodies.append(MCSLite.build(CHANNEL_VIDEO, frag))
+        for i in range(3):
+            bodies.append(MCSLite.build(CHANNEL_CURSOR, PDUBuilder.build_cursor_pdu(seq, i, i)))
+    return bodies
+
+
+def relay_legacy(bodies, sink):
+    mcs = MCSLite()
+    parser = PDUParser()
+    buffers = {CHANNEL_VIDEO: LegacyChannelBuffer(), CHANNEL_CURSOR: LegacyChannelBuffer()}
+    for body in bodies:
+        mcs.feed(body)
+        for ch_id, chan in buffers.items():
+            new_data = mcs.read_channel(ch_id)
+            if not new_data:
+                continue
+            for pdu_bytes in chan.feed(new_data):
+                parser.parse(bytes(pdu_bytes), reassemble=False)
+                sink.sendall(TPKTLayer.pack(MCSLite.build(ch_id, pdu_bytes)))
+
+
+def relay_zero_copy(bodies, sink):
+    mcs = MCSLite()
+    parser = PDUParser()
+    decoders = {CHANNEL_VIDEO: PDUFrameDecoder(), CHANNEL_CURSOR: PDUFrameDecoder()}
+    for body in bodies:
+        # Body TPKT được nhận vào bytearray riêng (như recv_one_view); bản sao này
+        # mô phỏng recv_into và được tính vào thời gian đo.
+        for ch_id, payload in mcs.feed_view(memoryview(bytearray(body))):
+            batch = FrameBatch()
+            for pdu_view in decoders[ch_id].feed(payload):
+                pdu = parser.parse(pdu_view, reassemble=False)
+                batch.add(ch_id, pdu.raw)
+            while batch:
+                for seg in batch.take(DEFAULT_MAX_BATCH)[0]:
+                    sink.sendall(seg)
+
+
+def measure(fn, bodies, seconds):
+    sink = NullSock()
+    cpu = 0.0
+    while cpu < seconds:
+        t0 = time.process_time()
+        fn(bodies, sink)
+        cpu += time.process_time() - t0
+    return sink.bytes / cpu
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=2.0)
+    ap.add_argument("--frame-kb", type=int, default=150, help="kích thước JPEG của mỗi FULL frame (KB)")
+    ap.add_argument("--frames", type=int, default=20)
+    args = ap.parse_args()
+
+    bodies = build_tpkt_bodies(args.frame_kb, args.frames)
+    legacy = measure(relay_legacy, bodies, args.seconds)
+    zero_copy = measure(relay_zero_copy, bodies, args.seconds)
+    mb = 1024 * 1024
+    print(f"Traffic: {len(bodies)} MCS frame, FULL {args.frame_kb} KB")
+    print(f"  legacy   : {legacy / mb:10.1f} MB/s mỗi core")
+    print(f"  zero-copy: {zero_copy / mb:10.1f} MB/s mỗi core")
+    print(f"  tăng tốc: x{zero_copy / legacy:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# benchmarks/bench_session_routing.py
+"""
+Benchmark tranh chấp lock của SessionManager với nhiều kết nối (mặc định 500: 1/2 client, 1/2 manager).
+- global-lock: mô phỏng thiết kế cũ: 1 lock chung cho việc tra phiên của MỌI PDU, đổi phiên, danh sách client
+  và seq tin nhắn của server.
+- sharded: SessionManager hiện tại: tra phiên không lấy lock (bảng copy-on-write theo shard),
+  đổi phiên chỉ lấy lock của các shard liên quan, seq bằng itertools.count.
+Mỗi kết nối có 1 luồng nhận riêng (như ServerReceiver của engine thread) gọi handle_pdu --rate lần / giây
+(--rate 0: liên tục, bão hòa CPU -> đo thông lượng tối đa; luồng điều khiển khi đó chỉ còn ít lượt GIL):
+client trong phiên gửi CURSOR, manager gửi INPUT, client chưa có người xem gửi RECT (ghi vào cache keyframe).
+Song song, 1 luồng điều khiển liên tục cho manager vào / rời phiên, cứ 10 lượt thì thêm 1 client
+kết nối / đăng ký / ngắt kết nối (danh sách client được gửi lại cho mọi manager rảnh).
+SessionManager chạy inline (định tuyến ngay trong handle_pdu), broadcaster chỉ đếm số PDU gửi đi.
+Báo cáo: PDU / s qua handle_pdu, độ trễ mỗi lần gọi (p50 / p99 / max µs), số lượt đổi phiên / s và độ trễ.
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_session_routing [--connections 500] [--sessions 200] [--rate 50] [--seconds 3]
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+from common_network.pdu_builder import PDUBuilder
+from common_network.pdu_parser import PDUParser
+from server0.server_constants import (
+    CHANNEL_CONTROL, CMD_REGISTER, CMD_CONNECT_CLIENT, CMD_DISCONNECT, ROLE_CLIENT, ROLE_MANAGER,
+)
+from server0.server_network.server_session_manager import SessionManager
+
+
+class CountingBroadcaster:
+    """Thay cho ServerBroadcaster: không có socket, chỉ đếm."""
+    def __init__(self):
+        self.sent = 0
+
+    def enqueue(self, target_id, channel_id, pdu_bytes):
+        self.sent += 1
+
+    def video_backlog(self, target_id):
+        return 0
+
+
+class GlobalLockSessionManager(SessionManager):
+    """Thiết kế cũ: 1 lock (1 shard) cho mọi thứ, tra phiên của mỗi PDU và tăng seq tin nhắn cũng lấy lock đó."""
+    def __init__(self, broadcaster):
+        super().__init__(broadcaster, inline=True, shards=1)
+        self.lock = self.shards[0].lock
+
+    def _route(self, cid):
+        with self.lock:
+            return self.shards[0].routes.get(cid)
+
+    def _send_control_pdu(self, target_id, message: str):
+        with self.lock:
+            seq = next(self._seq) & 0xFFFFFFFF
+            pdu_bytes = self.builder.build_control_pdu(seq, message.encode())
+        self.broadcaster.enqueue(target_id, CHANNEL_CONTROL, pdu_bytes)
+
+
+def parse(raw: bytes):
+    return PDUParser().parse(raw, reassemble=False)
+
+
+def control(message: str):
+    return parse(PDUBuilder.build_control_pdu(0, message.encode()))
+
+
+def percentiles(samples):
+    if not samples:
+        return float("nan"), float("nan"), float("nan")
+    samples.sort()
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))], samples[-1]
+
+
+def setup(sm, n_clients: int, n_managers: int, n_sessions: int):
+    clients = [f"pc{i}" for i in range(n_clients)]
+    managers = [f"mgr{i}" for i in range(n_managers)]
+    for cid, role in [(c, ROLE_CLIENT) for c in clients] + [(m, ROLE_MANAGER) for m in managers]:
+        sm.handle_new_connection(cid, None)
+        sm.handle_pdu(cid, control(f"{CMD_REGISTER}{role}"))
+    for mid, cid in zip(managers[:n_sessions], clients[:n_sessions]):
+        sm.handle_pdu(mid, control(f"{CMD_CONNECT_CLIENT}{cid}"))
+    return clients, managers
+
+
+def run(label: str, sm, args):
+    half = args.connections // 2
+    clients, managers = setup(sm, half, args.connections - half, args.sessions)
+    churners = managers[args.sessions:args.sessions + args.churners]
+    in_session = clients[:args.sessions]
+
+    pdus = {
+        "cursor": parse(PDUBuilder.build_cursor_pdu(1, 100, 200)),
+        "input": parse(PDUBuilder.build_input_pdu(1, {"type": "mouse_move", "x_norm": 0.5, "y_norm": 0.5})),
+        "rect": parse(PDUBuilder.build_rect_frame_pdu(1, b"r" * 200, 0, 0, 8, 8, 1280, 720)),
+    }
+    go = threading.Event() # mọi luồng cùng bắt đầu (luồng tạo sau không bị các luồng đang chạy làm chậm)
+    stop = threading.Event()
+    samples = []
+
+    def receiver(cid, pdu):
+        handle = sm.handle_pdu
+        clock = time.perf_counter
+        interval = 1.0 / args.rate if args.rate > 0 else 0.0
+        local = []
+        go.wait()
+        due = clock() + random.random() * interval # rải đều các kết nối
+        while not stop.is_set():
+            if interval:
+                delay = due - clock()
+                if delay > 0:
+                    time.sleep(delay)
+                due += interval
+            t0 = clock()
+            handle(cid, pdu)
+            local.append(clock() - t0)
+        samples.append(local)
+
+    threads = []
+    for cid in clients:
+        pdu = pdus["cursor"] if sm._route(cid) is not None else pdus["rect"]
+        threads.append(threading.Thread(target=receiver, args=(cid, pdu), daemon=True))
+    for mid in managers:
+        if mid not in churners:
+            threads.append(threading.Thread(target=receiver, args=(mid, pdus["input"]), daemon=True))
+
+    churn_lat = []
+
+    def churn():
+        rng = random.Random(1)
+        leave = control(CMD_DISCONNECT)
+        i = 0
+        go.wait()
+        while not stop.is_set():
+            mid = churners[i % len(churners)]
+            target = rng.choice(in_session)
+            t0 = time.perf_counter()
+            sm.handle_pdu(mid, control(f"{CMD_CONNECT_CLIENT}{target}"))
+            sm.handle_pdu(mid, leave)
+            if i % 10 == 0:
+                cid = f"extra{i}"
+                sm.handle_new_connection(cid, None)
+                sm.handle_pdu(cid, control(f"{CMD_REGISTER}{ROLE_CLIENT}"))
+                sm.handle_disconnection(cid)
+            churn_lat.append(time.perf_counter() - t0)
+            i += 1
+
+    threads.append(threading.Thread(target=churn, daemon=True))
+    for t in threads:
+        t.start()
+    go.set()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    lat = [s * 1e6 for local in samples for s in local]
+    total = len(lat)
+    p50, p99, pmax = percentiles(lat)
+    c50, c99, _ = percentiles([s * 1e3 for s in churn_lat])
+    print(f"  {label:11s}: {total / args.seconds:10.0f} PDU/s  handle_pdu p50 {p50:7.1f}  p99 {p99:9.1f}  "
+          f"max {pmax:9.1f} µs  | đổi phiên {len(churn_lat) / args.seconds:6.0f}/s  p50 {c50:6.2f}  p99 {c99:7.2f} ms")
+    sm.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--connections", type=int, default=500, help="số kết nối giả lập (1/2 client, 1/2 manager)")
+    ap.add_argument("--sessions", type=int, default=200, help="số phiên đang chạy")
+    ap.add_argument("--churners", type=int, default=20, help="số manager liên tục vào / rời phiên")
+    ap.add_argument("--rate", type=float, default=50.0, help="số PDU / s của mỗi kết nối (0 = liên tục)")
+    ap.add_argument("--seconds", type=float, default=3.0)
+    args = ap.parse_args()
+    args.sessions = min(args.sessions, args.connections // 2 - args.churners)
+
+    rate = f"{args.rate:.0f} PDU/s mỗi kết nối" if args.rate > 0 else "liên tục"
+    print(f"{args.connections} kết nối ({rate}), {args.sessions} phiên, {args.churners} manager vào / rời phiên, "
+          f"{args.seconds:.0f}s, {os.cpu_count()} CPU")
+    run("global-lock", GlobalLockSessionManager(CountingBroadcaster()), args)
+    run("sharded", SessionManager(CountingBroadcaster(), inline=True), args)
+
+
+if __name__ == "__main__":
+    main()
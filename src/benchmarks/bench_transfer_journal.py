@@ -0,0 +1,136 @@
+# benchmarks/bench_transfer_journal.py
+"""
+Benchmark lưu trạng thái gửi file ở bên gửi (mặc định file 1 GB, chunk 32 KB như ClientSender.send_file).
+- pdu-queue: thiết kế trước: mỗi chunk được đóng gói thành PDU FILE_CHUNK hoàn chỉnh và lưu cả vào
+  DurableQueue; vòng gửi đọc PDU từ DB rồi parse lại để biết offset / độ dài; ACK bỏ phần tử theo id.
+- journal: TransferJournal: chỉ lưu (transfer_id, offset, length, state); vòng gửi đọc dữ liệu từ file nguồn
+  qua mmap và đóng gói PDU lúc gửi; ACK = 1 câu UPDATE theo khoảng offset.
+Đo: thời gian xếp hàng (tới khi đã commit), dung lượng DB (+ WAL) sau khi xếp hàng,
+thông lượng vòng gửi (đọc + đóng gói mọi chunk, không có socket) và thời gian xử lý ACK
+(bên nhận ACK cộng dồn sau mỗi --ack-every chunk).
+
+Chạy từ thư mục src:
+    python -m benchmarks.bench_transfer_journal [--size-mb 1024] [--chunk-kb 32] [--ack-every 16]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from benchmarks.bench_durable_queue import make_file
+from common_network.durable_queue import DurableQueue
+from common_network.file_utils import FileChunkReader, stream_file_in_chunks
+from common_network.pdu_builder import PDUBuilder
+from common_network.pdu_parser import PDUParser
+from common_network.transfer_journal import TransferJournal
+
+BATCH = 64
+
+
+def db_size_mb(db):
+    return sum(os.path.getsize(db + ext) for ext in ("", "-wal") if os.path.exists(db + ext)) / 2**20
+
+
+def run_pdu_queue(path, db, args):
+    q = DurableQueue(db)
+    chunk_size = args.chunk_kb * 1024
+    t0 = time.perf_counter()
+    batch = []
+    for seq, (offset, chunk) in enumerate(stream_file_in_chunks(path, chunk_size)):
+        batch.append(PDUBuilder.build_file_chunk(seq, offset, chunk))
+        if len(batch) >= BATCH:
+            q.push_many(batch)
+            batch = []
+    if batch:
+        q.push_many(batch)
+    q.flush()
+    t_enq = time.perf_counter() - t0
+    size = db_size_mb(db)
+
+    parser = PDUParser()
+    sent = nbytes = 0
+    t_ack = 0.0
+    cursor = 0
+    t0 = time.perf_counter()
+    while True:
+        entries = q.peek_many(cursor, BATCH)
+        if not entries:
+            break
+        for qid, pdu in entries:
+            parsed = parser.parse(pdu, reassemble=False)
+            nbytes += len(parsed.data)
+            sent += 1
+            if sent % args.ack_every == 0:
+                t1 = time.perf_counter()
+                q.ack_through(qid)
+                t_ack += time.perf_counter() - t1
+        cursor = entries[-1][0]
+    q.ack_through(cursor)
+    q.flush()
+    t_send = time.perf_counter() - t0
+    q.close()
+    return t_enq, size, t_send, nbytes, sent, t_ack
+
+
+def run_journal(path, db, args):
+    j = TransferJournal(db)
+    chunk_size = args.chunk_kb * 1024
+    total = os.path.getsize(path)
+    t0 = time.perf_counter()
+    tid = j.add_transfer(path, os.path.basename(path), total, chunk_size, 0)
+    t_enq = time.perf_counter() - t0
+    size = db_size_mb(db)
+
+    reader = FileChunkReader(path)
+    sent = nbytes = seq = 0
+    t_ack = 0.0
+    cursor = -1
+    t0 = time.perf_counter()
+    while True:
+        chunks = j.pending_chunks(tid, cursor, BATCH)
+        if not chunks:
+            break
+        for offset, length in chunks:
+            PDUBuilder.build_file_chunk(seq, offset, reader.read(offset, length))
+            seq += 1
+            nbytes += length
+            sent += 1
+            if sent % args.ack_every == 0:
+                t1 = time.perf_counter()
+                j.ack_through(tid, offset + length)
+                t_ack += time.perf_counter() - t1
+        cursor = chunks[-1][0]
+    j.ack_through(tid, total)
+    j.finish(tid)
+    t_send = time.perf_counter() - t0
+    reader.close()
+    j.close()
+    return t_enq, size, t_send, nbytes, sent, t_ack
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size-mb", type=int, default=1024, help="kích thước file (MB)")
+    ap.add_argument("--chunk-kb", type=int, default=32, help="kích thước chunk (KB)")
+    ap.add_argument("--ack-every", type=int, default=16, help="bên nhận ACK sau mỗi N chunk")
+    ap.add_argument("--dir", default=None, help="thư mục chứa file / DB tạm")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_tj_", dir=args.dir)
+    try:
+        path = os.path.join(workdir, "payload.bin")
+        make_file(path, args.size_mb * 2**20)
+        print(f"File {args.size_mb} MB, chunk {args.chunk_kb} KB, ACK mỗi {args.ack_every} chunk, thư mục {workdir}")
+        for label, fn in (("pdu-queue", run_pdu_queue), ("journal", run_journal)):
+            t_enq, size, t_send, nbytes, sent, t_ack = fn(path, os.path.join(workdir, f"{label}.db"), args)
+            mb = nbytes / 2**20
+            n_ack = max(1, sent // args.ack_every)
+            print(f"  {label:9s}: xếp hàng {t_enq:6.2f}s  DB {size:8.1f} MB | vòng gửi {sent} chunk {t_send:6.2f}s "
+                  f"{mb / t_send:7.1f} MB/s | ACK {t_ack * 1e6 / n_ack:7.1f} µs / lần")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
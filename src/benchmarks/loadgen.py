@@ -0,0 +1,286 @@
+# benchmarks/loadgen.py
+"""
+Bộ tạo tải (load generator) cho server0: so sánh engine thread và asyncio.
+- Chạy server0 trong một tiến trình con (python -m server0.server --engine ...).
+- Mở N cặp (client, manager) thật qua X224 -> TLS -> TPKT/MCS; mỗi manager kết nối tới 1 client.
+- Mỗi client gửi CURSOR (--cursor-hz) và FULL frame (--fps, --frame-kb) cho manager của nó.
+- Độ trễ relay = thời điểm manager nhận - thời điểm client gửi (perf_counter_ns nhúng trong
+  cursor_shape / 8 byte đầu của jpg; cùng một tiến trình nên đồng hồ khớp nhau).
+- CPU của server đo trên cửa sổ đo (/proc/<pid>/stat), fallback: os.wait4 (toàn bộ thời gian sống).
+
+Lưu ý: loadgen chạy trong 1 event loop, với N lớn bản thân loadgen cũng tốn CPU và
+làm tăng độ trễ đo được như nhau cho cả hai engine.
+
+Chạy từ thư mục src:
+    python -m benchmarks.loadgen [--engine both] [--clients 50] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from common_network.constants import TPKT_HEADER_FMT, PDU_TYPE_CONTROL, PDU_TYPE_CURSOR, PDU_TYPE_FULL, CAP_EXTLEN32
+from common_network.x224_handshake import X224Handshake, CONFIRM_MAGIC
+from common_network.tpkt_writer import frame_header
+from common_network.security_layer_tls import create_client_context
+from common_network.pdu_builder import PDUBuilder
+from common_network.pdu_parser import PDUParser
+from common_network.mcs_layer import MCSLite
+from common_network.tpkt_layer import TPKTLayer
+from common_network.frame_decoder import PDUFrameDecoder
+from common_network.stats import LatencyHistogram
+from server0.server_constants import (
+    CHANNEL_VIDEO, CHANNEL_CONTROL, CHANNEL_CURSOR,
+    CMD_REGISTER, CMD_CONNECT_CLIENT, CMD_SESSION_STARTED, ROLE_CLIENT, ROLE_MANAGER,
+)
+
+CA_FILE = os.path.join("client", "ca.crt")
+MAX_BODY_SIZE_PER_FRAGMENT = 64000
+_TS = struct.Struct(">Q")
+
+
+class Peer:
+    """1 kết nối loadgen (client hoặc manager) trên asyncio streams."""
+    def __init__(self, peer_id: str, offer_ext_framing: bool = False):
+        self.peer_id = peer_id
+        self.offer_ext_framing = offer_ext_framing
+        self.ext_framing = False
+        self.reader = None
+        self.writer = None
+        self.seq = 0
+        self.session_started = asyncio.Event()
+
+    async def connect(self, host: str, port: int, tls_context):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        caps = {CAP_EXTLEN32} if self.offer_ext_framing else None
+        self.writer.write(X224Handshake.build_connect(self.peer_id, caps))
+        hdr = await self.reader.readexactly(4)
+        _ver, _rsv, length = struct.unpack(TPKT_HEADER_FMT, hdr)
+        resp = await self.reader.readexactly(length - 4)
+        if not resp.startswith(CONFIRM_MAGIC):
+            raise ConnectionError(f"X224 bị từ chối: {resp!r}")
+        self.ext_framing = CAP_EXTLEN32 in X224Handshake.parse_caps(resp)
+        await self.writer.start_tls(tls_context, server_hostname=host)
+
+    def next_seq(self) -> int:
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        return self.seq
+
+    def send(self, channel_id: int, pdu: bytes):
+        self.writer.write(frame_header(channel_id, len(pdu), self.ext_framing) + pdu)
+
+    def send_control(self, message: str):
+        self.send(CHANNEL_CONTROL, PDUBuilder.build_control_pdu(self.next_seq(), message.encode()))
+
+    async def read_loop(self, on_pdu):
+        mcs = MCSLite()
+        parser = PDUParser()
+        decoders = defaultdict(PDUFrameDecoder)
+        try:
+            while True:
+                body = await TPKTLayer.recv_one_async(self.reader)
+                for ch_id, payload in mcs.feed_view(body):
+                    for pdu_bytes in decoders[ch_id].feed(payload):
+                        pdu = parser.parse(pdu_bytes)
+                        if pdu is None:
+                            continue
+                        if pdu.ptype == PDU_TYPE_CONTROL and pdu.message.startswith(CMD_SESSION_STARTED):
+                            self.session_started.set()
+                        on_pdu(pdu)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, asyncio.CancelledError):
+            pass
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class LoadRun:
+    def __init__(self, args, port: int):
+        self.args = args
+        self.port = port
+        self.cursor_lat = LatencyHistogram()
+        self.video_lat = LatencyHistogram()
+        self.recording = False
+
+    def _on_manager_pdu(self, pdu):
+        if not self.recording:
+            return
+        now = time.perf_counter_ns()
+        if pdu.ptype == PDU_TYPE_CURSOR and len(pdu.cursor_shape) >= 8:
+            self.cursor_lat.record((now - _TS.unpack_from(pdu.cursor_shape)[0]) / 1e6)
+        elif pdu.ptype == PDU_TYPE_FULL and len(pdu.jpg) >= 8:
+            self.video_lat.record((now - _TS.unpack_from(pdu.jpg)[0]) / 1e6)
+
+    async def _client_traffic(self, client: Peer, stop: asyncio.Event):
+        args = self.args
+        jpg_tail = os.urandom(max(0, args.frame_kb * 1024 - 8))
+        cursor_period = 1.0 / args.cursor_hz if args.cursor_hz > 0 else None
+        frame_period = 1.0 / args.fps if args.fps > 0 else None
+        loop = asyncio.get_running_loop()
+        # Lệch pha ngẫu nhiên để các client không gửi cùng lúc
+        start = loop.time() + (hash(client.peer_id) % 1000) / 1000.0 * (cursor_period or 0.05)
+        next_cursor = start
+        next_frame = start
+        while not stop.is_set():
+            now = loop.time()
+            if cursor_period and now >= next_cursor:
+                shape = _TS.pack(time.perf_counter_ns())
+                client.send(CHANNEL_CURSOR, PDUBuilder.build_cursor_pdu(client.next_seq(), 5000, 5000, shape))
+                next_cursor += cursor_period
+            if frame_period and now >= next_frame:
+                jpg = _TS.pack(time.perf_counter_ns()) + jpg_tail
+                pdu = PDUBuilder.build_full_frame_pdu(client.next_seq(), jpg, 1280, 720)
+                if len(pdu) > MAX_BODY_SIZE_PER_FRAGMENT and not client.ext_framing:
+                    for _, frag in PDUBuilder.fragmentize(pdu, MAX_BODY_SIZE_PER_FRAGMENT):
+                        client.send(CHANNEL_VIDEO, frag)
+                else:
+                    client.send(CHANNEL_VIDEO, pdu)
+                next_frame += frame_period
+            try:
+                await client.writer.drain()
+            except (ConnectionError, OSError):
+                return
+            targets = [t for t in (next_cursor if cursor_period else None, next_frame if frame_period else None) if t]
+            await asyncio.sleep(max(0.0, min(targets) - loop.time()) if targets else 0.1)
+
+    async def _open_pair(self, idx: int, tls_context, tasks):
+        host = "127.0.0.1"
+        client = Peer(f"lg-client-{idx}", self.args.ext_framing)
+        manager = Peer(f"lg-manager-{idx}", self.args.ext_framing)
+        await client.connect(host, self.port, tls_context)
+        await manager.connect(host, self.port, tls_context)
+        tasks.append(asyncio.create_task(client.read_loop(lambda pdu: None)))
+        tasks.append(asyncio.create_task(manager.read_loop(self._on_manager_pdu)))
+        client.send_control(f"{CMD_REGISTER}{ROLE_CLIENT}")
+        manager.send_control(f"{CMD_REGISTER}{ROLE_MANAGER}")
+        await asyncio.sleep(0.2) # chờ server xử lý đăng ký của cả hai
+        manager.send_control(f"{CMD_CONNECT_CLIENT}{client.peer_id}")
+        await asyncio.wait_for(client.session_started.wait(), 15)
+        await asyncio.wait_for(manager.session_started.wait(), 15)
+        return client, manager
+
+    async def run(self, server_pid: int):
+        args = self.args
+        tls_context = create_client_context(cafile=CA_FILE, check_hostname=False)
+        tasks = []
+        sem = asyncio.Semaphore(32) # giới hạn số handshake TLS đồng thời
+        async def open_limited(i):
+            async with sem:
+                return await self._open_pair(i, tls_context, tasks)
+        pairs = await asyncio.gather(*(open_limited(i) for i in range(args.clients)))
+
+        stop = asyncio.Event()
+        traffic = [asyncio.create_task(self._client_traffic(c, stop)) for c, _ in pairs]
+
+        await asyncio.sleep(args.warmup)
+        self.recording = True
+        cpu0, t0 = proc_cpu_seconds(server_pid), time.perf_counter()
+        threads = proc_threads(server_pid)
+        await asyncio.sleep(args.duration)
+        cpu1, t1 = proc_cpu_seconds(server_pid), time.perf_counter()
+        self.recording = False
+
+        stop.set()
+        await asyncio.gather(*traffic, return_exceptions=True)
+        for c, m in pairs:
+            c.close()
+            m.close()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        cpu = None if cpu0 is None or cpu1 is None else (cpu1 - cpu0) / (t1 - t0)
+        return cpu, threads
+
+
+def proc_cpu_seconds(pid: int):
+    """utime + stime (giây) của tiến trình, đọc từ /proc (Linux). None nếu không có /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        return (int(fields[11]) + int(fields[12])) / ticks
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def proc_threads(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def wait_port(port: int, timeout: float = 10.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def run_engine(engine: str, args, port: int):
+    cmd = [sys.executable, "-m", "server0.server", "--engine", engine, "--host", "127.0.0.1", "--port", str(port)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    started = time.perf_counter()
+    try:
+        # wait_port mở 1 kết nối thô rồi đóng ngay: server chỉ log handshake X224 thất bại
+        if not wait_port(port):
+            raise RuntimeError(f"server ({engine}) không lắng nghe trên cổng {port}")
+        load = LoadRun(args, port)
+        cpu, threads = asyncio.run(load.run(proc.pid))
+    finally:
+        proc.terminate()
+        _, _, rusage = os.wait4(proc.pid, 0)
+    lifetime = time.perf_counter() - started
+    if cpu is None:
+        # Không có /proc: dùng CPU của cả vòng đời tiến trình
+        cpu = (rusage.ru_utime + rusage.ru_stime) / lifetime
+    return load, cpu, threads
+
+
+def report(engine: str, args, load: LoadRun, cpu: float, threads):
+    cur = load.cursor_lat.summary()
+    vid = load.video_lat.summary()
+    print(f"[{engine}] {args.clients} client + {args.clients} manager, threads={threads}")
+    print(f"  cursor : n={cur['count']:7d}  p50={cur['p50']:7.2f} ms  p99={cur['p99']:7.2f} ms  max={cur['max']:7.2f} ms")
+    print(f"  video  : n={vid['count']:7d}  p50={vid['p50']:7.2f} ms  p99={vid['p99']:7.2f} ms  max={vid['max']:7.2f} ms")
+    print(f"  CPU server: {cpu * 100:6.1f}% 1 core  ->  {cpu * 1000 / args.clients:6.2f} ms CPU/s mỗi client")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--engine", choices=("thread", "asyncio", "both"), default="both")
+    ap.add_argument("--clients", type=int, default=50, help="số client (mỗi client có 1 manager riêng)")
+    ap.add_argument("--duration", type=float, default=10.0, help="thời gian đo (giây)")
+    ap.add_argument("--warmup", type=float, default=2.0)
+    ap.add_argument("--cursor-hz", type=float, default=30.0)
+    ap.add_argument("--fps", type=float, default=15.0)
+    ap.add_argument("--frame-kb", type=int, default=16, help="kích thước jpg của mỗi FULL frame (KB)")
+    ap.add_argument("--port", type=int, default=5600)
+    ap.add_argument("--ext-framing", action="store_true", help="đàm phán EXTLEN32: FULL frame gửi nguyên khối")
+    args = ap.parse_args()
+
+    engines = ("thread", "asyncio") if args.engine == "both" else (args.engine,)
+    for i, engine in enumerate(engines):
+        load, cpu, threads = run_engine(engine, args, args.port + i)
+        report(engine, args, load, cpu, threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# benchmarks/sim_rate_control.py
+"""
+Mô phỏng đường truyền bị giới hạn băng thông để kiểm tra AdaptiveRateController:
+- Nguồn: chụp theo fps, FULL frame theo FULL_FRAME_INTERVAL (hoặc bị ép), còn lại RECT chiếm
+  --activity diện tích màn hình. Kích thước JPEG lấy từ encode THẬT ảnh desktop tổng hợp
+  (bench_delta) ở đúng quality / max_dimension (có cache).
+- Hàng đợi gửi: như ClientSender.frame_q (60 frame; đầy -> bỏ RECT + ép FULL, FULL xóa hàng đợi).
+- Đường truyền: gửi tuần tự 1 frame mỗi lần với băng thông thay đổi theo các pha (--phases).
+- Đồng hồ ảo (bước 5 ms), chạy nhanh và lặp lại được.
+So sánh cấu hình cố định (q=65, 10 fps, 1280) với bộ điều khiển; báo cáo theo từng pha:
+độ trễ chụp -> gửi xong (p50/p95, và p95 "ổn định" sau STEADY_AFTER giây đầu của pha), fps nhận được,
+số frame bị bỏ, quality / độ phân giải trung bình.
+
+Chạy từ thư mục src:
+    python -m benchmarks.sim_rate_control [--target-ms 200] [--phases 20:15,20:2,20:0.8,20:8]
+    (--phases: danh sách giây:Mbit/s)
+"""
+
+import argparse
+import io
+import random
+from collections import deque
+from benchmarks.bench_delta import _desktop, WIDTH, HEIGHT
+from client.client_rate_control import AdaptiveRateController, _p90
+
+DT = 0.005
+STEADY_AFTER = 5.0 # giây đầu mỗi pha (đang thích nghi) không tính vào cột "ổn định"
+QUEUE_SIZE = 60
+
+
+class FrameSizes:
+    """Kích thước JPEG (byte) của FULL / RECT ở (quality, max_dimension): encode thật, có cache."""
+    def __init__(self, activity: float):
+        self.base = _desktop(random.Random(7))
+        self.activity = activity
+        self.cache = {}
+
+    def get(self, quality: int, dim: int, full: bool) -> int:
+        key = (quality, dim, full)
+        if key not in self.cache:
+            scale = min(1.0, dim / max(WIDTH, HEIGHT))
+            img = self.base.resize((int(WIDTH * scale), int(HEIGHT * scale)))
+            if not full:
+                side = self.activity ** 0.5
+                w, h = max(16, int(img.width * side)), max(16, int(img.height * side))
+                img = img.crop((80, 80, 80 + w, 80 + h))
+            bio = io.BytesIO()
+            img.save(bio, format="JPEG", quality=quality)
+            self.cache[key] = len(bio.getvalue())
+        return self.cache[key]
+
+
+class Source:
+    """Thông số chụp hiện tại (như ClientScreenshot) - bộ điều khiển ghi trực tiếp vào đây."""
+    def __init__(self):
+        self.quality = 65
+        self.fps = 10.0
+        self.max_dimension = 1280
+        self.FULL_FRAME_INTERVAL = 60.0
+        self.force_full = True
+
+    def force_full_frame(self):
+        self.force_full = True
+
+
+def simulate(phases, sizes: FrameSizes, controller=None, target_ms: float = 200.0):
+    src = Source()
+    if controller is not None:
+        controller.screenshot = src
+        controller.apply()
+    q = deque() # (capture_t, bytes, is_full, enqueue_t)
+    sending = None # (capture_t, enqueue_t, start_t, finish_t)
+    next_capture = 0.0
+    last_full = -1e9
+    next_tick = controller.tick_interval if controller else None
+    tick_waits, tick_sends, tick_drops = [], [], 0
+
+    total = sum(d for d, _ in phases)
+    bounds = []
+    acc = 0.0
+    for dur, mbit in phases:
+        bounds.append((acc, acc + dur, mbit * 1e6 / 8))
+        acc += dur
+    report = [{"lat": [], "steady": [], "frames": 0, "drops": 0, "q": [], "dim": []} for _ in phases]
+
+    def phase_at(t):
+        for i, (a, b, bw) in enumerate(bounds):
+            if a <= t < b:
+                return i, bw
+        return len(bounds) - 1, bounds[-1][2]
+
+    t = 0.0
+    while t < total:
+        pi, bandwidth = phase_at(t)
+        rep = report[pi]
+
+        # 1. Chụp
+        if t >= next_capture:
+            next_capture = t + 1.0 / src.fps
+            full = src.force_full or (t - last_full) >= src.FULL_FRAME_INTERVAL
+            if full:
+                src.force_full = False
+                last_full = t
+            nbytes = sizes.get(src.quality, src.max_dimension, full)
+            rep["q"].append(src.quality)
+            rep["dim"].append(src.max_dimension)
+            if len(q) >= QUEUE_SIZE:
+                if full:
+                    q.clear()
+                else:
+                    rep["drops"] += 1
+                    tick_drops += 1
+                    src.force_full_frame()
+                    nbytes = None
+            if nbytes is not None:
+                q.append((t, nbytes, full, t))
+
+        # 2. Đường truyền
+        if sending is not None and t >= sending[3]:
+            cap_t, enq_t, start_t, fin_t = sending
+            rep["lat"].append((fin_t - cap_t) * 1000)
+            if cap_t - bounds[pi][0] >= STEADY_AFTER:
+                rep["steady"].append((fin_t - cap_t) * 1000)
+            rep["frames"] += 1
+            tick_sends.append((fin_t - start_t) * 1000)
+            sending = None
+        if sending is None and q:
+            cap_t, nbytes, full, enq_t = q.popleft()
+            tick_waits.append((t - enq_t) * 1000)
+            sending = (cap_t, enq_t, t, t + nbytes / bandwidth)
+
+        # 3. Bộ điều khiển
+        if controller is not None and t >= next_tick:
+            next_tick = t + controller.tick_interval
+            latency = _p90(tick_waits) + _p90(tick_sends)
+            if sending is not None: # frame đang gửi dở cũng là độ trễ (đường truyền rất chậm)
+                latency = max(latency, (t - sending[2]) * 1000)
+            if controller.observe(len(q) / QUEUE_SIZE, latency, tick_drops):
+                controller.apply()
+            tick_waits, tick_sends, tick_drops = [], [], 0
+        t += DT
+
+    return report
+
+
+def _pct(samples, p):
+    data = sorted(samples)
+    return data[min(len(data) - 1, int(p * len(data)))] if data else float("nan")
+
+
+def print_report(name, phases, report):
+    print(f"  {name}")
+    for (dur, mbit), rep in zip(phases, report):
+        p50, p95 = _pct(rep["lat"], 0.5), _pct(rep["lat"], 0.95)
+        steady = _pct(rep["steady"], 0.95)
+        q = sum(rep["q"]) / len(rep["q"]) if rep["q"] else 0
+        dim = sum(rep["dim"]) / len(rep["dim"]) if rep["dim"] else 0
+        print(f"    {mbit:5.1f} Mbit/s {dur:4.0f}s: trễ p50 {p50:6.0f} ms  p95 {p95:6.0f} ms  "
+              f"(ổn định p95 {steady:6.0f} ms)  "
+              f"{rep['frames'] / dur:5.1f} fps  bỏ {rep['drops']:4d}  q {q:4.1f}  dim {dim:6.0f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target-ms", type=float, default=200.0)
+    ap.add_argument("--phases", default="20:15,20:2,20:0.8,20:8")
+    ap.add_argument("--activity", type=float, default=0.15, help="tỉ lệ diện tích màn hình thay đổi mỗi frame")
+    args = ap.parse_args()
+
+    phases = [(float(d), float(m)) for d, m in (p.split(":") for p in args.phases.split(","))]
+    sizes = FrameSizes(args.activity)
+    print(f"Mục tiêu độ trễ {args.target_ms:.0f} ms, RECT = {args.activity:.0%} màn hình")
+    print_report("cố định (q=65, 10 fps, 1280)", phases, simulate(phases, sizes))
+    controller = AdaptiveRateController(target_latency_ms=args.target_ms, quality_range=(30, 65),
+                                        fps_range=(2, 10), dimension_range=(640, 1280))
+    print_report("AdaptiveRateController", phases, simulate(phases, sizes, controller, args.target_ms))
+    print(f"    {controller.stats()}")
+
+
+if __name__ == "__main__":
+    main()
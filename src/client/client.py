@@ -4,6 +4,7 @@ import threading
 import time
 import os
 import sys
+import json
 
 # [THÊM] Thư viện lấy tiêu đề cửa sổ
 try:
@@ -15,16 +16,22 @@ except ImportError:
 from client.client_network.client_network import ClientNetwork
 from client.client_network.client_sender import ClientSender
 from client.client_screenshot import ClientScreenshot
+from client.client_pipeline import CapturePipeline
+from client.client_rate_control import AdaptiveRateController
+from client.client_thumbnail import ThumbnailStreamer
 from client.client_input import ClientInputHandler
 from client.client_cursor import ClientCursorTracker
-from client.client_constants import CLIENT_ID, CA_FILE
+from client.client_constants import (
+    CLIENT_ID, CA_FILE, CMD_THUMB_START, CMD_THUMB_STOP, CMD_VIEWER_JOINED, CMD_KEYFRAME_CACHE,
+)
+from common_network.stats import LatencyHistogram
 
 class Client:
     """
     Lớp "keo" (glue) cấp cao nhất.
     Khởi tạo và kết nối tất cả các thành phần.
     """
-    def __init__(self, host, port, fps=10, logger=None):
+    def __init__(self, host, port, fps=10, logger=None, encode_workers=None):
         self.host = host
         self.port = port
         self.fps = fps
@@ -48,7 +55,21 @@ class Client:
         self.input_handler = ClientInputHandler(logger=self.logger)
         self.cursor_tracker = ClientCursorTracker(self.network, fps=30, logger=self.logger)
 
-        self.screenshot_thread = None
+        # [SỬA] Pipeline chụp -> encode (nhiều luồng) -> sender thay cho 1 luồng capture_loop tuần tự
+        self.pipeline = CapturePipeline(self.screenshot, self._on_frame, encode_workers=encode_workers)
+        # [THÊM] Tự chỉnh quality / fps / độ phân giải / chu kỳ FULL frame theo tình trạng nghẽn
+        # (cấu hình ở trên là mức tốt nhất)
+        self.rate_control = AdaptiveRateController(
+            self.screenshot, self.sender,
+            quality_range=(30, self.screenshot.quality),
+            fps_range=(2, fps),
+            dimension_range=(640, self.screenshot.max_dimension),
+            full_interval_range=(self.screenshot.FULL_FRAME_INTERVAL, 3 * self.screenshot.FULL_FRAME_INTERVAL),
+        )
+        # [THÊM] Luồng ảnh thu nhỏ cho màn hình tổng quan của manager (chỉ chạy khi server yêu cầu)
+        self.thumbnails = ThumbnailStreamer(self.network.send_thumbnail_pdu)
+        # [THÊM] Độ trễ đầu-cuối (ms) đo bằng FRAME_ACK: chụp -> manager hiển thị -> ACK về lại client
+        self.frame_latency = LatencyHistogram(max_samples=10_000)
         self.monitor_thread = None # [THÊM] Thread giám sát
         self.last_full_frame_ts = 0
         self.full_frame_interval = 30 
@@ -58,6 +79,7 @@ class Client:
         self.network.on_control_pdu = self._on_control_pdu
         self.network.on_file_ack = self.sender.handle_file_ack
         self.network.on_file_nak = self.sender.handle_file_nak
+        self.network.on_frame_ack = self._on_frame_ack
         self.network.on_disconnected = self._on_disconnected
 
     def start(self):
@@ -77,12 +99,8 @@ class Client:
         self.screenshot.force_full_frame()
         self.last_full_frame_ts = time.time()
         
-        self.screenshot_thread = threading.Thread(
-            target=self.screenshot.capture_loop, 
-            args=(self._on_frame,),
-            daemon=True
-        )
-        self.screenshot_thread.start()
+        self.pipeline.start()
+        self.rate_control.start()
         
         # 4. Khởi động Cursor Tracker
         self.cursor_tracker.start()
@@ -99,13 +117,12 @@ class Client:
 
     def stop(self):
         self.logger("[Client] Đang dừng...")
-        self.screenshot.stop = True
+        self.rate_control.stop()
+        self.pipeline.stop()
+        self.thumbnails.stop()
         self.cursor_tracker.stop()
         self.sender.stop()
         self.network.stop() # Sẽ kích hoạt _on_disconnected
-        
-        if self.screenshot_thread:
-            self.screenshot_thread.join(timeout=1.0)
         # Monitor thread là daemon nên sẽ tự tắt khi main thread tắt
             
         self.logger("[Client] Đã dừng.")
@@ -163,8 +180,16 @@ class Client:
     def _on_frame(self, width, height, jpg_bytes, bbox, img, seq, ts_ms):
         return self.sender.enqueue_frame(width, height, jpg_bytes, bbox, seq, ts_ms)
 
-    def _on_control_pdu(self, pdu: dict):
-        msg = pdu.get("message", "")
+    def _on_frame_ack(self, pdu):
+        # frame_ts_ms là ts_ms lúc chụp do chính client ghi -> so với đồng hồ của client, không cần đồng bộ giờ
+        latency = time.time() * 1000 - pdu.frame_ts_ms
+        if latency < 0:
+            return
+        self.frame_latency.record(latency)
+        self.rate_control.report_decode_lag(latency)
+
+    def _on_control_pdu(self, pdu):
+        msg = pdu.message
         self.logger(f"[Client] Nhận lệnh từ Server: {msg}")
         
         if msg.startswith("session_started"):
@@ -174,15 +199,37 @@ class Client:
             
         elif msg == "request_refresh":
             self.screenshot.force_full_frame()
+
+        # [THÊM] Manager vào xem và đã nhận ảnh hiện tại từ cache của server: không cần chụp lại FULL frame
+        elif msg.startswith(CMD_VIEWER_JOINED):
+            self.logger(f"[Client] ==> Manager {msg.split(':', 1)[-1]} đang xem (ảnh từ cache của server).")
+
+        # [THÊM] Server giữ keyframe cho manager mới / refresh: FULL frame định kỳ chỉ còn là lưới an toàn
+        elif msg.startswith(CMD_KEYFRAME_CACHE):
+            try:
+                factor = float(msg.split(":", 1)[1])
+            except (IndexError, ValueError):
+                factor = 1.0
+            self.rate_control.stretch_full_interval(factor)
+
+        # [THÊM] Có / hết manager theo dõi màn hình tổng quan
+        elif msg.startswith(CMD_THUMB_START):
+            try:
+                params = json.loads(msg.split(":", 1)[1]) if ":" in msg else {}
+            except ValueError:
+                params = {}
+            self.thumbnails.start(**{k: params.get(k) for k in ("max_dimension", "interval", "quality")})
+
+        elif msg == CMD_THUMB_STOP:
+            self.thumbnails.stop()
         
     def _on_disconnected(self):
         self.logger("[Client] _on_disconnected được gọi.")
-        self.screenshot.stop = True
+        self.rate_control.stop()
+        self.pipeline.stop()
+        self.thumbnails.stop()
         self.cursor_tracker.stop()
         self.sender.stop()
-        if self.screenshot_thread:
-            self.screenshot_thread.join(timeout=1.0)
-            self.screenshot_thread = None
 
 
 if __name__ == "__main__":
@@ -24,6 +24,7 @@ CHANNEL_CONTROL = 3
 CHANNEL_INPUT = 4
 CHANNEL_FILE = 5
 CHANNEL_CURSOR = 6
+CHANNEL_THUMB = 7 # [THÊM] ảnh thu nhỏ (màn hình tổng quan của manager)
 
 ALL_CHANNELS = (
     CHANNEL_VIDEO,
@@ -31,8 +32,25 @@ ALL_CHANNELS = (
     CHANNEL_INPUT,
     CHANNEL_FILE,
     CHANNEL_CURSOR,
+    CHANNEL_THUMB,
 )
 
 # --- Lệnh Gửi đi (Client -> Server) ---
 CMD_REGISTER = f"register:client"
-CMD_DISCONNECT = "disconnect"
\ No newline at end of file
+CMD_DISCONNECT = "disconnect"
+
+# --- [THÊM] Lệnh Nhận về (Server -> Client): luồng ảnh thu nhỏ ---
+CMD_THUMB_START = "thumb_start" # "thumb_start:{\"max_dimension\": 320, \"interval\": 1.0, \"quality\": 50}"
+CMD_THUMB_STOP = "thumb_stop"
+CMD_VIEWER_JOINED = "viewer_joined"   # Manager vào xem, đã nhận ảnh từ cache của server (không cần FULL frame)
+CMD_KEYFRAME_CACHE = "keyframe_cache" # Server giữ keyframe: giãn chu kỳ FULL frame định kỳ: "keyframe_cache:3"
+
+# --- [THÊM] Gửi file (ClientSender) ---
+FILE_SEND_BATCH = 64 # số chunk đọc từ nhật ký truyền file (TransferJournal) mỗi lượt của vòng gửi
+FILE_WINDOW_BYTES = 10 * 1024 * 1024 # cửa sổ gửi: tối đa số byte đã gửi chưa được ACK (SACK)
+FILE_INITIAL_RTO = 1.0 # giây chờ ACK trước khi gửi lại, khi chưa đo được RTT
+FILE_MIN_RTO = 0.2 # RTO = srtt + 4 * rttvar, giới hạn trong [FILE_MIN_RTO, FILE_MAX_RTO]
+FILE_MAX_RTO = 5.0
+FILE_STREAM_CRC = True # CRC cả file tính dần khi gửi (gửi trong FILE_END), không đọc file 1 lượt riêng trước khi gửi
+FILE_CHUNK_CRC = False # gửi kèm CRC32 từng chunk: chunk hỏng chỉ phải gửi lại chunk đó
+FILE_RESUME_TIMEOUT = 3.0 # giây chờ bên nhận trả lời FILE_START tiếp tục transfer (bên nhận cũ không trả lời)
@@ -0,0 +1,244 @@
+# client/client_delta.py
+
+from typing import List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError: # không có numpy -> ClientScreenshot dùng cách cũ (1 bbox)
+    np = None
+
+"""
+Phát hiện vùng thay đổi theo ô (tile) cho ClientScreenshot.
+Màn hình được chia thành các ô tile_size x tile_size; ô nào có điểm ảnh (thang xám) lệch quá
+threshold so với frame trước là ô "bẩn" (dirty). Các ô bẩn được gộp thành ít hình chữ nhật
+(mỗi hình là 1 RECT PDU), thay vì 1 bbox bao trùm mọi thay đổi (đồng hồ ở khay + con trỏ ở góc
+đối diện sẽ không còn kéo theo cả màn hình).
+- TileDiffDetector: trên ảnh PIL (thang xám) đã resize.
+- BGRADeltaEngine: trên buffer BGRA thô của mss ở độ phân giải gốc (không tạo ảnh PIL trung gian).
+"""
+
+Rect = Tuple[int, int, int, int] # (left, upper, right, lower) - giống PIL bbox
+
+DEFAULT_TILE_SIZE = 64
+DEFAULT_THRESHOLD = 30
+DEFAULT_MAX_RECTS = 16
+DEFAULT_GAP_TILES = 1 # gộp 2 đoạn ô bẩn trên cùng hàng nếu cách nhau <= số ô sạch này
+
+
+def merge_dirty_tiles(grid, tile_size: int, width: int, height: int,
+                      gap: int = DEFAULT_GAP_TILES) -> List[Rect]:
+    """
+    Gộp lưới ô bẩn (mảng bool [hàng][cột]) thành các hình chữ nhật (toạ độ pixel, đã cắt theo ảnh).
+    1. Mỗi hàng ô: tách các đoạn ô bẩn liên tiếp (cho phép khe <= gap ô sạch).
+    2. Đoạn có cùng [cột đầu, cột cuối] ở hàng kế tiếp được nối dài xuống dưới.
+    """
+    rects = []
+    open_runs = {} # (c0, c1) -> hàng bắt đầu
+    rows = len(grid)
+    for r in range(rows + 1):
+        runs = set()
+        if r < rows:
+            start = prev = None
+            for c in np.flatnonzero(grid[r]).tolist():
+                if start is None:
+                    start = prev = c
+                elif c - prev - 1 <= gap:
+                    prev = c
+                else:
+                    runs.add((start, prev))
+                    start = prev = c
+            if start is not None:
+                runs.add((start, prev))
+
+        # Đóng các đoạn không tiếp tục ở hàng này
+        for span in list(open_runs):
+            if span not in runs:
+                r0 = open_runs.pop(span)
+                c0, c1 = span
+                rects.append((c0 * tile_size, r0 * tile_size,
+                              min((c1 + 1) * tile_size, width), min(r * tile_size, height)))
+        for span in runs:
+            open_runs.setdefault(span, r)
+
+    rects.sort(key=lambda b: (b[1], b[0]))
+    return rects
+
+
+def union_bbox(rects: List[Rect]) -> Optional[Rect]:
+    if not rects:
+        return None
+    return (min(b[0] for b in rects), min(b[1] for b in rects),
+            max(b[2] for b in rects), max(b[3] for b in rects))
+
+
+def rects_area(rects: List[Rect]) -> int:
+    return sum((b[2] - b[0]) * (b[3] - b[1]) for b in rects)
+
+
+class TileDiffDetector:
+    """
+    So sánh frame hiện tại với frame trước theo ô, bằng NumPy (vector hoá, không có lambda theo pixel).
+    - update(img): trả về danh sách Rect thay đổi ([] nếu đứng im). Chỉ các vùng được trả về mới được
+      cập nhật vào frame tham chiếu (giống cách cũ chỉ cập nhật _prev_image khi có thay đổi): thay đổi
+      nhỏ dần dần (dưới threshold mỗi frame) vẫn được cộng dồn và gửi đi khi vượt ngưỡng.
+    - reset(img): lưu toàn bộ frame làm tham chiếu (sau khi gửi FULL frame).
+    Nhiều hơn max_rects hình -> gộp thành 1 bbox (mỗi RECT có chi phí header JPEG riêng).
+    """
+    def __init__(self, tile_size: int = DEFAULT_TILE_SIZE, threshold: int = DEFAULT_THRESHOLD,
+                 max_rects: int = DEFAULT_MAX_RECTS, gap: int = DEFAULT_GAP_TILES):
+        if np is None:
+            raise ImportError("TileDiffDetector cần numpy")
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.max_rects = max_rects
+        self.gap = gap
+        self._prev = None # mảng uint8 (h, w) thang xám của frame tham chiếu (= nội dung manager đang có)
+
+    @staticmethod
+    def _gray(img):
+        return np.array(img.convert("L"), dtype=np.uint8) # bản sao ghi được (frame tham chiếu được vá tại chỗ)
+
+    def reset(self, img=None) -> None:
+        self._prev = self._gray(img) if img is not None else None
+
+    def dirty_tiles(self, cur, prev):
+        """Lưới bool (số hàng ô, số cột ô): ô nào có điểm ảnh lệch > threshold."""
+        h, w = cur.shape
+        t = self.tile_size
+        # |cur - prev| > threshold  <=>  max(cur, prev) - min(cur, prev) > threshold (không tràn uint8)
+        changed = (np.maximum(cur, prev) - np.minimum(cur, prev)) > self.threshold
+        th, tw = -(-h // t), -(-w // t)
+        if th * t != h or tw * t != w:
+            padded = np.zeros((th * t, tw * t), dtype=bool)
+            padded[:h, :w] = changed
+            changed = padded
+        return changed.reshape(th, t, tw, t).any(axis=(1, 3))
+
+    def update(self, img) -> List[Rect]:
+        cur = self._gray(img)
+        prev = self._prev
+        if prev is None or prev.shape != cur.shape:
+            self._prev = cur
+            return [(0, 0, img.width, img.height)] # chưa có tham chiếu / đổi kích thước: coi như đổi toàn bộ
+        grid = self.dirty_tiles(cur, prev)
+        if not grid.any():
+            return []
+        rects = merge_dirty_tiles(grid, self.tile_size, img.width, img.height, self.gap)
+        if len(rects) > self.max_rects:
+            rects = [union_bbox(rects)]
+        for l, u, r, b in rects:
+            prev[u:b, l:r] = cur[u:b, l:r]
+        return rects
+
+
+class BGRADeltaEngine:
+    """
+    Bộ phát hiện thay đổi chạy thẳng trên buffer BGRA thô của mss (sct_img.bgra), ở độ phân giải gốc,
+    KHÔNG tạo ảnh PIL trung gian (không convert("L"), không ImageChops, không lambda theo pixel).
+    - threshold=0 (mặc định): so sánh chính xác từng điểm ảnh dưới dạng uint32 (ảnh chụp màn hình
+      không nén nên không có nhiễu) -> 1 lượt so sánh trên h*w phần tử.
+    - threshold>0: điểm ảnh thay đổi nếu 1 trong 3 kênh B, G, R lệch > threshold.
+    Từ mặt nạ thay đổi tính mặt nạ theo hàng / theo cột (row_mask, col_mask: bbox nhanh) và lưới ô bẩn
+    (chỉ xét các dải hàng có thay đổi), rồi gộp ô bằng merge_dirty_tiles như TileDiffDetector.
+    Frame tham chiếu là bản sao BGRA; chỉ các vùng trả về mới được chép vào (giống TileDiffDetector).
+    """
+    def __init__(self, tile_size: int = DEFAULT_TILE_SIZE, threshold: int = 0,
+                 max_rects: int = DEFAULT_MAX_RECTS, gap: int = DEFAULT_GAP_TILES):
+        if np is None:
+            raise ImportError("BGRADeltaEngine cần numpy")
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.max_rects = max_rects
+        self.gap = gap
+        self._prev = None # mảng uint8 (h, w, 4) - bản sao frame tham chiếu
+        self.row_mask = None # mặt nạ hàng/cột của lần update gần nhất (để thống kê/gỡ lỗi)
+        self.col_mask = None
+
+    @staticmethod
+    def as_array(bgra, width: int, height: int):
+        """View (h, w, 4) uint8 trên buffer BGRA (không sao chép)."""
+        return np.frombuffer(bgra, dtype=np.uint8).reshape(height, width, 4)
+
+    def reset(self, bgra=None, width: int = 0, height: int = 0) -> None:
+        self._prev = self.as_array(bgra, width, height).copy() if bgra is not None else None
+
+    def changed_mask(self, cur, prev):
+        """Mặt nạ bool (h, w): điểm ảnh nào đã thay đổi."""
+        if not self.threshold:
+            h, w, _ = cur.shape
+            # So sánh 4 byte BGRX như 1 số uint32 (byte X luôn giống nhau giữa các frame)
+            return cur.view(np.uint32).reshape(h, w) != prev.view(np.uint32).reshape(h, w)
+        c = cur[:, :, :3]
+        p = prev[:, :, :3]
+        return ((np.maximum(c, p) - np.minimum(c, p)) > self.threshold).any(axis=2)
+
+    def dirty_tiles(self, changed, row_mask):
+        """Lưới ô bẩn; dải hàng ô không có hàng nào thay đổi được bỏ qua (không reshape/any)."""
+        h, w = changed.shape
+        t = self.tile_size
+        th, tw = -(-h // t), -(-w // t)
+        grid = np.zeros((th, tw), dtype=bool)
+        band_dirty = np.zeros(th * t, dtype=bool)
+        band_dirty[:h] = row_mask
+        band_dirty = band_dirty.reshape(th, t).any(axis=1)
+        pad_w = tw * t - w
+        for r in np.flatnonzero(band_dirty).tolist():
+            band = changed[r * t:(r + 1) * t]
+            if pad_w:
+                band = np.pad(band, ((0, 0), (0, pad_w)))
+            grid[r] = band.reshape(band.shape[0], tw, t).any(axis=(0, 2))
+        return grid
+
+    def bbox(self, bgra, width: int, height: int) -> Optional[Rect]:
+        """1 bbox bao mọi thay đổi (tương đương compute_delta_bbox), chỉ từ mặt nạ hàng/cột."""
+        cur = self.as_array(bgra, width, height)
+        prev = self._prev
+        if prev is None or prev.shape != cur.shape:
+            self._prev = cur.copy()
+            return (0, 0, width, height)
+        changed = self.changed_mask(cur, prev)
+        rows = np.flatnonzero(changed.any(axis=1))
+        if not len(rows):
+            return None
+        cols = np.flatnonzero(changed.any(axis=0))
+        box = (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+        prev[box[1]:box[3], box[0]:box[2]] = cur[box[1]:box[3], box[0]:box[2]]
+        return box
+
+    def update(self, bgra, width: int, height: int) -> List[Rect]:
+        """Danh sách Rect thay đổi (toạ độ gốc của buffer), [] nếu đứng im."""
+        cur = self.as_array(bgra, width, height)
+        prev = self._prev
+        if prev is None or prev.shape != cur.shape:
+            self._prev = cur.copy()
+            return [(0, 0, width, height)]
+        changed = self.changed_mask(cur, prev)
+        self.row_mask = row_mask = changed.any(axis=1)
+        if not row_mask.any():
+            self.col_mask = None
+            return []
+        self.col_mask = changed.any(axis=0)
+        grid = self.dirty_tiles(changed, row_mask)
+        rects = merge_dirty_tiles(grid, self.tile_size, width, height, self.gap)
+        if len(rects) > self.max_rects:
+            rects = [union_bbox(rects)]
+        for l, u, r, b in rects:
+            prev[u:b, l:r] = cur[u:b, l:r]
+        return rects
+
+
+def scale_rects(rects: List[Rect], src_size, dst_size, pad: int = 2) -> List[Rect]:
+    """
+    Đổi toạ độ Rect từ ảnh gốc (src_size) sang ảnh đã thu nhỏ (dst_size).
+    Nới thêm pad pixel mỗi phía: bộ lọc resize (LANCZOS) làm điểm ảnh cạnh vùng thay đổi cũng đổi theo.
+    """
+    sw, sh = src_size
+    dw, dh = dst_size
+    if (sw, sh) == (dw, dh):
+        return list(rects)
+    fx, fy = dw / sw, dh / sh
+    out = []
+    for l, u, r, b in rects:
+        out.append((max(0, int(l * fx) - pad), max(0, int(u * fy) - pad),
+                    min(dw, -int(-r * fx // 1) + pad), min(dh, -int(-b * fy // 1) + pad)))
+    return out
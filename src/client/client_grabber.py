@@ -0,0 +1,144 @@
+# client/client_grabber.py
+
+import threading
+import time
+from typing import Callable, Optional
+from mss import mss
+from common_network.stats import LatencyHistogram
+
+try:
+    from mss.exception import ScreenShotError
+except ImportError: # mss quá cũ: coi mọi lỗi chụp như nhau
+    ScreenShotError = Exception
+
+"""
+Phiên chụp màn hình mss dùng lâu dài (thay cho `with mss() as sct:` ở mỗi frame).
+Mở mss mỗi frame phải khởi tạo lại handle của nền tảng (kết nối X11 display, GDI DC, bitmap DIB)
+rồi hủy ngay; giữ 1 phiên thì các handle và buffer gốc được dùng lại (mss trên Windows giữ DC + bitmap
+theo kích thước vùng chụp, trên Linux giữ kết nối display).
+- Vòng đời rõ ràng: open() / close() / `with ScreenGrabber() as g:`; grab() tự mở nếu chưa mở.
+- mss không thread-safe (handle gắn với luồng tạo ra nó): grab() từ luồng khác -> đóng + mở lại phiên.
+- Bố cục màn hình (cắm/rút màn hình, đổi độ phân giải) được kiểm tra lại mỗi layout_check_interval giây
+  và sau mỗi lần lỗi -> on_layout_change(monitor) (ClientScreenshot ép gửi FULL frame).
+- Mất handle (đổi phiên RDP, khóa màn hình, X server khởi động lại, ...): đóng phiên, mở lại và chụp lại
+  1 lần; vẫn lỗi thì ném lỗi cho vòng chụp (lượt sau sẽ thử mở lại).
+"""
+
+DEFAULT_LAYOUT_CHECK_INTERVAL = 2.0
+
+
+class ScreenGrabber:
+    def __init__(self, monitor_index: int = 1, layout_check_interval: float = DEFAULT_LAYOUT_CHECK_INTERVAL,
+                 on_layout_change: Optional[Callable[[dict], None]] = None):
+        self.monitor_index = monitor_index # mss: monitors[0] = toàn bộ màn hình ảo, monitors[1..] = từng màn hình
+        self.layout_check_interval = layout_check_interval
+        self.on_layout_change = on_layout_change
+
+        self._sct = None
+        self._owner = None # ident của luồng đã mở phiên
+        self.monitor: Optional[dict] = None
+        self._layout = None
+        self._next_layout_check = 0.0
+
+        # --- Thống kê ---
+        self.grab_latency = LatencyHistogram(max_samples=10_000) # ms mỗi lần sct.grab()
+        self.open_latency = LatencyHistogram(max_samples=1_000) # ms mỗi lần mở phiên mss
+        self.frames = 0
+        self.opens = 0
+        self.failures = 0 # lần chụp lỗi
+        self.recoveries = 0 # lần chụp lại thành công sau khi mở lại phiên
+        self.layout_changes = 0
+
+    # ------------------------------------------------------------------
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def is_open(self) -> bool:
+        return self._sct is not None
+
+    def open(self) -> None:
+        if self._sct is not None:
+            return
+        t0 = time.perf_counter()
+        self._sct = mss()
+        self._owner = threading.get_ident()
+        self.opens += 1
+        self._refresh_layout(initial=True)
+        self.open_latency.record((time.perf_counter() - t0) * 1000)
+
+    def close(self) -> None:
+        sct, self._sct = self._sct, None
+        self._owner = None
+        if sct is not None:
+            try:
+                sct.close()
+            except Exception as e:
+                print(f"[ScreenGrabber] Lỗi đóng phiên mss: {e}")
+
+    # ------------------------------------------------------------------
+    def _refresh_layout(self, initial: bool = False) -> None:
+        """Đọc lại danh sách màn hình; đổi bố cục -> cập nhật vùng chụp + báo on_layout_change."""
+        sct = self._sct
+        if not initial:
+            # mss lưu đệm danh sách màn hình ở lần đọc đầu: xóa để lần đọc sau liệt kê lại
+            try:
+                del sct._monitors[:]
+            except AttributeError:
+                pass
+        monitors = sct.monitors
+        layout = tuple((m["left"], m["top"], m["width"], m["height"]) for m in monitors)
+        self._next_layout_check = time.monotonic() + self.layout_check_interval
+        if layout == self._layout:
+            return
+        index = self.monitor_index if self.monitor_index < len(monitors) else len(monitors) - 1
+        if index != self.monitor_index:
+            print(f"[ScreenGrabber] Không còn màn hình {self.monitor_index}, chuyển sang màn hình {index}")
+        changed = self._layout is not None
+        self._layout = layout
+        self.monitor = dict(monitors[index])
+        if changed:
+            self.layout_changes += 1
+            print(f"[ScreenGrabber] Bố cục màn hình thay đổi: {self.monitor}")
+            if self.on_layout_change:
+                self.on_layout_change(self.monitor)
+
+    def grab(self):
+        """Chụp màn hình đã chọn, trả về ScreenShot của mss (.bgra, .size, .width, .height)."""
+        if self._sct is not None and self._owner != threading.get_ident():
+            self.close() # phiên thuộc luồng khác (vd: client khởi động lại pipeline)
+        self.open()
+        if time.monotonic() >= self._next_layout_check:
+            self._refresh_layout()
+
+        t0 = time.perf_counter()
+        try:
+            shot = self._sct.grab(self.monitor)
+        except ScreenShotError as e:
+            # Handle hỏng: mở lại phiên (và đọc lại bố cục) rồi chụp lại 1 lần
+            self.failures += 1
+            print(f"[ScreenGrabber] Lỗi chụp ({e}), mở lại phiên mss...")
+            self.close()
+            self.open()
+            t0 = time.perf_counter()
+            shot = self._sct.grab(self.monitor)
+            self.recoveries += 1
+        self.grab_latency.record((time.perf_counter() - t0) * 1000)
+        self.frames += 1
+        return shot
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "opens": self.opens,
+            "failures": self.failures,
+            "recoveries": self.recoveries,
+            "layout_changes": self.layout_changes,
+            "monitor": self.monitor,
+            "grab_ms": self.grab_latency.summary(),
+            "open_ms": self.open_latency.summary(),
+        }
@@ -2,6 +2,7 @@
 
 import pyautogui
 import traceback
+from common_network.constants import PDU_TYPE_INPUT
 
 class ClientInputHandler:
     """
@@ -21,15 +22,15 @@ class ClientInputHandler:
             self.screen_width, self.screen_height = 1920, 1080
         self.logger(f"Kích thước màn hình Client: {self.screen_width}x{self.screen_height}")
 
-    def handle_input_pdu(self, pdu: dict):
+    def handle_input_pdu(self, pdu):
         """
         Được gọi bởi ClientNetwork khi có PDU input.
         """
         print(f"[DEBUG Input] Nhận PDU: {pdu}")
-        if pdu.get("type") != "input":
+        if pdu.ptype != PDU_TYPE_INPUT:
             return
             
-        ev = pdu.get("input")
+        ev = pdu.input # JSON chỉ được giải mã tại đây
         if not ev:
             return
             
@@ -0,0 +1,535 @@
+# client/client_network/client_file_sender.py
+
+import os
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from common_network.pdu_builder import PDUBuilder
+from common_network.transfer_journal import TransferJournal, TRANSFER_DONE, TRANSFER_FAILED
+from common_network.file_utils import FileChunkReader
+from client.client_constants import (
+    CHANNEL_FILE, FILE_SEND_BATCH, FILE_WINDOW_BYTES, FILE_INITIAL_RTO, FILE_MIN_RTO, FILE_MAX_RTO, FILE_RESUME_TIMEOUT,
+    FILE_STREAM_CRC, FILE_CHUNK_CRC,
+)
+
+"""
+Gửi file theo cửa sổ trượt (sliding window) trên các PDU FILE_START / CHUNK / END / ACK / NAK:
+- Tối đa window_bytes byte đang trên đường (đã gửi, chưa ACK); ACK cộng dồn hoặc SACK (các đoạn đã nhận
+  sau ack_offset) bỏ chunk khỏi cửa sổ -> gửi tiếp ngay, không sleep cố định.
+- RTT đo trên chunk chỉ gửi 1 lần (thuật toán Karn) -> srtt / rttvar -> RTO = srtt + 4 * rttvar
+  (giới hạn [FILE_MIN_RTO, FILE_MAX_RTO], nhân đôi mỗi lần hết hạn). Hết RTO: chỉ gửi lại chunk chưa ACK đầu tiên
+  (chunk đã SACK không bao giờ bị gửi lại).
+- FILE_NAK(offset, "gap") từ bên nhận -> gửi lại ngay chunk đó (fast retransmit), không chờ RTO;
+  chunk chưa ACK mà 1 chunk gửi sau nó đã tới (ACK / SACK) cũng được gửi lại ngay. FILE_NAK(0, "crc") -> bỏ transfer.
+- Nhịp gửi (pacing): khi đã có srtt, các chunk được dàn đều để cả cửa sổ đi hết trong khoảng 1 srtt
+  (tránh dồn cả cửa sổ vào buffer ghi trong 1 lần).
+Trạng thái bền vững (các chunk chưa ACK) nằm trong TransferJournal; dữ liệu chunk đọc lại từ file nguồn.
+Tiếp tục sau khi mất kết nối / khởi động lại: FILE_START mang mã transfer (token trong journal), chờ bên nhận trả
+FILE_ACK cùng mã (tối đa FILE_RESUME_TIMEOUT giây) cho biết các đoạn nó đang giữ -> journal lấy theo đó làm chuẩn và
+chỉ gửi phần còn thiếu. Bên nhận cũ không trả lời: gửi tiếp từ các chunk chưa ACK trong journal.
+Transfer chỉ đóng khi có ACK toàn bộ file SAU FILE_END (bên nhận đã kiểm tra CRC).
+CRC cả file (stream_crc): tính dần trên dữ liệu chunk lúc gửi lần đầu (file chỉ được đọc 1 lượt, chunk đầu đi ngay),
+FILE_START mang checksum 0, FILE_END mang CRC cuối. Tùy chọn chunk_crc: mỗi FILE_CHUNK kèm CRC32 của nó,
+bên nhận trả FILE_NAK(offset, "chunk_crc") cho chunk hỏng -> chỉ gửi lại chunk đó.
+"""
+
+NAK_GAP = "gap"
+NAK_CRC = "crc"
+NAK_CHUNK_CRC = "chunk_crc"
+CRC_CATCH_UP_BYTES = 1 << 20 # đọc bù CRC (đoạn không gửi lại vì bên nhận đã có) theo khối 1 MB
+
+
+class _InFlight:
+    __slots__ = ("end", "sent_at", "retransmitted")
+
+    def __init__(self, end: int, sent_at: float):
+        self.end = end
+        self.sent_at = sent_at
+        self.retransmitted = False
+
+
+class _Current:
+    """Transfer đang gửi (chỉ luồng gửi dùng)."""
+    __slots__ = ("transfer", "reader", "batch", "cursor", "exhausted", "end_sent", "resume_deadline",
+                 "crc", "crc_offset", "crc_saved")
+
+    def __init__(self, transfer, reader, cursor: int, resume_deadline: Optional[float] = None):
+        self.transfer = transfer
+        self.reader = reader
+        self.batch = deque() # (offset, length) đọc từ journal, chưa gửi
+        self.cursor = cursor # offset chunk mới cuối cùng đã gửi
+        self.exhausted = False # journal không còn chunk nào sau cursor
+        self.end_sent = False
+        self.resume_deadline = resume_deadline # đang chờ bên nhận trả lời FILE_START tiếp tục transfer
+        self.crc = transfer.crc
+        self.crc_offset = transfer.crc_offset # None: CRC cả file đã có sẵn; khác None: CRC32 của [0, crc_offset)
+        self.crc_saved = transfer.crc_offset # crc_offset đã lưu vào journal
+
+
+class FileSender:
+    def __init__(self, network, next_seq: Callable[[], int], channel_file: int = CHANNEL_FILE,
+                 window_bytes: int = FILE_WINDOW_BYTES, journal_path: str = "client_transfer_journal.db"):
+        self.network = network
+        self.next_seq = next_seq
+        self.channel_file = channel_file
+        self.window_bytes = window_bytes
+        # Nhật ký truyền file chỉ lưu (transfer_id, offset, length, state); dữ liệu đọc lại từ file nguồn
+        self.journal = TransferJournal(db_path=journal_path)
+        self.file_sessions: Dict[str, Dict[str, Any]] = {}
+
+        # Mọi biến dưới đây được bảo vệ bởi self.lock (luồng gửi <-> luồng nhận ACK / NAK)
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self._transfer = None # Transfer đang gửi (ACK / NAK từ bên nhận áp dụng cho transfer này)
+        self._inflight: Dict[int, _InFlight] = {} # offset -> chunk đã gửi chưa ACK (thứ tự offset tăng dần)
+        self._retransmit = deque() # offset chờ gửi lại (NAK / hết RTO), ưu tiên hơn chunk mới
+        self._queued = set() # offset đang nằm trong _retransmit
+        self._acked_offset = 0 # mọi byte < giá trị này đã ACK
+        self._failed = False # bên nhận báo sai CRC
+        self._end_sent = False
+        self._complete = False # ACK toàn bộ file sau FILE_END
+        self._resume_token: Optional[bytes] = None # mã transfer đang chờ trả lời tiếp tục
+        self._resume_reply = None # (ack_offset, sack) bên nhận trả lời
+        self._next_timeout_check = float("inf")
+        self._rto_restart = 0.0 # bộ đếm RTO khởi động lại lúc hết hạn gần nhất
+        self._next_send_at = 0.0 # pacing
+        self.unacked_bytes = 0
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.rto = FILE_INITIAL_RTO
+
+        # --- Thống kê ---
+        self.chunks_sent = 0
+        self.retransmits = 0
+        self.fast_retransmits = 0 # gửi lại do NAK / phát hiện mất qua ACK (không chờ RTO)
+        self.timeouts = 0 # số lần có chunk quá RTO
+        self.resumed_bytes = 0 # byte không phải gửi lại nhờ bên nhận còn giữ file dở
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._send_loop, daemon=True, name="FileSender")
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self.cond:
+            self.cond.notify_all()
+        if self._thread and self._thread.is_alive() and self._thread != threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    # --- API ---
+
+    def send_file(self, filepath: str, chunk_size: int = 32 * 1024, stream_crc: bool = FILE_STREAM_CRC,
+                  chunk_crc: bool = FILE_CHUNK_CRC) -> threading.Thread:
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(filepath)
+        t = threading.Thread(target=self._prepare_file, args=(filepath, chunk_size, stream_crc, chunk_crc), daemon=True)
+        t.start()
+        return t
+
+    def _prepare_file(self, filepath: str, chunk_size: int, stream_crc: bool = FILE_STREAM_CRC,
+                      chunk_crc: bool = FILE_CHUNK_CRC):
+        filename = os.path.basename(filepath)
+        total_size = os.path.getsize(filepath)
+        crc = 0
+        if not stream_crc:
+            # CRC cả file trước khi gửi (đọc file thêm 1 lượt; chunk đầu chỉ đi sau khi đọc xong)
+            try:
+                with open(filepath, "rb") as f:
+                    while True:
+                        b = f.read(65536)
+                        if not b: break
+                        crc = zlib.crc32(b, crc)
+            except Exception as e:
+                print(f"Không thể đọc file {filepath}: {e}")
+                return
+            crc &= 0xffffffff
+
+        # Chỉ ghi vị trí các chunk vào journal; FILE_START / chunk / FILE_END do luồng gửi phát theo thứ tự
+        transfer_id = self.journal.add_transfer(os.path.abspath(filepath), filename, total_size, chunk_size, crc,
+                                                crc_offset=0 if stream_crc else None, chunk_crc=chunk_crc)
+        self.file_sessions[filename] = {
+            "total": total_size, "crc": crc, "last_ack": 0, "chunk_size": chunk_size, "transfer_id": transfer_id
+        }
+        with self.cond:
+            self.cond.notify_all()
+
+    def handle_file_ack(self, pdu):
+        try:
+            self._on_ack(pdu.ack_offset, pdu.sack, pdu.transfer_id)
+        except Exception as e:
+            print(f"[FileSender] Lỗi xử lý ACK: {e}")
+
+    def handle_file_nak(self, pdu):
+        reason = pdu.reason
+        if reason == NAK_GAP or reason == NAK_CHUNK_CRC:
+            with self.cond:
+                if self._queue_retransmit(pdu.offset, time.monotonic()):
+                    self.fast_retransmits += 1
+                    self.cond.notify_all()
+        elif reason == NAK_CRC:
+            print(f"[FileSender] Bên nhận báo sai CRC, bỏ transfer")
+            with self.cond:
+                self._failed = True
+                self.cond.notify_all()
+        else:
+            print(f"[FileSender] Nhận NAK offset={pdu.offset} reason={reason}")
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "transfer": self._transfer.filename if self._transfer else None,
+                "acked": self._acked_offset,
+                "inflight_bytes": self.unacked_bytes,
+                "srtt_ms": round(self.srtt * 1000, 2) if self.srtt is not None else None,
+                "rto_ms": round(self.rto * 1000, 1),
+                "chunks_sent": self.chunks_sent,
+                "retransmits": self.retransmits,
+                "fast_retransmits": self.fast_retransmits,
+                "timeouts": self.timeouts,
+                "resumed_bytes": self.resumed_bytes,
+            }
+
+    # --- ACK / NAK (luồng nhận) ---
+
+    def _on_ack(self, ack_offset: int, sack=(), transfer_id: bytes = b""):
+        now = time.monotonic()
+        sacked = []
+        with self.cond:
+            transfer = self._transfer
+            if transfer is None:
+                return
+            if transfer_id or self._resume_token is not None:
+                # Trả lời FILE_START tiếp tục transfer; ACK khác trong lúc chờ là của transfer / kết nối trước
+                if transfer_id and transfer_id == self._resume_token:
+                    self._resume_token = None
+                    self._resume_reply = (ack_offset, tuple(sack))
+                    self.cond.notify_all()
+                return
+            if self._end_sent and ack_offset >= transfer.total_size:
+                self._complete = True
+                self.cond.notify_all()
+            inflight = self._inflight
+            sample_sent_at = None
+            advanced = ack_offset > self._acked_offset
+            if advanced:
+                for offset in list(inflight):
+                    entry = inflight[offset]
+                    if entry.end > ack_offset:
+                        break
+                    del inflight[offset]
+                    self.unacked_bytes -= entry.end - offset
+                    if not entry.retransmitted:
+                        sample_sent_at = entry.sent_at if sample_sent_at is None else max(sample_sent_at, entry.sent_at)
+                self._acked_offset = min(ack_offset, transfer.total_size)
+            if sack and inflight:
+                # Chunk nằm trọn trong 1 đoạn SACK: bên nhận đã có, bỏ khỏi cửa sổ (không gửi lại)
+                bounds = [x for block in sack for x in block]
+                for offset in list(inflight):
+                    i = bisect_right(bounds, offset)
+                    entry = inflight[offset]
+                    if i % 2 == 1 and entry.end <= bounds[i]:
+                        del inflight[offset]
+                        self.unacked_bytes -= entry.end - offset
+                        if not entry.retransmitted:
+                            sample_sent_at = entry.sent_at if sample_sent_at is None else max(sample_sent_at, entry.sent_at)
+                        sacked.append((offset, entry.end))
+            if sample_sent_at is not None:
+                self._update_rtt(now - sample_sent_at)
+                # Chunk gửi trước 1 chunk đã tới (quá srtt / 4) mà vẫn chưa ACK: coi như mất (cả bản gửi lại bị mất,
+                # bên nhận chỉ NAK mỗi lỗ hổng 1 lần) -> gửi lại ngay, không chờ RTO
+                lost_before = sample_sent_at - self.srtt / 4
+                for offset, entry in inflight.items():
+                    if entry.sent_at < lost_before and self._queue_retransmit(offset, now):
+                        self.fast_retransmits += 1
+            if advanced or sacked:
+                self.cond.notify_all()
+        if advanced:
+            self.journal.ack_through(transfer.transfer_id, ack_offset)
+            session = self.file_sessions.get(transfer.filename)
+            if session is not None:
+                session["last_ack"] = max(session["last_ack"], ack_offset)
+        if sacked:
+            # Gộp các chunk liền nhau -> 1 câu UPDATE / đoạn
+            start, end = sacked[0]
+            for s, e in sacked[1:]:
+                if s != end:
+                    self.journal.ack_range(transfer.transfer_id, start, end)
+                    start = s
+                end = e
+            self.journal.ack_range(transfer.transfer_id, start, end)
+
+    def _update_rtt(self, sample: float):
+        # Gọi khi đang giữ self.lock (RFC 6298)
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+            self.srtt = 0.875 * self.srtt + 0.125 * sample
+        self.rto = min(FILE_MAX_RTO, max(FILE_MIN_RTO, self.srtt + 4 * self.rttvar))
+
+    def _queue_retransmit(self, offset: int, now: float) -> bool:
+        # Gọi khi đang giữ self.lock
+        entry = self._inflight.get(offset)
+        if entry is None or offset in self._queued:
+            return False
+        if entry.retransmitted and self.srtt is not None and now - entry.sent_at < self.srtt:
+            return False # bản gửi lại trước đó chưa kịp tới bên nhận
+        self._retransmit.append(offset)
+        self._queued.add(offset)
+        return True
+
+    def _check_timeouts(self, now: float):
+        """
+        Gọi khi đang giữ self.lock. Hết RTO (tính từ chunk gửi sớm nhất chưa ACK, hoặc từ lần hết hạn trước):
+        gửi lại chunk chưa ACK có offset nhỏ nhất, RTO nhân đôi, khởi động lại bộ đếm (RFC 6298 mục 5.4 - 5.6).
+        Không gửi lại cả cửa sổ: chunk sau lỗ hổng thường đã tới (SACK / ACK cộng dồn nhảy qua khi lỗ được lấp).
+        """
+        oldest = min((e.sent_at for o, e in self._inflight.items() if o not in self._queued), default=None)
+        if oldest is None:
+            self._next_timeout_check = float("inf")
+            return
+        deadline = max(oldest + self.rto, self._rto_restart)
+        if deadline > now:
+            self._next_timeout_check = deadline
+            return
+        for offset in self._inflight:
+            if offset not in self._queued:
+                self._retransmit.append(offset)
+                self._queued.add(offset)
+                break
+        self.timeouts += 1
+        self.rto = min(FILE_MAX_RTO, self.rto * 2)
+        self._rto_restart = self._next_timeout_check = now + self.rto
+
+    # --- Luồng gửi ---
+
+    def _reset_window(self, transfer, acked: int):
+        # Gọi khi đang giữ self.lock
+        self._transfer = transfer
+        self._inflight.clear()
+        self._retransmit.clear()
+        self._queued.clear()
+        self._acked_offset = acked
+        self._failed = False
+        self._end_sent = False
+        self._complete = False
+        self._resume_token = transfer.token if transfer is not None and transfer.token else None
+        self._resume_reply = None
+        self._next_timeout_check = float("inf")
+        self.unacked_bytes = 0
+
+    def _open_transfer(self) -> Optional[_Current]:
+        """Chọn transfer cũ nhất chưa xong trong journal và gửi FILE_START."""
+        for transfer in self.journal.active_transfers():
+            try:
+                reader = FileChunkReader(transfer.path)
+            except OSError as e:
+                reader = None
+                print(f"[FileSender] Không mở được file nguồn {transfer.path}: {e}")
+            if reader is None or reader.size != transfer.total_size:
+                # File nguồn đã bị xóa / thay đổi: dữ liệu chưa gửi không còn -> bỏ transfer
+                if reader is not None:
+                    reader.close()
+                self.journal.finish(transfer.transfer_id, TRANSFER_FAILED)
+                continue
+            acked = self.journal.acked_offset(transfer.transfer_id)
+            with self.cond:
+                self._reset_window(transfer, acked)
+            # CRC tính dần: FILE_START mang 0 (không đổi giữa các lần tiếp tục), CRC thật nằm trong FILE_END
+            checksum = transfer.crc if transfer.crc_offset is None else 0
+            start_pdu = PDUBuilder.build_file_start(self.next_seq(), transfer.filename, transfer.total_size,
+                                                    transfer.chunk_size, checksum, transfer.token or b"")
+            self.network.send_mcs_pdu(self.channel_file, start_pdu)
+            deadline = time.monotonic() + FILE_RESUME_TIMEOUT if transfer.token else None
+            return _Current(transfer, reader, acked - 1, deadline)
+        return None
+
+    def _apply_resume(self, cur: _Current, reply):
+        """Trạng thái bên nhận (ack_offset, sack) là chuẩn: đánh dấu lại journal, gửi tiếp từ chunk đầu tiên còn thiếu."""
+        transfer = cur.transfer
+        cur.resume_deadline = None
+        if reply is None:
+            print(f"[FileSender] Bên nhận không trả lời tiếp tục {transfer.filename}, gửi các chunk chưa ACK")
+            return
+        ack_offset, sack = reply
+        tid = transfer.transfer_id
+        self.journal.reset_acks(tid)
+        self.journal.ack_through(tid, ack_offset)
+        for start, end in sack:
+            self.journal.ack_range(tid, start, end)
+        acked = self.journal.acked_offset(tid)
+        held = transfer.total_size - self.journal.remaining(tid)[1]
+        with self.cond:
+            self._acked_offset = acked
+        cur.cursor = acked - 1
+        cur.batch.clear()
+        cur.exhausted = False
+        self.resumed_bytes += held
+        if held:
+            print(f"[FileSender] Tiếp tục {transfer.filename}: bên nhận đã có {held}/{transfer.total_size} bytes")
+
+    def _update_crc(self, cur: _Current, offset: int, data) -> None:
+        """CRC tính dần trên chunk gửi theo thứ tự offset; chunk đã tính (gửi lại) bị bỏ qua."""
+        if cur.crc_offset is None or offset + len(data) <= cur.crc_offset:
+            return
+        if offset > cur.crc_offset:
+            self._catch_up_crc(cur, offset) # các chunk bên nhận đã có từ trước (không gửi lại)
+        cur.crc = zlib.crc32(data, cur.crc)
+        cur.crc_offset = offset + len(data)
+
+    def _catch_up_crc(self, cur: _Current, upto: int) -> None:
+        while cur.crc_offset < upto:
+            n = min(CRC_CATCH_UP_BYTES, upto - cur.crc_offset)
+            cur.crc = zlib.crc32(cur.reader.read(cur.crc_offset, n), cur.crc)
+            cur.crc_offset += n
+
+    def _save_crc(self, cur: _Current) -> None:
+        if cur.crc_offset is not None and cur.crc_offset != cur.crc_saved:
+            self.journal.set_crc(cur.transfer.transfer_id, cur.crc, cur.crc_offset)
+            cur.crc_saved = cur.crc_offset
+
+    def _final_crc(self, cur: _Current) -> int:
+        if cur.crc_offset is None:
+            return cur.transfer.crc
+        self._catch_up_crc(cur, cur.transfer.total_size)
+        cur.crc &= 0xffffffff
+        self._save_crc(cur)
+        return cur.crc
+
+    def _close_transfer(self, cur: _Current, state: int):
+        with self.cond:
+            self._reset_window(None, 0)
+        cur.reader.close()
+        self.journal.finish(cur.transfer.transfer_id, state)
+        self.file_sessions.pop(cur.transfer.filename, None)
+
+    def _next_action(self, cur: _Current):
+        """
+        Gọi khi đang giữ self.lock. Trả về ("chunk", offset, length, ack_now) / ("end",) / ("done",) / ("fail",),
+        hoặc None (đã chờ / cần đọc thêm từ journal).
+        """
+        now = time.monotonic()
+        total = cur.transfer.total_size
+        if self._failed:
+            return ("fail",)
+        if self._complete:
+            return ("done",)
+        if now >= self._next_timeout_check:
+            self._check_timeouts(now)
+
+        while self._retransmit:
+            offset = self._retransmit.popleft()
+            self._queued.discard(offset)
+            entry = self._inflight.get(offset)
+            if entry is not None:
+                entry.sent_at = now
+                entry.retransmitted = True
+                self.retransmits += 1
+                self._next_timeout_check = min(self._next_timeout_check, now + self.rto)
+                return ("chunk", offset, entry.end - offset, True)
+
+        if self._next_send_at > now + 0.001:
+            self.cond.wait(self._next_send_at - now)
+            return None
+
+        batch = cur.batch
+        while batch and (batch[0][0] + batch[0][1] <= self._acked_offset or batch[0][0] in self._inflight):
+            batch.popleft() # đã ACK (ACK về trước khi journal kịp cập nhật) / đang trên đường
+        if batch:
+            offset, length = batch[0]
+            if self.unacked_bytes == 0 or self.unacked_bytes + length <= self.window_bytes:
+                batch.popleft()
+                cur.cursor = offset
+                self._inflight[offset] = _InFlight(offset + length, now)
+                self.unacked_bytes += length
+                self._next_timeout_check = min(self._next_timeout_check, now + self.rto)
+                if self.srtt is not None:
+                    # Dàn đều: cả cửa sổ trong 1 srtt
+                    self._next_send_at = max(self._next_send_at, now) + self.srtt * length / self.window_bytes
+                # Cửa sổ không còn chỗ cho chunk kế / chunk cuối file: bên nhận ACK ngay thay vì chờ đủ byte
+                ack_now = self.unacked_bytes + length > self.window_bytes or offset + length >= total
+                return ("chunk", offset, length, ack_now)
+        elif not cur.exhausted:
+            return None
+        elif not cur.end_sent:
+            cur.end_sent = self._end_sent = True
+            return ("end",)
+
+        # Đầy cửa sổ / đã gửi hết: chờ ACK, NAK hoặc tới hạn RTO
+        self.cond.wait(max(0.001, min(self._next_timeout_check - now, 0.5)))
+        return None
+
+    def _send_loop(self):
+        cur: Optional[_Current] = None
+        while self._running:
+            try:
+                if not self.network.running or not self.network.client:
+                    if cur is not None:
+                        # Chunk đang trên đường đã mất cùng kết nối; kết nối lại thì bắt đầu lại bằng FILE_START
+                        cur.reader.close()
+                        cur = None
+                        with self.cond:
+                            self._reset_window(None, 0)
+                    time.sleep(1.0)
+                    continue
+
+                if cur is None:
+                    cur = self._open_transfer()
+                    if cur is None:
+                        with self.cond:
+                            self.cond.wait(0.5)
+                        continue
+
+                if cur.resume_deadline is not None:
+                    with self.cond:
+                        reply = self._resume_reply
+                        wait = cur.resume_deadline - time.monotonic()
+                        if reply is None and wait > 0:
+                            self.cond.wait(min(wait, 0.5))
+                            continue
+                        self._resume_token = self._resume_reply = None
+                    self._apply_resume(cur, reply)
+                    continue
+
+                if not cur.batch and not cur.exhausted:
+                    self._save_crc(cur)
+                    cur.batch.extend(self.journal.pending_chunks(cur.transfer.transfer_id, cur.cursor, FILE_SEND_BATCH))
+                    cur.exhausted = not cur.batch
+
+                with self.cond:
+                    action = self._next_action(cur)
+                if action is None:
+                    continue
+
+                kind = action[0]
+                if kind == "chunk":
+                    _, offset, length, ack_now = action
+                    data = cur.reader.read(offset, length)
+                    self._update_crc(cur, offset, data)
+                    chunk_crc = zlib.crc32(data) if cur.transfer.chunk_crc else None
+                    pdu = PDUBuilder.build_file_chunk(self.next_seq(), offset, data, ack_now, chunk_crc)
+                    self.network.send_mcs_pdu(self.channel_file, pdu)
+                    self.chunks_sent += 1
+                elif kind == "end":
+                    self.network.send_mcs_pdu(self.channel_file, PDUBuilder.build_file_end(self.next_seq(), self._final_crc(cur)))
+                elif kind == "done":
+                    self._close_transfer(cur, TRANSFER_DONE)
+                    cur = None
+                elif kind == "fail":
+                    self._close_transfer(cur, TRANSFER_FAILED)
+                    cur = None
+
+            except Exception as e:
+                print(f"[FileSender] Lỗi vòng gửi: {e}")
+                time.sleep(1.0)
@@ -4,16 +4,16 @@ import threading
 import socket
 import ssl
 from queue import Queue, Empty
-from time import time
 from common_network.x224_handshake import X224Handshake, CONFIRM_MAGIC
 from common_network.security_layer_tls import create_client_context, client_wrap_socket
 from common_network.pdu_builder import PDUBuilder
-from common_network.mcs_layer import MCSLite
-from common_network.tpkt_layer import TPKTLayer
+from common_network.tpkt_writer import TPKTWriter
+from common_network.constants import PDU_TYPE_INPUT, PDU_TYPE_CONTROL, PDU_TYPE_FILE_ACK, PDU_TYPE_FILE_NAK, PDU_TYPE_FRAME_ACK, CAP_EXTLEN32
+from common_network.pdu_records import FILE_PDU_TYPES
 from client.client_network.client_receiver import ClientReceiver
 from client.client_constants import (
     CLIENT_ID, CA_FILE, 
-    CHANNEL_CONTROL, CHANNEL_INPUT, CHANNEL_VIDEO, CHANNEL_FILE, CHANNEL_CURSOR,
+    CHANNEL_CONTROL, CHANNEL_INPUT, CHANNEL_VIDEO, CHANNEL_FILE, CHANNEL_CURSOR, CHANNEL_THUMB,
     CMD_REGISTER
 )
 
@@ -23,15 +23,21 @@ class ClientNetwork:
     và vòng lặp xử lý PDU.
     """
 
-    def __init__(self, host, port, client_id=CLIENT_ID, cafile=CA_FILE, logger=None):
+    def __init__(self, host, port, client_id=CLIENT_ID, cafile=CA_FILE, logger=None, offer_ext_framing=True):
         self.host = host
         self.port = port
         self.client_id = client_id
         self.cafile = cafile
         self.logger = logger or print
+
+        # Extended framing (EXTLEN32): đề nghị trong X224, chỉ bật nếu server chấp nhận.
+        # Khi bật, frame lớn (FULL 1280+) được gửi thành 1 PDU thay vì các fragment 64 KB.
+        self.offer_ext_framing = offer_ext_framing
+        self.ext_framing = False
         
         self.client = None # Sẽ là SSLSocket
         self.receiver = None
+        self.writer = None # TPKTWriter: gộp ghi nhiều gói vào 1 lần sendall
         self.running = False
         
         self.pdu_queue = Queue()
@@ -39,7 +45,7 @@ class ClientNetwork:
         
         self.builder = PDUBuilder()
         self.seq = 0
-        self.lock = threading.Lock() # Dùng cho self.seq và self.client
+        self.lock = threading.Lock() # Dùng cho self.seq
 
         # Callbacks cho lớp Client (UI/Glue)
         self.on_input_pdu = None
@@ -47,6 +53,7 @@ class ClientNetwork:
         self.on_file_pdu = None
         self.on_file_ack = None
         self.on_file_nak = None
+        self.on_frame_ack = None # [THÊM] FRAME_ACK của manager (độ trễ đầu-cuối)
         self.on_disconnected = None
 
     def connect(self, timeout=20.0) -> bool:
@@ -59,13 +66,15 @@ class ClientNetwork:
             raw_sock.connect((self.host, self.port))
 
             # 2. Thực hiện X224 Handshake
-            resp = X224Handshake.client_send_connect(raw_sock, self.client_id, timeout=timeout)
+            offer = {CAP_EXTLEN32} if self.offer_ext_framing else None
+            resp = X224Handshake.client_send_connect(raw_sock, self.client_id, timeout=timeout, caps=offer)
             
             if not (isinstance(resp, bytes) and resp.startswith(CONFIRM_MAGIC)):
                 self.logger(f"[ClientNetwork] Handshake X224 thất bại, resp: {resp}")
                 raw_sock.close()
                 return False
-            self.logger("[ClientNetwork] Handshake X224 thành công.")
+            self.ext_framing = CAP_EXTLEN32 in X224Handshake.parse_caps(resp)
+            self.logger(f"[ClientNetwork] Handshake X224 thành công (ext_framing={self.ext_framing}).")
 
             # 3. Tạo TLS Context
             tls_context = create_client_context(cafile=self.cafile, check_hostname=False)
@@ -98,6 +107,11 @@ class ClientNetwork:
             return False
         
         self.running = True
+
+        # Khởi tạo Writer (gộp ghi)
+        self.writer = TPKTWriter(self.client, name="ClientWriter", on_error=self._on_writer_error,
+                                 ext_framing=self.ext_framing)
+        self.writer.start()
         
         # Khởi tạo Receiver
         self.receiver = ClientReceiver(self.client, self.pdu_queue, self._on_receiver_done)
@@ -115,6 +129,8 @@ class ClientNetwork:
 
     def stop(self):
         self.running = False
+        if self.writer:
+            self.writer.stop()
         if self.receiver:
             self.receiver.stop()
         if self.client:
@@ -146,27 +162,31 @@ class ClientNetwork:
                 if self.running:
                     self.logger(f"[ClientNetwork] Lỗi PDU loop: {e}")
 
-    def _handle_pdu(self, pdu: dict):
-        """Phân loại PDU và gọi callback cho lớp Client"""
-        ptype = pdu.get("type")
+    def _handle_pdu(self, pdu):
+        """Phân loại PDU (theo ptype số nguyên) và gọi callback cho lớp Client"""
+        ptype = pdu.ptype
         
-        if ptype == "input":
+        if ptype == PDU_TYPE_INPUT:
             if self.on_input_pdu:
                 self.on_input_pdu(pdu)
         
-        elif ptype == "control":
+        elif ptype == PDU_TYPE_CONTROL:
             if self.on_control_pdu:
                 self.on_control_pdu(pdu)
         
-        elif ptype == "file_ack":
+        elif ptype == PDU_TYPE_FRAME_ACK:
+            if self.on_frame_ack:
+                self.on_frame_ack(pdu)
+        
+        elif ptype == PDU_TYPE_FILE_ACK:
             if self.on_file_ack:
                 self.on_file_ack(pdu)
         
-        elif ptype == "file_nak":
+        elif ptype == PDU_TYPE_FILE_NAK:
             if self.on_file_nak:
                 self.on_file_nak(pdu)
         
-        elif ptype.startswith("file_"):
+        elif ptype in FILE_PDU_TYPES:
             if self.on_file_pdu:
                 self.on_file_pdu(pdu)
         
@@ -180,40 +200,21 @@ class ClientNetwork:
     # --- Public API cho ClientSender và Client ---
 
     def send_mcs_pdu(self, channel_id: int, pdu_bytes: bytes):
-        if not self.running or not self.client: 
+        """
+        Xếp PDU vào TPKTWriter của kết nối (không gửi trực tiếp).
+        Writer gộp nhiều gói TPKT vào 1 lần sendall; lỗi kết nối được báo qua _on_writer_error.
+        """
+        if not self.running or not self.writer: 
             return
-        try:
-            mcs_frame = MCSLite.build(channel_id, pdu_bytes)
-            tpkt_packet = TPKTLayer.pack(mcs_frame)
-            
-            with self.lock:
-                totalsent = 0
-                data_to_send = tpkt_packet
-                
-                while totalsent < len(data_to_send):
-                    sent = self.client.send(data_to_send[totalsent:])
-                    if sent is None: # Sửa điều kiện kiểm tra
-                        raise ConnectionError("Socket broken")
-                    if sent == 0: 
-                        # Socket đang bận/đầy, không nên throw error ngay
-                        # Chờ xíu rồi thử lại hoặc return để ClientSender gửi lại sau
-                        time.sleep(0.01)
-                        continue
-                    totalsent += sent
-
-        except (socket.timeout, BlockingIOError):
-            # [SỬA] Đừng ngắt kết nối khi Timeout, chỉ in log và bỏ qua gói này
-            # Video frame sau sẽ bù đắp lại
-            self.logger(f"[ClientNetwork] Socket Busy/Timeout. Bỏ qua gói tin.")
-            return 
-
-        except (ssl.SSLError, ConnectionError) as e:
-            self.logger(f"[ClientNetwork] Lỗi kết nối nghiêm trọng: {e}")
-            self._on_receiver_done() # Chỉ ngắt khi lỗi thực sự nghiêm trọng
-            
-        except Exception as e:
-            self.logger(f"[ClientNetwork] Lỗi gửi PDU: {e}")
-            # Có thể không cần ngắt kết nối ở đây tùy vào mức độ lỗi
+        self.writer.send(channel_id, pdu_bytes)
+
+    def _on_writer_error(self, e):
+        self.logger(f"[ClientNetwork] Lỗi kết nối nghiêm trọng khi gửi: {e}")
+        self._on_receiver_done()
+
+    def get_write_stats(self) -> dict:
+        """Thống kê gộp ghi: số lần sendall/giây, bytes/lần, frames/lần."""
+        return self.writer.stats.snapshot() if self.writer else {}
 
     def send_cursor_pdu(self, x_norm: float, y_norm: float, cursor_shape_bytes: bytes = None):
         """Gửi PDU Cursor tới Server (dùng để chuyển tiếp tới Manager)"""
@@ -228,6 +229,12 @@ class ClientNetwork:
         )
         self.send_mcs_pdu(CHANNEL_CURSOR, pdu)
 
+    def send_thumbnail_pdu(self, jpg_bytes: bytes, width: int, height: int, ts_ms: int = None):
+        """[THÊM] Gửi 1 ảnh thu nhỏ (server điền id client rồi chuyển cho các manager theo dõi)"""
+        seq = self._next_seq()
+        pdu = self.builder.build_thumbnail_pdu(seq, jpg_bytes, width, height, ts_ms=ts_ms)
+        self.send_mcs_pdu(CHANNEL_THUMB, pdu)
+
     def send_control_pdu(self, message: str):
         """Gửi một PDU Control tới server"""
         seq = self._next_seq()
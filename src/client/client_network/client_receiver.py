@@ -1,19 +1,12 @@
 # client/client_network/client_receiver.py
 
 import threading
-import struct
 import ssl
 from collections import defaultdict
 from common_network.mcs_layer import MCSLite
 from common_network.pdu_parser import PDUParser
 from common_network.tpkt_layer import TPKTLayer
-from common_network.constants import (
-    SHARE_CTRL_HDR_FMT, SHARE_HDR_SIZE,
-    FRAGMENT_FLAG, FRAGMENT_HDR_FMT, FRAGMENT_HDR_SIZE,
-    PDU_TYPE_FULL, PDU_TYPE_RECT, PDU_TYPE_CONTROL, PDU_TYPE_INPUT,
-    PDU_TYPE_FILE_START, PDU_TYPE_FILE_CHUNK, PDU_TYPE_FILE_END, 
-    PDU_TYPE_FILE_ACK, PDU_TYPE_FILE_NAK
-)
+from common_network.frame_decoder import PDUFrameDecoder
 # Thay đổi import
 from client.client_constants import ALL_CHANNELS
 
@@ -22,7 +15,7 @@ class ClientReceiver(threading.Thread):
     """
     Giống hệt ManagerReceiver.
     Đọc TPKT từ SSL socket -> feed vào MCS -> xử lý buffer từng kênh
-    -> trích xuất PDU -> đẩy PDU (dict) vào pdu_queue.
+    -> trích xuất PDU -> đẩy PDU (PDURecord) vào pdu_queue.
     """
     def __init__(self, ssl_sock, pdu_queue, done_callback):
         super().__init__(daemon=True, name="ClientReceiver") # Đổi tên thread
@@ -34,92 +27,30 @@ class ClientReceiver(threading.Thread):
         self.mcs = MCSLite()
         self.parser = PDUParser()
         self.running = True
-        self.channel_buffers = defaultdict(bytearray)
+        self.decoders = defaultdict(PDUFrameDecoder) # { channel_id -> PDUFrameDecoder }
 
-    def _get_pdu_total_length(self, data: bytes) -> int:
+    def _process_channel_buffer(self, channel_id: int, new_data):
         """
-        Kiểm tra buffer và trả về tổng độ dài của PDU đầu tiên.
-        (Logic giống hệt Server/ManagerReceiver)
+        Đưa dữ liệu mới vào bộ tách PDU của kênh, parse tất cả PDU hoàn chỉnh.
         """
-        if len(data) < SHARE_HDR_SIZE:
-            raise ValueError("Không đủ dữ liệu cho header chung")
-        
-        seq, ts_ms, ptype, flags = struct.unpack_from(SHARE_CTRL_HDR_FMT, data)
-        offset = SHARE_HDR_SIZE
-
-        if (flags & FRAGMENT_FLAG):
-            return len(data)
-
-        try:
-            if ptype == PDU_TYPE_FULL:
-                if len(data) < offset + 12: raise ValueError("Thiếu header FULL")
-                jpg_len = struct.unpack_from(">I", data, offset + 8)[0]
-                return offset + 12 + jpg_len
-            
-            elif ptype == PDU_TYPE_RECT:
-                if len(data) < offset + 28: raise ValueError("Thiếu header RECT")
-                jpg_len = struct.unpack_from(">I", data, offset + 16)[0]
-                return offset + 28 + jpg_len
-            
-            elif ptype == PDU_TYPE_CONTROL or ptype == PDU_TYPE_INPUT:
-                if len(data) < offset + 4: raise ValueError("Thiếu header CONTROL/INPUT")
-                msg_len = struct.unpack_from(">I", data, offset)[0]
-                return offset + 4 + msg_len
-                
-            elif ptype == PDU_TYPE_FILE_START:
-                if len(data) < offset + 2: raise ValueError("Thiếu header FILE_START")
-                fn_len = struct.unpack_from(">H", data, offset)[0]
-                return offset + 2 + fn_len + 16
-                
-            elif ptype == PDU_TYPE_FILE_CHUNK:
-                if len(data) < offset + 12: raise ValueError("Thiếu header FILE_CHUNK")
-                chunk_len = struct.unpack_from(">I", data, offset + 8)[0]
-                return offset + 12 + chunk_len
-                
-            elif ptype == PDU_TYPE_FILE_END:
-                return offset + 4
-                
-            elif ptype == PDU_TYPE_FILE_ACK:
-                return offset + 8
-                
-            elif ptype == PDU_TYPE_FILE_NAK:
-                if len(data) < offset + 12: raise ValueError("Thiếu header FILE_NAK")
-                reason_len = struct.unpack_from(">I", data, offset + 8)[0]
-                return offset + 12 + reason_len
-                
-            else:
-                raise ValueError(f"Loại PDU không xác định: {ptype}")
-                
-        except struct.error:
-            raise ValueError("Không đủ dữ liệu để đọc độ dài PDU")
-
-    def _process_channel_buffer(self, channel_id: int):
-        buf = self.channel_buffers[channel_id]
-        while self.running:
-            if not buf: break
-            try:
-                total_pdu_len = self._get_pdu_total_length(bytes(buf))
-            except ValueError: break 
-            if len(buf) < total_pdu_len: break
-                
-            pdu_bytes = buf[:total_pdu_len]
-            del buf[:total_pdu_len]
-
+        for pdu_bytes in self.decoders[channel_id].feed(new_data):
+            if not self.running:
+                break
             try:
                 parsed = self.parser.parse(pdu_bytes)
             except Exception as e:
                 print(f"[ClientReceiver] Lỗi parse PDU, bỏ qua: {e}")
                 continue
 
-            if parsed and parsed.get("type") != "fragment_pending":
-                parsed["_raw_payload"] = pdu_bytes
+            # None: fragment chưa đủ, đang chờ lắp ráp
+            if parsed is not None:
                 self.pdu_queue.put(parsed)
 
     def run(self):
         try:
             while self.running:
                 try:
-                    tpkt_body = TPKTLayer.recv_one(self.sock, recv_fn=self.sock.recv, timeout=600.0)
+                    tpkt_body = TPKTLayer.recv_one_view(self.sock, timeout=600.0)
                 except (TimeoutError, ConnectionError, OSError, ssl.SSLError) as e:
                     if self.running:
                         print(f"[ClientReceiver] Mất kết nối tới Server: {e}")
@@ -129,13 +60,9 @@ class ClientReceiver(threading.Thread):
                     if self.running: print(f"[ClientReceiver] Nhận 0 bytes, kết thúc.")
                     break
                     
-                self.mcs.feed(tpkt_body)
-
-                for ch_id in ALL_CHANNELS:
-                    new_data = self.mcs.read_channel(ch_id)
-                    if new_data:
-                        self.channel_buffers[ch_id].extend(new_data)
-                    self._process_channel_buffer(ch_id)
+                for ch_id, payload in self.mcs.feed_view(tpkt_body):
+                    if ch_id in ALL_CHANNELS:
+                        self._process_channel_buffer(ch_id, payload)
 
         except Exception as e:
             if self.running:
@@ -0,0 +1,188 @@
+# client/client_pipeline.py
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+from common_network.stats import LatencyHistogram
+
+"""
+Pipeline gửi màn hình nhiều giai đoạn (thay cho ClientScreenshot.capture_loop chạy tuần tự):
+
+    [chụp + so sánh] --encode_q--> [N luồng resize + encode JPEG] --sắp lại thứ tự--> callback (ClientSender)
+
+- Luồng chụp: ClientScreenshot.capture_frame() theo nhịp fps. Hàng đợi encode đầy -> BỎ LƯỢT chụp này
+  (chưa so sánh nên ảnh tham chiếu không bị lệch; lượt sau sẽ thấy đủ thay đổi).
+- Luồng encode (pool): render() (resize/cắt) + JPEG; PIL nhả GIL khi resize/encode nên chạy song song thật.
+- Bộ sắp thứ tự: frame được giao cho callback đúng thứ tự chụp (RECT sau phải đè lên RECT trước),
+  seq được cấp lúc giao.
+- Callback trả về False (hàng đợi sender đầy, frame bị bỏ): ép FULL frame và bỏ luôn các RECT đã encode
+  sau đó cho tới khi 1 FULL frame đi qua (chúng không sửa được vùng đã lệch trên manager).
+Mỗi giai đoạn có LatencyHistogram riêng (ms): capture, queue_wait, encode, reorder, deliver, end_to_end.
+"""
+
+DEFAULT_MAX_ENCODE_WORKERS = 4
+
+
+class CapturePipeline:
+    def __init__(self, screenshot, callback: Callable, encode_workers: Optional[int] = None,
+                 queue_size: Optional[int] = None):
+        self.screenshot = screenshot
+        self.callback = callback # callback(width, height, jpg_bytes, bbox, img, seq, ts_ms) -> False nếu bị bỏ
+        self.encode_workers = encode_workers or min(DEFAULT_MAX_ENCODE_WORKERS, os.cpu_count() or 1)
+        # Mỗi luồng encode 1 frame + 1 frame chờ sẵn: đủ để không luồng nào rảnh, độ trễ vẫn thấp
+        self.encode_q = queue.Queue(maxsize=queue_size or self.encode_workers * 2)
+
+        self._running = False
+        self._threads = []
+        self._frame_idx = 0 # số thứ tự chụp (chỉ luồng chụp tăng)
+        self._emit_lock = threading.Lock()
+        self._ready: Dict[int, tuple] = {} # frame_idx -> kết quả encode đang chờ tới lượt giao
+        self._next_emit = 0
+        self._resync = False # đã bỏ 1 frame -> chờ FULL frame
+
+        self.histograms = {name: LatencyHistogram(max_samples=10_000) for name in
+                           ("capture", "queue_wait", "encode", "reorder", "deliver", "end_to_end")}
+        self.captured = 0
+        self.idle = 0 # lượt chụp không có thay đổi
+        self.skipped = 0 # lượt chụp bị bỏ vì hàng đợi encode đầy
+        self.delivered = 0
+        self.dropped = 0 # callback trả về False
+        self.discarded = 0 # RECT bị bỏ trong lúc chờ FULL frame (sau khi bị drop)
+        self.errors = 0
+
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.screenshot.stop = False
+        t = threading.Thread(target=self._capture_loop, daemon=True, name="Capture")
+        t.start()
+        self._threads.append(t)
+        for i in range(self.encode_workers):
+            t = threading.Thread(target=self._encode_loop, daemon=True, name=f"Encode-{i}")
+            t.start()
+            self._threads.append(t)
+        print(f"[CapturePipeline] Bắt đầu: {self.encode_workers} luồng encode, hàng đợi {self.encode_q.maxsize}")
+
+    def stop(self, timeout: float = 1.0):
+        self._running = False
+        self.screenshot.stop = True
+        current_t = threading.current_thread()
+        for t in self._threads:
+            if t is not current_t and t.is_alive():
+                t.join(timeout=timeout)
+        self._threads = []
+
+    # ------------------------------------------------------------------
+    def _capture_loop(self):
+        shot = self.screenshot
+        while self._running and not shot.stop:
+            interval = 1.0 / shot.fps # đọc lại mỗi lượt: fps có thể được chỉnh khi đang chạy
+            start_time = time.perf_counter()
+            try:
+                if self.encode_q.full():
+                    # Encode không theo kịp: bỏ lượt chụp (trước khi so sánh -> không lệch tham chiếu)
+                    self.skipped += 1
+                else:
+                    size, parts, ts_ms = shot.capture_frame()
+                    t_captured = time.perf_counter()
+                    self.histograms["capture"].record((t_captured - start_time) * 1000)
+                    if parts:
+                        self.captured += 1
+                        job = (self._frame_idx, size, parts, ts_ms, start_time, t_captured)
+                        self._frame_idx += 1
+                        self._put(job)
+                    else:
+                        self.idle += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"[CapturePipeline] Lỗi chụp: {e}")
+            elapsed = time.perf_counter() - start_time
+            time.sleep(max(0, interval - elapsed))
+        shot.close() # phiên mss gắn với luồng chụp: đóng ngay trên luồng này
+
+    def _put(self, job):
+        # Chỉ luồng chụp ghi vào encode_q và đã kiểm tra còn chỗ -> thường không phải chờ
+        while self._running:
+            try:
+                self.encode_q.put(job, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _encode_loop(self):
+        shot = self.screenshot
+        while self._running:
+            try:
+                idx, size, parts, ts_ms, t_start, t_queued = self.encode_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            t0 = time.perf_counter()
+            self.histograms["queue_wait"].record((t0 - t_queued) * 1000)
+            out = []
+            try:
+                for bbox, render in parts:
+                    img = render()
+                    out.append((bbox, shot._encode_jpeg(img), img))
+            except Exception as e:
+                self.errors += 1
+                print(f"[CapturePipeline] Lỗi encode: {e}")
+                out = None # frame hỏng: vẫn phải chiếm lượt để không chặn các frame sau
+            t1 = time.perf_counter()
+            self.histograms["encode"].record((t1 - t0) * 1000)
+            self._complete(idx, (size, out, ts_ms, t_start, t1))
+
+    # ------------------------------------------------------------------
+    def _complete(self, idx: int, result: tuple):
+        # Giao theo đúng thứ tự chụp; luồng hoàn tất frame "tới lượt" giao luôn các frame kế tiếp đã xong
+        with self._emit_lock:
+            self._ready[idx] = result
+            while self._next_emit in self._ready:
+                self._deliver(self._ready.pop(self._next_emit))
+                self._next_emit += 1
+
+    def _deliver(self, result: tuple):
+        (width, height), out, ts_ms, t_start, t_done = result
+        t0 = time.perf_counter()
+        self.histograms["reorder"].record((t0 - t_done) * 1000)
+        if out is None:
+            # Không encode được (vùng này coi như đã gửi trong ảnh tham chiếu) -> cần FULL
+            self._resync = True
+            self.screenshot.force_full_frame()
+            return
+        shot = self.screenshot
+        for bbox, jpg_bytes, img in out:
+            if bbox is None:
+                self._resync = False
+            elif self._resync:
+                self.discarded += 1
+                continue
+            seq = shot.frame_seq
+            shot.frame_seq += 1
+            if self.callback(width, height, jpg_bytes, bbox, img, seq, ts_ms) is False:
+                # Frame bị bỏ (hàng đợi sender đầy): manager sẽ lệch -> gửi lại FULL frame để đồng bộ
+                self.dropped += 1
+                self._resync = True
+                shot.force_full_frame()
+                break
+            self.delivered += 1
+        t1 = time.perf_counter()
+        self.histograms["deliver"].record((t1 - t0) * 1000)
+        self.histograms["end_to_end"].record((t1 - t_start) * 1000)
+
+    # ------------------------------------------------------------------
+    def stats(self) -> dict:
+        return {
+            "captured": self.captured,
+            "idle": self.idle,
+            "skipped": self.skipped,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "discarded": self.discarded,
+            "errors": self.errors,
+            "encode_queue": self.encode_q.qsize(),
+            "latency_ms": {name: h.summary() for name, h in self.histograms.items()},
+        }
@@ -0,0 +1,270 @@
+# client/client_rate_control.py
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+"""
+Điều khiển bitrate / chất lượng luồng video theo tình trạng nghẽn.
+Đầu vào (mỗi tick_interval giây):
+- độ đầy hàng đợi gửi (ClientSender.frame_q)
+- độ trễ phía gửi của các frame vừa gửi: thời gian chờ trong frame_q + thời gian ghi socket
+  (send_mcs_pdu chặn khi buffer ghi TCP đầy -> tăng khi đường truyền chậm)
+- số frame bị bỏ vì frame_q đầy
+- độ trễ đầu-cuối đo bằng FRAME_ACK của manager (report_decode_lag): chụp -> manager hiển thị -> ACK về
+  client; thấy được nghẽn mà phía gửi không thấy (đường server -> manager, manager giải mã chậm).
+  Quá DECODE_LAG_STALE_SEC giây không có ACK mới thì bỏ qua (manager cũ không gửi ACK)
+Đầu ra: 1 "mức" (level) trên thang chất lượng 0 (tốt nhất) .. levels-1 (tiết kiệm nhất); mỗi mức quy ra
+(quality JPEG, fps, max_dimension, FULL_FRAME_INTERVAL) trong các giới hạn cấu hình. Giảm theo thứ tự
+ít ảnh hưởng trước: chất lượng JPEG -> fps -> độ phân giải; khoảng cách FULL frame giãn dần trên cả thang.
+- Nghẽn (độ trễ > target, hàng đợi > 1/2) 2 tick liên tiếp: xuống 1 mức (1 FULL frame lớn chỉ làm trễ
+  1 tick, không tính). Nghẽn nặng (có frame bị bỏ, trễ > 2x target): xuống ngay 1 mức, 2 mức nếu kéo dài.
+- Sau khi xuống mức, các frame đang xếp hàng vẫn là frame của mức cũ: chờ ~1 lần độ trễ đo được
+  (tối đa MAX_COOLDOWN_TICKS) rồi mới xét giảm tiếp (trừ khi có frame bị bỏ) -> không giảm quá tay.
+- Dư tải (độ trễ < target/2, hàng đợi < 1/4) liên tục hold_ticks tick: lên 1 mức. Lên 1 mức rồi lại nghẽn
+  ngay (thăm dò thất bại) -> lần thăm dò sau vào đúng mức đó phải chờ gấp đôi (tối đa MAX_HOLD_TICKS),
+  ghi nhớ trong PROBE_MEMORY_TICKS tick (đường truyền thay đổi thì thăm dò lại bình thường).
+observe(...) là hàm thuần (không đọc đồng hồ / socket) để mô phỏng được (benchmarks/sim_rate_control.py);
+tick() / start() lấy số liệu thật từ ClientSender và áp dụng vào ClientScreenshot.
+"""
+
+DEFAULT_TARGET_LATENCY_MS = 200.0
+DEFAULT_LEVELS = 12
+DEFAULT_TICK_INTERVAL = 0.5
+DEFAULT_HOLD_TICKS = 4
+MAX_HOLD_TICKS = 32
+MAX_COOLDOWN_TICKS = 4
+PROBE_MEMORY_TICKS = 60
+DECODE_LAG_ALPHA = 0.3 # hệ số EWMA cho độ trễ đầu-cuối từ FRAME_ACK
+DECODE_LAG_STALE_SEC = 3.0
+
+
+def _ramp(f: float, start: float, end: float) -> float:
+    """0 khi f <= start, 1 khi f >= end, tuyến tính ở giữa."""
+    return min(1.0, max(0.0, (f - start) / (end - start)))
+
+
+def _p90(samples: List[float]) -> float:
+    if not samples:
+        return 0.0
+    data = sorted(samples)
+    return data[min(len(data) - 1, int(0.9 * len(data)))]
+
+
+class AdaptiveRateController:
+    def __init__(self, screenshot=None, sender=None,
+                 target_latency_ms: float = DEFAULT_TARGET_LATENCY_MS,
+                 quality_range: Tuple[int, int] = (30, 75),
+                 fps_range: Tuple[float, float] = (2, 15),
+                 dimension_range: Tuple[int, int] = (640, 1280),
+                 full_interval_range: Tuple[float, float] = (60.0, 180.0),
+                 levels: int = DEFAULT_LEVELS,
+                 tick_interval: float = DEFAULT_TICK_INTERVAL,
+                 hold_ticks: int = DEFAULT_HOLD_TICKS):
+        self.screenshot = screenshot
+        self.sender = sender
+        self.target_latency_ms = target_latency_ms
+        self.quality_range = quality_range
+        self.fps_range = fps_range
+        self.dimension_range = dimension_range
+        self.full_interval_range = full_interval_range
+        self._base_full_interval_range = full_interval_range
+        self.levels = max(2, levels)
+        self.tick_interval = tick_interval
+        self.base_hold_ticks = hold_ticks
+
+        self.level = 0
+        self._tick = 0
+        self._good_ticks = 0
+        self._bad_ticks = 0
+        self._cooldown = 0
+        self._ticks_since_increase = None # None: chưa thăm dò lên mức nào (hoặc đã qua thời gian thử)
+        self._probe_hold: Dict[int, Tuple[int, int]] = {} # mức -> (số tick phải chờ, hết hiệu lực ở tick)
+        self.decode_lag_ms: Optional[float] = None
+        self._decode_lag_at = 0.0 # time.monotonic() của lần report_decode_lag gần nhất
+
+        # Vị trí đọc các bộ đếm của ClientSender ở tick trước
+        self._queue_count = 0
+        self._send_count = 0
+        self._dropped = 0
+
+        self.last_latency_ms = 0.0
+        self.decreases = 0
+        self.increases = 0
+
+        self._running = False
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    def settings_for(self, level: int) -> Dict[str, float]:
+        f = level / (self.levels - 1)
+        q_lo, q_hi = self.quality_range
+        fps_lo, fps_hi = self.fps_range
+        d_lo, d_hi = self.dimension_range
+        i_lo, i_hi = self.full_interval_range
+        t_q, t_fps, t_dim = _ramp(f, 0.0, 0.5), _ramp(f, 0.25, 0.75), _ramp(f, 0.5, 1.0)
+        return {
+            "quality": int(round(q_hi - t_q * (q_hi - q_lo))),
+            "fps": round(fps_hi * (fps_lo / fps_hi) ** t_fps, 2), # giảm theo cấp số nhân
+            "max_dimension": int(round((d_hi - t_dim * (d_hi - d_lo)) / 16)) * 16,
+            "full_frame_interval": round(i_lo * (i_hi / i_lo) ** f, 1),
+        }
+
+    def stretch_full_interval(self, factor: float) -> None:
+        """Nhân khoảng FULL_FRAME_INTERVAL (so với cấu hình ban đầu) với factor, vd. khi server có cache keyframe."""
+        factor = max(1.0, float(factor))
+        lo, hi = self._base_full_interval_range
+        self.full_interval_range = (lo * factor, hi * factor)
+        self.apply()
+
+    @property
+    def settings(self) -> Dict[str, float]:
+        return self.settings_for(self.level)
+
+    def report_decode_lag(self, lag_ms: float) -> None:
+        """Độ trễ đầu-cuối tới lúc manager hiển thị (ms, từ FRAME_ACK), làm mượt bằng EWMA."""
+        self._decode_lag_at = time.monotonic()
+        if self.decode_lag_ms is None:
+            self.decode_lag_ms = lag_ms
+        else:
+            self.decode_lag_ms += DECODE_LAG_ALPHA * (lag_ms - self.decode_lag_ms)
+
+    # ------------------------------------------------------------------
+    def observe(self, queue_fill: float, latency_ms: float, dropped: int = 0,
+                decode_lag_ms: Optional[float] = None) -> int:
+        """
+        1 bước điều khiển. queue_fill: 0..1, latency_ms: độ trễ phía gửi (p90) trong tick vừa qua,
+        dropped: số frame bị bỏ trong tick. Trả về độ thay đổi mức (+ = giảm chất lượng).
+        """
+        target = self.target_latency_ms
+        lag = decode_lag_ms if decode_lag_ms is not None else (self.decode_lag_ms or 0.0)
+        worst = max(latency_ms, lag)
+        self.last_latency_ms = worst
+
+        self._tick += 1
+        severe = bool(dropped) or worst > 2 * target
+        if severe or worst > target or queue_fill > 0.5:
+            self._bad_ticks += 1
+            self._good_ticks = 0
+        else:
+            self._bad_ticks = 0
+        if self._cooldown:
+            self._cooldown -= 1
+
+        step = 0
+        if dropped or (self._bad_ticks and not self._cooldown):
+            if severe:
+                step = 2 if self._bad_ticks > 1 else 1
+            elif self._bad_ticks > 1:
+                step = 1
+        if step:
+            if self._ticks_since_increase is not None:
+                # Vừa lên mức đã nghẽn: mức đó quá sức đường truyền, lần sau chờ lâu hơn mới thử lại
+                hold = min(MAX_HOLD_TICKS, self.hold_for(self.level) * 2)
+                self._probe_hold[self.level] = (hold, self._tick + PROBE_MEMORY_TICKS)
+            self._ticks_since_increase = None
+            self._cooldown = min(MAX_COOLDOWN_TICKS, int(worst / (self.tick_interval * 1000)) + 1)
+            return self._set_level(self.level + step)
+
+        if self._ticks_since_increase is not None:
+            self._ticks_since_increase += 1
+            if self._ticks_since_increase > self.hold_for(self.level):
+                self._ticks_since_increase = None # đã trụ vững ở mức mới
+
+        if not self._bad_ticks and worst < target / 2 and queue_fill < 0.25:
+            self._good_ticks += 1
+            if self.level > 0 and self._good_ticks >= self.hold_for(self.level - 1):
+                self._good_ticks = 0
+                self._ticks_since_increase = 0
+                return self._set_level(self.level - 1)
+        else:
+            self._good_ticks = 0
+        return 0
+
+    def hold_for(self, level: int) -> int:
+        """Số tick dư tải liên tục cần có trước khi thăm dò lên `level`."""
+        entry = self._probe_hold.get(level)
+        if entry is None:
+            return self.base_hold_ticks
+        hold, expires = entry
+        if self._tick >= expires:
+            del self._probe_hold[level]
+            return self.base_hold_ticks
+        return hold
+
+    def _set_level(self, level: int) -> int:
+        level = min(self.levels - 1, max(0, level))
+        delta = level - self.level
+        if delta > 0:
+            self.decreases += 1
+        elif delta < 0:
+            self.increases += 1
+        self.level = level
+        return delta
+
+    # ------------------------------------------------------------------
+    def apply(self) -> None:
+        """Áp dụng mức hiện tại vào ClientScreenshot (đổi độ phân giải -> gửi FULL frame với kích thước mới)."""
+        shot = self.screenshot
+        if shot is None:
+            return
+        s = self.settings
+        shot.quality = s["quality"]
+        shot.fps = s["fps"]
+        shot.FULL_FRAME_INTERVAL = s["full_frame_interval"]
+        if shot.max_dimension != s["max_dimension"]:
+            shot.max_dimension = s["max_dimension"]
+            shot.force_full_frame()
+
+    def tick(self) -> int:
+        """Đọc số liệu của ClientSender trong tick vừa qua, gọi observe() và áp dụng nếu đổi mức."""
+        sender = self.sender
+        queue_fill = sender.frame_q.qsize() / max(1, sender.frame_q.maxsize)
+        waits, self._queue_count = sender.queue_latency.since(self._queue_count)
+        sends, self._send_count = sender.send_latency.since(self._send_count)
+        dropped = sender.frames_dropped - self._dropped
+        self._dropped = sender.frames_dropped
+        latency = _p90(waits) + _p90(sends)
+        if self.decode_lag_ms is not None and time.monotonic() - self._decode_lag_at > DECODE_LAG_STALE_SEC:
+            self.decode_lag_ms = None
+        delta = self.observe(queue_fill, latency, dropped)
+        if delta:
+            self.apply()
+            s = self.settings
+            print(f"[RateController] {'Giảm' if delta > 0 else 'Tăng'} -> mức {self.level}: "
+                  f"q={s['quality']} fps={s['fps']} dim={s['max_dimension']} "
+                  f"(trễ {latency:.0f} ms, hàng đợi {queue_fill:.0%}, bỏ {dropped})")
+        return delta
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self.apply() # bắt đầu ở mức hiện tại (mặc định: tốt nhất)
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="RateController")
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def _loop(self) -> None:
+        while self._running:
+            time.sleep(self.tick_interval)
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[RateController] Lỗi: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "level": self.level,
+            "settings": self.settings,
+            "latency_ms": self.last_latency_ms,
+            "decode_lag_ms": self.decode_lag_ms,
+            "probe_hold": {lvl: hold for lvl, (hold, _) in self._probe_hold.items()},
+            "decreases": self.decreases,
+            "increases": self.increases,
+        }
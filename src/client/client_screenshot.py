@@ -1,11 +1,15 @@
 # client/client_screenshot.py
 
-from mss import mss
 import pyautogui
 from PIL import Image, ImageChops
 import io
 import time
 import threading
+from functools import partial
+from client.client_grabber import ScreenGrabber
+from client.client_delta import (
+    TileDiffDetector, BGRADeltaEngine, rects_area, scale_rects, np, DEFAULT_TILE_SIZE,
+)
 
 try:
     RESAMPLE_MODE = Image.Resampling.LANCZOS
@@ -13,12 +17,38 @@ except AttributeError:
     RESAMPLE_MODE = Image.ANTIALIAS
 
 
+# Vùng thay đổi chiếm >= tỉ lệ này của màn hình -> gửi FULL frame (1 ảnh JPEG rẻ hơn nhiều RECT)
+FULL_FRAME_AREA_RATIO = 0.6
+
+# Bộ phát hiện thay đổi (delta_engine):
+# - "bgra":  BGRADeltaEngine trên buffer BGRA thô của mss (độ phân giải gốc, không tạo ảnh PIL;
+#            màn hình đứng im -> không convert/resize gì cả)
+# - "tiles": TileDiffDetector trên ảnh PIL đã resize (thang xám)
+# - "bbox":  cách cũ compute_delta_bbox (1 bbox, ImageChops + lambda theo pixel)
+DELTA_ENGINES = ("bgra", "tiles", "bbox")
+
+
 class ClientScreenshot:
-    def __init__(self, fps=15, quality=60, max_dimension=1280, detect_delta=True):
+    def __init__(self, fps=15, quality=60, max_dimension=1280, detect_delta=True, tile_size=DEFAULT_TILE_SIZE,
+                 delta_engine="bgra"):
         self.fps = fps
         self.quality = quality
         self.max_dimension = max_dimension
-        self.detect_delta = False
+        self.detect_delta = detect_delta # [SỬA] trước đây luôn bị ép False
+
+        # [THÊM] Phát hiện thay đổi theo ô (tile): nhiều RECT nhỏ thay vì 1 bbox bao trùm.
+        # tile_size=None/0 hoặc không có numpy -> dùng cách cũ (compute_delta_bbox).
+        if delta_engine not in DELTA_ENGINES:
+            raise ValueError(f"delta_engine phải là 1 trong {DELTA_ENGINES}")
+        if not tile_size or np is None:
+            delta_engine = "bbox"
+        self.delta_engine = delta_engine
+        self.tiles = TileDiffDetector(tile_size=tile_size) if delta_engine == "tiles" else None
+        self.bgra = BGRADeltaEngine(tile_size=tile_size) if delta_engine == "bgra" else None
+
+        # [THÊM] Phiên mss dùng lâu dài (mở trong luồng chụp ở lần grab đầu, đóng khi vòng chụp kết thúc);
+        # đổi bố cục màn hình -> gửi FULL frame với kích thước mới
+        self.grabber = ScreenGrabber(on_layout_change=lambda monitor: self.force_full_frame())
 
         self._first_frame = True
         self._prev_image = None
@@ -30,11 +60,9 @@ class ClientScreenshot:
         self.last_full_frame_ts = 0.0 # <--- [SỬA ĐỔI] Thêm biến thời gian
 
     def _resize_if_needed(self, img):
-        w, h = img.size
-        long_edge = max(w, h)
-        if self.max_dimension and long_edge > self.max_dimension:
-            scale = float(self.max_dimension) / long_edge
-            img = img.resize((int(w*scale), int(h*scale)), RESAMPLE_MODE)
+        size = self._scaled_size(img.size)
+        if size != img.size:
+            img = img.resize(size, RESAMPLE_MODE)
         return img
 
     def _encode_jpeg(self, img):
@@ -44,15 +72,22 @@ class ClientScreenshot:
         img.save(bio, format="JPEG", quality=self.quality)
         return bio.getvalue()
 
+    def capture_raw(self):
+        """[THÊM] Ảnh chụp thô của mss (sct_img: .bgra, .size, .width, .height), chưa tạo ảnh PIL."""
+        # [SỬA] Dùng lại phiên mss thay vì `with mss() as sct:` mỗi frame (màn hình đầu tiên: monitors[1])
+        return self.grabber.grab()
+
+    def close(self):
+        """[THÊM] Giải phóng phiên chụp (gọi từ luồng chụp khi vòng chụp kết thúc)."""
+        self.grabber.close()
+
+    def _to_image(self, sct_img):
+        # Convert sang PIL Image cực nhanh
+        img = Image.frombytes("RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
+        return self._resize_if_needed(img)
+
     def capture_once(self):
-        with mss() as sct:
-            # Lấy màn hình đầu tiên
-            monitor = sct.monitors[1] # Thường là monitors[1] trên Windows/mss
-            sct_img = sct.grab(monitor)
-            
-            # Convert sang PIL Image cực nhanh
-            img = Image.frombytes("RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
-            return self._resize_if_needed(img)
+        return self._to_image(self.capture_raw())
 
         # img = pyautogui.screenshot()
         # return self._resize_if_needed(img)
@@ -79,6 +114,110 @@ class ClientScreenshot:
             
         return bbox
 
+    def compute_delta_rects(self, img):
+        """
+        Danh sách bbox (left, upper, right, lower) các vùng thay đổi, [] nếu đứng im.
+        Dùng TileDiffDetector nếu có, nếu không thì 1 bbox của compute_delta_bbox.
+        """
+        if not self.detect_delta:
+            return []
+        if self.tiles is None:
+            bbox = self.compute_delta_bbox(img)
+            return [bbox] if bbox else []
+        return self.tiles.update(img)
+
+    def _scaled_size(self, size):
+        w, h = size
+        long_edge = max(w, h)
+        if self.max_dimension and long_edge > self.max_dimension:
+            scale = float(self.max_dimension) / long_edge
+            return int(w*scale), int(h*scale)
+        return w, h
+
+    def _region_image(self, native_img, bbox, size):
+        """
+        [THÊM] Ảnh của vùng bbox (toạ độ ảnh đã resize) lấy thẳng từ ảnh gốc: resize(box=...) chỉ lọc
+        đúng vùng này (điểm ảnh giống hệt img_resize.crop(bbox)) thay vì resize cả màn hình.
+        """
+        if native_img.size == size:
+            return native_img.crop(bbox)
+        fx = native_img.width / size[0]
+        fy = native_img.height / size[1]
+        l, u, r, b = bbox
+        return native_img.resize((r - l, b - u), RESAMPLE_MODE, box=(l * fx, u * fy, r * fx, b * fy))
+
+    def _next_frame(self, should_send_full):
+        """
+        [THÊM] Chụp 1 frame và tìm vùng thay đổi. Trả về (size, parts):
+        - size: (rộng, cao) của frame gửi đi (đã resize)
+        - parts = [(None, render)]: gửi FULL frame (ảnh tham chiếu đã được cập nhật)
+        - parts = [(bbox, render), ...]: các RECT (bbox theo toạ độ đã resize)
+        - parts = []: màn hình đứng im (engine "bgra": không tạo ảnh PIL nào)
+        render() trả về ảnh PIL của phần đó. Việc resize/cắt (tốn CPU, nhả GIL) được để lại cho render()
+        để pipeline chạy nó trên luồng encode thay vì luồng chụp.
+        """
+        if self.bgra is None:
+            img = self.capture_once()
+            rects = []
+            if not should_send_full:
+                # --- RECT FRAME: các vùng thay đổi so với ảnh trước ---
+                rects = self.compute_delta_rects(img)
+                # Thay đổi quá lớn -> gửi FULL luôn
+                if rects and rects_area(rects) >= FULL_FRAME_AREA_RATIO * img.width * img.height:
+                    should_send_full = True
+            if should_send_full:
+                # Cập nhật ảnh tham chiếu (để so sánh cho lần sau)
+                self._set_reference(img)
+                return img.size, [(None, lambda: img)]
+            return img.size, [(bbox, partial(img.crop, bbox)) for bbox in rects]
+
+        # Engine "bgra": so sánh trên buffer thô ở độ phân giải gốc, chỉ tạo ảnh PIL khi có gì để gửi
+        raw = self.capture_raw()
+        width, height = raw.size
+        native = []
+        if not should_send_full and self.detect_delta:
+            native = self.bgra.update(raw.bgra, width, height)
+            if native and rects_area(native) >= FULL_FRAME_AREA_RATIO * width * height:
+                should_send_full = True
+        size = self._scaled_size(raw.size)
+        if not should_send_full and not native:
+            return size, []
+        # frombytes sao chép buffer: lần chụp sau không ảnh hưởng tới các render() đang chờ
+        native_img = Image.frombytes("RGB", raw.size, raw.bgra, "raw", "BGRX")
+        if should_send_full:
+            self.bgra.reset(raw.bgra, width, height)
+            return size, [(None, partial(self._resize_if_needed, native_img))]
+        return size, [(bbox, partial(self._region_image, native_img, bbox, size))
+                      for bbox in scale_rects(native, raw.size, size)]
+
+    def capture_frame(self):
+        """
+        [THÊM] Giai đoạn "chụp + so sánh": quyết định FULL/RECT rồi gọi _next_frame.
+        Trả về (size, parts, ts_ms) - xem _next_frame. Dùng bởi capture_loop (tuần tự)
+        và CapturePipeline (client_pipeline.py).
+        """
+        # - Là frame đầu tiên?
+        # - Bị ép buộc (force_full)? (đọc + xóa cờ cùng lúc: yêu cầu đến trong lúc chụp không bị mất)
+        # - Đã quá lâu chưa gửi Full Frame?
+        now = time.time()
+        with self._lock:
+            forced, self._force_full = self._force_full, False
+        is_time_for_full = (now - self.last_full_frame_ts) >= self.FULL_FRAME_INTERVAL
+        should_send_full = self._first_frame or forced or is_time_for_full
+
+        size, parts = self._next_frame(should_send_full)
+        if parts and parts[0][0] is None:
+            self._first_frame = False
+            self.last_full_frame_ts = now
+        return size, parts, int(now * 1000)
+
+    def _set_reference(self, img):
+        """Lưu ảnh tham chiếu sau khi gửi FULL frame."""
+        if self.tiles is not None:
+            self.tiles.reset(img)
+        else:
+            self._prev_image = img.convert("L")
+
     def force_full_frame(self):
         with self._lock:
             self._force_full = True
@@ -91,63 +230,35 @@ class ClientScreenshot:
             start_time = time.perf_counter()
             
             try:
-                # 1. Chụp ảnh màn hình hiện tại
-                img = self.capture_once()
-                full_width, full_height = img.size
-                
-                # 2. Kiểm tra xem có CẦN gửi Full Frame không?
-                # - Là frame đầu tiên?
-                # - Bị ép buộc (force_full)?
-                # - Đã quá lâu chưa gửi Full Frame (30s)?
-                now = time.time()
-                is_time_for_full = (now - self.last_full_frame_ts) >= self.FULL_FRAME_INTERVAL
-                should_send_full = self._first_frame or self._force_full or is_time_for_full
-
-                bbox = None # Mặc định là None (nghĩa là Full Frame)
-
-                if should_send_full:
-                    # --- GỬI FULL FRAME ---
-                    self._first_frame = False
-                    self._force_full = False
-                    self.last_full_frame_ts = now
-                    
-                    # Cập nhật ảnh tham chiếu (để so sánh cho lần sau)
-                    self._prev_image = img.convert("L") 
-                    
-                    # bbox vẫn là None -> Code phía dưới sẽ hiểu là Full Frame
-                    
-                else:
-                    # --- GỬI RECT FRAME (Đây là đoạn bạn cần bật lại) ---
-                    # Tính toán vùng thay đổi so với ảnh trước
-                    bbox = self.compute_delta_bbox(img)
-
-                # 3. Xử lý gửi
-                # Nếu là chế độ Rect (không phải Full) mà bbox là None (nghĩa là màn hình đứng im, không thay đổi)
+                # 1. Chụp ảnh + tìm vùng thay đổi (FULL nếu là frame đầu / bị ép / quá lâu chưa gửi FULL)
+                (full_width, full_height), parts, ts_ms = self.capture_frame()
+
+                # 2. Xử lý gửi
+                # Nếu là chế độ Rect (không phải Full) mà không có vùng thay đổi (màn hình đứng im)
                 # -> Thì KHÔNG gửi gì cả để tiết kiệm băng thông.
-                if not should_send_full and bbox is None:
+                if not parts:
                     # Ngủ bù thời gian rồi tiếp tục vòng lặp
                     elapsed = time.perf_counter() - start_time
                     time.sleep(max(0, interval - elapsed))
                     continue
 
-                # 4. Cắt ảnh và Encode
-                if bbox:
-                    # [RECT] Cắt vùng thay đổi
-                    crop_img = img.crop(bbox)
-                    jpg_bytes = self._encode_jpeg(crop_img)
-                    pass 
-                else:
-                    # [FULL] Lấy toàn bộ ảnh
+                # 3. Cắt ảnh, Encode và gửi qua callback (vào Sender): mỗi vùng là 1 RECT PDU (seq riêng)
+                # (bbox = None -> FULL frame)
+                for bbox, render in parts:
+                    img = render()
                     jpg_bytes = self._encode_jpeg(img)
 
-                ts_ms = int(time.time() * 1000)
-                seq = self.frame_seq
-                self.frame_seq += 1
+                    seq = self.frame_seq
+                    self.frame_seq += 1
 
-                # 5. Gửi qua callback (vào Sender)
-                sent_ok = callback(full_width, full_height, jpg_bytes, bbox, img, seq, ts_ms)
-                if sent_ok is False:
-                    time.sleep(0.05)
+                    sent_ok = callback(full_width, full_height, jpg_bytes, bbox, img, seq, ts_ms)
+                    if sent_ok is False:
+                        # RECT bị bỏ (hàng đợi đầy): ảnh tham chiếu đã coi vùng này là đã gửi
+                        # -> manager sẽ lệch, phải gửi lại FULL frame để đồng bộ
+                        if bbox:
+                            self.force_full_frame()
+                        time.sleep(0.05)
+                        break
 
             except Exception as e:
                 print(f"[ClientScreenshot] Lỗi: {e}")
@@ -156,4 +267,6 @@ class ClientScreenshot:
 
             # Điều chỉnh FPS
             elapsed = time.perf_counter() - start_time
-            time.sleep(max(0, interval - elapsed))
\ No newline at end of file
+            time.sleep(max(0, interval - elapsed))
+
+        self.close()
\ No newline at end of file
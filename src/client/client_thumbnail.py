@@ -0,0 +1,135 @@
+# client/client_thumbnail.py
+
+import io
+import threading
+import time
+from typing import Callable, Optional
+from PIL import Image
+from client.client_grabber import ScreenGrabber
+from common_network.stats import LatencyHistogram
+
+"""
+Luồng ảnh thu nhỏ (màn hình tổng quan của manager), chạy song song và độc lập với luồng video tương tác:
+- Chỉ chạy khi server báo có manager theo dõi (thumb_start), dừng hẳn khi thumb_stop -> không ai xem thì không tốn gì.
+- 1 luồng riêng, 1 phiên mss riêng (mss gắn với luồng tạo ra nó), mặc định 320 px / 1 fps.
+- Thu nhỏ bằng resize(reducing_gap=...) (reduce() theo số nguyên trước, rồi lọc trên ảnh đã nhỏ), encode JPEG
+  ảnh vài chục KB -> vài ms mỗi giây.
+- Ảnh không đổi so với lần gửi trước -> không gửi (server giữ ảnh mới nhất cho manager mới đăng ký).
+Thông số do server quyết định, client chỉ kẹp lại trong giới hạn an toàn (MIN_INTERVAL, MAX_DIMENSION).
+"""
+
+DEFAULT_MAX_DIMENSION = 320
+DEFAULT_INTERVAL = 1.0
+DEFAULT_QUALITY = 50
+MIN_INTERVAL = 0.5 # tối đa 2 ảnh / giây dù server yêu cầu gì
+MAX_DIMENSION = 640
+
+try:
+    THUMB_RESAMPLE = Image.Resampling.BILINEAR
+except AttributeError:
+    THUMB_RESAMPLE = Image.BILINEAR
+
+
+def thumbnail_size(size, max_dimension: int):
+    w, h = size
+    scale = min(1.0, float(max_dimension) / max(w, h))
+    return max(1, int(w * scale)), max(1, int(h * scale))
+
+
+class ThumbnailStreamer:
+    def __init__(self, send: Callable, grabber: Optional[ScreenGrabber] = None):
+        self.send = send # send(jpg_bytes, width, height, ts_ms)
+        self.grabber = grabber or ScreenGrabber()
+        self.max_dimension = DEFAULT_MAX_DIMENSION
+        self.interval = DEFAULT_INTERVAL
+        self.quality = DEFAULT_QUALITY
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_pixels = None
+
+        # --- Thống kê ---
+        self.cost = LatencyHistogram(max_samples=1_000) # ms mỗi lượt chụp + thu nhỏ + encode
+        self.captured = 0
+        self.sent = 0
+        self.unchanged = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def configure(self, max_dimension: Optional[int] = None, interval: Optional[float] = None,
+                  quality: Optional[int] = None) -> None:
+        if max_dimension:
+            self.max_dimension = max(16, min(int(max_dimension), MAX_DIMENSION))
+        if interval:
+            self.interval = max(MIN_INTERVAL, float(interval))
+        if quality:
+            self.quality = max(10, min(int(quality), 95))
+
+    def start(self, **params) -> None:
+        self.configure(**params)
+        self._last_pixels = None # ảnh đầu tiên luôn được gửi
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="ThumbnailStreamer")
+        self._thread.start()
+        print(f"[ThumbnailStreamer] Bắt đầu: {self.max_dimension} px, mỗi {self.interval:.1f} s")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+    def _loop(self) -> None:
+        try:
+            while not self._stop_event.is_set():
+                t0 = time.perf_counter()
+                try:
+                    self.capture_once()
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[ThumbnailStreamer] Lỗi: {e}")
+                self._stop_event.wait(max(0.0, self.interval - (time.perf_counter() - t0)))
+        finally:
+            self.grabber.close() # phiên mss gắn với luồng này
+
+    def capture_once(self) -> bool:
+        """Chụp, thu nhỏ và gửi 1 ảnh. False nếu ảnh không đổi so với lần gửi trước."""
+        t0 = time.perf_counter()
+        ts_ms = int(time.time() * 1000)
+        raw = self.grabber.grab()
+        img = Image.frombytes("RGB", raw.size, raw.bgra, "raw", "BGRX")
+        size = thumbnail_size(img.size, self.max_dimension)
+        if size != img.size:
+            img = img.resize(size, THUMB_RESAMPLE, reducing_gap=2.0)
+        self.captured += 1
+
+        pixels = img.tobytes()
+        if pixels == self._last_pixels:
+            self.unchanged += 1
+            self.cost.record((time.perf_counter() - t0) * 1000)
+            return False
+        self._last_pixels = pixels
+
+        bio = io.BytesIO()
+        img.save(bio, format="JPEG", quality=self.quality)
+        self.cost.record((time.perf_counter() - t0) * 1000)
+        self.send(bio.getvalue(), img.width, img.height, ts_ms)
+        self.sent += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "max_dimension": self.max_dimension,
+            "interval": self.interval,
+            "captured": self.captured,
+            "sent": self.sent,
+            "unchanged": self.unchanged,
+            "errors": self.errors,
+            "cost_ms": self.cost.summary(),
+        }
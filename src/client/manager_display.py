@@ -7,13 +7,13 @@ class ManagerDisplay:
 
     def render(self, pdu):
         """Hiển thị khung hình hoặc cập nhật delta."""
-        ptype = pdu.get("type")
+        ptype = pdu.type_name
         if ptype == "full":
-            self.show_jpeg(pdu["jpg"])
+            self.show_jpeg(pdu.jpg)
         elif ptype == "rect":
-            self.show_jpeg(pdu["jpg"], pdu["x"], pdu["y"])
+            self.show_jpeg(pdu.jpg, pdu.x, pdu.y)
         elif ptype == "control":
-            print("[MANAGER] Control:", pdu["message"])
+            print("[MANAGER] Control:", pdu.message)
         else:
             print("[MANAGER] Unknown PDU type:", ptype)
 
@@ -8,6 +8,8 @@ PDU_TYPE_RECT = 2
 PDU_TYPE_CONTROL = 3
 PDU_TYPE_INPUT = 4
 PDU_TYPE_CURSOR = 5
+PDU_TYPE_FRAME_ACK = 6 # [THÊM] manager -> client: xác nhận frame đã hiển thị (đo độ trễ đầu-cuối)
+PDU_TYPE_THUMB = 7 # [THÊM] ảnh thu nhỏ (luồng phụ độ phân giải / fps thấp cho màn hình tổng quan của manager)
 
 # File transfer PDUs
 PDU_TYPE_FILE_START = 10 # báo hiệu bắt đầu truyền file
@@ -24,12 +26,49 @@ SHARE_HDR_SIZE = struct.calcsize(SHARE_CTRL_HDR_FMT) # kích thước header chu
 FRAGMENT_FLAG = 0x01 # bit flag (1) đánh dấu PDU bị phân mảnh
 FRAGMENT_HDR_FMT = ">QI" # fragment header: total_size (Q - 8 bytes), offset (I - 4 bytes)
 FRAGMENT_HDR_SIZE = struct.calcsize(FRAGMENT_HDR_FMT) # kích thước fragment header
+# [THÊM] Thân PDU FRAME_ACK: last_seq (I), frame_ts_ms (Q - ts_ms của frame last_seq, đồng hồ client),
+# decode_us (I), render_us (I) (trung bình trong đợt), frames (I - số frame đã hiển thị trong đợt),
+# dropped (I - số frame nhận được nhưng không hiển thị được)
+FRAME_ACK_FMT = ">IQIIII"
+FRAME_ACK_SIZE = struct.calcsize(FRAME_ACK_FMT)
+# [THÊM] Header riêng PDU THUMB: width (H), height (H), source_len (H), data_len (I);
+# data = source (id client, UTF-8, server điền khi chuyển tiếp) + jpg, data_len = source_len + len(jpg)
+THUMB_HDR_FMT = ">HHHI"
+THUMB_HDR_SIZE = struct.calcsize(THUMB_HDR_FMT)
+# [THÊM] FILE_ACK có SACK (selective ACK): sau ack_offset (Q) là số khối (H) + mỗi khối start (Q), end (Q):
+# các đoạn [start, end) đã nhận nằm sau ack_offset. Bên nhận cũ chỉ đọc ack_offset -> bỏ qua phần thêm.
+FILE_ACK_FLAG_SACK = 0x02 # bit flag trong header chung (0x01 là FRAGMENT_FLAG)
+FILE_SACK_BLOCK_FMT = ">QQ"
+FILE_SACK_BLOCK_SIZE = struct.calcsize(FILE_SACK_BLOCK_FMT)
+FILE_MAX_SACK_BLOCKS = 32 # số khối tối đa trong 1 FILE_ACK (bên nhận gửi các khối gần ack_offset nhất)
+# [THÊM] FILE_CHUNK có cờ này: bên nhận ACK ngay (không chờ đủ byte): bên gửi đặt khi chunk làm đầy cửa sổ,
+# chunk cuối file và chunk gửi lại. Bên nhận cũ bỏ qua cờ.
+FILE_CHUNK_FLAG_ACK_NOW = 0x02
+# [THÊM] Tiếp tục transfer sau khi mất kết nối: FILE_START có cờ FILE_START_FLAG_RESUME mang thêm mã transfer
+# (16 byte, sau chunk_size / CRC); bên nhận trả FILE_ACK có cờ FILE_ACK_FLAG_RESUME: sau ack_offset là mã transfer,
+# ack_offset = offset liên tục cao nhất bên nhận đang giữ, SACK (nếu có) = các đoạn đã giữ sau đó.
+# Bên nhận cũ bỏ qua cờ và phần thêm (nhận lại từ đầu); bên gửi không nhận được trả lời thì gửi như cũ.
+FILE_START_FLAG_RESUME = 0x02
+FILE_ACK_FLAG_RESUME = 0x04
+FILE_TRANSFER_ID_SIZE = 16
+# [THÊM] FILE_CHUNK có CRC32 riêng của chunk (>I, sau dữ liệu): bên nhận phát hiện chunk hỏng ngay và chỉ xin gửi lại
+# chunk đó (FILE_NAK "chunk_crc") thay vì hỏng cả file ở bước kiểm tra CRC cuối. Bên nhận cũ bỏ qua 4 byte thêm.
+FILE_CHUNK_FLAG_CRC = 0x04
 
 # TPKT 
 TPKT_HEADER_FMT = ">BBH" # TPKT header format: version (B - 1 byte), reserved (B - 1 byte), length (H - 2 bytes)
 TPKT_OVERHEAD = 4 # TPKT header size in bytes
 MAX_TPKT_LENGTH = 65535 # maximum TPKT length
 
+# [THÊM] Extended framing (độ dài 32-bit), chỉ dùng khi 2 bên đã đàm phán "EXTLEN32" trong X224.
+# Header mở rộng tự mô tả (bên nhận luôn nhận ra được), nên bên nhận không cần biết chế độ đã đàm phán;
+# bên gửi chỉ dùng dạng mở rộng cho frame vượt quá giới hạn 16-bit.
+CAP_EXTLEN32 = "EXTLEN32" # tên capability (đề nghị: bit trong byte reserved của TPKT connect; chấp nhận: body confirm)
+TPKT_EXT_FLAG = 0x01 # bit trong byte reserved: sau header có thêm 2 byte độ dài (H) -> length 32-bit
+TPKT_EXT_HEADER_FMT = ">BBI" # version, reserved (có TPKT_EXT_FLAG), length (I - 4 bytes)
+TPKT_EXT_OVERHEAD = 6
+MAX_EXT_TPKT_LENGTH = 32 * 1024 * 1024 # giới hạn 1 TPKT mở rộng (chống cấp phát quá lớn khi nhận)
+
 # Event types (input)
 class EventType:
     MOUSE_MOVE = "mouse_move"
@@ -41,9 +80,23 @@ class EventType:
 # MCS Layer
 MCS_HDR_FMT = ">HH" # 2-bytes channel id & 2-bytes payload_length
 MCS_HDR_SIZE = struct.calcsize(MCS_HDR_FMT) # = 4 bytes
+MCS_EXT_FLAG = 0x8000 # [THÊM] bit cao của channel_id: payload_length là 32-bit
+MCS_EXT_HDR_FMT = ">HI" # channel_id | MCS_EXT_FLAG (H), payload_length (I)
+MCS_EXT_HDR_SIZE = struct.calcsize(MCS_EXT_HDR_FMT) # = 6 bytes
+# Payload MCS tối đa trong 1 TPKT: dạng thường (16-bit) và dạng mở rộng
+MAX_MCS_PAYLOAD = MAX_TPKT_LENGTH - TPKT_OVERHEAD - MCS_HDR_SIZE # = 65527
+MAX_EXT_MCS_PAYLOAD = MAX_EXT_TPKT_LENGTH - TPKT_EXT_OVERHEAD - MCS_EXT_HDR_SIZE
+# Kích thước fragment khi gửi cho peer không hỗ trợ extended framing
+MAX_BODY_SIZE_PER_FRAGMENT = 64000
 MAX_CHANNEL_BUFFER = 2 * 1024 * 1024
 
 # Các hằng số đảm bảo PDUParser hoạt động an toàn 
 FRAGMENT_ASSEMBLY_TIMEOUT = 30.0 # Thời gian chờ lắp ráp tối đa 
 MAX_FRAGMENTS_PER_SEQ = 10000 # Giới hạn số fragment tối đa cho mỗi seq
 MAX_BUFFERED_BYTES_PER_SEQ = 50 * 1024 * 1024  # = 50 MB. Giới hạn tổng dung lượng (bytes) tối đa cho một PDU
+MAX_REASSEMBLY_BYTES = 128 * 1024 * 1024 # [THÊM] tổng buffer cấp phát sẵn cho mọi seq đang lắp ráp (vượt -> bỏ seq cũ nhất)
+
+# [THÊM] DurableQueue: ghi theo lô (group commit) trên luồng nền
+DURABLE_QUEUE_FLUSH_INTERVAL = 0.05 # giây: thời gian tối đa 1 lần push chờ được commit
+DURABLE_QUEUE_BATCH_BYTES = 8 * 1024 * 1024 # đủ chừng này byte chờ ghi thì commit ngay, không đợi hết interval
+DURABLE_QUEUE_MAX_PENDING_BYTES = 64 * 1024 * 1024 # push chặn khi dữ liệu chưa ghi vượt mức này (giới hạn bộ nhớ)
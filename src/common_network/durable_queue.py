@@ -3,15 +3,40 @@
 import sqlite3
 import threading
 import time
-from typing import Optional, Tuple
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+from common_network.constants import (
+    DURABLE_QUEUE_FLUSH_INTERVAL, DURABLE_QUEUE_BATCH_BYTES, DURABLE_QUEUE_MAX_PENDING_BYTES,
+)
+
+"""
+Hàng đợi bền vững (SQLite, WAL) cho các PDU phải gửi lại được sau khi mất kết nối / khởi động lại.
+[SỬA] Ghi theo lô (group commit) thay cho 1 INSERT + 1 commit mỗi phần tử:
+- push / push_many chỉ cấp id (tăng dần, do queue tự cấp) và đưa vào bộ đệm trong RAM rồi trả về ngay.
+  Luồng nền gom mọi thao tác đang chờ (INSERT + xóa đã ACK) vào 1 transaction, commit sau tối đa
+  flush_interval giây, hoặc sớm hơn khi đã gom đủ batch_bytes.
+  Bộ đệm chưa ghi vượt max_pending_bytes -> push chặn tới khi luồng nền ghi kịp (giới hạn bộ nhớ).
+- Đọc (peek_many) trên kết nối SQLite riêng (WAL: không chờ transaction ghi) + phần còn trong bộ đệm,
+  nên phần tử vừa push đọc được ngay, trước cả khi commit.
+- ack_through(id): bỏ mọi phần tử có id <= id. Có hiệu lực ngay với peek_many, việc xóa khỏi DB đi cùng lô ghi kế tiếp.
+- flush(): chờ mọi thao tác trước đó được commit (vd. trước khi báo "đã nhận" cho bên gửi dữ liệu).
+Bền vững: phần tử đã push nhưng chưa commit (tối đa flush_interval) mất nếu tiến trình chết đột ngột;
+ACK chưa commit thì phần tử được gửi lại sau khi khởi động lại (bên nhận phải chịu được trùng lặp).
+"""
+
 
 class DurableQueue:
-    def __init__(self, db_path="durable_queue.db"):
+    def __init__(self, db_path="durable_queue.db", flush_interval: float = DURABLE_QUEUE_FLUSH_INTERVAL,
+                 batch_bytes: int = DURABLE_QUEUE_BATCH_BYTES, max_pending_bytes: int = DURABLE_QUEUE_MAX_PENDING_BYTES):
         self.db_path = db_path
-        # check_same_thread=False: chỉ cho phép luồng tạo ra nó được dùng kết nối
+        self.flush_interval = flush_interval
+        self.batch_bytes = batch_bytes
+        self.max_pending_bytes = max_pending_bytes
+
+        # check_same_thread=False: kết nối được dùng từ luồng khác luồng tạo ra nó (luôn trong lock tương ứng)
         self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.conn.execute("PRAGMA journal_mode=WAL;") # bật Write-Ahead Logging → tăng concurrency đọc/ghi.
-        self.conn.execute("PRAGMA synchronous=NORMAL;") 
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
         self.conn.execute("""
             CREATE TABLE IF NOT EXISTS queue(
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -19,30 +44,232 @@ class DurableQueue:
                 timestamp REAL
             )
         """)
+        self.conn.commit()
+        # [THÊM] Kết nối chỉ để đọc: không bị chặn bởi transaction ghi của luồng nền
+        self.read_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.read_lock = threading.Lock()
+
+        row = self.conn.execute("SELECT MAX(id) FROM queue").fetchone()
+        seq = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name='queue'").fetchone()
+        self._next_id = max(row[0] or 0, seq[0] if seq else 0) + 1
+
         self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self._pending = deque() # (id, data, timestamp) đã push, chưa commit (id tăng dần)
+        self._pending_bytes = 0
+        self._acked_through = 0 # mọi id <= giá trị này đã được ACK (có hiệu lực ngay)
+        self._ack_written = 0 # ... và đã được xóa khỏi DB
+        self._pushed_id = 0 # id lớn nhất đã push
+        self._dirty_since = 0.0 # time.monotonic() lúc có thao tác đầu tiên đang chờ ghi
+        self._flush_requested = False
+        self._running = True
+
+        # --- Thống kê ---
+        self.commits = 0
+        self.rows_written = 0
+        self.push_waits = 0 # số lần push phải chờ vì bộ đệm đầy
+
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True, name="DurableQueueWriter")
+        self._writer.start()
+
+    # --- Ghi ---
+
+    def push(self, data: bytes) -> int:
+        return self.push_many((data,))[-1]
+
+    def push_many(self, items: Iterable[bytes]) -> List[int]:
+        """Thêm nhiều phần tử theo thứ tự, trả về id của chúng. Không chờ commit (xem flush())."""
+        ids = []
+        now = time.time()
+        with self.cond:
+            self._mark_dirty()
+            for data in items:
+                while self._pending_bytes >= self.max_pending_bytes and self._running:
+                    self.push_waits += 1
+                    self.cond.notify_all()
+                    self.cond.wait(0.5)
+                qid = self._next_id
+                self._next_id += 1
+                self._pending.append((qid, data, now))
+                self._pending_bytes += len(data)
+                ids.append(qid)
+            if ids:
+                self._pushed_id = ids[-1]
+                if self._pending_bytes >= self.batch_bytes:
+                    self.cond.notify_all()
+        return ids
+
+    def ack_through(self, qid: int) -> None:
+        """Bỏ mọi phần tử có id <= qid (đã được bên nhận xác nhận)."""
+        with self.cond:
+            self._ack_locked(qid)
+
+    def _ack_locked(self, qid: int) -> None:
+        # Gọi khi đang giữ self.lock
+        if qid <= self._acked_through:
+            return
+        self._mark_dirty()
+        self._acked_through = qid
+        # Phần tử chưa kịp ghi xuống DB: bỏ luôn khỏi bộ đệm, không cần INSERT rồi DELETE
+        while self._pending and self._pending[0][0] <= qid:
+            self._pending_bytes -= len(self._pending.popleft()[1])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Chờ mọi push / ack_through trước lời gọi này được commit. False nếu hết thời gian chờ."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            target_id, target_ack = self._pushed_id, self._acked_through
+            self._flush_requested = True
+            self.cond.notify_all()
+            while (self._pending and self._pending[0][0] <= target_id) or self._ack_written < target_ack:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if not self._writer.is_alive():
+                    return False
+                self.cond.wait(remaining if remaining is not None else 0.5)
+        return True
 
-    def push(self, data: bytes) -> None:
+    def _dirty(self) -> bool:
+        # Gọi khi đang giữ self.lock
+        return bool(self._pending) or self._ack_written < self._acked_through
+
+    def _mark_dirty(self) -> None:
+        # Gọi khi đang giữ self.lock, TRƯỚC khi thêm thao tác: mốc tính flush_interval
+        if not self._dirty():
+            self._dirty_since = time.monotonic()
+            self.cond.notify_all() # luồng nền đang chờ không hạn định: bắt đầu đếm interval
+
+    def _writer_loop(self):
+        while True:
+            with self.cond:
+                # Chờ: đủ flush_interval kể từ thao tác đầu tiên đang chờ, hoặc đủ batch_bytes, hoặc có flush()
+                while self._running:
+                    timeout = None
+                    if self._dirty():
+                        if self._flush_requested or self._pending_bytes >= self.batch_bytes:
+                            break
+                        timeout = self._dirty_since + self.flush_interval - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    self.cond.wait(timeout)
+                self._flush_requested = False
+                batch = list(self._pending)
+                ack = self._acked_through
+                stop = not self._running
+            if batch or ack > self._ack_written:
+                try:
+                    self._write(batch, ack)
+                except sqlite3.Error as e:
+                    print(f"[DurableQueue] Lỗi ghi: {e}")
+                    time.sleep(0.5)
+                    continue
+            if stop:
+                return
+
+    def _write(self, batch, ack):
+        """1 transaction: INSERT các phần tử chờ (chưa bị ACK) + xóa mọi id <= ack."""
+        rows = [(qid, data, ts) for qid, data, ts in batch if qid > ack]
+        with self.conn: # commit khi ra khỏi khối, rollback nếu lỗi
+            if rows:
+                self.conn.executemany("INSERT INTO queue(id, task, timestamp) VALUES(?,?,?)", rows)
+            if ack > self._ack_written:
+                self.conn.execute("DELETE FROM queue WHERE id<=?", (ack,))
+        with self.cond:
+            # Bỏ khỏi bộ đệm những gì vừa ghi (ack_through có thể đã bỏ bớt phần đầu trong lúc ghi)
+            last = batch[-1][0] if batch else 0
+            while self._pending and self._pending[0][0] <= last:
+                self._pending_bytes -= len(self._pending.popleft()[1])
+            self._ack_written = max(self._ack_written, ack)
+            self.commits += 1
+            self.rows_written += len(rows)
+            if self._dirty():
+                self._dirty_since = time.monotonic() # phần push trong lúc ghi: tính interval từ bây giờ
+            self.cond.notify_all()
+
+    def close(self) -> None:
+        """Ghi nốt mọi thứ đang chờ rồi dừng luồng nền."""
+        with self.cond:
+            self._running = False
+            self.cond.notify_all()
+        self._writer.join()
+        with self.read_lock:
+            self.read_conn.close()
+        self.conn.close()
+
+    # --- Đọc ---
+
+    def peek_many(self, after_id: int = 0, limit: int = 64) -> List[Tuple[int, bytes]]:
+        """Tối đa limit phần tử (id, task) chưa ACK có id > after_id, theo thứ tự id. Không xóa."""
         with self.lock:
-            self.conn.execute("INSERT INTO queue(task, timestamp) VALUES(?,?)", (data, time.time()))
-            self.conn.commit()
+            after_id = max(after_id, self._acked_through)
+            pending = [(qid, data) for qid, data, _ in self._pending if qid > after_id]
+        # Phần đã commit nằm trước phần còn trong bộ đệm. Phần tử vừa commit nhưng vẫn có trong bản chụp
+        # bộ đệm được lấy từ bản chụp (chặn trên bằng id đầu tiên của bộ đệm) -> không trùng, không sót
+        upper = pending[0][0] if pending else None
+        rows = []
+        if upper is None or upper > after_id + 1:
+            with self.read_lock:
+                if upper is None:
+                    rows = self.read_conn.execute(
+                        "SELECT id, task FROM queue WHERE id>? ORDER BY id LIMIT ?", (after_id, limit)).fetchall()
+                else:
+                    rows = self.read_conn.execute(
+                        "SELECT id, task FROM queue WHERE id>? AND id<? ORDER BY id LIMIT ?",
+                        (after_id, upper, limit)).fetchall()
+        if len(rows) < limit:
+            rows.extend(pending[:limit - len(rows)])
+        return rows
+
+    # Lấy (id, task) đầu tiên mà không xóa.
+    def peek(self) -> Optional[Tuple[int, bytes]]:
+        rows = self.peek_many(limit=1)
+        return rows[0] if rows else None
 
     def pop(self) -> Optional[bytes]:
-        with self.lock:
-            row = self.conn.execute("SELECT id, task FROM queue ORDER BY id LIMIT 1").fetchone()
-            if not row:
+        """Lấy và ACK phần tử đầu tiên. [SỬA] Đọc + ACK trong cùng self.lock (như bản cũ SELECT + DELETE
+        trong lock): nhiều luồng gọi pop() đồng thời không nhận trùng 1 phần tử."""
+        with self.cond:
+            after_id = self._acked_through
+            if self._pending:
+                upper = self._pending[0][0]
+                entry = (upper, self._pending[0][1])
+            else:
+                upper = entry = None
+            if upper is None or upper > after_id + 1:
+                # Phần đã commit (id nhỏ hơn mọi phần tử trong bộ đệm) được lấy trước
+                with self.read_lock:
+                    if upper is None:
+                        row = self.read_conn.execute(
+                            "SELECT id, task FROM queue WHERE id>? ORDER BY id LIMIT 1", (after_id,)).fetchone()
+                    else:
+                        row = self.read_conn.execute(
+                            "SELECT id, task FROM queue WHERE id>? AND id<? ORDER BY id LIMIT 1",
+                            (after_id, upper)).fetchone()
+                if row is not None:
+                    entry = row
+            if entry is None:
                 return None
-            self.conn.execute("DELETE FROM queue WHERE id=?", (row[0],))
-            self.conn.commit()
-            return row[1]
+            self._ack_locked(entry[0])
+            return entry[1]
 
     def size(self) -> int:
         with self.lock:
-            return self.conn.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+            acked = self._acked_through
+            in_buffer = len(self._pending)
+            first_pending = self._pending[0][0] if self._pending else None
+        with self.read_lock:
+            if first_pending is None:
+                return in_buffer + self.read_conn.execute("SELECT COUNT(*) FROM queue WHERE id>?", (acked,)).fetchone()[0]
+            return in_buffer + self.read_conn.execute(
+                "SELECT COUNT(*) FROM queue WHERE id>? AND id<?", (acked, first_pending)).fetchone()[0]
 
-    # Lấy (id, task) đầu tiên mà không xóa.
-    def peek(self) -> Optional[Tuple[int, bytes]]:
+    def stats(self) -> dict:
         with self.lock:
-            row = self.conn.execute("SELECT id, task FROM queue ORDER BY id LIMIT 1").fetchone()
-            if not row:
-                return None
-            return row[0], row[1] # (id, task_bytes)
\ No newline at end of file
+            return {
+                "pending": len(self._pending),
+                "pending_bytes": self._pending_bytes,
+                "commits": self.commits,
+                "rows_written": self.rows_written,
+                "push_waits": self.push_waits,
+            }
@@ -2,6 +2,7 @@
 
 import zlib # cung cấp các thuật toán nén dữ liệu và kiểm tra lỗi, bao gồm CRC32
 import os
+import mmap
 from typing import Iterator, Tuple
 
 # Tính CRC32 của dữ liệu bytes
@@ -18,6 +19,26 @@ def stream_file_in_chunks(path: str, chunk_size: int = 32768) -> Iterator[Tuple[
             yield offset, data # offset và chunk dữ liệu
             offset += len(data)
 
+class FileChunkReader:
+    """[THÊM] Đọc chunk theo offset từ file nguồn qua mmap (gửi / gửi lại mà không lưu dữ liệu chunk ở nơi khác)."""
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        self.size = os.fstat(self._f.fileno()).st_size
+        # mmap không ánh xạ được file rỗng
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def read(self, offset: int, length: int) -> bytes:
+        if self._mm is None:
+            return b""
+        return self._mm[offset:offset + length]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
 def safe_join(base_dir: str, filename: str) -> str:
     filename = os.path.basename(filename)
     return os.path.join(base_dir, filename)
@@ -0,0 +1,220 @@
+# common_network/fragment_reassembler.py
+
+import struct
+import time
+import logging
+import itertools
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, Optional
+from common_network.constants import (
+    SHARE_CTRL_HDR_FMT, SHARE_HDR_SIZE,
+    FRAGMENT_ASSEMBLY_TIMEOUT, MAX_FRAGMENTS_PER_SEQ, MAX_BUFFERED_BYTES_PER_SEQ, MAX_REASSEMBLY_BYTES,
+)
+
+log = logging.getLogger(__name__)
+
+RECENT_CLOSED_SEQ = 64 # số seq vừa đóng (lắp ráp xong / bị bỏ do thiếu bộ nhớ) cần nhớ để bỏ fragment đến muộn
+
+_SHARE_HDR = struct.Struct(SHARE_CTRL_HDR_FMT)
+
+"""
+Lắp ráp fragment với chi phí O(1) cho mỗi fragment (trường hợp thường gặp: đến theo thứ tự):
+- Fragment đầu tiên của 1 seq cấp phát sẵn bytearray(SHARE_HDR_SIZE + total_len), header chung
+  (cờ fragment đã xóa) được ghi trước -> khi đủ mảnh trả về luôn buffer này, không nối/sắp xếp.
+- Mỗi fragment được ghi thẳng vào đúng vị trí qua memoryview (1 lần sao chép duy nhất).
+- Số byte đã nhận được đếm tăng dần theo các đoạn [start, end) đã phủ (đã gộp, sắp xếp):
+  fragment trùng lặp hoặc chồng lấn chỉ cộng phần byte MỚI, không bao giờ đếm 2 lần.
+- Hết hạn: deque theo thứ tự tạo (timeout cố định -> cũng là thứ tự hết hạn), chỉ kiểm tra đầu hàng.
+- Fragment đến SAU khi seq đã hoàn tất (trùng lặp) hoặc đã bị bỏ vì vượt max_total_bytes bị bỏ qua
+  (nhớ RECENT_CLOSED_SEQ seq gần nhất) -> không cấp phát lại buffer cho seq không thể hoàn tất.
+  Ngoại lệ: fragment offset 0 mở lần lắp ráp mới (cả PDU được gửi lại, vd. server phát lại FULL frame từ cache).
+"""
+
+
+class _Assembly:
+    __slots__ = ("seq", "gen", "ptype", "ts_ms", "total", "buf", "view", "covered", "received", "nfrags")
+
+    def __init__(self, seq: int, gen: int, ts_ms: int, ptype: int, total: int):
+        self.seq = seq
+        self.gen = gen # số thứ tự lần lắp ráp (phân biệt khi 1 seq được mở lại)
+        self.ptype = ptype
+        self.ts_ms = ts_ms
+        self.total = total
+        self.buf = bytearray(SHARE_HDR_SIZE + total)
+        _SHARE_HDR.pack_into(self.buf, 0, seq, ts_ms, ptype, 0) # header PDU hoàn chỉnh, cờ fragment = 0
+        self.view = memoryview(self.buf)
+        self.covered = [] # các đoạn [start, end) đã nhận, không giao nhau, tăng dần (list phẳng: s0, e0, s1, e1, ...)
+        self.received = 0 # số byte (không trùng) đã nhận
+        self.nfrags = 0
+
+    def cover(self, start: int, end: int) -> int:
+        """Đánh dấu [start, end) đã nhận, trả về số byte MỚI được phủ."""
+        cov = self.covered
+        # Thường gặp: fragment nối tiếp ngay sau đoạn cuối (hoặc là fragment đầu tiên)
+        if not cov or start >= cov[-1]:
+            if cov and start == cov[-1]:
+                cov[-1] = end
+            else:
+                cov.append(start)
+                cov.append(end)
+            return end - start
+
+        # Tổng quát (đến lệch thứ tự / trùng lặp): gộp với các đoạn giao hoặc kề [start, end)
+        # i lẻ: cov[i] là "end" >= start -> đoạn (i-1, i) giao/kề; i chẵn: đoạn đầu tiên nằm sau start
+        i = bisect_left(cov, start)
+        lo = hi = i - (i & 1)
+        new_start, new_end = start, end
+        already = 0
+        while hi < len(cov) and cov[hi] <= end:
+            s, e = cov[hi], cov[hi + 1]
+            already += max(0, min(e, end) - max(s, start))
+            new_start = min(new_start, s)
+            new_end = max(new_end, e)
+            hi += 2
+        cov[lo:hi] = [new_start, new_end]
+        return (end - start) - already
+
+
+class FragmentReassembler:
+    """
+    Bộ lắp ráp fragment theo seq (dùng trong PDUParser khi reassemble=True).
+    add(...) trả về PDU hoàn chỉnh (memoryview trỏ vào buffer riêng, cờ fragment đã xóa)
+    khi đủ mảnh, None nếu còn thiếu.
+    Lỗi:
+    - ValueError: total_len mâu thuẫn giữa các fragment, hoặc fragment vượt ra ngoài total_len.
+    - MemoryError: vượt MAX_FRAGMENTS_PER_SEQ / MAX_BUFFERED_BYTES_PER_SEQ.
+    Seq bị lỗi được bỏ hẳn (các fragment đến sau sẽ mở 1 lần lắp ráp mới và hết hạn theo timeout).
+    `pending_bytes` bị giới hạn bởi max_total_bytes: vượt thì bỏ seq cũ nhất (buffer được cấp phát trước).
+    Không thread-safe: mỗi receiver có PDUParser (và FragmentReassembler) riêng.
+    """
+    def __init__(self, timeout: float = FRAGMENT_ASSEMBLY_TIMEOUT,
+                 max_fragments: int = MAX_FRAGMENTS_PER_SEQ,
+                 max_bytes_per_seq: int = MAX_BUFFERED_BYTES_PER_SEQ,
+                 max_total_bytes: int = MAX_REASSEMBLY_BYTES):
+        self.timeout = timeout
+        self.max_fragments = max_fragments
+        self.max_bytes_per_seq = max_bytes_per_seq
+        self.max_total_bytes = max_total_bytes
+
+        self.pending: Dict[int, _Assembly] = {} # seq -> _Assembly
+        # (deadline, seq, gen) theo thứ tự tạo (= thứ tự hết hạn). Không giữ tham chiếu tới buffer:
+        # PDU đã trả về cho bên gọi không bị giữ lại trong hàng đợi hết hạn.
+        self.order = deque()
+        self._gen = itertools.count()
+        self.pending_bytes = 0 # tổng dung lượng đã cấp phát cho các seq đang chờ
+        self.recent_closed = deque() # các seq vừa đóng (theo thứ tự)
+        self.recent_closed_set = set()
+
+        # --- Thống kê ---
+        self.completed = 0
+        self.expired = 0
+        self.evicted = 0 # bị bỏ do vượt max_total_bytes
+        self.duplicate_bytes = 0
+
+    def add(self, seq: int, ts_ms: int, ptype: int, frag_offset: int, total_len: int, payload) -> Optional[memoryview]:
+        now = time.monotonic()
+        self._expire(now)
+
+        asm = self.pending.get(seq)
+        if asm is None:
+            # [SỬA] fragment offset 0 của seq đã đóng = PDU được gửi lại từ đầu (relay phát lại keyframe) -> lắp ráp lại
+            if seq in self.recent_closed_set and frag_offset != 0:
+                self.duplicate_bytes += len(payload) # fragment của PDU đã lắp ráp xong / đã bị bỏ
+                return None
+            if total_len > self.max_bytes_per_seq:
+                raise MemoryError("fragment assembly would exceed MAX_BUFFERED_BYTES_PER_SEQ")
+            self._make_room(total_len)
+            asm = _Assembly(seq, next(self._gen), ts_ms, ptype, total_len)
+            self.pending[seq] = asm
+            self.order.append((now + self.timeout, seq, asm.gen))
+            self.pending_bytes += total_len
+        elif total_len != asm.total:
+            self._drop(asm)
+            raise ValueError("fragment total_len conflicted")
+
+        n = len(payload)
+        end = frag_offset + n
+        if end > asm.total:
+            self._drop(asm)
+            raise ValueError("fragment exceeds total_len")
+
+        asm.nfrags += 1
+        if asm.nfrags > self.max_fragments:
+            self._drop(asm)
+            raise MemoryError("too many fragments for seq")
+
+        if n:
+            start = SHARE_HDR_SIZE + frag_offset
+            asm.view[start:start + n] = payload
+            added = asm.cover(frag_offset, end)
+            asm.received += added
+            self.duplicate_bytes += n - added
+
+        if asm.received < asm.total:
+            return None
+
+        # Đủ mảnh: buffer đã chứa PDU hoàn chỉnh (header + body)
+        self._drop(asm)
+        self.completed += 1
+        self._remember_closed(seq)
+        return asm.view
+
+    def _remember_closed(self, seq: int) -> None:
+        self.recent_closed.append(seq)
+        self.recent_closed_set.add(seq)
+        if len(self.recent_closed) > RECENT_CLOSED_SEQ:
+            self.recent_closed_set.discard(self.recent_closed.popleft())
+
+    def _drop(self, asm: _Assembly) -> None:
+        # Chỉ bỏ khỏi dict; phần tử trong self.order được dọn dần ở đầu hàng (_expire)
+        if self.pending.get(asm.seq) is asm:
+            del self.pending[asm.seq]
+            self.pending_bytes -= asm.total
+
+    def _expire(self, now: float) -> None:
+        order = self.order
+        pending = self.pending
+        while order:
+            deadline, seq, gen = order[0]
+            asm = pending.get(seq)
+            if asm is None or asm.gen != gen:
+                order.popleft() # đã hoàn tất / đã bị bỏ
+            elif deadline <= now:
+                order.popleft()
+                self._drop(asm)
+                self.expired += 1
+                log.warning(f"[FragmentReassembler] seq {seq} hết hạn ({asm.received}/{asm.total} bytes)")
+            else:
+                break
+
+    def _make_room(self, need: int) -> None:
+        """Bỏ các seq cũ nhất nếu tổng dung lượng cấp phát sẵn vượt max_total_bytes."""
+        order = self.order
+        while order and self.pending_bytes + need > self.max_total_bytes:
+            _, seq, gen = order.popleft()
+            asm = self.pending.get(seq)
+            if asm is not None and asm.gen == gen:
+                self._drop(asm)
+                self._remember_closed(seq)
+                self.evicted += 1
+
+    def clear(self) -> None:
+        self.pending.clear()
+        self.order.clear()
+        self.pending_bytes = 0
+        self.recent_closed.clear()
+        self.recent_closed_set.clear()
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "pending_bytes": self.pending_bytes,
+            "completed": self.completed,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "duplicate_bytes": self.duplicate_bytes,
+        }
@@ -0,0 +1,172 @@
+# common_network/frame_decoder.py
+
+import struct
+import logging
+from typing import List, Optional
+from common_network.constants import (
+    PDU_TYPE_FULL, PDU_TYPE_RECT, PDU_TYPE_CONTROL, PDU_TYPE_INPUT, PDU_TYPE_CURSOR, PDU_TYPE_FRAME_ACK, PDU_TYPE_THUMB,
+    PDU_TYPE_FILE_START, PDU_TYPE_FILE_CHUNK, PDU_TYPE_FILE_END, PDU_TYPE_FILE_ACK, PDU_TYPE_FILE_NAK,
+    SHARE_CTRL_HDR_FMT, SHARE_HDR_SIZE, FRAGMENT_FLAG, FRAME_ACK_SIZE, THUMB_HDR_SIZE,
+    FILE_ACK_FLAG_SACK, FILE_SACK_BLOCK_SIZE,
+    FILE_START_FLAG_RESUME, FILE_ACK_FLAG_RESUME, FILE_TRANSFER_ID_SIZE, FILE_CHUNK_FLAG_CRC,
+)
+
+log = logging.getLogger(__name__)
+
+_SHARE_HDR = struct.Struct(SHARE_CTRL_HDR_FMT)
+_U32 = struct.Struct(">I")
+_U16 = struct.Struct(">H")
+
+# [SỬA] Đây là nơi DUY NHẤT mô tả độ dài PDU trên đường truyền: PDUFrameDecoder dùng để tách,
+# PDUParser dùng làm giới hạn khi đọc trường (không đọc quá độ dài này). Thêm trường mới vào
+# PDUBuilder thì phải thêm vào đây (trường theo cờ: _FLAG_RULES); tests/test_network.py kiểm tra
+# mọi biến thể PDUBuilder qua bộ tách + parser.
+# Quy tắc tính độ dài cho từng loại PDU (phần nằm sau header chung):
+# ptype -> (kích thước header riêng, offset trường độ dài trong header riêng, struct trường độ dài, số byte cố định sau header riêng)
+# Tổng độ dài PDU = SHARE_HDR_SIZE + header_riêng + cố_định + giá_trị_trường_độ_dài
+# PDU không có trường độ dài (FILE_END, FILE_ACK, FRAME_ACK) dùng None.
+_LENGTH_RULES = {
+    PDU_TYPE_FULL: (12, 8, _U32, 0),        # width, height, jpg_len
+    PDU_TYPE_RECT: (28, 16, _U32, 0),       # x, y, w, h, jpg_len, full_w, full_h
+    PDU_TYPE_CONTROL: (4, 0, _U32, 0),      # msg_len
+    PDU_TYPE_INPUT: (4, 0, _U32, 0),        # msg_len
+    PDU_TYPE_CURSOR: (12, 8, _U32, 0),      # x, y, shape_len
+    PDU_TYPE_FRAME_ACK: (FRAME_ACK_SIZE, None, None, 0), # last_seq, frame_ts_ms, decode_us, render_us, frames, dropped
+    PDU_TYPE_THUMB: (THUMB_HDR_SIZE, 6, _U32, 0), # width, height, source_len, data_len (source + jpg)
+    PDU_TYPE_FILE_START: (2, 0, _U16, 16),  # fn_len, (filename), total_size, chunk_size, checksum (+ mã transfer theo cờ)
+    PDU_TYPE_FILE_CHUNK: (12, 8, _U32, 0),  # offset, chunk_len (+ CRC32 của chunk theo cờ)
+    PDU_TYPE_FILE_END: (4, None, None, 0),  # checksum
+    PDU_TYPE_FILE_ACK: (8, None, None, 0),  # ack_offset (+ các trường theo cờ, xem _FLAG_RULES)
+    PDU_TYPE_FILE_NAK: (12, 8, _U32, 0),    # offset, reason_len
+}
+
+
+# [THÊM] Trường tùy chọn theo cờ (phải khớp PDUBuilder / PDUParser):
+# ptype -> hàm (data, offset, flags, avail, total) -> tổng độ dài (None nếu chưa đủ byte),
+# `total` là độ dài tính theo _LENGTH_RULES (khi không bật cờ nào).
+def _file_start_length(data, offset: int, flags: int, avail: int, total: int) -> Optional[int]:
+    if flags & FILE_START_FLAG_RESUME:
+        total += FILE_TRANSFER_ID_SIZE # mã transfer sau checksum
+    return total
+
+
+def _file_chunk_length(data, offset: int, flags: int, avail: int, total: int) -> Optional[int]:
+    if flags & FILE_CHUNK_FLAG_CRC:
+        total += 4 # CRC32 (I) ngay sau dữ liệu chunk
+    return total
+
+
+def _file_ack_length(data, offset: int, flags: int, avail: int, total: int) -> Optional[int]:
+    if flags & FILE_ACK_FLAG_RESUME:
+        total += FILE_TRANSFER_ID_SIZE # mã transfer ngay sau ack_offset, trước số khối SACK
+    if flags & FILE_ACK_FLAG_SACK:
+        # số khối SACK (H) + các đoạn [start, end)
+        if avail < total + 2:
+            return None
+        (n_blocks,) = _U16.unpack_from(data, offset + total)
+        total += 2 + n_blocks * FILE_SACK_BLOCK_SIZE
+    return total
+
+
+_FLAG_RULES = {
+    PDU_TYPE_FILE_START: _file_start_length,
+    PDU_TYPE_FILE_CHUNK: _file_chunk_length,
+    PDU_TYPE_FILE_ACK: _file_ack_length,
+}
+
+
+def pdu_total_length(data, offset: int = 0, end: Optional[int] = None) -> Optional[int]:
+    """
+    Tính tổng độ dài của PDU bắt đầu tại `offset` trong `data` (bytes/bytearray/memoryview).
+    - Trả về None nếu chưa đủ dữ liệu để biết độ dài.
+    - Ném ValueError nếu loại PDU không xác định (buffer đã lệch, không thể đồng bộ lại).
+    Không sao chép dữ liệu: chỉ dùng struct.unpack_from trên buffer gốc.
+    """
+    if end is None:
+        end = len(data)
+    avail = end - offset
+    if avail < SHARE_HDR_SIZE:
+        return None
+
+    _seq, _ts_ms, ptype, flags = _SHARE_HDR.unpack_from(data, offset)
+
+    # Fragment không mang trường độ dài: mỗi MCS frame chỉ chứa MỘT fragment,
+    # nên toàn bộ phần còn lại của buffer là payload của fragment.
+    if flags & FRAGMENT_FLAG:
+        return avail
+
+    rule = _LENGTH_RULES.get(ptype)
+    if rule is None:
+        raise ValueError(f"Loại PDU không xác định: {ptype}")
+
+    hdr_size, len_off, len_struct, fixed = rule
+    total = SHARE_HDR_SIZE + hdr_size + fixed
+    if len_struct is not None:
+        if avail < SHARE_HDR_SIZE + hdr_size:
+            return None
+        (var_len,) = len_struct.unpack_from(data, offset + SHARE_HDR_SIZE + len_off)
+        total += var_len
+    if flags:
+        flag_rule = _FLAG_RULES.get(ptype)
+        if flag_rule is not None:
+            return flag_rule(data, offset, flags, avail, total)
+    return total
+
+
+class PDUFrameDecoder:
+    """
+    Bộ tách PDU tăng dần (incremental) cho buffer của MỘT kênh MCS.
+    - feed(data): trả về TẤT CẢ PDU hoàn chỉnh dưới dạng memoryview (không sao chép).
+    - Nếu không còn dữ liệu dở dang, tách trực tiếp trên `data` (data phải là buffer
+      không bị sửa đổi về sau, ví dụ payload MCS trỏ vào body TPKT vừa nhận).
+    - Chỉ PDU dở dang ở cuối mới được sao chép vào buffer nội bộ; buffer chỉ được
+      ghép thành bản bytes bất biến khi PDU đang chờ đã đủ byte (không copy lặp lại).
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.dropped_bytes = 0 # số byte bị bỏ do không xác định được loại PDU
+
+    def feed(self, data) -> List[memoryview]:
+        if self.buffer:
+            self.buffer.extend(data)
+            try:
+                need = pdu_total_length(self.buffer)
+            except ValueError as e:
+                self._drop(len(self.buffer), e)
+                self.buffer.clear()
+                return []
+            if need is None or len(self.buffer) < need:
+                return [] # PDU đang chờ vẫn chưa đủ, không cần tách
+            data = bytes(self.buffer)
+            self.buffer.clear()
+
+        view = memoryview(data)
+        end = len(view)
+        frames = []
+        pos = 0
+        while pos < end:
+            try:
+                total = pdu_total_length(view, pos, end)
+            except ValueError as e:
+                # Không thể đồng bộ lại: bỏ toàn bộ phần còn lại
+                self._drop(end - pos, e)
+                pos = end
+                break
+            if total is None or pos + total > end:
+                break # chờ thêm dữ liệu
+            frames.append(view[pos:pos + total])
+            pos += total
+
+        if pos < end:
+            self.buffer.extend(view[pos:])
+        return frames
+
+    def _drop(self, nbytes: int, err: Exception) -> None:
+        log.error(f"[PDUFrameDecoder] {err}. Bỏ {nbytes} bytes.")
+        self.dropped_bytes += nbytes
+
+    def pending(self) -> int:
+        return len(self.buffer)
+
+    def clear(self) -> None:
+        self.buffer.clear()
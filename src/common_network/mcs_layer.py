@@ -3,10 +3,17 @@
 import struct
 import logging
 from collections import defaultdict
-from typing import Optional, Dict, Tuple
-from .constants import MCS_HDR_FMT, MCS_HDR_SIZE, MAX_CHANNEL_BUFFER
+from typing import Optional, Dict, List, Tuple
+from .constants import (
+    MCS_HDR_FMT, MCS_HDR_SIZE, MAX_CHANNEL_BUFFER,
+    MCS_EXT_FLAG, MCS_EXT_HDR_FMT, MCS_EXT_HDR_SIZE,
+)
 
 log = logging.getLogger(__name__)
+
+_MCS_HDR = struct.Struct(MCS_HDR_FMT)
+_MCS_EXT_HDR = struct.Struct(MCS_EXT_HDR_FMT)
+
 class MCSLite:
     def __init__(self):
         self.buffer = bytearray() # buffer chung, nhận dữ liệu thô từ TCP (qua TPKT)
@@ -16,15 +23,67 @@ class MCSLite:
     # đóng gói PDU với header MCS (channel_id (H), length (H)) + payload
     @staticmethod
     def build(channel_id: int, payload: bytes) -> bytes:
-        length = len(payload)
-        header = struct.pack(MCS_HDR_FMT, channel_id, length)
-        return header + payload
+        return MCSLite.build_header(channel_id, len(payload)) + payload
+
+    # chỉ tạo header MCS, dùng khi gửi payload riêng để tránh nối (concatenate) buffer lớn
+    # [SỬA] payload > 0xFFFF dùng header mở rộng (6 bytes, length 32-bit) - chỉ khi peer đã đàm phán EXTLEN32
+    @staticmethod
+    def build_header(channel_id: int, payload_len: int) -> bytes:
+        if payload_len > 0xFFFF:
+            return _MCS_EXT_HDR.pack(channel_id | MCS_EXT_FLAG, payload_len)
+        return _MCS_HDR.pack(channel_id, payload_len)
+
+    # [THÊM] đọc header MCS tại pos (dạng thường hoặc mở rộng).
+    # Trả về (channel_id, payload_len, header_size), None nếu chưa đủ byte.
+    @staticmethod
+    def _read_header(buf, pos: int, end: int):
+        if end - pos < MCS_HDR_SIZE:
+            return None
+        channel_id, payload_len = _MCS_HDR.unpack_from(buf, pos)
+        if not channel_id & MCS_EXT_FLAG:
+            return channel_id, payload_len, MCS_HDR_SIZE
+        if end - pos < MCS_EXT_HDR_SIZE:
+            return None
+        channel_id, payload_len = _MCS_EXT_HDR.unpack_from(buf, pos)
+        return channel_id & ~MCS_EXT_FLAG, payload_len, MCS_EXT_HDR_SIZE
 
     # thêm dữ liệu thô (từ TPKT) vào buffer để giải mã
     def feed(self, data: bytes) -> None:
         self.buffer.extend(data)
         self._process_buffer()
 
+    # tách các MCS frame từ data mà KHÔNG sao chép payload
+    def feed_view(self, data) -> List[Tuple[int, memoryview]]:
+        """
+        Trả về danh sách (channel_id, payload) theo đúng thứ tự nhận, payload là memoryview
+        trỏ vào `data`. `data` phải là buffer không bị sửa đổi về sau (ví dụ body TPKT vừa nhận).
+        Chỉ phần frame còn dở dang (chưa đủ byte) mới được sao chép vào self.buffer.
+        """
+        if self.buffer:
+            # Còn dữ liệu dở dang từ lần trước: ghép lại thành một bản bytes bất biến
+            self.buffer.extend(data)
+            data = bytes(self.buffer)
+            self.buffer.clear()
+
+        view = memoryview(data)
+        end = len(view)
+        frames = []
+        pos = 0
+        while True:
+            hdr = MCSLite._read_header(view, pos, end)
+            if hdr is None:
+                break
+            channel_id, payload_len, hdr_size = hdr
+            frame_end = pos + hdr_size + payload_len
+            if frame_end > end:
+                break
+            frames.append((channel_id, view[pos + hdr_size:frame_end]))
+            pos = frame_end
+
+        if pos < end:
+            self.buffer.extend(view[pos:])
+        return frames
+
     # giải mã 1 PDU từ buffer, trả về (channel_id, payload)
     # def unpack(self) -> Tuple[int, bytes]:
     #     if len(self.buffer) < MCS_HDR_SIZE:
@@ -37,18 +96,18 @@ class MCSLite:
     # vòng lặp xử lý buffer thô để tách các MCS frame
     def _process_buffer(self) -> None:
         while True:
-            if len(self.buffer) < MCS_HDR_SIZE:
-                break 
-
             # đọc header (channel_id và length)
-            channel_id, payload_len = struct.unpack_from(MCS_HDR_FMT, self.buffer)
+            hdr = MCSLite._read_header(self.buffer, 0, len(self.buffer))
+            if hdr is None:
+                break
+            channel_id, payload_len, hdr_size = hdr
             
-            frame_total_len = MCS_HDR_SIZE + payload_len
+            frame_total_len = hdr_size + payload_len
             if len(self.buffer) < frame_total_len:
                 break
 
             # trích xuất payload khi đã đủ data
-            payload_start = MCS_HDR_SIZE
+            payload_start = hdr_size
             payload_end = frame_total_len
             payload = self.buffer[payload_start:payload_end]
 
@@ -4,10 +4,15 @@ import json
 import struct
 import time
 from typing import List, Optional, Tuple
+from common_network.pdu_records import (
+    PDURecord, FullFrame, RectFrame, Control, Input, Cursor, FrameAck, Thumbnail,
+    FileStart, FileChunk, FileEnd, FileAck, FileNak,
+)
 from common_network.constants import (
-    PDU_TYPE_FULL, PDU_TYPE_RECT, PDU_TYPE_CONTROL, PDU_TYPE_INPUT, PDU_TYPE_CURSOR,
+    PDU_TYPE_FULL, PDU_TYPE_RECT, PDU_TYPE_CONTROL, PDU_TYPE_INPUT, PDU_TYPE_CURSOR, PDU_TYPE_FRAME_ACK, PDU_TYPE_THUMB,
     PDU_TYPE_FILE_START, PDU_TYPE_FILE_CHUNK, PDU_TYPE_FILE_END, PDU_TYPE_FILE_ACK, PDU_TYPE_FILE_NAK,
-    SHARE_CTRL_HDR_FMT,
+    SHARE_CTRL_HDR_FMT, FRAME_ACK_FMT, THUMB_HDR_FMT, FILE_ACK_FLAG_SACK, FILE_SACK_BLOCK_FMT, FILE_CHUNK_FLAG_ACK_NOW,
+    FILE_START_FLAG_RESUME, FILE_ACK_FLAG_RESUME, FILE_TRANSFER_ID_SIZE, FILE_CHUNK_FLAG_CRC,
     FRAGMENT_FLAG, FRAGMENT_HDR_FMT,
 )
 
@@ -17,8 +22,9 @@ SHARE_HDR_SIZE = struct.calcsize(SHARE_CTRL_HDR_FMT)
 class PDUBuilder:
     # xây dựng header chung cho PDU với seq, ts_ms, ptype, flags
     @staticmethod
-    def _hdr(seq: int, ptype: int, flags: int = 0) -> bytes:
-        ts_ms = int(time.time() * 1000)
+    def _hdr(seq: int, ptype: int, flags: int = 0, ts_ms: Optional[int] = None) -> bytes:
+        if ts_ms is None:
+            ts_ms = int(time.time() * 1000)
         return struct.pack(SHARE_CTRL_HDR_FMT, seq, ts_ms, ptype, flags)
     
     """
@@ -28,16 +34,19 @@ class PDUBuilder:
     """
 
     # tạo pdu full frame 
+    # [SỬA] ts_ms: thời điểm chụp (mặc định: lúc tạo PDU) -> manager/server đo được độ trễ từ lúc chụp
     @staticmethod
-    def build_full_frame_pdu(seq: int, jpeg_bytes: bytes, width: int, height: int, flags: int = 0) -> bytes:
-        header = PDUBuilder._hdr(seq, PDU_TYPE_FULL, flags)
+    def build_full_frame_pdu(seq: int, jpeg_bytes: bytes, width: int, height: int, flags: int = 0,
+                             ts_ms: Optional[int] = None) -> bytes:
+        header = PDUBuilder._hdr(seq, PDU_TYPE_FULL, flags, ts_ms)
         frame_hdr = struct.pack(">III", width, height, len(jpeg_bytes))
         return header + frame_hdr + jpeg_bytes
 
     # tạo pdu rect frame
     @staticmethod
-    def build_rect_frame_pdu(seq: int, jpeg_bytes: bytes, x: int, y: int, w: int, h: int, full_w: int, full_h: int, flags: int = 0) -> bytes:
-        header = PDUBuilder._hdr(seq, PDU_TYPE_RECT, flags)
+    def build_rect_frame_pdu(seq: int, jpeg_bytes: bytes, x: int, y: int, w: int, h: int, full_w: int, full_h: int, flags: int = 0,
+                             ts_ms: Optional[int] = None) -> bytes:
+        header = PDUBuilder._hdr(seq, PDU_TYPE_RECT, flags, ts_ms)
         rect_hdr = struct.pack(">IIIII", x, y, w, h, len(jpeg_bytes))
         full_dim = struct.pack(">II", full_w, full_h)
         return header + rect_hdr + full_dim + jpeg_bytes
@@ -70,21 +79,49 @@ class PDUBuilder:
             return header + cursor_hdr + cursor_shape_data
         return header + cursor_hdr
     
+    # [THÊM] tạo pdu xác nhận frame đã hiển thị (manager -> client), decode/render tính bằng ms
+    @staticmethod
+    def build_frame_ack_pdu(seq: int, last_seq: int, frame_ts_ms: int, decode_ms: float, render_ms: float,
+                            frames: int, dropped: int = 0) -> bytes:
+        header = PDUBuilder._hdr(seq, PDU_TYPE_FRAME_ACK, 0)
+        body = struct.pack(FRAME_ACK_FMT, last_seq, frame_ts_ms,
+                           int(decode_ms * 1000), int(render_ms * 1000), frames, dropped)
+        return header + body
+
+    # [THÊM] tạo pdu ảnh thu nhỏ; source: id client (client gửi rỗng, server điền khi chuyển tiếp)
+    @staticmethod
+    def build_thumbnail_pdu(seq: int, jpeg_bytes: bytes, width: int, height: int, source: str = "",
+                            ts_ms: Optional[int] = None) -> bytes:
+        header = PDUBuilder._hdr(seq, PDU_TYPE_THUMB, 0, ts_ms)
+        src = source.encode()
+        thumb_hdr = struct.pack(THUMB_HDR_FMT, width, height, len(src), len(src) + len(jpeg_bytes))
+        return header + thumb_hdr + src + jpeg_bytes
+
     # tạo pdu bắt đầu truyền file
     @staticmethod
-    def build_file_start(seq: int, filename: str, total_size: int, chunk_size: int = 32768, checksum: int = 0) -> bytes:
-        header = PDUBuilder._hdr(seq, PDU_TYPE_FILE_START, 0)
+    def build_file_start(seq: int, filename: str, total_size: int, chunk_size: int = 32768, checksum: int = 0,
+                         transfer_id: bytes = b"") -> bytes:
+        # [SỬA] transfer_id (16 byte): bên nhận giữ file dở theo mã này để tiếp tục sau khi mất kết nối
+        header = PDUBuilder._hdr(seq, PDU_TYPE_FILE_START, FILE_START_FLAG_RESUME if transfer_id else 0)
         fn_bytes = filename.encode()
         fn_len = struct.pack(">H", len(fn_bytes))
         meta = struct.pack(">Q I I", total_size, chunk_size, checksum)
+        if transfer_id:
+            meta += struct.pack(f">{FILE_TRANSFER_ID_SIZE}s", transfer_id)
         return header + fn_len + fn_bytes + meta
 
     # tạo pdu chunk dữ liệu file
     @staticmethod
-    def build_file_chunk(seq: int, offset: int, chunk_bytes: bytes) -> bytes:
-        header = PDUBuilder._hdr(seq, PDU_TYPE_FILE_CHUNK, 0)
+    def build_file_chunk(seq: int, offset: int, chunk_bytes: bytes, ack_now: bool = False,
+                         crc: Optional[int] = None) -> bytes:
+        # [SỬA] ack_now: yêu cầu bên nhận ACK ngay (cờ FILE_CHUNK_FLAG_ACK_NOW);
+        # crc: CRC32 của chunk, gửi sau dữ liệu (cờ FILE_CHUNK_FLAG_CRC)
+        flags = (FILE_CHUNK_FLAG_ACK_NOW if ack_now else 0) | (FILE_CHUNK_FLAG_CRC if crc is not None else 0)
+        header = PDUBuilder._hdr(seq, PDU_TYPE_FILE_CHUNK, flags)
         hdr = struct.pack(">Q I", offset, len(chunk_bytes))
-        return header + hdr + chunk_bytes
+        if crc is None:
+            return header + hdr + chunk_bytes
+        return header + hdr + chunk_bytes + struct.pack(">I", crc)
 
     # tạo pdu kết thúc truyền file
     @staticmethod
@@ -93,10 +130,18 @@ class PDUBuilder:
         return header + struct.pack(">I", checksum)
 
     # tạo pdu xác nhận đã nhận file thành công
+    # [SỬA] sack: các đoạn (start, end) đã nhận sau ack_offset (selective ACK, cờ FILE_ACK_FLAG_SACK)
     @staticmethod
-    def build_file_ack(seq: int, ack_offset: int) -> bytes:
-        header = PDUBuilder._hdr(seq, PDU_TYPE_FILE_ACK, 0)
-        return header + struct.pack(">Q", ack_offset)
+    def build_file_ack(seq: int, ack_offset: int, sack=(), transfer_id: bytes = b"") -> bytes:
+        # [SỬA] transfer_id: trả lời FILE_START tiếp tục transfer (cờ FILE_ACK_FLAG_RESUME), nằm ngay sau ack_offset
+        flags = (FILE_ACK_FLAG_SACK if sack else 0) | (FILE_ACK_FLAG_RESUME if transfer_id else 0)
+        header = PDUBuilder._hdr(seq, PDU_TYPE_FILE_ACK, flags)
+        body = struct.pack(">Q", ack_offset)
+        if transfer_id:
+            body += struct.pack(f">{FILE_TRANSFER_ID_SIZE}s", transfer_id)
+        if sack:
+            body += struct.pack(">H", len(sack)) + b"".join(struct.pack(FILE_SACK_BLOCK_FMT, start, end) for start, end in sack)
+        return header + body
 
     # tạo pdu thông báo lỗi khi nhận file
     @staticmethod
@@ -105,6 +150,44 @@ class PDUBuilder:
         body = struct.pack(">Q I", offset, len(reason)) + reason
         return header + body
 
+    # tạo PDU từ bản ghi (record) PDU; nếu record đã có raw (PDU nhận được) thì dùng lại nguyên vẹn
+    @staticmethod
+    def build(record: PDURecord) -> bytes:
+        if record.raw is not None:
+            return record.raw
+        seq = record.seq
+        if isinstance(record, FullFrame):
+            return PDUBuilder.build_full_frame_pdu(seq, record.jpg, record.width, record.height, record.flags,
+                                                   record.ts_ms or None)
+        if isinstance(record, RectFrame):
+            return PDUBuilder.build_rect_frame_pdu(seq, record.jpg, record.x, record.y, record.w, record.h,
+                                                   record.full_w, record.full_h, record.flags, record.ts_ms or None)
+        if isinstance(record, Control):
+            return PDUBuilder.build_control_pdu(seq, record.message.encode())
+        if isinstance(record, Input):
+            return PDUBuilder.build_input_pdu(seq, record.input)
+        if isinstance(record, Cursor):
+            return PDUBuilder.build_cursor_pdu(seq, record.x, record.y, record.cursor_shape or None)
+        if isinstance(record, FrameAck):
+            return PDUBuilder.build_frame_ack_pdu(seq, record.last_seq, record.frame_ts_ms, record.decode_ms,
+                                                  record.render_ms, record.frames, record.dropped)
+        if isinstance(record, Thumbnail):
+            return PDUBuilder.build_thumbnail_pdu(seq, record.jpg, record.width, record.height, record.source,
+                                                  record.ts_ms or None)
+        if isinstance(record, FileStart):
+            return PDUBuilder.build_file_start(seq, record.filename, record.total_size, record.chunk_size, record.checksum,
+                                              record.transfer_id)
+        if isinstance(record, FileChunk):
+            return PDUBuilder.build_file_chunk(seq, record.offset, record.data, bool(record.flags & FILE_CHUNK_FLAG_ACK_NOW),
+                                              record.crc)
+        if isinstance(record, FileEnd):
+            return PDUBuilder.build_file_end(seq, record.checksum)
+        if isinstance(record, FileAck):
+            return PDUBuilder.build_file_ack(seq, record.ack_offset, record.sack, record.transfer_id)
+        if isinstance(record, FileNak):
+            return PDUBuilder.build_file_nak(seq, record.offset, record.reason.encode())
+        raise ValueError(f"Không thể tạo PDU từ {type(record).__name__}")
+
     # phân mảnh 1 PDU lớn thành nhiều fragment nhỏ hơn max_payload
     @staticmethod
     def fragmentize(pdu_bytes: bytes, max_payload: int) -> List[Tuple[int, bytes]]:
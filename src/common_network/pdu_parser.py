@@ -1,253 +1,226 @@
 # common_network/pdu_parser.py
 
-import json
 import struct
-import time
-from typing import Optional, Dict,  Tuple
+from typing import Optional
+from common_network.pdu_records import (
+    PDURecord, FullFrame, RectFrame, Control, Input, Cursor, FrameAck, Thumbnail,
+    FileStart, FileChunk, FileEnd, FileAck, FileNak, Fragment, UnknownPDU,
+)
 from common_network.constants import (
-    PDU_TYPE_CURSOR, PDU_TYPE_FULL, PDU_TYPE_RECT, PDU_TYPE_CONTROL, PDU_TYPE_INPUT,
+    PDU_TYPE_CURSOR, PDU_TYPE_FULL, PDU_TYPE_RECT, PDU_TYPE_CONTROL, PDU_TYPE_INPUT, PDU_TYPE_FRAME_ACK, PDU_TYPE_THUMB,
     PDU_TYPE_FILE_START, PDU_TYPE_FILE_CHUNK, PDU_TYPE_FILE_END, PDU_TYPE_FILE_ACK, PDU_TYPE_FILE_NAK,
     SHARE_CTRL_HDR_FMT, SHARE_HDR_SIZE,
     FRAGMENT_FLAG, FRAGMENT_HDR_FMT, FRAGMENT_HDR_SIZE,
-    FRAGMENT_ASSEMBLY_TIMEOUT, MAX_FRAGMENTS_PER_SEQ, MAX_BUFFERED_BYTES_PER_SEQ
+    FRAME_ACK_FMT, FRAME_ACK_SIZE, THUMB_HDR_FMT, THUMB_HDR_SIZE,
+    FILE_ACK_FLAG_SACK, FILE_SACK_BLOCK_FMT, FILE_SACK_BLOCK_SIZE,
+    FILE_START_FLAG_RESUME, FILE_ACK_FLAG_RESUME, FILE_TRANSFER_ID_SIZE, FILE_CHUNK_FLAG_CRC,
 )
+from common_network.fragment_reassembler import FragmentReassembler
+from common_network.frame_decoder import pdu_total_length
+
+_SHARE_HDR = struct.Struct(SHARE_CTRL_HDR_FMT)
 
 class PDUParser:
     def __init__(self):
-        self.fragment_buffer: Dict[int, Dict] = {} # [seq, dict ["total", "parts" (offset->bytes), "ptype", "ts_ms", "first_ts"]]
+        # [SỬA] lắp ráp fragment bằng buffer cấp phát sẵn (O(1) mỗi fragment), thay cho dict các mảnh
+        self.reassembler = FragmentReassembler()
 
     # Kiểm tra xem PDU có phải là fragment không
     def _is_fragment(self, flags: int) -> bool:
         return (flags & FRAGMENT_FLAG) != 0
 
-    # Dọn dẹp các fragment cũ đã hết hạn
-    def _cleanup_old_fragments(self) -> None:
-        now = time.time()
-        to_delete = []
-        for seq, meta in list(self.fragment_buffer.items()):
-            first_ts = meta.get("first_ts", now)
-            if now - first_ts > FRAGMENT_ASSEMBLY_TIMEOUT:
-                to_delete.append(seq)
-        for seq in to_delete:
-            try:
-                del self.fragment_buffer[seq]
-            except KeyError:
-                pass
-
-    # Lưu fragment và kiểm tra xem có thể lắp ráp PDU hoàn chỉnh không
-    def _store_fragment(self, seq: int, ts_ms: int, ptype: int, frag_offset: int, total_len: int, payload: bytes) -> Optional[bytes]:
-        self._cleanup_old_fragments()
-
-        meta = self.fragment_buffer.get(seq)
-        if meta is None:
-            meta = {
-                "total": total_len,
-                "parts": {},
-                "ptype": ptype,
-                "ts_ms": ts_ms,
-                "first_ts": time.time(),
-            }
-            self.fragment_buffer[seq] = meta
-
-        if total_len != meta["total"]:
-            try:
-                del self.fragment_buffer[seq]
-            except KeyError:
-                pass
-            raise ValueError("fragment total_len conflicted")
-
-        if len(meta["parts"]) >= MAX_FRAGMENTS_PER_SEQ:
-            del self.fragment_buffer[seq]
-            raise MemoryError("too many fragments for seq")
-
-        current_buffered = sum(len(b) for b in meta["parts"].values())
-        if current_buffered + len(payload) > MAX_BUFFERED_BYTES_PER_SEQ:
-            del self.fragment_buffer[seq]
-            raise MemoryError("fragment assembly would exceed MAX_BUFFERED_BYTES_PER_SEQ")
-
-        meta["parts"][frag_offset] = payload
-
-        received = sum(len(b) for b in meta["parts"].values())
-        if received >= meta["total"]:
-            parts = meta["parts"]
-            assembled = bytearray()
-            for off in sorted(parts.keys()):
-                assembled.extend(parts[off])
-            try:
-                del self.fragment_buffer[seq]
-            except KeyError:
-                pass
-            
-            # header PDU đã lắp ráp
-            flags = 0 # xóa cờ fragment
-            header = struct.pack(SHARE_CTRL_HDR_FMT, seq, meta["ts_ms"], meta["ptype"], flags)
-            
-            return header + assembled
-        
-        return None
-
-    def parse(self, data: bytes, reassemble: bool = True) -> Optional[dict]:
+    def parse(self, data, reassemble: bool = True) -> Optional[PDURecord]:
         """
         Phân tích (parse) MỘT PDU payload (frame) duy nhất
         1. Phân tích PDU.
-        2. Nếu là fragment, lưu nó lại và trả về None (hoặc "pending").
+        2. Nếu là fragment, lưu nó lại và trả về None (chưa đủ mảnh).
         3. Nếu là fragment cuối cùng, lắp ráp và trả về PDU HOÀN CHỈNH.
-        4. Nếu là PDU thường, phân tích và trả về dict.
+        4. Nếu là PDU thường, phân tích và trả về bản ghi (record) tương ứng.
+        `data` có thể là bytes hoặc memoryview: các trường payload (jpg, data, ...)
+        là lát cắt của `data` (memoryview -> không sao chép).
+        reassemble=False: fragment được trả về nguyên dạng Fragment (server chỉ chuyển tiếp).
         """
         if len(data) < SHARE_HDR_SIZE:
             raise ValueError("PDU too small")
 
-        seq, ts_ms, ptype, flags = struct.unpack(SHARE_CTRL_HDR_FMT, data[:SHARE_HDR_SIZE])
+        seq, ts_ms, ptype, flags = _SHARE_HDR.unpack_from(data, 0)
         offset = SHARE_HDR_SIZE
 
         if self._is_fragment(flags):
             if not reassemble:
-                base = {"seq": seq, "ts_ms": ts_ms, "flags": flags}
-                # Trả về đúng loại PDU để ServerSession biết đường routing
-                if ptype == PDU_TYPE_FULL: return {**base, "type": "full"}
-                if ptype == PDU_TYPE_RECT: return {**base, "type": "rect"}
-                if ptype == PDU_TYPE_CURSOR: return {**base, "type": "cursor"}
-                return {**base, "type": "unknown_fragment"}
+                # Trả về đúng loại PDU gốc để ServerSession biết đường routing
+                return Fragment(seq, ts_ms, flags, data, ptype)
             
             if len(data) < SHARE_HDR_SIZE + FRAGMENT_HDR_SIZE:
                 raise ValueError("fragment PDU too small for frag header")
             
-            frag_offset, total_len = struct.unpack(FRAGMENT_HDR_FMT, data[offset:offset+FRAGMENT_HDR_SIZE])
+            frag_offset, total_len = struct.unpack_from(FRAGMENT_HDR_FMT, data, offset)
             offset += FRAGMENT_HDR_SIZE 
             frag_payload = data[offset:] # phần dữ liệu fragment
-            assembled_pdu_bytes = self._store_fragment(seq, ts_ms, ptype, frag_offset, total_len, frag_payload) # lưu fragment
+            assembled_pdu_bytes = self.reassembler.add(seq, ts_ms, ptype, frag_offset, total_len, frag_payload) # lưu fragment
             
-            # nếu chưa đủ, _store_fragment trả về None. Hàm parse trả về PDU "đặc biệt"
+            # nếu chưa đủ, reassembler trả về None -> vẫn đang chờ
             if assembled_pdu_bytes is None:
-                # Vẫn đang chờ, trả về một PDU "đặc biệt"
-                return {"seq": seq, "ts_ms": ts_ms, "type": "fragment_pending"}
-            # nếu đã đủ, _strore_fragment sẽ lắp ráp tất cả các mẫu, tạo và trả về PDU gốc hoàn chỉnh
+                return None
+            # nếu đã đủ, reassembler trả về PDU gốc hoàn chỉnh (memoryview, cờ fragment đã xóa)
             data = assembled_pdu_bytes 
             
             # phân tích lại PDU hoàn chỉnh (lấy header mới)
-            seq, ts_ms, ptype, flags = struct.unpack(SHARE_CTRL_HDR_FMT, data[:SHARE_HDR_SIZE])
+            seq, ts_ms, ptype, flags = _SHARE_HDR.unpack_from(data, 0)
             offset = SHARE_HDR_SIZE
             # cờ fragment bây giờ đã là 0
 
         # Nếu PDU là fragment, code sẽ chạy đến đây sau khi lắp ráp xong
-        base = {"seq": seq, "ts_ms": ts_ms, "flags": flags}
+        # [SỬA] Độ dài PDU lấy từ cùng quy tắc với PDUFrameDecoder (pdu_total_length): parser không đọc
+        # quá phần bộ tách coi là của PDU này -> trường mới (theo cờ) chưa khai báo trong frame_decoder
+        # làm parse lỗi ngay cả khi test parser riêng lẻ, thay vì âm thầm làm lệch buffer kênh ở relay.
+        try:
+            size = pdu_total_length(data)
+        except ValueError:
+            return UnknownPDU(seq, ts_ms, flags, data, ptype)
+        if size is None or size > len(data):
+            raise ValueError(f"PDU type {ptype} truncated: {len(data)} bytes, frame length {size}")
+        if size < len(data):
+            data = data[:size]
 
         if ptype == PDU_TYPE_FULL:
-            if len(data) < offset + 12:
+            if size < offset + 12:
                 raise ValueError("FULL too small")
-            width, height, jpg_len = struct.unpack(">III", data[offset:offset+12])
+            width, height, jpg_len = struct.unpack_from(">III", data, offset)
             offset += 12
-            if offset + jpg_len > len(data):
+            if offset + jpg_len > size:
                 raise ValueError("FULL jpg length exceeds payload")
-            jpg = data[offset:offset+jpg_len]
-            return {**base, "type": "full", "width": width, "height": height, "jpg": jpg}
+            return FullFrame(seq, ts_ms, flags, data, width, height, data[offset:offset+jpg_len])
 
         elif ptype == PDU_TYPE_RECT:
-            if len(data) < offset + 20:
+            if size < offset + 20:
                 raise ValueError("RECT too small")
-            x, y, w, h, jpg_len = struct.unpack(">IIIII", data[offset:offset+20])
+            x, y, w, h, jpg_len = struct.unpack_from(">IIIII", data, offset)
             offset += 20
-            if offset + 8 > len(data):
+            if offset + 8 > size:
                 raise ValueError("RECT missing full dims")
-            full_w, full_h = struct.unpack(">II", data[offset:offset+8])
+            full_w, full_h = struct.unpack_from(">II", data, offset)
             offset += 8
-            if offset + jpg_len > len(data):
+            if offset + jpg_len > size:
                 raise ValueError("RECT jpg length exceeds payload")
-            jpg = data[offset:offset+jpg_len]
-            return {
-                **base, "type": "rect", "x": x, "y": y, "w": w, "h": h,
-                "full_w": full_w, "full_h": full_h, "jpg": jpg
-            }
+            return RectFrame(seq, ts_ms, flags, data, x, y, w, h, full_w, full_h, data[offset:offset+jpg_len])
 
         elif ptype == PDU_TYPE_CONTROL:
-            if len(data) < offset + 4:
+            if size < offset + 4:
                 raise ValueError("CONTROL missing length")
-            (msg_len,) = struct.unpack(">I", data[offset:offset+4])
+            (msg_len,) = struct.unpack_from(">I", data, offset)
             offset += 4
-            if offset + msg_len > len(data):
+            if offset + msg_len > size:
                 raise ValueError("CONTROL msg exceeds payload")
             msg = data[offset:offset+msg_len]
-            return {**base, "type": "control", "message": msg.decode(errors="ignore"), "raw_message": msg}
+            return Control(seq, ts_ms, flags, data, str(msg, "utf-8", "ignore"), msg)
 
         elif ptype == PDU_TYPE_INPUT:
-            if len(data) < offset + 4:
+            if size < offset + 4:
                 raise ValueError("INPUT missing length")
-            (msg_len,) = struct.unpack(">I", data[offset:offset+4])
+            (msg_len,) = struct.unpack_from(">I", data, offset)
             offset += 4
-            if offset + msg_len > len(data):
+            if offset + msg_len > size:
                 raise ValueError("INPUT body exceeds payload")
-            body = data[offset:offset+msg_len]
-            obj = None
-            try:
-                obj = json.loads(body.decode())
-            except Exception:
-                pass
-            return {**base, "type": "input", "input": obj, "raw_body": body}
+            # JSON chỉ được giải mã khi truy cập Input.input
+            return Input(seq, ts_ms, flags, data, data[offset:offset+msg_len])
 
         elif ptype == PDU_TYPE_CURSOR:
-            if len(data) < offset + 12:
+            if size < offset + 12:
                 raise ValueError("CURSOR too small")
-            x, y, shape_len = struct.unpack(">III", data[offset:offset+12])
+            x, y, shape_len = struct.unpack_from(">III", data, offset)
             offset += 12
-            
-            cursor_shape = data[offset:offset+shape_len]
-            
-            return {
-                **base, "type": "cursor", "x": x, "y": y, 
-                "cursor_shape": cursor_shape
-            }
+            return Cursor(seq, ts_ms, flags, data, x, y, data[offset:offset+shape_len])
+
+        elif ptype == PDU_TYPE_FRAME_ACK:
+            if size < offset + FRAME_ACK_SIZE:
+                raise ValueError("FRAME_ACK too small")
+            last_seq, frame_ts_ms, decode_us, render_us, frames, dropped = struct.unpack_from(FRAME_ACK_FMT, data, offset)
+            return FrameAck(seq, ts_ms, flags, data, last_seq, frame_ts_ms,
+                            decode_us / 1000.0, render_us / 1000.0, frames, dropped)
+
+        elif ptype == PDU_TYPE_THUMB:
+            if size < offset + THUMB_HDR_SIZE:
+                raise ValueError("THUMB too small")
+            width, height, src_len, data_len = struct.unpack_from(THUMB_HDR_FMT, data, offset)
+            offset += THUMB_HDR_SIZE
+            if src_len > data_len or offset + data_len > size:
+                raise ValueError("THUMB data exceeds payload")
+            source = str(data[offset:offset+src_len], "utf-8", "ignore")
+            return Thumbnail(seq, ts_ms, flags, data, width, height, source, data[offset+src_len:offset+data_len])
 
         elif ptype == PDU_TYPE_FILE_START:
-            if len(data) < offset + 2:
+            if size < offset + 2:
                 raise ValueError("FILE_START too small")
-            fn_len, = struct.unpack(">H", data[offset:offset+2])
+            fn_len, = struct.unpack_from(">H", data, offset)
             offset += 2
-            if offset + fn_len + 16 > len(data):
+            if offset + fn_len + 16 > size:
                 raise ValueError("FILE_START missing fields")
-            filename = data[offset:offset+fn_len].decode(errors="ignore")
+            filename = str(data[offset:offset+fn_len], "utf-8", "ignore")
             offset += fn_len
-            total_size, chunk_size, checksum = struct.unpack(">Q I I", data[offset:offset+16])
-            return {
-                **base, "type": "file_start", "filename": filename,
-                "total_size": total_size, "chunk_size": chunk_size, "checksum": checksum
-            }
+            total_size, chunk_size, checksum = struct.unpack_from(">Q I I", data, offset)
+            transfer_id = b""
+            if flags & FILE_START_FLAG_RESUME:
+                # [THÊM] mã transfer (tiếp tục sau khi mất kết nối)
+                offset += 16
+                if offset + FILE_TRANSFER_ID_SIZE > size:
+                    raise ValueError("FILE_START missing transfer id")
+                transfer_id = bytes(data[offset:offset + FILE_TRANSFER_ID_SIZE])
+            return FileStart(seq, ts_ms, flags, data, filename, total_size, chunk_size, checksum, transfer_id)
         
         elif ptype == PDU_TYPE_FILE_CHUNK:
-            if len(data) < offset + 12:
+            if size < offset + 12:
                 raise ValueError("FILE_CHUNK too small")
-            frag_offset, chunk_len = struct.unpack(">Q I", data[offset:offset+12])
+            frag_offset, chunk_len = struct.unpack_from(">Q I", data, offset)
             offset += 12
-            if offset + chunk_len > len(data):
+            if offset + chunk_len > size:
                 raise ValueError("FILE_CHUNK data exceeds payload")
-            chunk_data = data[offset:offset+chunk_len]
-            return {
-                **base, "type": "file_chunk", "offset": frag_offset,
-                "data": chunk_data
-            }
+            crc = None
+            if flags & FILE_CHUNK_FLAG_CRC:
+                # [THÊM] CRC32 của chunk ngay sau dữ liệu
+                if offset + chunk_len + 4 > size:
+                    raise ValueError("FILE_CHUNK missing chunk CRC")
+                (crc,) = struct.unpack_from(">I", data, offset + chunk_len)
+            return FileChunk(seq, ts_ms, flags, data, frag_offset, data[offset:offset+chunk_len], crc)
         
         elif ptype == PDU_TYPE_FILE_END:
-            if len(data) < offset + 4:
+            if size < offset + 4:
                 raise ValueError("FILE_END too small")
-            (checksum,) = struct.unpack(">I", data[offset:offset+4])
-            return {**base, "type": "file_end", "checksum": checksum}
+            (checksum,) = struct.unpack_from(">I", data, offset)
+            return FileEnd(seq, ts_ms, flags, data, checksum)
         
         elif ptype == PDU_TYPE_FILE_ACK:
-            if len(data) < offset + 8:
+            if size < offset + 8:
                 raise ValueError("FILE_ACK too small")
-            (ack_offset,) = struct.unpack(">Q", data[offset:offset+8])
-            return {**base, "type": "file_ack", "ack_offset": ack_offset}
+            (ack_offset,) = struct.unpack_from(">Q", data, offset)
+            offset += 8
+            transfer_id = b""
+            if flags & FILE_ACK_FLAG_RESUME:
+                # [THÊM] trả lời FILE_START tiếp tục transfer
+                if offset + FILE_TRANSFER_ID_SIZE > size:
+                    raise ValueError("FILE_ACK missing transfer id")
+                transfer_id = bytes(data[offset:offset + FILE_TRANSFER_ID_SIZE])
+                offset += FILE_TRANSFER_ID_SIZE
+            sack = ()
+            if flags & FILE_ACK_FLAG_SACK:
+                # [THÊM] selective ACK: số khối (H) + các đoạn [start, end) đã nhận
+                if size < offset + 2:
+                    raise ValueError("FILE_ACK missing SACK count")
+                (n_blocks,) = struct.unpack_from(">H", data, offset)
+                offset += 2
+                if offset + n_blocks * FILE_SACK_BLOCK_SIZE > size:
+                    raise ValueError("FILE_ACK SACK blocks exceed payload")
+                sack = tuple(struct.iter_unpack(FILE_SACK_BLOCK_FMT, data[offset:offset + n_blocks * FILE_SACK_BLOCK_SIZE]))
+            return FileAck(seq, ts_ms, flags, data, ack_offset, sack, transfer_id)
         
         elif ptype == PDU_TYPE_FILE_NAK:
-            if len(data) < offset + 12:
+            if size < offset + 12:
                 raise ValueError("FILE_NAK too small")
-            frag_offset, reason_len = struct.unpack(">Q I", data[offset:offset+12])
+            frag_offset, reason_len = struct.unpack_from(">Q I", data, offset)
             offset += 12
-            if offset + reason_len > len(data):
+            if offset + reason_len > size:
                 raise ValueError("FILE_NAK reason exceeds payload")
             reason = data[offset:offset+reason_len]
-            return {
-                **base, "type": "file_nak", "offset": frag_offset,
-                "reason": reason.decode(errors="ignore"), "raw_reason": reason
-            }
+            return FileNak(seq, ts_ms, flags, data, frag_offset, str(reason, "utf-8", "ignore"), reason)
 
-        return {**base, "type": "unknown", "ptype": ptype}
+        return UnknownPDU(seq, ts_ms, flags, data, ptype)
@@ -0,0 +1,268 @@
+# common_network/pdu_records.py
+
+import json
+from typing import Optional
+from common_network.constants import (
+    PDU_TYPE_FULL, PDU_TYPE_RECT, PDU_TYPE_CONTROL, PDU_TYPE_INPUT, PDU_TYPE_CURSOR, PDU_TYPE_FRAME_ACK, PDU_TYPE_THUMB,
+    PDU_TYPE_FILE_START, PDU_TYPE_FILE_CHUNK, PDU_TYPE_FILE_END, PDU_TYPE_FILE_ACK, PDU_TYPE_FILE_NAK,
+    FRAGMENT_FLAG,
+)
+
+"""
+Các lớp bản ghi (record) PDU gọn nhẹ dùng __slots__, thay cho dict tạo mới cho mỗi PDU.
+- Mỗi lớp có `ptype` (số nguyên, dùng để routing) và `type_name` (chuỗi, dùng để log).
+- `raw` là toàn bộ PDU trên đường truyền (bytes hoặc memoryview trỏ vào buffer nhận),
+  server chuyển tiếp nguyên `raw` mà không sao chép.
+- Các trường payload (jpg, data, ...) là lát cắt của `raw` (memoryview -> không sao chép).
+"""
+
+# Tên loại PDU (dùng cho log)
+PDU_TYPE_NAMES = {
+    PDU_TYPE_FULL: "full",
+    PDU_TYPE_RECT: "rect",
+    PDU_TYPE_CONTROL: "control",
+    PDU_TYPE_INPUT: "input",
+    PDU_TYPE_CURSOR: "cursor",
+    PDU_TYPE_FRAME_ACK: "frame_ack",
+    PDU_TYPE_THUMB: "thumb",
+    PDU_TYPE_FILE_START: "file_start",
+    PDU_TYPE_FILE_CHUNK: "file_chunk",
+    PDU_TYPE_FILE_END: "file_end",
+    PDU_TYPE_FILE_ACK: "file_ack",
+    PDU_TYPE_FILE_NAK: "file_nak",
+}
+
+FILE_PDU_TYPES = frozenset((
+    PDU_TYPE_FILE_START, PDU_TYPE_FILE_CHUNK, PDU_TYPE_FILE_END, PDU_TYPE_FILE_ACK, PDU_TYPE_FILE_NAK,
+))
+VIDEO_PDU_TYPES = frozenset((PDU_TYPE_FULL, PDU_TYPE_RECT))
+
+
+class PDURecord:
+    __slots__ = ("seq", "ts_ms", "flags", "raw", "client_id")
+    ptype = 0
+    type_name = "unknown"
+
+    def __init__(self, seq: int = 0, ts_ms: int = 0, flags: int = 0, raw=None):
+        self.seq = seq
+        self.ts_ms = ts_ms
+        self.flags = flags
+        self.raw = raw
+        self.client_id = None # server gán id của kết nối gửi PDU
+
+    @property
+    def is_fragment(self) -> bool:
+        return (self.flags & FRAGMENT_FLAG) != 0
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(seq={self.seq}, len={len(self.raw) if self.raw is not None else 0})"
+
+
+class FullFrame(PDURecord):
+    __slots__ = ("width", "height", "jpg")
+    ptype = PDU_TYPE_FULL
+    type_name = "full"
+
+    def __init__(self, seq, ts_ms, flags, raw, width: int, height: int, jpg):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.width = width
+        self.height = height
+        self.jpg = jpg
+
+
+class RectFrame(PDURecord):
+    __slots__ = ("x", "y", "w", "h", "full_w", "full_h", "jpg")
+    ptype = PDU_TYPE_RECT
+    type_name = "rect"
+
+    def __init__(self, seq, ts_ms, flags, raw, x: int, y: int, w: int, h: int, full_w: int, full_h: int, jpg):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.full_w = full_w
+        self.full_h = full_h
+        self.jpg = jpg
+
+
+class Control(PDURecord):
+    __slots__ = ("message", "raw_message")
+    ptype = PDU_TYPE_CONTROL
+    type_name = "control"
+
+    def __init__(self, seq, ts_ms, flags, raw, message: str, raw_message=b""):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.message = message
+        self.raw_message = raw_message
+
+    def __repr__(self) -> str:
+        return f"Control(seq={self.seq}, message={self.message!r})"
+
+
+class Input(PDURecord):
+    __slots__ = ("raw_body", "_input")
+    ptype = PDU_TYPE_INPUT
+    type_name = "input"
+
+    def __init__(self, seq, ts_ms, flags, raw, raw_body, input_obj: Optional[dict] = None):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.raw_body = raw_body
+        self._input = input_obj
+
+    @property
+    def input(self) -> Optional[dict]:
+        """Sự kiện input (JSON chỉ được giải mã khi truy cập lần đầu, server relay không cần)."""
+        if self._input is None and self.raw_body:
+            try:
+                self._input = json.loads(str(self.raw_body, "utf-8"))
+            except Exception:
+                self._input = None
+        return self._input
+
+    def __repr__(self) -> str:
+        return f"Input(seq={self.seq}, input={self.input!r})"
+
+
+class Cursor(PDURecord):
+    __slots__ = ("x", "y", "cursor_shape")
+    ptype = PDU_TYPE_CURSOR
+    type_name = "cursor"
+
+    def __init__(self, seq, ts_ms, flags, raw, x: int, y: int, cursor_shape=b""):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.x = x
+        self.y = y
+        self.cursor_shape = cursor_shape
+
+
+class FrameAck(PDURecord):
+    """
+    Manager báo đã hiển thị tới frame `last_seq` (gửi định kỳ, không phải mỗi frame).
+    `frame_ts_ms` là ts_ms (lúc chụp, đồng hồ client) của frame đó, trả lại nguyên vẹn để client
+    tự tính độ trễ đầu-cuối trên đồng hồ của chính nó.
+    """
+    __slots__ = ("last_seq", "frame_ts_ms", "decode_ms", "render_ms", "frames", "dropped")
+    ptype = PDU_TYPE_FRAME_ACK
+    type_name = "frame_ack"
+
+    def __init__(self, seq, ts_ms, flags, raw, last_seq: int, frame_ts_ms: int,
+                 decode_ms: float, render_ms: float, frames: int, dropped: int = 0):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.last_seq = last_seq
+        self.frame_ts_ms = frame_ts_ms
+        self.decode_ms = decode_ms
+        self.render_ms = render_ms
+        self.frames = frames
+        self.dropped = dropped
+
+    def __repr__(self) -> str:
+        return (f"FrameAck(last_seq={self.last_seq}, decode_ms={self.decode_ms:.1f}, "
+                f"render_ms={self.render_ms:.1f}, frames={self.frames}, dropped={self.dropped})")
+
+
+class Thumbnail(PDURecord):
+    """
+    Ảnh thu nhỏ màn hình của 1 client (luồng phụ, độ phân giải / fps thấp).
+    Client gửi với source rỗng; server điền `source` = id kết nối của client trước khi chuyển tiếp
+    cho các manager đã đăng ký, để manager biết ảnh thuộc ô nào trên màn hình tổng quan.
+    """
+    __slots__ = ("width", "height", "source", "jpg")
+    ptype = PDU_TYPE_THUMB
+    type_name = "thumb"
+
+    def __init__(self, seq, ts_ms, flags, raw, width: int, height: int, source: str, jpg):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.width = width
+        self.height = height
+        self.source = source
+        self.jpg = jpg
+
+    def __repr__(self) -> str:
+        return f"Thumbnail(seq={self.seq}, source={self.source!r}, size={self.width}x{self.height})"
+
+
+class FileStart(PDURecord):
+    __slots__ = ("filename", "total_size", "chunk_size", "checksum", "transfer_id")
+    ptype = PDU_TYPE_FILE_START
+    type_name = "file_start"
+
+    def __init__(self, seq, ts_ms, flags, raw, filename: str, total_size: int, chunk_size: int, checksum: int,
+                 transfer_id: bytes = b""):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.filename = filename
+        self.total_size = total_size
+        self.chunk_size = chunk_size
+        self.checksum = checksum
+        self.transfer_id = transfer_id # [THÊM] mã transfer (b"": không tiếp tục được sau khi mất kết nối)
+
+
+class FileChunk(PDURecord):
+    __slots__ = ("offset", "data", "crc")
+    ptype = PDU_TYPE_FILE_CHUNK
+    type_name = "file_chunk"
+
+    def __init__(self, seq, ts_ms, flags, raw, offset: int, data, crc: Optional[int] = None):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.offset = offset
+        self.data = data
+        self.crc = crc # [THÊM] CRC32 của data (None: bên gửi không kèm)
+
+
+class FileEnd(PDURecord):
+    __slots__ = ("checksum",)
+    ptype = PDU_TYPE_FILE_END
+    type_name = "file_end"
+
+    def __init__(self, seq, ts_ms, flags, raw, checksum: int):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.checksum = checksum
+
+
+class FileAck(PDURecord):
+    __slots__ = ("ack_offset", "sack", "transfer_id")
+    ptype = PDU_TYPE_FILE_ACK
+    type_name = "file_ack"
+
+    def __init__(self, seq, ts_ms, flags, raw, ack_offset: int, sack=(), transfer_id: bytes = b""):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.ack_offset = ack_offset
+        self.sack = sack # [THÊM] ((start, end), ...): các đoạn đã nhận sau ack_offset (selective ACK)
+        self.transfer_id = transfer_id # [THÊM] khác b"": trả lời FILE_START tiếp tục transfer này
+
+
+class FileNak(PDURecord):
+    __slots__ = ("offset", "reason", "raw_reason")
+    ptype = PDU_TYPE_FILE_NAK
+    type_name = "file_nak"
+
+    def __init__(self, seq, ts_ms, flags, raw, offset: int, reason: str, raw_reason=b""):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.offset = offset
+        self.reason = reason
+        self.raw_reason = raw_reason
+
+
+class Fragment(PDURecord):
+    """
+    Một fragment chưa được lắp ráp (server chỉ chuyển tiếp, parse với reassemble=False).
+    `ptype` là loại của PDU gốc để routing đúng kênh.
+    """
+    __slots__ = ("ptype",)
+
+    def __init__(self, seq, ts_ms, flags, raw, ptype: int):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.ptype = ptype
+
+    @property
+    def type_name(self) -> str:
+        return PDU_TYPE_NAMES.get(self.ptype, "unknown")
+
+
+class UnknownPDU(PDURecord):
+    __slots__ = ("ptype",)
+    type_name = "unknown"
+
+    def __init__(self, seq, ts_ms, flags, raw, ptype: int):
+        super().__init__(seq, ts_ms, flags, raw)
+        self.ptype = ptype
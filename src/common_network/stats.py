@@ -0,0 +1,107 @@
+# common_network/stats.py
+
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+"""
+Các bộ đếm thống kê nhẹ dùng chung (đo độ trễ, thông lượng, ...).
+Thread-safe (dùng lock), chi phí ghi O(1) để có thể gọi trên đường nóng (hot path).
+"""
+
+
+class LatencyHistogram:
+    """
+    Lưu N mẫu độ trễ gần nhất (ms) trong một deque vòng, tính phân vị khi cần.
+    - record(ms): O(1)
+    - percentile(p) / summary(): sắp xếp bản sao các mẫu (chỉ gọi khi báo cáo)
+    """
+    def __init__(self, max_samples: int = 100_000):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0 # tổng số mẫu đã ghi (kể cả mẫu đã bị đẩy khỏi deque)
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, value_ms: float) -> None:
+        with self.lock:
+            self.samples.append(value_ms)
+            self.count += 1
+            self.total += value_ms
+            if value_ms > self.max:
+                self.max = value_ms
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self.lock:
+            data = sorted(self.samples)
+        return self._pick(data, p)
+
+    @staticmethod
+    def _pick(sorted_data, p: float) -> Optional[float]:
+        if not sorted_data:
+            return None
+        idx = min(len(sorted_data) - 1, max(0, int(round(p / 100.0 * (len(sorted_data) - 1)))))
+        return sorted_data[idx]
+
+    def since(self, count: int):
+        """Các mẫu ghi sau thời điểm self.count == count (tối đa số mẫu còn trong deque) và count hiện tại."""
+        with self.lock:
+            n = min(self.count - count, len(self.samples))
+            data = list(itertools.islice(self.samples, len(self.samples) - n, None)) if n > 0 else []
+            return data, self.count
+
+    def summary(self) -> Dict[str, float]:
+        with self.lock:
+            data = sorted(self.samples)
+            count, total, mx = self.count, self.total, self.max
+        return {
+            "count": count,
+            "mean": (total / count) if count else 0.0,
+            "p50": self._pick(data, 50) or 0.0,
+            "p99": self._pick(data, 99) or 0.0,
+            "max": mx,
+        }
+
+    def reset(self) -> None:
+        with self.lock:
+            self.samples.clear()
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+
+class WriteStats:
+    """
+    Đếm số lần ghi (sendall / transport.write), số byte và số MCS frame đã gửi,
+    để thấy hiệu quả gộp ghi: syscalls/giây, bytes/syscall, frames/syscall.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def record(self, nbytes: int, nframes: int = 1, nwrites: int = 1) -> None:
+        with self.lock:
+            self.writes += nwrites
+            self.bytes += nbytes
+            self.frames += nframes
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            writes, nbytes, frames = self.writes, self.bytes, self.frames
+        return {
+            "writes": writes,
+            "bytes": nbytes,
+            "frames": frames,
+            "writes_per_sec": writes / elapsed,
+            "bytes_per_write": (nbytes / writes) if writes else 0.0,
+            "frames_per_write": (frames / writes) if writes else 0.0,
+        }
+
+    def reset(self) -> None:
+        self.writes = 0
+        self.bytes = 0
+        self.frames = 0
+        self.started = time.monotonic()
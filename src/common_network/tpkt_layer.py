@@ -2,7 +2,12 @@
 
 import struct
 import time
-from common_network.constants import TPKT_HEADER_FMT, TPKT_OVERHEAD, MAX_TPKT_LENGTH
+from common_network.constants import (
+    TPKT_HEADER_FMT, TPKT_OVERHEAD, MAX_TPKT_LENGTH,
+    TPKT_EXT_FLAG, TPKT_EXT_HEADER_FMT, TPKT_EXT_OVERHEAD, MAX_EXT_TPKT_LENGTH,
+)
+
+_TPKT_EXT_LO = struct.Struct(">H")
 
 class TPKTLayer:
     # nhận chính xác n bytes từ socket 
@@ -32,6 +37,36 @@ class TPKTLayer:
             raise ValueError(f"TPKT too large: {total_len}")
         return struct.pack(TPKT_HEADER_FMT, 0x03, 0x00, total_len) + body
 
+    # chỉ tạo TPKT header cho body dài body_len (gửi header và body riêng, không nối buffer)
+    @staticmethod
+    def pack_header(body_len: int) -> bytes:
+        total_len = TPKT_OVERHEAD + body_len
+        if total_len > MAX_TPKT_LENGTH:
+            raise ValueError(f"TPKT too large: {total_len}")
+        return struct.pack(TPKT_HEADER_FMT, 0x03, 0x00, total_len)
+
+    # [THÊM] header TPKT mở rộng (length 32-bit, cờ TPKT_EXT_FLAG trong byte reserved).
+    # Chỉ dùng khi peer đã đàm phán EXTLEN32.
+    @staticmethod
+    def pack_ext_header(body_len: int) -> bytes:
+        total_len = TPKT_EXT_OVERHEAD + body_len
+        if total_len > MAX_EXT_TPKT_LENGTH:
+            raise ValueError(f"TPKT too large: {total_len}")
+        return struct.pack(TPKT_EXT_HEADER_FMT, 0x03, TPKT_EXT_FLAG, total_len)
+
+    # [THÊM] tính và kiểm tra độ dài tổng từ header; dạng mở rộng: length (4 byte đầu) là 16 bit cao,
+    # lo (2 byte đọc thêm) là 16 bit thấp. Trả về (total_len, overhead). Dùng chung cho bản socket và asyncio.
+    @staticmethod
+    def _check_length(rsv: int, length: int, lo: int = 0):
+        if rsv & TPKT_EXT_FLAG:
+            total_len = (length << 16) | lo
+            if total_len < TPKT_EXT_OVERHEAD or total_len > MAX_EXT_TPKT_LENGTH:
+                raise ValueError(f"Invalid TPKT total_len {total_len}")
+            return total_len, TPKT_EXT_OVERHEAD
+        if length < TPKT_OVERHEAD or length > MAX_TPKT_LENGTH:
+            raise ValueError(f"Invalid TPKT total_len {length}")
+        return length, TPKT_OVERHEAD
+
     # gỡ TPKT header, trả về (version, reserved, length)
     @staticmethod
     def unpack_header(hdr: bytes):
@@ -41,11 +76,52 @@ class TPKTLayer:
     @staticmethod
     def recv_one(sock, recv_fn=None, timeout=10):
         hdr = TPKTLayer.recv_exact(sock, TPKT_OVERHEAD, recv_fn=recv_fn, timeout=timeout)
-        ver, rsv, total_len = struct.unpack(TPKT_HEADER_FMT, hdr)
+        ver, rsv, length = struct.unpack(TPKT_HEADER_FMT, hdr)
+        lo = 0
+        if rsv & TPKT_EXT_FLAG:
+            (lo,) = _TPKT_EXT_LO.unpack(TPKTLayer.recv_exact(sock, 2, recv_fn=recv_fn, timeout=timeout))
+        total_len, overhead = TPKTLayer._check_length(rsv, length, lo)
 
-        if total_len < TPKT_OVERHEAD or total_len > MAX_TPKT_LENGTH:
-            raise ValueError(f"Invalid TPKT total_len {total_len}")
-
-        body_len = total_len - TPKT_OVERHEAD
+        body_len = total_len - overhead
         body = TPKTLayer.recv_exact(sock, body_len, recv_fn=recv_fn, timeout=timeout)
         return body
+
+
+    # đọc một TPKT đầy đủ, nhận body thẳng vào một bytearray riêng (recv_into) và trả về memoryview.
+    # Buffer này không bị sửa đổi về sau nên các lớp trên có thể giữ lát cắt (slice) mà không sao chép.
+    @staticmethod
+    def recv_one_view(sock, timeout=10) -> memoryview:
+        hdr = TPKTLayer.recv_exact(sock, TPKT_OVERHEAD, timeout=timeout)
+        ver, rsv, length = struct.unpack(TPKT_HEADER_FMT, hdr)
+        lo = 0
+        if rsv & TPKT_EXT_FLAG:
+            (lo,) = _TPKT_EXT_LO.unpack(TPKTLayer.recv_exact(sock, 2, timeout=timeout))
+        total_len, overhead = TPKTLayer._check_length(rsv, length, lo)
+
+        body_len = total_len - overhead
+        body = bytearray(body_len)
+        view = memoryview(body)
+        got = 0
+        start = time.time()
+        while got < body_len:
+            if time.time() - start > timeout:
+                raise TimeoutError("TPKT recv_one_view timeout")
+            n = sock.recv_into(view[got:], body_len - got)
+            if not n:
+                raise ConnectionError("socket closed during recv_one_view")
+            got += n
+        return view
+
+    # [THÊM] đọc một TPKT đầy đủ từ asyncio StreamReader, trả về body dưới dạng memoryview
+    # (readexactly trả về bytes bất biến nên các lớp trên giữ lát cắt mà không cần sao chép)
+    @staticmethod
+    async def recv_one_async(reader) -> memoryview:
+        hdr = await reader.readexactly(TPKT_OVERHEAD)
+        ver, rsv, length = struct.unpack(TPKT_HEADER_FMT, hdr)
+        lo = 0
+        if rsv & TPKT_EXT_FLAG:
+            (lo,) = _TPKT_EXT_LO.unpack(await reader.readexactly(2))
+        total_len, overhead = TPKTLayer._check_length(rsv, length, lo)
+
+        body = await reader.readexactly(total_len - overhead)
+        return memoryview(body)
@@ -0,0 +1,169 @@
+# common_network/tpkt_writer.py
+
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+from common_network.tpkt_layer import TPKTLayer
+from common_network.mcs_layer import MCSLite
+from common_network.pdu_builder import PDUBuilder
+from common_network.constants import MCS_HDR_SIZE, MAX_MCS_PAYLOAD, MAX_BODY_SIZE_PER_FRAGMENT
+from common_network.stats import WriteStats
+
+"""
+Gộp ghi (write coalescing): nhiều gói TPKT(MCS(PDU)) nhỏ được nối vào MỘT buffer và gửi bằng
+một lần sendall -> ít TLS record và ít syscall hơn (đặc biệt với cursor ~30 byte).
+SSLSocket không hỗ trợ sendmsg (scatter-gather) nên gói nhỏ được nối bằng b"".join,
+payload lớn được gửi thẳng (không sao chép).
+"""
+
+DEFAULT_MAX_BATCH = 64 * 1024          # số byte tối đa trong 1 lần sendall
+DEFAULT_MAX_PENDING = 4 * 1024 * 1024  # vượt ngưỡng này thì send() chặn bên gọi (backpressure)
+
+
+def frame_header(channel_id: int, payload_len: int, ext_framing: bool = False) -> bytes:
+    """
+    Header TPKT + MCS cho 1 PDU dài payload_len.
+    ext_framing (peer đã đàm phán EXTLEN32): PDU vượt giới hạn 16-bit dùng header mở rộng (length 32-bit);
+    PDU nhỏ vẫn dùng header thường. Không có ext_framing thì PDU quá lớn -> ValueError (phải phân mảnh trước).
+    """
+    if ext_framing and payload_len > MAX_MCS_PAYLOAD:
+        mcs_hdr = MCSLite.build_header(channel_id, payload_len)
+        return TPKTLayer.pack_ext_header(len(mcs_hdr) + payload_len) + mcs_hdr
+    return TPKTLayer.pack_header(MCS_HDR_SIZE + payload_len) + MCSLite.build_header(channel_id, payload_len)
+
+
+def legacy_frames(payload) -> list:
+    """
+    Chia PDU thành các MCS payload vừa framing 16-bit (cho peer không hỗ trợ EXTLEN32).
+    PDU đủ nhỏ được trả về nguyên vẹn; PDU lớn được phân mảnh (PDUBuilder.fragmentize).
+    """
+    if len(payload) <= MAX_MCS_PAYLOAD:
+        return [payload]
+    return [frag for _, frag in PDUBuilder.fragmentize(payload, MAX_BODY_SIZE_PER_FRAGMENT)]
+
+
+class FrameBatch:
+    """
+    Danh sách MCS frame chờ gửi. take() gộp các frame đầu hàng thành các đoạn (segment) để sendall:
+    - header + payload nhỏ được nối liền thành 1 đoạn,
+    - payload lớn (>= JOIN_LIMIT, ví dụ fragment video) là 1 đoạn riêng, KHÔNG bị sao chép
+      (header của nó vẫn được nối vào đoạn trước).
+    """
+    __slots__ = ("frames", "nbytes", "ext_framing")
+
+    JOIN_LIMIT = 16 * 1024
+
+    def __init__(self, ext_framing: bool = False):
+        self.frames = deque() # (header, payload)
+        self.nbytes = 0
+        self.ext_framing = ext_framing # peer hỗ trợ EXTLEN32: PDU lớn đi nguyên khối
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def add(self, channel_id: int, payload) -> None:
+        header = frame_header(channel_id, len(payload), self.ext_framing)
+        self.frames.append((header, payload))
+        self.nbytes += len(header) + len(payload)
+
+    def take(self, max_bytes: Optional[int] = None) -> Tuple[List, int, int]:
+        """
+        Lấy các frame đầu hàng (ít nhất 1) sao cho tổng <= max_bytes.
+        Trả về (danh sách đoạn cần sendall theo thứ tự, tổng số byte, số frame).
+        """
+        segments = []
+        parts = []
+        total = 0
+        count = 0
+        frames = self.frames
+        join_limit = self.JOIN_LIMIT
+        while frames:
+            header, payload = frames[0]
+            size = len(header) + len(payload)
+            if count and max_bytes is not None and total + size > max_bytes:
+                break
+            frames.popleft()
+            parts.append(header)
+            if len(payload) >= join_limit:
+                segments.append(b"".join(parts))
+                segments.append(payload)
+                parts = []
+            else:
+                parts.append(payload)
+            total += size
+            count += 1
+        if parts:
+            segments.append(b"".join(parts))
+        self.nbytes -= total
+        return segments, total, count
+
+
+class TPKTWriter(threading.Thread):
+    """
+    Thread ghi riêng cho MỘT kết nối (ClientNetwork, ManagerApp).
+    - send(): chỉ xếp frame vào buffer rồi trả về ngay (chặn nếu buffer vượt max_pending).
+    - run(): lấy các frame đang chờ (tối đa max_batch byte) và gửi bằng ít lần sendall nhất.
+      Khi tải thấp, mỗi frame được gửi ngay (không thêm độ trễ); khi tải cao, các frame
+      dồn lại trong lúc sendall trước đang chạy sẽ được gộp vào lần gửi kế tiếp.
+    - linger: (giây) chờ thêm trước mỗi lần gửi để gộp nhiều hơn (mặc định 0).
+    - on_error(e): gọi khi sendall lỗi (kết nối hỏng), writer dừng.
+    - ext_framing: kết nối đã đàm phán EXTLEN32 (PDU > 64 KB được gửi nguyên khối).
+    """
+    def __init__(self, sock, name: str = "TPKTWriter", max_batch: int = DEFAULT_MAX_BATCH,
+                 max_pending: int = DEFAULT_MAX_PENDING, linger: float = 0.0, on_error=None,
+                 ext_framing: bool = False):
+        super().__init__(daemon=True, name=name)
+        self.sock = sock
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.linger = linger
+        self.on_error = on_error
+        self.ext_framing = ext_framing
+
+        self.cond = threading.Condition()
+        self.batch = FrameBatch(ext_framing)
+        self.running = True
+        self.stats = WriteStats()
+
+    def send(self, channel_id: int, payload) -> bool:
+        with self.cond:
+            while self.running and self.batch.nbytes >= self.max_pending:
+                self.cond.wait(0.5) # backpressure: chờ writer gửi bớt
+            if not self.running:
+                return False
+            self.batch.add(channel_id, payload)
+            self.cond.notify_all()
+        return True
+
+    def run(self):
+        try:
+            while True:
+                with self.cond:
+                    while self.running and not self.batch:
+                        self.cond.wait(0.5)
+                    if not self.running:
+                        break
+                if self.linger:
+                    time.sleep(self.linger)
+                with self.cond:
+                    segments, nbytes, nframes = self.batch.take(self.max_batch)
+                    self.cond.notify_all() # đánh thức bên gửi đang bị chặn (backpressure)
+                for seg in segments:
+                    self.sock.sendall(seg)
+                self.stats.record(nbytes, nframes, len(segments))
+        except Exception as e:
+            if self.running:
+                self.running = False
+                if self.on_error:
+                    self.on_error(e)
+        finally:
+            with self.cond:
+                self.running = False
+                self.batch = FrameBatch(self.ext_framing)
+                self.cond.notify_all()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
@@ -0,0 +1,270 @@
+# common_network/transfer_journal.py
+
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+"""
+Nhật ký truyền file (SQLite, WAL) cho bên gửi: chỉ lưu vị trí các chunk, KHÔNG lưu dữ liệu.
+- transfers: 1 dòng / file (đường dẫn nguồn, tên, kích thước, chunk_size, CRC, trạng thái).
+- chunks: 1 dòng / chunk (transfer_id, offset, length, state). Dữ liệu chunk được đọc lại từ file nguồn
+  theo offset (FileChunkReader, mmap) lúc gửi / gửi lại -> DB chỉ vài chục byte / chunk thay vì cả PDU.
+- ACK (cộng dồn theo offset) = 1 câu UPDATE theo khoảng, không parse lại từng PDU.
+- Transfer xong (đã ACK hết) được đánh dấu DONE và xóa các dòng chunk của nó.
+- Mỗi transfer có mã ngẫu nhiên 16 byte (token) gửi trong FILE_START: bên nhận dùng để tiếp tục file dở.
+- CRC tính dần khi gửi (crc_offset khác NULL): crc = CRC32 của [0, crc_offset), lưu lại theo từng lô chunk
+  để bên gửi khởi động lại không phải đọc lại phần đã tính.
+Thread-safe (1 kết nối, 1 lock): luồng gửi file thêm transfer, luồng nhận ACK cập nhật, vòng gửi đọc.
+
+ReceiveJournal: phía nhận, lưu file dở (<tên>.part) theo token + (offset, length, CRC32) từng chunk đã ghi,
+để sau khi mất kết nối / khởi động lại vẫn trả lời được "đã giữ những đoạn nào" (chunk sai CRC bị bỏ).
+"""
+
+TRANSFER_ACTIVE = 0
+TRANSFER_DONE = 1
+TRANSFER_FAILED = 2 # file nguồn đã bị xóa / thay đổi kích thước: không thể gửi lại
+
+CHUNK_PENDING = 0 # câu SQL ghi thẳng "state=0": điều kiện của chỉ mục một phần chunks_pending
+CHUNK_ACKED = 1
+
+
+class Transfer(NamedTuple):
+    transfer_id: int
+    path: str
+    filename: str
+    total_size: int
+    chunk_size: int
+    crc: int
+    state: int
+    token: Optional[bytes] # None: transfer tạo trước khi có cột token (không tiếp tục được ở bên nhận)
+    crc_offset: Optional[int] # None: crc là CRC cả file, tính trước khi gửi
+    chunk_crc: int # 1: gửi kèm CRC32 của từng chunk
+
+
+_TRANSFER_COLS = "transfer_id, path, filename, total_size, chunk_size, crc, state, token, crc_offset, chunk_crc"
+# Cột thêm sau phiên bản đầu của bảng transfers (DB cũ được ALTER TABLE lúc mở)
+_TRANSFER_EXTRA_COLS = (("token", "BLOB"), ("crc_offset", "INTEGER"), ("chunk_crc", "INTEGER DEFAULT 0"))
+
+
+def _chunk_rows(transfer_id: int, total_size: int, chunk_size: int) -> Iterator[Tuple[int, int, int]]:
+    for offset in range(0, total_size, chunk_size):
+        yield transfer_id, offset, min(chunk_size, total_size - offset)
+
+
+class TransferJournal:
+    def __init__(self, db_path="transfer_journal.db"):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS transfers(
+                transfer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT,
+                filename TEXT,
+                total_size INTEGER,
+                chunk_size INTEGER,
+                crc INTEGER,
+                state INTEGER DEFAULT 0,
+                created REAL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks(
+                transfer_id INTEGER,
+                offset INTEGER,
+                length INTEGER,
+                state INTEGER DEFAULT 0,
+                PRIMARY KEY (transfer_id, offset)
+            ) WITHOUT ROWID
+        """)
+        # Chỉ mục riêng cho chunk chưa ACK: ACK / tìm chunk chờ gửi không phải quét lại các chunk đã ACK
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_pending ON chunks(transfer_id, offset) WHERE state=0")
+        cols = {row[1] for row in self.conn.execute("PRAGMA table_info(transfers)")}
+        for name, decl in _TRANSFER_EXTRA_COLS:
+            if name not in cols:
+                self.conn.execute(f"ALTER TABLE transfers ADD COLUMN {name} {decl}")
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def add_transfer(self, path: str, filename: str, total_size: int, chunk_size: int, crc: int = 0,
+                     crc_offset: Optional[int] = None, chunk_crc: bool = False) -> int:
+        """
+        Ghi transfer + toàn bộ dòng chunk trong 1 transaction. Trả về transfer_id.
+        crc_offset=None: crc là CRC cả file; crc_offset=0: CRC tính dần khi gửi (set_crc).
+        """
+        with self.lock, self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO transfers(path, filename, total_size, chunk_size, crc, state, created, token, crc_offset, chunk_crc) "
+                "VALUES(?,?,?,?,?,?,?,?,?,?)",
+                (path, filename, total_size, chunk_size, crc, TRANSFER_ACTIVE, time.time(), uuid.uuid4().bytes,
+                 crc_offset, int(chunk_crc)))
+            transfer_id = cur.lastrowid
+            self.conn.executemany("INSERT INTO chunks(transfer_id, offset, length) VALUES(?,?,?)",
+                                  _chunk_rows(transfer_id, total_size, chunk_size))
+        return transfer_id
+
+    def get_transfer(self, transfer_id: int) -> Optional[Transfer]:
+        with self.lock:
+            row = self.conn.execute(f"SELECT {_TRANSFER_COLS} FROM transfers WHERE transfer_id=?", (transfer_id,)).fetchone()
+        return Transfer(*row) if row else None
+
+    def active_transfers(self) -> List[Transfer]:
+        """Các transfer chưa xong, theo thứ tự tạo (= thứ tự gửi)."""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {_TRANSFER_COLS} FROM transfers WHERE state=? ORDER BY transfer_id", (TRANSFER_ACTIVE,)).fetchall()
+        return [Transfer(*row) for row in rows]
+
+    def pending_chunks(self, transfer_id: int, after_offset: int = -1, limit: int = 64) -> List[Tuple[int, int]]:
+        """Tối đa limit chunk (offset, length) chưa ACK có offset > after_offset, theo thứ tự offset."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT offset, length FROM chunks WHERE transfer_id=? AND offset>? AND state=0 ORDER BY offset LIMIT ?",
+                (transfer_id, after_offset, limit)).fetchall()
+
+    def ack_through(self, transfer_id: int, ack_offset: int) -> int:
+        """Đánh dấu ACK mọi chunk nằm trọn trong [0, ack_offset). Trả về số chunk vừa được ACK."""
+        with self.lock, self.conn:
+            # Khóa chính (transfer_id, offset) cũng khớp "offset<?" nhưng quét lại mọi chunk đã ACK (O(n) mỗi ACK):
+            # chỉ định rõ chỉ mục chunks_pending để chỉ quét các chunk còn chờ
+            cur = self.conn.execute(
+                "UPDATE chunks INDEXED BY chunks_pending SET state=? WHERE transfer_id=? AND offset<? AND offset+length<=? AND state=0",
+                (CHUNK_ACKED, transfer_id, ack_offset, ack_offset))
+        return cur.rowcount
+
+    def ack_range(self, transfer_id: int, start: int, end: int) -> int:
+        """Đánh dấu ACK mọi chunk nằm trọn trong [start, end) (SACK: đoạn bên nhận đã có sau ack_offset)."""
+        with self.lock, self.conn:
+            cur = self.conn.execute(
+                "UPDATE chunks INDEXED BY chunks_pending SET state=? WHERE transfer_id=? AND offset>=? AND offset<? "
+                "AND offset+length<=? AND state=0",
+                (CHUNK_ACKED, transfer_id, start, end, end))
+        return cur.rowcount
+
+    def set_crc(self, transfer_id: int, crc: int, crc_offset: int) -> None:
+        """Lưu CRC tính dần: crc = CRC32 của [0, crc_offset)."""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE transfers SET crc=?, crc_offset=? WHERE transfer_id=?", (crc, crc_offset, transfer_id))
+
+    def reset_acks(self, transfer_id: int) -> None:
+        """Đưa mọi chunk về chưa ACK: bên nhận trả lời tiếp tục transfer bằng trạng thái của nó (có thể đã mất file dở)."""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE chunks SET state=0 WHERE transfer_id=? AND state=?", (transfer_id, CHUNK_ACKED))
+
+    def acked_offset(self, transfer_id: int) -> int:
+        """Offset liên tục cao nhất đã được ACK (= offset của chunk chưa ACK đầu tiên)."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MIN(offset) FROM chunks INDEXED BY chunks_pending WHERE transfer_id=? AND state=0", (transfer_id,)).fetchone()
+            if row[0] is not None:
+                return row[0]
+            row = self.conn.execute("SELECT total_size FROM transfers WHERE transfer_id=?", (transfer_id,)).fetchone()
+        return row[0] if row else 0
+
+    def remaining(self, transfer_id: int) -> Tuple[int, int]:
+        """(số chunk, số byte) chưa ACK."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks INDEXED BY chunks_pending WHERE transfer_id=? AND state=0",
+                (transfer_id,)).fetchone()
+        return row[0], row[1]
+
+    def finish(self, transfer_id: int, state: int = TRANSFER_DONE) -> None:
+        """Đóng transfer (DONE / FAILED) và xóa các dòng chunk của nó."""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE transfers SET state=? WHERE transfer_id=?", (state, transfer_id))
+            self.conn.execute("DELETE FROM chunks WHERE transfer_id=?", (transfer_id,))
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+RECEIVE_DONE_KEEP = 7 * 24 * 3600 # giây giữ dòng của file đã nhận xong (trả lời FILE_START gửi lại khi mất ACK cuối)
+
+
+class Partial(NamedTuple):
+    token: bytes
+    filename: str
+    part_path: str
+    total_size: int
+    crc: int
+    done: int # 1: đã nhận đủ, đúng CRC và đổi tên thành file thật
+
+
+class ReceiveJournal:
+    def __init__(self, db_path="receive_journal.db"):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS partials(
+                token BLOB PRIMARY KEY,
+                filename TEXT,
+                part_path TEXT,
+                total_size INTEGER,
+                crc INTEGER,
+                done INTEGER DEFAULT 0,
+                created REAL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS received(
+                token BLOB,
+                offset INTEGER,
+                length INTEGER,
+                crc INTEGER,
+                PRIMARY KEY (token, offset)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute("DELETE FROM partials WHERE done=1 AND created<?", (time.time() - RECEIVE_DONE_KEEP,))
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def find(self, token: bytes) -> Optional[Partial]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT token, filename, part_path, total_size, crc, done FROM partials WHERE token=?", (token,)).fetchone()
+        return Partial(*row) if row else None
+
+    def begin(self, token: bytes, filename: str, part_path: str, total_size: int, crc: int) -> None:
+        """Ghi file dở mới (thay bản cũ cùng token nếu có)."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM received WHERE token=?", (token,))
+            self.conn.execute("INSERT OR REPLACE INTO partials(token, filename, part_path, total_size, crc, created) "
+                              "VALUES(?,?,?,?,?,?)", (token, filename, part_path, total_size, crc, time.time()))
+
+    def add_chunks(self, token: bytes, rows: Iterable[Tuple[int, int, int]]) -> None:
+        """Ghi các chunk (offset, length, crc32) đã ghi xuống file dở, 1 transaction."""
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO received(token, offset, length, crc) VALUES(?,?,?,?)",
+                                  ((token, o, n, c) for o, n, c in rows))
+
+    def chunks(self, token: bytes) -> List[Tuple[int, int, int]]:
+        """Các chunk (offset, length, crc32) đã nhận, theo thứ tự offset."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT offset, length, crc FROM received WHERE token=? ORDER BY offset", (token,)).fetchall()
+
+    def drop_chunks(self, token: bytes, offsets: Iterable[int]) -> None:
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM received WHERE token=? AND offset=?", ((token, o) for o in offsets))
+
+    def finish(self, token: bytes) -> None:
+        """File đã nhận xong: bỏ các dòng chunk, giữ dòng partials (done=1)."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM received WHERE token=?", (token,))
+            self.conn.execute("UPDATE partials SET done=1, created=? WHERE token=?", (time.time(), token))
+
+    def remove(self, token: bytes) -> None:
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM received WHERE token=?", (token,))
+            self.conn.execute("DELETE FROM partials WHERE token=?", (token,))
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
@@ -1,11 +1,23 @@
 # common_network/x224_handshake.py
 
 import struct
-from common_network.constants import TPKT_HEADER_FMT
+import asyncio
+from common_network.constants import TPKT_HEADER_FMT, CAP_EXTLEN32
 
 CONNECT_MAGIC = b"X224_CONNECT_V1"
 CONFIRM_MAGIC = b"X224_CONFIRM_V1"
 
+# [THÊM] Đàm phán capability:
+# - client đề nghị bằng các bit trong byte reserved của header TPKT gói connect (CAP_BITS);
+#   body vẫn đúng "X224_CONNECT_V1:<client_id>" -> server cũ (bỏ qua byte reserved, lấy cả phần
+#   sau ":" làm id) vẫn nhận đúng client_id.
+# - server mới chỉ trả "X224_CONFIRM_V1:OK;caps=<phần giao với SUPPORTED_CAPS>" khi client có đề nghị;
+#   client cũ (không đặt bit nào) nhận đúng "X224_CONFIRM_V1:OK" như trước.
+# Bên nào cũ (không đề nghị / không trả caps) -> hai bên dùng framing 16-bit như trước.
+CAPS_SEP = b";caps="
+SUPPORTED_CAPS = frozenset({CAP_EXTLEN32})
+CAP_BITS = {CAP_EXTLEN32: 0x01} # capability -> bit trong byte reserved của TPKT connect
+
 class X224Handshake:
     # nhận chính xác n bytes từ socket
     @staticmethod
@@ -19,12 +31,47 @@ class X224Handshake:
             data.extend(chunk)
         return bytes(data)
 
+    # [THÊM] tách "<giá trị>;caps=A,B" thành (giá trị, tập caps) - dùng cho body confirm
+    @staticmethod
+    def split_caps(text: bytes):
+        value, sep, caps = text.partition(CAPS_SEP)
+        if not sep:
+            return value, frozenset()
+        return value, frozenset(c for c in caps.decode(errors="ignore").split(",") if c)
+
+    # [THÊM] đọc tập caps server đã chấp nhận từ phản hồi confirm (client dùng)
+    @staticmethod
+    def parse_caps(resp: bytes) -> frozenset:
+        if not isinstance(resp, bytes) or not resp.startswith(CONFIRM_MAGIC + b":"):
+            return frozenset()
+        return X224Handshake.split_caps(resp[len(CONFIRM_MAGIC) + 1:])[1]
+
+    @staticmethod
+    def _encode_caps(caps) -> bytes:
+        return CAPS_SEP + ",".join(sorted(caps)).encode() if caps else b""
+
+    # [THÊM] gói TPKT connect: caps nằm trong byte reserved, body giữ nguyên định dạng cũ
+    @staticmethod
+    def build_connect(client_id: str, caps=None) -> bytes:
+        body = CONNECT_MAGIC + b":" + client_id.encode() # b"X224_CONNECT_V1:MyComputerName"
+        rsv = 0
+        for cap in caps or ():
+            rsv |= CAP_BITS.get(cap, 0)
+        return struct.pack(TPKT_HEADER_FMT, 0x03, rsv, 4 + len(body)) + body
+
+    # [SỬA] server: parse body connect + byte reserved -> (client_id, caps được chấp nhận), tạo body confirm
+    @staticmethod
+    def _accept_connect(body: bytes, rsv: int = 0):
+        _, rest = body.split(b":", 1)
+        caps = frozenset(cap for cap, bit in CAP_BITS.items() if rsv & bit) & SUPPORTED_CAPS
+        resp = CONFIRM_MAGIC + b":OK" + X224Handshake._encode_caps(caps)
+        return rest.decode(errors="ignore"), caps, resp
+
     # gửi yêu cầu kết nối từ client và chờ phản hồi từ server
+    # [SỬA] caps: các capability client đề nghị (ví dụ {CAP_EXTLEN32}); dùng parse_caps(resp) để biết server chấp nhận gì
     @staticmethod
-    def client_send_connect(sock, client_id: str, timeout=10):
-        body = CONNECT_MAGIC + b":" + client_id.encode() # b"X224_CONNECT_V1:MyComputerName
-        hdr = struct.pack(TPKT_HEADER_FMT, 0x03, 0x00, 4 + len(body))
-        sock.sendall(hdr + body)
+    def client_send_connect(sock, client_id: str, timeout=10, caps=None):
+        sock.sendall(X224Handshake.build_connect(client_id, caps))
         sock.settimeout(timeout)
 
         hdr = X224Handshake.recv_all(sock, 4, timeout)
@@ -37,6 +84,7 @@ class X224Handshake:
         return body
 
     # xử lý yêu cầu kết nối từ client và gửi phản hồi từ server
+    # [SỬA] trả về (ok, client_id, caps) - caps: tập capability đã thống nhất với client
     @staticmethod
     def server_do_handshake(sock, timeout=10):
         sock.settimeout(timeout)
@@ -51,7 +99,7 @@ class X224Handshake:
                 sock.sendall(tpkt)
             except:
                 pass
-            return False, None
+            return False, None, frozenset()
 
         body = X224Handshake.recv_all(sock, length - 4, timeout)
         if not body.startswith(CONNECT_MAGIC + b":"):
@@ -61,13 +109,33 @@ class X224Handshake:
                 sock.sendall(tpkt)
             except:
                 pass
-            return False, None
-
-        _, rest = body.split(b":", 1)
-        client_id = rest.decode(errors="ignore")
+            return False, None, frozenset()
 
-        resp = CONFIRM_MAGIC + b":OK"
+        client_id, caps, resp = X224Handshake._accept_connect(body, rsv)
         tpkt = struct.pack(TPKT_HEADER_FMT, 0x03, 0x00, 4 + len(resp)) + resp
         sock.sendall(tpkt)
 
-        return True, client_id
+        return True, client_id, caps
+
+    # [THÊM] phiên bản asyncio của server_do_handshake (dùng asyncio StreamReader/StreamWriter)
+    @staticmethod
+    async def server_do_handshake_async(reader, writer, timeout=10):
+        hdr = await asyncio.wait_for(reader.readexactly(4), timeout)
+        ver, rsv, length = struct.unpack(TPKT_HEADER_FMT, hdr)
+
+        if length > 4096 or length < 4:
+            bad = b"BAD_TOO_LARGE"
+            writer.write(struct.pack(TPKT_HEADER_FMT, 0x03, 0x00, 4 + len(bad)) + bad)
+            return False, None, frozenset()
+
+        body = await asyncio.wait_for(reader.readexactly(length - 4), timeout)
+        if not body.startswith(CONNECT_MAGIC + b":"):
+            bad = b"BAD_MAGIC"
+            writer.write(struct.pack(TPKT_HEADER_FMT, 0x03, 0x00, 4 + len(bad)) + bad)
+            return False, None, frozenset()
+
+        client_id, caps, resp = X224Handshake._accept_connect(body, rsv)
+        writer.write(struct.pack(TPKT_HEADER_FMT, 0x03, 0x00, 4 + len(resp)) + resp)
+        await writer.drain()
+
+        return True, client_id, caps
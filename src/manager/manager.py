@@ -6,12 +6,15 @@ from PIL import Image
 import io
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtGui import QImage
 
 from manager.manager_network.manager_app import ManagerApp
 from manager.manager_gui import ManagerWindow 
 from manager.manager_input import ManagerInputHandler
 from manager.manager_viewer import ManagerViewer
+from manager.manager_decoder import VideoDecodePool
 from manager.manager_constants import CA_FILE
+from common_network.constants import PDU_TYPE_FILE_START
 import os
 
 class Manager(QObject): 
@@ -23,16 +26,28 @@ class Manager(QObject):
     error_received = pyqtSignal(str)
     disconnected_from_server = pyqtSignal()
     cursor_pdu_received = pyqtSignal(object)
+    thumbnail_received = pyqtSignal(str, object) # [THÊM] (client_id, QImage) cho màn hình tổng quan
+    thumbnail_removed = pyqtSignal(str)
+    input_control_changed = pyqtSignal(bool, str) # [THÊM] (mình có quyền điều khiển?, người đang giữ)
 
-    def __init__(self, host: str, port: int, manager_id: str = "manager1"):
+    def __init__(self, host: str, port: int, manager_id: str = "manager1", decode_workers: int = None):
         super().__init__()
         
         self.app = ManagerApp(host, port, manager_id)
         self.input_handler = ManagerInputHandler(self.app)
         self.viewer = ManagerViewer()
+        # [THÊM] Giải mã JPEG trên nhiều luồng, FULL frame mới bỏ các frame cũ đang chờ,
+        # hàng đợi có giới hạn (thay cho giải mã tuần tự trên luồng _pdu_loop)
+        self.decoder = VideoDecodePool(
+            self.viewer.decode_pdu, self._on_video_decoded, workers=decode_workers,
+            on_resync=self._on_decode_resync,
+            on_drop=lambda key, n: self.app.frame_acks.dropped_frame(n),
+        )
         
         self.current_session_client_id = None
         self.client_list = []
+        self.wall_enabled = True # [THÊM] theo dõi ảnh thu nhỏ của mọi client (màn hình tổng quan)
+        self.has_input_control = False # [THÊM] phiên nhiều người xem: chỉ 1 manager được điều khiển
 
         self.app.on_connected = self._on_connected
         self.app.on_disconnected = self._on_disconnected
@@ -44,6 +59,10 @@ class Manager(QObject):
         self.app.on_file_pdu = self._on_file_pdu
         self.app.on_control_pdu = self._on_control_pdu
         self.app.on_cursor_pdu = self._on_cursor_pdu
+        self.app.on_session_stats = self._on_session_stats
+        self.app.on_thumbnail_pdu = self._on_thumbnail_pdu
+        self.app.on_thumbnail_gone = self.thumbnail_removed.emit
+        self.app.on_input_owner = self._on_input_owner
 
     def start(self):
         if not os.path.exists(CA_FILE):
@@ -51,17 +70,22 @@ class Manager(QObject):
             return False
         
         print("[Manager] Đang khởi động...")
+        self.decoder.start()
         ok = self.app.start(cafile=CA_FILE)
         if not ok:
             print("[Manager] Khởi động thất bại.")
+            self.decoder.stop()
             return False
         
+        if self.wall_enabled:
+            self.app.subscribe_thumbnails()
         print("[Manager] Đã khởi động và đăng ký với server.")
         return True
 
     def stop(self):
         print("[Manager] Đang dừng...")
         self.app.stop()
+        self.decoder.stop()
         print("[Manager] Đã dừng.")
 
     # --- Các hàm xử lý Callback (Giữ nguyên) ---
@@ -71,7 +95,10 @@ class Manager(QObject):
 
     def _on_disconnected(self):
         print("[Manager] Mất kết nối tới server.")
+        if self.current_session_client_id:
+            self.decoder.clear(self.current_session_client_id)
         self.current_session_client_id = None
+        self.has_input_control = False
         self.client_list = []
         self.disconnected_from_server.emit()
 
@@ -93,39 +120,105 @@ class Manager(QObject):
         print(f"[Manager] Phiên làm việc với '{client_id}' đã kết thúc.")
         if self.current_session_client_id == client_id:
             self.current_session_client_id = None
+            self.has_input_control = False
+        self.decoder.clear(client_id)
         self.session_ended.emit()
         self.app.request_client_list()
 
+    def _on_input_owner(self, owner, is_you: bool):
+        """Server báo ai đang giữ quyền điều khiển phiên (vào phiên, xin / nhả quyền, người giữ rời phiên)."""
+        self.has_input_control = is_you
+        if is_you:
+            print("[Manager] Bạn đang điều khiển client.")
+        else:
+            print(f"[Manager] Chỉ xem. Người điều khiển: {owner or 'không có'}")
+        self.input_control_changed.emit(is_you, owner or "")
+
+    def gui_set_input_control(self, want: bool):
+        """Nút "Điều khiển" của GUI: xin / nhả quyền điều khiển (server trả lời bằng input_owner)."""
+        if not self.current_session_client_id or want == self.has_input_control:
+            return
+        if want:
+            self.app.request_input_control()
+        else:
+            self.app.release_input_control()
+
     def _on_error(self, error_msg: str):
         print(f"[Manager] Lỗi từ Server: {error_msg}")
         self.error_received.emit(error_msg)
 
-    def _on_video_pdu(self, pdu: dict):
+    def _on_video_pdu(self, pdu):
         if not self.current_session_client_id:
             # Nếu chạy vào đây nghĩa là Lỗi Race Condition vẫn còn
-            print(f"[Manager] CẢNH BÁO: Bỏ qua video PDU vì chưa có Session ID! Type: {pdu.get('type')}")
+            print(f"[Manager] CẢNH BÁO: Bỏ qua video PDU vì chưa có Session ID! Type: {pdu.type_name}")
             return
         
-        updated_img = self.viewer.process_video_pdu(self.current_session_client_id, pdu)
+        # [SỬA] Chuyển cho VideoDecodePool (không giải mã trên luồng _pdu_loop)
+        self.decoder.submit(self.current_session_client_id, pdu)
+
+    def _on_video_decoded(self, client_id, pdu, img, decode_ms):
+        """VideoDecodePool giao ảnh đã giải mã, đúng thứ tự nhận (từ 1 luồng giải mã)."""
+        # [SỬA] Chỉ mang vùng thay đổi (FrameUpdate); GUI vá vào framebuffer của nó
+        update = self.viewer.make_update(client_id, pdu, img, decode_ms) if img is not None else None
         
-        if updated_img:
-            self.video_pdu_received.emit(updated_img)
+        if update:
+            self.video_pdu_received.emit(update)
+        else:
+            self.app.frame_acks.dropped_frame()
+
+    def _on_decode_resync(self, client_id):
+        print(f"[Manager] Giải mã không theo kịp, bỏ RECT và xin FULL frame từ {client_id}.")
+        self.app.request_refresh()
+
+    def get_decode_stats(self) -> dict:
+        """Độ sâu hàng đợi giải mã, số frame bị bỏ / thay thế, thời gian chờ / giải mã."""
+        stats = self.decoder.stats()
+        stats["pdu_queue"] = self.app.pdu_queue.qsize()
+        return stats
+
+    def _on_thumbnail_pdu(self, pdu):
+        # Ảnh vài chục KB: giải mã ngay trên luồng _pdu_loop (QImage dùng được ngoài luồng GUI)
+        image = QImage.fromData(bytes(pdu.jpg), "JPEG")
+        if image.isNull() or not pdu.source:
+            return
+        self.thumbnail_received.emit(pdu.source, image)
+
+    def set_wall_enabled(self, enabled: bool):
+        """Bật / tắt theo dõi ảnh thu nhỏ (client chỉ tạo ảnh thu nhỏ khi có manager theo dõi)."""
+        if enabled == self.wall_enabled:
+            return
+        self.wall_enabled = enabled
+        if not self.app.running:
+            return
+        if enabled:
+            self.app.subscribe_thumbnails()
+        else:
+            self.app.unsubscribe_thumbnails()
+
+    def on_frame_presented(self, update, render_ms: float):
+        """GUI đã vá frame lên màn hình -> ghi nhận cho FRAME_ACK định kỳ (client / server đo độ trễ đầu-cuối)."""
+        self.app.frame_acks.rendered(update.seq, update.ts_ms, update.decode_ms, render_ms)
         
-    def _on_file_pdu(self, pdu: dict):
-        ptype = pdu.get("type")
-        if ptype == "file_start":
-            print(f"[Manager] {self.current_session_client_id} đang gửi file: {pdu.get('filename')}")
+    def _on_file_pdu(self, pdu):
+        if pdu.ptype == PDU_TYPE_FILE_START:
+            print(f"[Manager] {self.current_session_client_id} đang gửi file: {pdu.filename}")
         
-    def _on_control_pdu(self, pdu: dict):
-        print(f"[Manager] Control PDU từ client: {pdu.get('message')}")
+    def _on_control_pdu(self, pdu):
+        print(f"[Manager] Control PDU từ client: {pdu.message}")
+
+    def _on_session_stats(self, stats: dict):
+        for session_id, s in stats.items():
+            lat = s["latency_ms"]
+            print(f"[Manager] Phiên {session_id}: trễ p50 {lat['p50']:.0f} ms / p99 {lat['p99']:.0f} ms, "
+                  f"jitter {s['jitter_ms']:.1f} ms, {s['fps']:.1f} fps")
 
     # --- Slots (Hàm được gọi từ GUI) (Giữ nguyên) ---
 
-    def _on_cursor_pdu(self, pdu: dict):
+    def _on_cursor_pdu(self, pdu):
         if not self.current_session_client_id:
             return
         # pdu chứa x, y (đã chuẩn hóa), cursor_shape (bytes)
-        self.cursor_pdu_received.emit(pdu) # Gửi thẳng dict PDU lên GUI/Viewer
+        self.cursor_pdu_received.emit(pdu) # Gửi thẳng bản ghi Cursor lên GUI/Viewer
 
     def gui_connect_to_client(self, client_id: str):
         if self.current_session_client_id:
@@ -143,6 +236,19 @@ class Manager(QObject):
         
         self.app.connect_to_client(client_id)
 
+    def gui_promote_client(self, client_id: str):
+        """
+        [THÊM] Nhấp đúp 1 ô của màn hình tổng quan: mở phiên tương tác với client đó.
+        Đang trong phiên khác -> server kết thúc phiên cũ (session_ended) rồi mở phiên mới (session_started).
+        """
+        if client_id == self.current_session_client_id:
+            return
+        if not self.current_session_client_id:
+            self.gui_connect_to_client(client_id)
+            return
+        print(f"[Manager] Chuyển phiên: {self.current_session_client_id} -> {client_id}")
+        self.app.connect_to_client(client_id)
+
     def gui_disconnect_session(self):
         if not self.current_session_client_id:
             print("Lỗi: Không ở trong phiên nào.")
@@ -152,8 +258,8 @@ class Manager(QObject):
     # --- SỬA HÀM NÀY ---
     def send_input_event(self, event: dict):
         """GUI gọi hàm này khi có sự kiện chuột/phím"""
-        if not self.current_session_client_id:
-            return 
+        if not self.current_session_client_id or not self.has_input_control:
+            return # [SỬA] chỉ xem (người khác đang điều khiển): server cũng bỏ input này
         # Gửi sự kiện đã được format bởi GUI
         self.input_handler.send_event(event)
 
@@ -184,8 +290,15 @@ if __name__ == "__main__":
     manager_logic.session_started.connect(window.set_session_started)
     manager_logic.session_ended.connect(window.set_session_ended)
     manager_logic.video_pdu_received.connect(window.update_video_frame)
+    window.frame_presented.connect(manager_logic.on_frame_presented)
     manager_logic.cursor_pdu_received.connect(window.update_cursor_pos)
     manager_logic.error_received.connect(window.show_error)
+    manager_logic.thumbnail_received.connect(window.update_thumbnail)
+    manager_logic.thumbnail_removed.connect(window.remove_thumbnail)
+    window.promote_requested.connect(manager_logic.gui_promote_client)
+    window.wall_toggled.connect(manager_logic.set_wall_enabled)
+    manager_logic.input_control_changed.connect(window.set_input_control)
+    window.input_control_requested.connect(manager_logic.gui_set_input_control)
     
     window.connect_requested.connect(manager_logic.gui_connect_to_client)
     window.disconnect_requested.connect(manager_logic.gui_disconnect_session)
@@ -0,0 +1,93 @@
+# manager/manager_compositor.py
+
+from typing import Optional
+from PyQt6.QtGui import QImage, QPixmap, QPainter
+from PyQt6.QtCore import Qt, QRect, QRectF, QSize, QPoint
+from manager.manager_viewer import FrameUpdate, scale_damage
+
+"""
+Framebuffer bền (persistent) của màn hình client trên luồng GUI:
+- framebuffer: QImage RGB32 kích thước gốc; FULL frame thay toàn bộ, RECT được vẽ tại chỗ
+  (QPainter.drawImage chỉ chạm vào vùng thay đổi, không sao chép cả ảnh).
+- view: QPixmap đã co giãn vừa khung hiển thị (KeepAspectRatio). Với RECT chỉ vùng tương ứng
+  trên view được co giãn lại từ framebuffer (scale_damage, nới 1 px cho bộ lọc mịn).
+apply() trả về vùng cần vẽ lại trên view để widget chỉ repaint vùng đó.
+Mọi hàm phải gọi trên luồng GUI (QPixmap không dùng được ở luồng khác).
+"""
+
+
+class FrameCompositor:
+    def __init__(self):
+        self.framebuffer = QImage()
+        self.view = QPixmap()
+        self.view_size = QSize() # kích thước khung hiển thị (label) hiện tại
+
+    def is_empty(self) -> bool:
+        return self.framebuffer.isNull()
+
+    def clear(self) -> None:
+        self.framebuffer = QImage()
+        self.view = QPixmap()
+
+    def apply(self, update: FrameUpdate) -> Optional[QRect]:
+        """
+        Vá 1 FrameUpdate vào framebuffer và view.
+        Trả về vùng đã đổi trên view (toạ độ view); None nếu không có gì để vẽ (RECT lệch kích thước).
+        """
+        # QImage trỏ thẳng vào bytes của ảnh PIL (không sở hữu bộ nhớ): `data` phải sống tới khi vẽ xong,
+        # mọi lần vẽ bên dưới đều đồng bộ trong hàm này
+        img = update.image
+        data = img.tobytes()
+        region = QImage(data, img.width, img.height, img.width * 3, QImage.Format.Format_RGB888)
+        if update.full or self.framebuffer.isNull():
+            if not update.full:
+                return None # RECT khi chưa có FULL frame
+            # FULL: framebuffer mới (convertToFormat tạo bản sở hữu bộ nhớ riêng), co giãn lại cả view
+            self.framebuffer = region.convertToFormat(QImage.Format.Format_RGB32)
+            self.rescale()
+            return self.view.rect()
+
+        fb_size = (self.framebuffer.width(), self.framebuffer.height())
+        if tuple(update.size) != fb_size:
+            return None
+
+        x, y, w, h = update.rect
+        painter = QPainter(self.framebuffer)
+        painter.drawImage(QPoint(x, y), region)
+        painter.end()
+
+        if self.view.isNull():
+            return None
+        view_size = (self.view.width(), self.view.height())
+        vx, vy, vw, vh = scale_damage((x, y, w, h), fb_size, view_size)
+        if vw <= 0 or vh <= 0:
+            return None
+        self._draw_scaled(QRect(vx, vy, vw, vh))
+        return QRect(vx, vy, vw, vh)
+
+    def _draw_scaled(self, target: QRect) -> None:
+        """
+        Co giãn vùng `target` (toạ độ view) từ framebuffer (toạ độ nguồn = toạ độ view / tỉ lệ).
+        Cả view lẫn từng vùng vá đều vẽ qua hàm này (cùng 1 bộ lọc) -> vùng vá không lộ đường nối.
+        """
+        sx = self.framebuffer.width() / self.view.width()
+        sy = self.framebuffer.height() / self.view.height()
+        source = QRectF(target.x() * sx, target.y() * sy, target.width() * sx, target.height() * sy)
+        painter = QPainter(self.view)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        painter.drawImage(QRectF(target), self.framebuffer, source)
+        painter.end()
+
+    def rescale(self, view_size: Optional[QSize] = None) -> None:
+        """Co giãn lại toàn bộ view (FULL frame mới hoặc khung hiển thị đổi kích thước)."""
+        if view_size is not None:
+            self.view_size = view_size
+        if self.framebuffer.isNull() or self.view_size.isEmpty():
+            self.view = QPixmap()
+            return
+        size = self.framebuffer.size().scaled(self.view_size, Qt.AspectRatioMode.KeepAspectRatio)
+        if size.isEmpty():
+            self.view = QPixmap()
+            return
+        self.view = QPixmap(size)
+        self._draw_scaled(self.view.rect())
@@ -16,6 +16,7 @@ CHANNEL_CONTROL = 3
 CHANNEL_INPUT = 4
 CHANNEL_FILE = 5
 CHANNEL_CURSOR = 6
+CHANNEL_THUMB = 7 # [THÊM] ảnh thu nhỏ (màn hình tổng quan của manager)
 
 ALL_CHANNELS = (
     CHANNEL_VIDEO,
@@ -23,6 +24,7 @@ ALL_CHANNELS = (
     CHANNEL_INPUT,
     CHANNEL_FILE,
     CHANNEL_CURSOR,
+    CHANNEL_THUMB,
 )
 
 # --- Lệnh Gửi đi (Manager -> Server) ---
@@ -30,10 +32,25 @@ CMD_REGISTER = "register:manager"
 CMD_LIST_CLIENTS = "list_clients"
 CMD_CONNECT_CLIENT = "connect:"  # Ví dụ: "connect:client_pc_1"
 CMD_DISCONNECT = "disconnect"
+CMD_REQUEST_REFRESH = "request_refresh" # Xin client gửi FULL frame (client xử lý trong _on_control_pdu)
+CMD_SESSION_STATS = "session_stats" # Hỏi / nhận thống kê phiên: "session_stats:{json}"
+CMD_THUMB_SUBSCRIBE = "thumb_subscribe" # Theo dõi ảnh thu nhỏ: "thumb_subscribe:*" hoặc "thumb_subscribe:[\"pc1\"]"
+CMD_THUMB_UNSUBSCRIBE = "thumb_unsubscribe"
+CMD_INPUT_REQUEST = "input_request" # Xin quyền điều khiển chuột/phím (phiên có nhiều manager cùng xem)
+CMD_INPUT_RELEASE = "input_release" # Nhả quyền điều khiển
 
 # --- Lệnh Nhận về (Server -> Manager) ---
 CMD_REGISTER_OK = "register_ok"
 CMD_CLIENT_LIST_UPDATE = "client_list_update" # "client_list_update:['pc1', 'pc2']"
 CMD_SESSION_STARTED = "session_started"
 CMD_SESSION_ENDED = "session_ended"
-CMD_ERROR = "error"
\ No newline at end of file
+CMD_ERROR = "error"
+CMD_THUMB_GONE = "thumb_gone" # Client đã ngắt kết nối, bỏ ô của nó: "thumb_gone:pc1"
+CMD_INPUT_OWNER = "input_owner" # Ai đang điều khiển: "input_owner:{\"owner\": \"...\" | null, \"is_you\": true}"
+
+# --- [THÊM] Nhận file (FileReceiver) ---
+FILE_SAVE_DIR = "received_files" # thư mục lưu file client gửi lên
+FILE_ACK_EVERY_BYTES = 256 * 1024 # ACK sau mỗi chừng này byte nhận liên tục (lệch thứ tự / trùng lặp: ACK ngay)
+FILE_SACK_ENABLED = True # gửi kèm các đoạn đã nhận sau ack_offset (selective ACK) trong FILE_ACK
+FILE_RESUME_ENABLED = True # giữ file dở + nhật ký chunk (theo mã transfer trong FILE_START) để tiếp tục sau khi mất kết nối
+FILE_RECEIVE_JOURNAL = "receive_journal.db" # nhật ký file dở, nằm trong FILE_SAVE_DIR
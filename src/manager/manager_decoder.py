@@ -0,0 +1,209 @@
+# manager/manager_decoder.py
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+from common_network.constants import PDU_TYPE_FULL
+from common_network.stats import LatencyHistogram
+
+"""
+Giai đoạn giải mã video của manager (thay cho giải mã tuần tự trên luồng _pdu_loop):
+
+    _pdu_loop --submit--> [hàng đợi chờ, có giới hạn] --> [N luồng giải mã JPEG] --sắp lại thứ tự--> deliver
+
+- "FULL frame mới nhất thắng": FULL frame mới vào hàng đợi -> mọi PDU (FULL/RECT) của cùng phiên còn
+  đang CHỜ (chưa bắt đầu giải mã) bị bỏ, vì FULL frame vẽ lại toàn bộ màn hình.
+- Hàng đợi của 1 phiên đầy (max_pending): bỏ các RECT đang chờ của phiên (giữ FULL frame đang chờ
+  nếu có, để vẫn có hình), bỏ tiếp các RECT tới khi có FULL frame mới và gọi on_resync(key)
+  (manager xin client gửi FULL frame).
+  -> manager không bao giờ chậm hơn max_pending frame so với dữ liệu đã nhận.
+- Kết quả được giao (deliver) đúng thứ tự nhận: RECT sau phải vá lên FULL/RECT trước.
+  PIL nhả GIL khi giải mã JPEG nên các luồng chạy song song thật.
+Số liệu: độ sâu hàng đợi (chờ + đang giải mã) lúc nhận mỗi PDU, thời gian chờ / giải mã (ms), bộ đếm.
+"""
+
+DEFAULT_MAX_DECODE_WORKERS = 4
+# PDU chờ tối đa / phiên: chỉ là lưới an toàn khi client gửi dồn RECT mà không có FULL frame
+# (FULL frame đã giới hạn độ trễ ở mức ~1 frame); đủ rộng cho 1 đợt RECT của 1 lượt chụp
+DEFAULT_MAX_PENDING = 16
+
+
+class VideoDecodePool:
+    def __init__(self, decode: Callable, deliver: Callable, workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, on_resync: Optional[Callable] = None,
+                 on_drop: Optional[Callable] = None):
+        self.decode = decode # decode(pdu) -> kết quả (None: lỗi); gọi song song từ nhiều luồng
+        self.deliver = deliver # deliver(key, pdu, result, decode_ms), đúng thứ tự submit
+        self.on_resync = on_resync # on_resync(key): đã bỏ RECT, cần FULL frame
+        self.on_drop = on_drop # on_drop(key, n): n PDU bị bỏ không giải mã
+        self.workers = workers or min(DEFAULT_MAX_DECODE_WORKERS, os.cpu_count() or 1)
+        self.max_pending = max_pending or max(DEFAULT_MAX_PENDING, self.workers * 2)
+
+        self.cond = threading.Condition()
+        self.pending = deque() # (key, pdu, t_submit)
+        self._resync = set() # các phiên đang chờ FULL frame
+        self._in_flight = 0 # đã lấy khỏi hàng đợi nhưng chưa giao
+        self._next_ticket = 0
+        self._emit_lock = threading.Lock()
+        self._ready: Dict[int, tuple] = {}
+        self._next_emit = 0
+
+        self._running = False
+        self._threads = []
+
+        self.depth = LatencyHistogram(max_samples=10_000) # số frame đang chờ + đang giải mã, lúc nhận PDU
+        self.queue_wait = LatencyHistogram(max_samples=10_000)
+        self.decode_time = LatencyHistogram(max_samples=10_000)
+        self.max_depth = 0
+        self.submitted = 0
+        self.delivered = 0
+        self.superseded = 0 # bị FULL frame mới hơn thay thế
+        self.overflowed = 0 # bị bỏ vì hàng đợi đầy
+        self.discarded = 0 # RECT bị bỏ trong lúc chờ FULL frame
+        self.resyncs = 0
+        self.errors = 0
+
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._decode_loop, daemon=True, name=f"Decode-{i}")
+            t.start()
+            self._threads.append(t)
+        print(f"[VideoDecodePool] Bắt đầu: {self.workers} luồng giải mã, tối đa {self.max_pending} frame chờ / phiên")
+
+    def stop(self, timeout: float = 1.0):
+        with self.cond:
+            self._running = False
+            self.pending.clear()
+            self._resync.clear()
+            self.cond.notify_all()
+        current_t = threading.current_thread()
+        for t in self._threads:
+            if t is not current_t and t.is_alive():
+                t.join(timeout=timeout)
+        self._threads = []
+
+    def clear(self, key) -> int:
+        """Bỏ mọi PDU đang chờ của 1 phiên (phiên kết thúc). Trả về số PDU bị bỏ."""
+        with self.cond:
+            self._resync.discard(key)
+            return self._discard(key)
+
+    # ------------------------------------------------------------------
+    def submit(self, key, pdu) -> bool:
+        """Đưa 1 PDU video vào hàng đợi giải mã. False nếu PDU bị bỏ."""
+        dropped = 0
+        accepted = True
+        resync = False
+        with self.cond:
+            if not self._running:
+                return False
+            self.submitted += 1
+            if pdu.ptype == PDU_TYPE_FULL:
+                self._resync.discard(key)
+                n = self._discard(key)
+                self.superseded += n
+                dropped += n
+            elif key in self._resync:
+                self.discarded += 1
+                dropped = 1
+                accepted = False
+            elif sum(1 for item in self.pending if item[0] == key) >= self.max_pending:
+                n = self._discard(key, keep_full=True) + 1 # cả PDU mới
+                self.overflowed += n
+                dropped = n
+                self._resync.add(key)
+                self.resyncs += 1
+                resync = True
+                accepted = False
+
+            if accepted:
+                self.pending.append((key, pdu, time.perf_counter()))
+                self.cond.notify()
+            depth = len(self.pending) + self._in_flight
+            if depth > self.max_depth:
+                self.max_depth = depth
+        self.depth.record(depth)
+
+        if dropped and self.on_drop:
+            self.on_drop(key, dropped)
+        if resync and self.on_resync:
+            self.on_resync(key)
+        return accepted
+
+    def _discard(self, key, keep_full: bool = False) -> int:
+        # Gọi khi đang giữ self.cond. Mỗi phiên có nhiều nhất 1 FULL frame đang chờ (FULL mới thay FULL cũ)
+        before = len(self.pending)
+        if before:
+            self.pending = deque(
+                item for item in self.pending
+                if item[0] != key or (keep_full and item[1].ptype == PDU_TYPE_FULL)
+            )
+        return before - len(self.pending)
+
+    # ------------------------------------------------------------------
+    def _decode_loop(self):
+        while True:
+            with self.cond:
+                while self._running and not self.pending:
+                    self.cond.wait(0.1)
+                if not self._running:
+                    return
+                key, pdu, t_submit = self.pending.popleft()
+                # Vé giao hàng được cấp theo thứ tự lấy khỏi hàng đợi (= thứ tự submit):
+                # PDU bị bỏ khi còn chờ không bao giờ nhận vé nên không chặn các frame sau
+                ticket = self._next_ticket
+                self._next_ticket += 1
+                self._in_flight += 1
+
+            t0 = time.perf_counter()
+            self.queue_wait.record((t0 - t_submit) * 1000)
+            try:
+                result = self.decode(pdu)
+            except Exception as e:
+                self.errors += 1
+                print(f"[VideoDecodePool] Lỗi giải mã: {e}")
+                result = None # vẫn phải chiếm lượt để không chặn các frame sau
+            decode_ms = (time.perf_counter() - t0) * 1000
+            self.decode_time.record(decode_ms)
+            self._complete(ticket, (key, pdu, result, decode_ms))
+
+    def _complete(self, ticket: int, item: tuple):
+        with self._emit_lock:
+            self._ready[ticket] = item
+            while self._next_emit in self._ready:
+                key, pdu, result, decode_ms = self._ready.pop(self._next_emit)
+                self._next_emit += 1
+                with self.cond:
+                    self._in_flight -= 1
+                try:
+                    self.deliver(key, pdu, result, decode_ms)
+                    self.delivered += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[VideoDecodePool] Lỗi giao frame: {e}")
+
+    # ------------------------------------------------------------------
+    def stats(self) -> dict:
+        with self.cond:
+            pending, in_flight = len(self.pending), self._in_flight
+        return {
+            "workers": self.workers,
+            "pending": pending,
+            "in_flight": in_flight,
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "delivered": self.delivered,
+            "superseded": self.superseded,
+            "overflowed": self.overflowed,
+            "discarded": self.discarded,
+            "resyncs": self.resyncs,
+            "errors": self.errors,
+            "depth": self.depth.summary(),
+            "latency_ms": {"queue_wait": self.queue_wait.summary(), "decode": self.decode_time.summary()},
+        }
@@ -1,14 +1,16 @@
 import sys
 import os
+import time
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-    QListWidget, QPushButton, QLabel, QListWidgetItem
+    QListWidget, QPushButton, QLabel, QListWidgetItem, QStackedWidget, QCheckBox
 )
 from PyQt6.QtGui import (
     QPixmap, QImage, QMouseEvent, QKeyEvent, QPainter, QBrush, QPen, QPolygon, QCursor
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QObject, QPoint, QEvent
-from PIL.ImageQt import ImageQt # Dùng cái này an toàn hơn toqimage
+from PyQt6.QtCore import Qt, pyqtSignal, QObject, QPoint, QRect, QEvent
+from manager.manager_compositor import FrameCompositor
+from manager.manager_wall import ThumbnailWall
 
 # Map phím (Giữ nguyên)
 key_map = {
@@ -45,17 +47,59 @@ key_map = {
     Qt.Key.Key_F10: 'f10', Qt.Key.Key_F11: 'f11', Qt.Key.Key_F12: 'f12',
 }
 
+class FrameLabel(QLabel):
+    """
+    [THÊM] QLabel vẽ trực tiếp view của FrameCompositor (căn giữa) thay cho setPixmap:
+    setPixmap giữ 1 bản của pixmap nên mỗi frame phải đặt lại và vẽ lại cả khung;
+    ở đây view được vá tại chỗ và chỉ vùng thay đổi được update()/repaint.
+    """
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.frame = None # QPixmap (view của FrameCompositor), None: hiển thị text như QLabel thường
+
+    def set_frame(self, pixmap):
+        self.frame = pixmap if pixmap is not None and not pixmap.isNull() else None
+        self.update()
+
+    def pixmap(self):
+        # Các hàm tính toạ độ chuột / con trỏ ảo dùng kích thước ảnh đang hiển thị
+        return self.frame if self.frame is not None else super().pixmap()
+
+    def frame_offset(self) -> QPoint:
+        return QPoint((self.width() - self.frame.width()) // 2, (self.height() - self.frame.height()) // 2)
+
+    def update_frame_region(self, rect: QRect):
+        """Yêu cầu vẽ lại 1 vùng (toạ độ trên view)."""
+        if self.frame is not None:
+            self.update(rect.translated(self.frame_offset()))
+
+    def paintEvent(self, event):
+        if self.frame is None:
+            super().paintEvent(event)
+            return
+        painter = QPainter(self)
+        # Qt chỉ vẽ trong vùng event.rect() (vùng đã update) -> vá nhỏ thì blit nhỏ
+        painter.fillRect(event.rect(), Qt.GlobalColor.black)
+        painter.drawPixmap(self.frame_offset(), self.frame)
+        painter.end()
+
+
 class ManagerWindow(QMainWindow):
     connect_requested = pyqtSignal(str)
     disconnect_requested = pyqtSignal()
     input_event_generated = pyqtSignal(dict) 
+    frame_presented = pyqtSignal(object, float) # [THÊM] (FrameUpdate, ms vá + co giãn) -> FRAME_ACK
+    promote_requested = pyqtSignal(str) # [THÊM] nhấp đúp 1 ô của màn hình tổng quan
+    wall_toggled = pyqtSignal(bool) # [THÊM] bật / tắt theo dõi ảnh thu nhỏ
+    input_control_requested = pyqtSignal(bool) # [THÊM] xin / nhả quyền điều khiển (phiên nhiều manager)
 
     def __init__(self):
         super().__init__()
         
         # --- [SỬA] KHAI BÁO BIẾN TRẠNG THÁI TRƯỚC TIÊN ---
         self.current_client_id = None 
-        self.client_pixmap = QPixmap()
+        # [SỬA] Framebuffer bền + view đã co giãn (thay cho client_pixmap tạo lại mỗi frame)
+        self.compositor = FrameCompositor()
         # --------------------------------------------------
 
         self.setWindowTitle("PBL4 - Remote Desktop Manager (PyQt6)")
@@ -78,12 +122,28 @@ class ManagerWindow(QMainWindow):
         left_layout.addWidget(self.client_list_widget)
         left_layout.addWidget(self.connect_btn)
         left_layout.addWidget(self.disconnect_btn)
+
+        # [THÊM] Phiên có nhiều manager cùng xem: chỉ người giữ quyền mới điều khiển được chuột/phím
+        self.control_btn = QPushButton("Điều khiển (Control)")
+        self.control_btn.setCheckable(True)
+        self.control_label = QLabel("")
+        self.control_label.setWordWrap(True)
+        left_layout.addWidget(self.control_btn)
+        left_layout.addWidget(self.control_label)
+
+        # [THÊM] Màn hình tổng quan: theo dõi ảnh thu nhỏ của mọi client / xem tổng quan khi đang trong phiên
+        self.wall_enabled_box = QCheckBox("Theo dõi ảnh thu nhỏ")
+        self.wall_enabled_box.setChecked(True)
+        self.wall_btn = QPushButton("Màn hình tổng quan")
+        self.wall_btn.setCheckable(True)
+        left_layout.addWidget(self.wall_enabled_box)
+        left_layout.addWidget(self.wall_btn)
         
         right_panel = QWidget()
         right_layout = QVBoxLayout(right_panel)
         right_layout.setContentsMargins(0, 0, 0, 0)
         
-        self.screen_label = QLabel("Chưa kết nối...")
+        self.screen_label = FrameLabel("Chưa kết nối...")
         self.screen_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.screen_label.setStyleSheet("background-color: black; color: white;")
         
@@ -115,12 +175,21 @@ class ManagerWindow(QMainWindow):
         self.cursor_label.adjustSize()
         self.cursor_label.hide() 
 
-        right_layout.addWidget(self.screen_label)
+        # [SỬA] Khung bên phải: màn hình tổng quan (ngoài phiên) hoặc màn hình client (trong phiên)
+        self.wall = ThumbnailWall()
+        self.right_stack = QStackedWidget()
+        self.right_stack.addWidget(self.wall)
+        self.right_stack.addWidget(self.screen_label)
+        right_layout.addWidget(self.right_stack)
         main_layout.addWidget(left_panel)
         main_layout.addWidget(right_panel, 1)
 
         self.connect_btn.clicked.connect(self.on_connect_click)
         self.disconnect_btn.clicked.connect(self.on_disconnect_click)
+        self.wall.promote_requested.connect(self.promote_requested)
+        self.wall_enabled_box.toggled.connect(self.on_wall_enabled_toggled)
+        self.wall_btn.toggled.connect(self.show_wall)
+        self.control_btn.clicked.connect(self.input_control_requested)
         
         self.update_button_states()
 
@@ -195,7 +264,7 @@ class ManagerWindow(QMainWindow):
 
     def _calculate_norm_coords(self, local_pos: QPoint):
         """Tính tọa độ chuẩn hóa từ vị trí chuột TRONG label"""
-        if self.client_pixmap.isNull(): return None, None
+        if self.compositor.is_empty(): return None, None
         
         label_size = self.screen_label.size()
         scaled_pixmap = self.screen_label.pixmap()
@@ -234,23 +303,32 @@ class ManagerWindow(QMainWindow):
             self.cursor_label.show()
 
     # --- Cập nhật ảnh Video ---
-    def update_video_frame(self, pil_image):
+    def update_video_frame(self, update):
+        """
+        [SỬA] Nhận FrameUpdate (chỉ vùng thay đổi): vá vào framebuffer, co giãn lại đúng vùng đó
+        và chỉ repaint vùng đó. FULL frame (hoặc đổi kích thước) mới co giãn / vẽ lại cả khung.
+        """
         try:
-            q_image = ImageQt(pil_image)
-            self.client_pixmap = QPixmap.fromImage(q_image.copy()) 
-            self.update_scaled_pixmap()
+            t0 = time.perf_counter()
+            if update.full:
+                self.compositor.view_size = self.screen_label.size()
+            damage = self.compositor.apply(update)
+            if damage is None:
+                return
+            if update.full:
+                self.screen_label.set_frame(self.compositor.view)
+                self._move_cursor_overlay_to_norm(self.current_cursor_norm_x, self.current_cursor_norm_y)
+            else:
+                self.screen_label.update_frame_region(damage)
+            self.frame_presented.emit(update, (time.perf_counter() - t0) * 1000)
         except Exception as e:
             print(f"[GUI] Lỗi cập nhật frame: {e}")
 
     def update_scaled_pixmap(self):
-        if self.client_pixmap.isNull(): return
+        if self.compositor.is_empty(): return
         
-        scaled_pixmap = self.client_pixmap.scaled(
-            self.screen_label.size(), 
-            Qt.AspectRatioMode.KeepAspectRatio, 
-            Qt.TransformationMode.SmoothTransformation
-        )
-        self.screen_label.setPixmap(scaled_pixmap)
+        self.compositor.rescale(self.screen_label.size())
+        self.screen_label.set_frame(self.compositor.view)
         
         # Cập nhật lại vị trí con trỏ theo tỷ lệ mới (nếu đang resize)
         self._move_cursor_overlay_to_norm(self.current_cursor_norm_x, self.current_cursor_norm_y)
@@ -261,7 +339,7 @@ class ManagerWindow(QMainWindow):
             self.update_scaled_pixmap()
 
     # --- Nhận vị trí chuột từ Client (Remote Loopback) ---
-    def update_cursor_pos(self, pdu: dict):
+    def update_cursor_pos(self, pdu):
         """
         Nhận PDU cursor từ Client gửi về.
         Chỉ cập nhật nếu chuột của Manager ĐANG KHÔNG nằm trong vùng video.
@@ -271,8 +349,8 @@ class ManagerWindow(QMainWindow):
         if self.screen_label.underMouse():
             return 
 
-        x_int = pdu.get('x', 5000)
-        y_int = pdu.get('y', 5000)
+        x_int = pdu.x
+        y_int = pdu.y
         
         self.current_cursor_norm_x = x_int / 10000.0
         self.current_cursor_norm_y = y_int / 10000.0
@@ -287,12 +365,43 @@ class ManagerWindow(QMainWindow):
     def on_disconnect_click(self):
         self.disconnect_requested.emit()
 
+    # --- [THÊM] Màn hình tổng quan ---
+    def update_thumbnail(self, client_id, image):
+        self.wall.update_thumbnail(client_id, image)
+
+    def remove_thumbnail(self, client_id):
+        self.wall.remove_thumbnail(client_id)
+
+    def on_wall_enabled_toggled(self, enabled: bool):
+        if not enabled:
+            self.wall.clear()
+        self.wall_toggled.emit(enabled)
+
+    def show_wall(self, show: bool):
+        """Ngoài phiên luôn hiện màn hình tổng quan; trong phiên nút "Màn hình tổng quan" chuyển qua lại."""
+        if show or not self.current_client_id:
+            self.right_stack.setCurrentWidget(self.wall)
+        else:
+            self.right_stack.setCurrentWidget(self.screen_label)
+            self.update_scaled_pixmap()
+
+    def set_input_control(self, is_you: bool, owner: str):
+        self.control_btn.setChecked(is_you)
+        if is_you:
+            self.control_label.setText("Bạn đang điều khiển.")
+        elif owner:
+            self.control_label.setText(f"Chỉ xem ({owner} đang điều khiển).")
+        else:
+            self.control_label.setText("Chỉ xem (chưa ai điều khiển).")
+
     def update_client_list(self, client_list):
         self.client_list_widget.clear()
         self.client_list_widget.addItems(client_list)
 
     def set_session_started(self, client_id):
         self.current_client_id = client_id
+        self.wall_btn.setChecked(False)
+        self.show_wall(False)
         self.screen_label.setText(f"Đang xem {client_id}...")
         self.update_button_states()
         self.setFocus()
@@ -302,17 +411,23 @@ class ManagerWindow(QMainWindow):
         self.current_client_id = None
         self.screen_label.clear()
         self.screen_label.setText("Đã ngắt kết nối.")
-        self.client_pixmap = QPixmap()
-        self.screen_label.setPixmap(self.client_pixmap)
+        self.compositor.clear()
+        self.screen_label.set_frame(None)
         self.update_button_states()
         self.cursor_label.hide()
         self.screen_label.setCursor(Qt.CursorShape.ArrowCursor) # Hiện lại chuột thật
+        self.wall_btn.setChecked(False)
+        self.show_wall(True)
+        self.set_input_control(False, "")
+        self.control_label.setText("")
 
     def update_button_states(self):
         in_session = self.current_client_id is not None
         self.connect_btn.setEnabled(not in_session)
         self.disconnect_btn.setEnabled(in_session)
         self.client_list_widget.setEnabled(not in_session)
+        self.wall_btn.setEnabled(in_session)
+        self.control_btn.setEnabled(in_session)
 
     def show_error(self, message):
         print(f"--- LỖI SERVER: {message} ---")
@@ -5,19 +5,25 @@ import json
 from queue import Queue, Empty
 from .manager_client import ManagerClient
 from .manager_receiver import ManagerReceiver
+from .manager_frame_ack import FrameAckReporter
+from .manager_file_receiver import FileReceiver
 from common_network.pdu_builder import PDUBuilder
-from common_network.mcs_layer import MCSLite
-from common_network.tpkt_layer import TPKTLayer
+from common_network.tpkt_writer import TPKTWriter
+from common_network.constants import PDU_TYPE_CONTROL, PDU_TYPE_CURSOR, PDU_TYPE_THUMB
+from common_network.pdu_records import VIDEO_PDU_TYPES, FILE_PDU_TYPES
 from manager.manager_constants import (
-    CHANNEL_CONTROL, CHANNEL_INPUT,
+    CHANNEL_CONTROL, CHANNEL_INPUT, CHANNEL_FILE,
     CMD_REGISTER, CMD_LIST_CLIENTS, CMD_CONNECT_CLIENT, CMD_DISCONNECT,
-    CMD_CLIENT_LIST_UPDATE, CMD_SESSION_STARTED, CMD_SESSION_ENDED, CMD_ERROR
+    CMD_CLIENT_LIST_UPDATE, CMD_SESSION_STARTED, CMD_SESSION_ENDED, CMD_ERROR, CMD_SESSION_STATS,
+    CMD_REQUEST_REFRESH, CMD_THUMB_SUBSCRIBE, CMD_THUMB_UNSUBSCRIBE, CMD_THUMB_GONE,
+    CMD_INPUT_REQUEST, CMD_INPUT_RELEASE, CMD_INPUT_OWNER
 )
 
 class ManagerApp:
     def __init__(self, host: str, port: int, manager_id: str = "manager1"):
         self.client = ManagerClient(host, port, manager_id)
         self.receiver = None
+        self.writer = None # TPKTWriter: gộp ghi nhiều gói vào 1 lần sendall
         self.running = False
         
         self.pdu_queue = Queue()
@@ -26,6 +32,10 @@ class ManagerApp:
         self.builder = PDUBuilder()
         self.seq = 0
         self.lock = threading.Lock() 
+        # [THÊM] Xác nhận frame đã hiển thị (FRAME_ACK) gửi định kỳ về client qua server
+        self.frame_acks = FrameAckReporter(self._send_frame_ack)
+        # [THÊM] Nhận file client gửi lên: ghi theo offset, trả FILE_ACK (SACK) / FILE_NAK trên kênh FILE
+        self.file_receiver = FileReceiver(lambda pdu_bytes: self._send_mcs_pdu(CHANNEL_FILE, pdu_bytes))
 
         self.on_connected = None
         self.on_disconnected = None
@@ -37,6 +47,10 @@ class ManagerApp:
         self.on_file_pdu = None
         self.on_control_pdu = None
         self.on_cursor_pdu = None
+        self.on_session_stats = None # [THÊM] nhận dict {session_id: thống kê} từ server
+        self.on_thumbnail_pdu = None # [THÊM] ảnh thu nhỏ của 1 client (pdu.source) cho màn hình tổng quan
+        self.on_thumbnail_gone = None # [THÊM] client đã ngắt kết nối (bỏ ô của nó)
+        self.on_input_owner = None # [THÊM] (owner_id | None, is_you): ai đang giữ quyền điều khiển phiên
 
     def start(self, cafile: str) -> bool:
         if not self.client.connect(cafile):
@@ -44,11 +58,15 @@ class ManagerApp:
             return False
         
         self.running = True
+        self.writer = TPKTWriter(self.client.sock, name="ManagerWriter", on_error=self._on_writer_error,
+                                 ext_framing=self.client.ext_framing)
+        self.writer.start()
         self.receiver = ManagerReceiver(self.client.sock, self.pdu_queue, self._on_receiver_done)
         self.receiver.start()
         
         self.pdu_loop_thread = threading.Thread(target=self._pdu_loop, daemon=True)
         self.pdu_loop_thread.start()
+        self.frame_acks.start()
         
         print("[ManagerApp] Receiver đã khởi động.")
         self.register()
@@ -59,6 +77,10 @@ class ManagerApp:
 
     def stop(self):
         self.running = False
+        self.frame_acks.stop()
+        self.file_receiver.close()
+        if self.writer:
+            self.writer.stop()
         if self.receiver:
             self.receiver.stop()
         self.client.close()
@@ -86,12 +108,12 @@ class ManagerApp:
                 if self.running:
                     print(f"[ManagerApp] Lỗi PDU loop: {e}")
 
-    def _handle_pdu(self, pdu: dict):
-        """Phân loại PDU và gọi callback cho UI"""
-        ptype = pdu.get("type")
+    def _handle_pdu(self, pdu):
+        """Phân loại PDU (theo ptype số nguyên) và gọi callback cho UI"""
+        ptype = pdu.ptype
         
-        if ptype == "control":
-            msg = pdu.get("message", "")
+        if ptype == PDU_TYPE_CONTROL:
+            msg = pdu.message
             if msg.startswith(CMD_CLIENT_LIST_UPDATE):
                 if self.on_client_list_update:
                     try:
@@ -108,18 +130,39 @@ class ManagerApp:
             elif msg.startswith(CMD_ERROR):
                 if self.on_error:
                     self.on_error(msg.split(":", 1)[1])
+            elif msg.startswith(CMD_THUMB_GONE):
+                if self.on_thumbnail_gone:
+                    self.on_thumbnail_gone(msg.split(":", 1)[1])
+            elif msg.startswith(CMD_INPUT_OWNER):
+                if self.on_input_owner:
+                    try:
+                        info = json.loads(msg.split(":", 1)[1])
+                        self.on_input_owner(info.get("owner"), bool(info.get("is_you")))
+                    except Exception as e:
+                        print(f"Lỗi parse input owner: {e}")
+            elif msg.startswith(CMD_SESSION_STATS):
+                if self.on_session_stats:
+                    try:
+                        self.on_session_stats(json.loads(msg.split(":", 1)[1]))
+                    except Exception as e:
+                        print(f"Lỗi parse session stats: {e}")
             elif self.on_control_pdu:
                 self.on_control_pdu(pdu)
 
-        elif ptype in ("full", "rect"):
+        elif ptype in VIDEO_PDU_TYPES:
             if self.on_video_pdu:
                 self.on_video_pdu(pdu)
 
-        elif ptype == "cursor": 
+        elif ptype == PDU_TYPE_THUMB:
+            if self.on_thumbnail_pdu:
+                self.on_thumbnail_pdu(pdu)
+
+        elif ptype == PDU_TYPE_CURSOR: 
             if self.on_cursor_pdu:
                 self.on_cursor_pdu(pdu)
 
-        elif ptype.startswith("file_"):
+        elif ptype in FILE_PDU_TYPES:
+            self.file_receiver.handle_pdu(pdu)
             if self.on_file_pdu:
                 self.on_file_pdu(pdu)
 
@@ -129,16 +172,18 @@ class ManagerApp:
             return self.seq
 
     def _send_mcs_pdu(self, channel_id: int, pdu_bytes: bytes):
-        if not self.running or not self.client.sock:
+        # Xếp vào TPKTWriter (gộp ghi); lỗi kết nối được báo qua _on_writer_error
+        if not self.running or not self.writer:
             return
-        try:
-            mcs_frame = MCSLite.build(channel_id, pdu_bytes)
-            tpkt_packet = TPKTLayer.pack(mcs_frame)
-            with self.lock:
-                self.client.sock.sendall(tpkt_packet)
-        except Exception as e:
-            print(f"[ManagerApp] Lỗi gửi PDU: {e}")
-            self._on_receiver_done()
+        self.writer.send(channel_id, pdu_bytes)
+
+    def _on_writer_error(self, e):
+        print(f"[ManagerApp] Lỗi gửi PDU: {e}")
+        self._on_receiver_done()
+
+    def get_write_stats(self) -> dict:
+        """Thống kê gộp ghi: số lần sendall/giây, bytes/lần, frames/lần."""
+        return self.writer.stats.snapshot() if self.writer else {}
 
     def _send_control_pdu(self, message: str):
         seq = self._next_seq()
@@ -160,6 +205,37 @@ class ManagerApp:
         print("[ManagerApp] Yêu cầu ngắt kết nối phiên...")
         self._send_control_pdu(CMD_DISCONNECT)
 
+    def request_refresh(self):
+        """Xin client trong phiên gửi FULL frame (sau khi manager phải bỏ RECT)."""
+        self._send_control_pdu(CMD_REQUEST_REFRESH)
+
+    def request_input_control(self):
+        """Xin quyền điều khiển chuột/phím của phiên (chỉ được cấp khi không ai giữ)."""
+        self._send_control_pdu(CMD_INPUT_REQUEST)
+
+    def release_input_control(self):
+        self._send_control_pdu(CMD_INPUT_RELEASE)
+
+    def subscribe_thumbnails(self, client_ids=None):
+        """Theo dõi ảnh thu nhỏ của các client (None: mọi client, kể cả client kết nối sau)."""
+        arg = "*" if client_ids is None else json.dumps(list(client_ids))
+        self._send_control_pdu(f"{CMD_THUMB_SUBSCRIBE}:{arg}")
+
+    def unsubscribe_thumbnails(self, client_ids=None):
+        """Bỏ theo dõi ảnh thu nhỏ (None: bỏ tất cả)."""
+        arg = "*" if client_ids is None else json.dumps(list(client_ids))
+        self._send_control_pdu(f"{CMD_THUMB_UNSUBSCRIBE}:{arg}")
+
+    def request_session_stats(self):
+        """Hỏi server thống kê độ trễ / jitter / fps (phiên hiện tại, hoặc mọi phiên nếu chưa vào phiên)."""
+        self._send_control_pdu(CMD_SESSION_STATS)
+
+    def _send_frame_ack(self, last_seq: int, frame_ts_ms: int, decode_ms: float, render_ms: float,
+                        frames: int, dropped: int):
+        seq = self._next_seq()
+        pdu = self.builder.build_frame_ack_pdu(seq, last_seq, frame_ts_ms, decode_ms, render_ms, frames, dropped)
+        self._send_mcs_pdu(CHANNEL_CONTROL, pdu)
+
     def send_input(self, event: dict):
         seq = self._next_seq()
         pdu = self.builder.build_input_pdu(seq, event)
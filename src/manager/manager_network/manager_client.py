@@ -4,6 +4,7 @@ import socket
 import ssl
 from common_network.x224_handshake import X224Handshake, CONFIRM_MAGIC
 from common_network.security_layer_tls import create_client_context, client_wrap_socket
+from common_network.constants import CAP_EXTLEN32
 
 class ManagerClient:
     """
@@ -16,6 +17,7 @@ class ManagerClient:
         self.port = port
         self.manager_id = manager_id
         self.sock = None # Sẽ là SSLSocket sau khi kết nối
+        self.ext_framing = False # server đã chấp nhận EXTLEN32 (nhận/gửi PDU > 64 KB nguyên khối)
 
     def connect(self, cafile: str, timeout: float = 10.0) -> bool:
         raw_sock = None
@@ -26,14 +28,15 @@ class ManagerClient:
             raw_sock.connect((self.host, self.port))
 
             # 2. Thực hiện X224 Handshake (trên socket thô)
-            resp = X224Handshake.client_send_connect(raw_sock, self.manager_id, timeout=timeout)
+            resp = X224Handshake.client_send_connect(raw_sock, self.manager_id, timeout=timeout, caps={CAP_EXTLEN32})
             
             if not (isinstance(resp, bytes) and resp.startswith(CONFIRM_MAGIC)):
                 print("[ManagerClient] Handshake X224 thất bại, resp:", resp)
                 raw_sock.close()
                 return False
 
-            print("[ManagerClient] Handshake X224 thành công.")
+            self.ext_framing = CAP_EXTLEN32 in X224Handshake.parse_caps(resp)
+            print(f"[ManagerClient] Handshake X224 thành công (ext_framing={self.ext_framing}).")
 
             # 3. Tạo TLS Context
             tls_context = create_client_context(cafile=cafile, check_hostname=False)
@@ -0,0 +1,344 @@
+# manager/manager_network/manager_file_receiver.py
+
+import os
+import zlib
+from bisect import bisect_left
+from typing import Callable, Optional
+from common_network.pdu_builder import PDUBuilder
+from common_network.file_utils import safe_join, FileChunkReader
+from common_network.transfer_journal import ReceiveJournal
+from common_network.constants import (
+    PDU_TYPE_FILE_START, PDU_TYPE_FILE_CHUNK, PDU_TYPE_FILE_END, FILE_MAX_SACK_BLOCKS, FILE_CHUNK_FLAG_ACK_NOW,
+)
+from manager.manager_constants import (
+    FILE_SAVE_DIR, FILE_ACK_EVERY_BYTES, FILE_SACK_ENABLED, FILE_RESUME_ENABLED, FILE_RECEIVE_JOURNAL,
+)
+
+"""
+Nhận file client gửi lên (FILE_START -> FILE_CHUNK... -> FILE_END) và trả lời bằng FILE_ACK / FILE_NAK:
+- Chunk được ghi thẳng vào đúng offset của file tạm (<tên>.part), đến lệch thứ tự vẫn ghi được.
+- ACK cộng dồn (ack_offset = số byte liên tục đã nhận từ đầu file) sau mỗi ack_every_bytes byte mới;
+  chunk có cờ FILE_CHUNK_FLAG_ACK_NOW (bên gửi đã đầy cửa sổ / chunk cuối / gửi lại), chunk đến lệch thứ tự
+  hoặc trùng lặp thì ACK ngay, kèm các đoạn đã nhận sau ack_offset (SACK) nếu bật sack.
+- Mỗi lỗ hổng mới (chunk đến sau 1 đoạn chưa nhận) -> FILE_NAK(offset đầu lỗ hổng, "gap") đúng 1 lần:
+  bên gửi gửi lại ngay, không chờ hết thời gian chờ ACK.
+- Đủ dữ liệu và đã có FILE_END: kiểm tra CRC32 cả file -> đổi tên thành file thật và ACK toàn bộ
+  (CRC tính dần trên dữ liệu liên tục lúc nhận, chỉ đọc lại từ file tạm phần đến lệch thứ tự / có từ trước khi tiếp tục)
+  (bên gửi chỉ đóng transfer khi nhận ACK này); sai CRC -> FILE_NAK(0, "crc") và xóa file tạm.
+- FILE_START có mã transfer (resume): (offset, length, CRC32) của mỗi chunk đã ghi được lưu vào ReceiveJournal
+  (trước mỗi ACK). FILE_START lại cùng mã (sau khi mất kết nối / khởi động lại): đọc lại từng chunk trong file tạm,
+  bỏ chunk sai CRC, rồi trả FILE_ACK có mã transfer: ack_offset = offset liên tục cao nhất, SACK = các đoạn còn lại
+  -> bên gửi chỉ gửi phần còn thiếu. Mã đã nhận xong: trả ack_offset = toàn bộ file (chờ FILE_END để ACK cuối).
+- Chunk kèm CRC32 riêng (FILE_CHUNK_FLAG_CRC) mà sai: không ghi, trả FILE_NAK(offset, "chunk_crc") -> chỉ chunk đó bị gửi lại.
+Không thread-safe: gọi từ 1 luồng (luồng xử lý PDU của ManagerApp).
+"""
+
+NAK_GAP = b"gap"
+NAK_CRC = b"crc"
+NAK_CHUNK_CRC = b"chunk_crc"
+
+
+class FileReceiver:
+    def __init__(self, send_pdu: Callable[[bytes], None], save_dir: str = FILE_SAVE_DIR,
+                 ack_every_bytes: int = FILE_ACK_EVERY_BYTES, sack: bool = FILE_SACK_ENABLED,
+                 resume: bool = FILE_RESUME_ENABLED):
+        self.send_pdu = send_pdu # send_pdu(pdu_bytes): gửi trên kênh FILE
+        self.save_dir = save_dir
+        self.ack_every_bytes = ack_every_bytes
+        self.sack = sack
+        self.resume = resume
+        self._journal: Optional[ReceiveJournal] = None # mở khi có FILE_START đầu tiên mang mã transfer
+        self._seq = 0
+
+        self._f = None
+        self.filename: Optional[str] = None
+        self.total = 0
+        self.crc: Optional[int] = None # CRC trong FILE_END (None: chưa nhận FILE_END)
+        self.contiguous = 0 # mọi byte < contiguous đã nhận
+        self.ranges = [] # các đoạn đã nhận sau contiguous, không giao nhau, tăng dần (list phẳng: s0, e0, s1, e1, ...)
+        self.naked = set() # offset đầu các lỗ hổng đã gửi NAK
+        self.complete = False # đã nhận đủ, đúng CRC (chunk / FILE_END đến muộn chỉ được ACK lại)
+        self._unacked = 0 # byte liên tục mới từ lần ACK trước
+        self.token = b"" # mã transfer hiện tại (b"": không lưu nhật ký, không tiếp tục được)
+        self._rows = [] # (offset, length, crc32) đã ghi, chưa lưu vào nhật ký
+        self._crc = 0 # CRC32 tính dần của [0, _crc_offset)
+        self._crc_offset = 0
+
+        # --- Thống kê ---
+        self.files_completed = 0
+        self.files_failed = 0
+        self.bytes_received = 0
+        self.duplicate_bytes = 0
+        self.acks_sent = 0
+        self.naks_sent = 0
+        self.resumed_bytes = 0 # byte giữ lại được từ file dở khi tiếp tục transfer
+        self.resume_bad_chunks = 0 # chunk trong file dở sai CRC (bị bỏ, bên gửi gửi lại)
+        self.corrupt_chunks = 0 # chunk nhận được sai CRC riêng của nó
+
+    def handle_pdu(self, pdu) -> None:
+        ptype = pdu.ptype
+        if ptype == PDU_TYPE_FILE_CHUNK:
+            self._on_chunk(pdu.offset, pdu.data, pdu.flags & FILE_CHUNK_FLAG_ACK_NOW, pdu.crc)
+        elif ptype == PDU_TYPE_FILE_START:
+            self._on_start(pdu.filename, pdu.total_size, pdu.checksum, pdu.transfer_id)
+        elif ptype == PDU_TYPE_FILE_END:
+            if self.complete:
+                self._send_ack()
+                return
+            self.crc = pdu.checksum
+            self._try_finish()
+
+    @property
+    def part_path(self) -> str:
+        return safe_join(self.save_dir, self.filename) + ".part"
+
+    @property
+    def journal(self) -> ReceiveJournal:
+        if self._journal is None:
+            self._journal = ReceiveJournal(os.path.join(self.save_dir, FILE_RECEIVE_JOURNAL))
+        return self._journal
+
+    def _on_start(self, filename: str, total: int, checksum: int = 0, token: bytes = b""):
+        self._close()
+        os.makedirs(self.save_dir, exist_ok=True)
+        self.filename = filename
+        self.total = total
+        self.crc = None
+        self.contiguous = 0
+        self.ranges = []
+        self.naked.clear()
+        self.complete = False
+        self._unacked = 0
+        self._crc = self._crc_offset = 0
+        self.token = token if self.resume else b""
+        if self.token and self._resume(checksum):
+            return
+        self._f = open(self.part_path, "w+b")
+        self._f.truncate(total)
+        if self.token:
+            self.journal.begin(self.token, filename, self.part_path, total, checksum)
+            self._send_ack(resume=True) # trả lời: chưa có gì, gửi từ đầu
+        print(f"[FileReceiver] Bắt đầu nhận {filename} ({total} bytes)")
+        if total == 0:
+            self._try_finish()
+
+    def _resume(self, checksum: int) -> bool:
+        """FILE_START cùng mã transfer với 1 file dở / đã nhận xong: khôi phục trạng thái và trả lời. False: nhận lại từ đầu."""
+        partial = self.journal.find(self.token)
+        part = self.part_path
+        if partial is None:
+            return False
+        final = part[:-len(".part")]
+        path = final if partial.done else part
+        if (partial.part_path != part or partial.total_size != self.total or partial.crc != checksum
+                or not os.path.exists(path) or os.path.getsize(path) != self.total):
+            self.journal.remove(self.token)
+            return False
+        if partial.done:
+            # Đã nhận xong nhưng bên gửi mất ACK cuối: báo đã có đủ, ACK toàn bộ lại khi nhận FILE_END
+            self.contiguous = self.total
+            self.complete = True
+            self._send_ack(resume=True)
+            print(f"[FileReceiver] {self.filename} đã nhận xong trước đó")
+            return True
+
+        # Kiểm tra CRC từng chunk đã ghi: dữ liệu chưa kịp xuống đĩa / file tạm bị sửa -> bỏ chunk đó
+        good, bad = [], []
+        reader = FileChunkReader(part)
+        try:
+            for offset, length, crc in self.journal.chunks(self.token):
+                (good if zlib.crc32(reader.read(offset, length)) & 0xFFFFFFFF == crc else bad).append((offset, length))
+        finally:
+            reader.close()
+        if bad:
+            self.journal.drop_chunks(self.token, [offset for offset, _ in bad])
+        for offset, length in good:
+            if offset <= self.contiguous:
+                self.contiguous = max(self.contiguous, offset + length)
+            else:
+                self._insert(offset, offset + length)
+        ranges = self.ranges
+        while ranges and ranges[0] <= self.contiguous:
+            self.contiguous = max(self.contiguous, ranges[1])
+            del ranges[:2]
+        kept = sum(length for _, length in good)
+        self.resumed_bytes += kept
+        self.resume_bad_chunks += len(bad)
+        self._f = open(part, "r+b")
+        print(f"[FileReceiver] Tiếp tục nhận {self.filename}: đã có {kept}/{self.total} bytes "
+              f"(liên tục {self.contiguous}), bỏ {len(bad)} chunk sai CRC")
+        self._send_ack(resume=True)
+        return True
+
+    def _on_chunk(self, offset: int, data, ack_now: int = 0, crc: Optional[int] = None):
+        n = len(data)
+        end = offset + n
+        if self.complete:
+            self.duplicate_bytes += n
+            self._send_ack()
+            return
+        if self._f is None or end > self.total or n == 0:
+            return
+        if end <= self.contiguous or self._covered(offset, end):
+            # Trùng lặp (bên gửi gửi lại vì mất ACK / hết thời gian chờ): ACK lại ngay
+            self.duplicate_bytes += n
+            self._send_ack()
+            return
+
+        if crc is not None or self.token:
+            chunk_crc = zlib.crc32(data) & 0xFFFFFFFF
+            if crc is not None and chunk_crc != crc:
+                # Chunk hỏng trên đường: không ghi, xin gửi lại riêng chunk này
+                self.corrupt_chunks += 1
+                self._send_nak(offset, NAK_CHUNK_CRC)
+                return
+        self._f.seek(offset)
+        self._f.write(data)
+        self.bytes_received += n
+        if self.token:
+            self._rows.append((offset, n, chunk_crc))
+
+        if offset <= self.contiguous:
+            advanced = end - self.contiguous
+            self.contiguous = end
+            # Nối các đoạn đã nhận trước đó (lệch thứ tự) liền sau
+            ranges = self.ranges
+            while ranges and ranges[0] <= self.contiguous:
+                self.contiguous = max(self.contiguous, ranges[1])
+                del ranges[:2]
+            self._unacked += advanced
+            self._advance_crc(offset, data)
+            if self.naked:
+                self.naked = {o for o in self.naked if o >= self.contiguous}
+            if ack_now or self.ranges or self._unacked >= self.ack_every_bytes or self.contiguous == self.total:
+                self._send_ack()
+        else:
+            gap_start = self._insert(offset, end)
+            if gap_start is not None and gap_start not in self.naked:
+                self.naked.add(gap_start)
+                self._send_nak(gap_start, NAK_GAP)
+            self._send_ack()
+        self._try_finish()
+
+    def _advance_crc(self, offset: int, data):
+        """CRC cả file tính dần tới contiguous: chunk đến đúng thứ tự dùng luôn dữ liệu, phần nối thêm đọc lại từ file tạm."""
+        if offset == self._crc_offset:
+            self._crc = zlib.crc32(data, self._crc)
+            self._crc_offset += len(data)
+        if self._crc_offset < self.contiguous:
+            self._f.flush()
+            self._catch_up_crc(self._f, self.contiguous)
+
+    def _catch_up_crc(self, f, upto: int):
+        f.seek(self._crc_offset)
+        while self._crc_offset < upto:
+            b = f.read(min(1 << 20, upto - self._crc_offset))
+            if not b:
+                break
+            self._crc = zlib.crc32(b, self._crc)
+            self._crc_offset += len(b)
+
+    def _covered(self, start: int, end: int) -> bool:
+        r = self.ranges
+        i = bisect_left(r, start + 1) # đoạn có start < start + 1
+        return i % 2 == 1 and r[i - 1] <= start and end <= r[i]
+
+    def _insert(self, start: int, end: int) -> Optional[int]:
+        """Thêm [start, end) vào ranges (gộp đoạn giao / kề). Trả về offset đầu lỗ hổng ngay trước đoạn nếu có."""
+        r = self.ranges
+        i = bisect_left(r, start)
+        lo = hi = i - (i & 1) # i lẻ: đoạn (i-1, i) giao / kề [start, end)
+        new_start, new_end = start, end
+        while hi < len(r) and r[hi] <= end:
+            new_start = min(new_start, r[hi])
+            new_end = max(new_end, r[hi + 1])
+            hi += 2
+        r[lo:hi] = [new_start, new_end]
+        prev_end = r[lo - 1] if lo >= 2 else self.contiguous
+        return prev_end if prev_end < new_start else None
+
+    def _send_ack(self, resume: bool = False):
+        sack = ()
+        if (self.sack or resume) and self.ranges:
+            r = self.ranges[:2 * FILE_MAX_SACK_BLOCKS]
+            sack = list(zip(r[0::2], r[1::2]))
+        ack = self.contiguous
+        if ack >= self.total and not self.complete and not resume:
+            # ACK toàn bộ chỉ sau khi kiểm tra CRC (bên gửi đóng transfer khi nhận ACK này)
+            return
+        self._flush_journal() # chỉ ACK những gì đã có trong nhật ký
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        self.send_pdu(PDUBuilder.build_file_ack(self._seq, ack, sack, self.token if resume else b""))
+        self._unacked = 0
+        self.acks_sent += 1
+
+    def _send_nak(self, offset: int, reason: bytes):
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        self.send_pdu(PDUBuilder.build_file_nak(self._seq, offset, reason))
+        self.naks_sent += 1
+
+    def _try_finish(self):
+        if self._f is None or self.contiguous < self.total or self.crc is None:
+            return
+        if self._crc_offset < self.total:
+            self._f.flush()
+            self._catch_up_crc(self._f, self.total)
+        self._f.close()
+        self._f = None
+        part = self.part_path
+        crc = self._crc
+        if (crc & 0xFFFFFFFF) != self.crc:
+            print(f"[FileReceiver] Sai CRC {self.filename}: {crc & 0xFFFFFFFF:08x} != {self.crc:08x}")
+            os.remove(part)
+            self._drop_journal()
+            self.files_failed += 1
+            self._send_nak(0, NAK_CRC)
+            return
+        os.replace(part, part[:-len(".part")])
+        if self.token:
+            self._rows.clear()
+            self.journal.finish(self.token)
+        self.files_completed += 1
+        self.complete = True
+        print(f"[FileReceiver] Đã nhận xong {self.filename} ({self.total} bytes)")
+        self._send_ack()
+
+    def _flush_journal(self):
+        if self._rows:
+            self._f.flush() # dữ liệu xuống OS trước khi ghi nhật ký (chưa fsync: lúc tiếp tục vẫn kiểm tra CRC từng chunk)
+            self.journal.add_chunks(self.token, self._rows)
+            self._rows = []
+
+    def _drop_journal(self):
+        if self.token:
+            self._rows.clear()
+            self.journal.remove(self.token)
+
+    def _close(self):
+        if self._f is not None:
+            self._flush_journal()
+            self._f.close()
+            self._f = None
+
+    def close(self):
+        self._close()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def stats(self) -> dict:
+        return {
+            "file": self.filename,
+            "received": self.contiguous,
+            "total": self.total,
+            "out_of_order_ranges": len(self.ranges) // 2,
+            "files_completed": self.files_completed,
+            "files_failed": self.files_failed,
+            "bytes_received": self.bytes_received,
+            "duplicate_bytes": self.duplicate_bytes,
+            "acks_sent": self.acks_sent,
+            "naks_sent": self.naks_sent,
+            "resumed_bytes": self.resumed_bytes,
+            "resume_bad_chunks": self.resume_bad_chunks,
+            "corrupt_chunks": self.corrupt_chunks,
+        }
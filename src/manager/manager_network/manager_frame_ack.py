@@ -0,0 +1,84 @@
+# manager/manager_network/manager_frame_ack.py
+
+import threading
+from typing import Callable, Optional
+
+"""
+Gom thông tin các frame đã hiển thị và gửi FRAME_ACK định kỳ (không phải mỗi frame):
+- last_seq / frame_ts_ms: frame mới nhất đã hiển thị (ts_ms gốc của client, trả lại nguyên vẹn)
+- decode_ms / render_ms: trung bình trong đợt (giải mã JPEG / vá vào ảnh nền)
+- frames / dropped: số frame hiển thị được / nhận được nhưng bỏ (thiếu ảnh nền, JPEG hỏng) trong đợt
+Đợt nào không có frame mới thì không gửi gì.
+"""
+
+DEFAULT_ACK_INTERVAL = 0.25 # giây giữa 2 lần gửi FRAME_ACK
+
+
+class FrameAckReporter:
+    def __init__(self, send_ack: Callable, interval: float = DEFAULT_ACK_INTERVAL):
+        # send_ack(last_seq, frame_ts_ms, decode_ms, render_ms, frames, dropped)
+        self.send_ack = send_ack
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._reset_batch()
+        self.acks_sent = 0
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _reset_batch(self):
+        self.last_seq = None
+        self.frame_ts_ms = 0
+        self.frames = 0
+        self.dropped = 0
+        self.decode_total_ms = 0.0
+        self.render_total_ms = 0.0
+
+    def rendered(self, seq: int, ts_ms: int, decode_ms: float, render_ms: float) -> None:
+        """Gọi sau khi 1 frame (FULL/RECT) đã được vá vào ảnh nền và giao cho GUI."""
+        with self.lock:
+            self.last_seq = seq
+            self.frame_ts_ms = ts_ms
+            self.frames += 1
+            self.decode_total_ms += decode_ms
+            self.render_total_ms += render_ms
+
+    def dropped_frame(self, count: int = 1) -> None:
+        with self.lock:
+            self.dropped += count
+
+    def flush(self) -> bool:
+        """Gửi FRAME_ACK cho đợt hiện tại (nếu có frame mới). Trả về True nếu đã gửi."""
+        with self.lock:
+            if self.last_seq is None:
+                # Chỉ có frame bị bỏ: chưa có gì để xác nhận, giữ bộ đếm cho đợt sau
+                return False
+            args = (self.last_seq, self.frame_ts_ms,
+                    self.decode_total_ms / self.frames, self.render_total_ms / self.frames,
+                    self.frames, self.dropped)
+            self._reset_batch()
+        self.send_ack(*args)
+        self.acks_sent += 1
+        return True
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="FrameAckReporter")
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        with self.lock:
+            self._reset_batch()
+
+    def _loop(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[FrameAckReporter] Lỗi gửi FRAME_ACK: {e}")
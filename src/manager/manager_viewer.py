@@ -1,78 +1,127 @@
 # manager/manager_viewer.py
 
 import threading
+import math
 from PIL import Image
 import io
 import time
 from typing import Optional, Dict, Any, Tuple
+from common_network.constants import PDU_TYPE_FULL, PDU_TYPE_RECT
+
+
+class FrameUpdate:
+    """
+    [THÊM] 1 cập nhật màn hình đã giải mã, giao cho GUI (FrameCompositor) vá vào framebuffer:
+    - full=True: ảnh toàn màn hình (image.size == size), thay toàn bộ framebuffer
+    - full=False: vùng `image` đặt tại (x, y) trên màn hình kích thước `size`
+    Chỉ mang vùng thay đổi: không sao chép ảnh toàn màn hình cho mỗi RECT.
+    """
+    __slots__ = ("client_id", "seq", "ts_ms", "full", "x", "y", "image", "size", "decode_ms")
+
+    def __init__(self, client_id: str, seq: int, ts_ms: int, full: bool, x: int, y: int,
+                 image: Image.Image, size: Tuple[int, int], decode_ms: float = 0.0):
+        self.client_id = client_id
+        self.seq = seq
+        self.ts_ms = ts_ms
+        self.full = full
+        self.x = x
+        self.y = y
+        self.image = image
+        self.size = size
+        self.decode_ms = decode_ms
+
+    @property
+    def rect(self) -> Tuple[int, int, int, int]:
+        """(x, y, w, h) của vùng thay đổi trên framebuffer."""
+        return (self.x, self.y) + self.image.size
+
+    def __repr__(self) -> str:
+        return f"FrameUpdate(seq={self.seq}, full={self.full}, rect={self.rect}, size={self.size})"
+
+
+def scale_damage(rect: Tuple[int, int, int, int], src_size: Tuple[int, int], dst_size: Tuple[int, int],
+                 pad: int = 1) -> Tuple[int, int, int, int]:
+    """
+    Quy vùng (x, y, w, h) trên framebuffer `src_size` ra vùng (x, y, w, h) nguyên trên ảnh hiển thị
+    `dst_size` (đã co giãn), làm tròn ra ngoài và nới thêm `pad` px: bộ lọc co giãn mịn
+    lấy mẫu cả điểm ảnh lân cận nên viền vùng thay đổi cũng phải vẽ lại.
+    """
+    x, y, w, h = rect
+    sx = dst_size[0] / src_size[0]
+    sy = dst_size[1] / src_size[1]
+    left = max(0, math.floor(x * sx) - pad)
+    top = max(0, math.floor(y * sy) - pad)
+    right = min(dst_size[0], math.ceil((x + w) * sx) + pad)
+    bottom = min(dst_size[1], math.ceil((y + h) * sy) + pad)
+    return left, top, max(0, right - left), max(0, bottom - top)
+
 
 class ManagerViewer:
     """
-    Quản lý ảnh nền (base image) và xử lý logic vá (patch) các vùng thay đổi.
+    Giải mã PDU video và kiểm tra tính hợp lệ so với kích thước màn hình hiện tại của từng client.
+    [SỬA] Không còn giữ ảnh nền ở đây: ảnh nền (framebuffer) do FrameCompositor trên luồng GUI giữ
+    và vá tại chỗ; trước đây mỗi RECT trả về current_base.copy() (sao chép cả màn hình).
     """
 
     def __init__(self):
         self.lock = threading.Lock()
-        # Lưu trữ ảnh nền đầy đủ (base image)
-        self.current_base_image: Dict[str, Optional[Image.Image]] = {} 
+        # Kích thước framebuffer hiện tại (từ FULL frame gần nhất) của từng client
         self.current_base_size: Dict[str, Tuple[int, int]] = {}
-        
-    def process_video_pdu(self, client_id: str, pdu: dict) -> Optional[Image.Image]:
+
+    def process_video_pdu(self, client_id: str, pdu) -> Optional[FrameUpdate]:
         """
-        Xử lý PDU video (full/rect), vá ảnh nếu cần, và trả về ảnh nền mới nhất.
+        Giải mã PDU video (full/rect) thành FrameUpdate cho GUI; None nếu phải bỏ frame.
+        (= decode_pdu + make_update, dùng khi giải mã tuần tự trên 1 luồng)
         """
-        jpg = pdu.get("jpg")
-        ptype = pdu.get("type")
-        
-        if not jpg: 
+        t0 = time.perf_counter()
+        new_img = self.decode_pdu(pdu)
+        if new_img is None:
+            return None
+        return self.make_update(client_id, pdu, new_img, (time.perf_counter() - t0) * 1000)
+
+    def decode_pdu(self, pdu) -> Optional[Image.Image]:
+        """Giải mã JPEG của PDU video. Không đụng tới trạng thái: gọi song song từ nhiều luồng được."""
+        jpg = pdu.jpg # memoryview trỏ vào PDU nhận được
+        if not jpg:
             return None
-        
         try:
             # Giải mã JPEG của vùng/ảnh mới
             # Rất quan trọng: Sử dụng io.BytesIO để giải mã in-memory
-            new_img = Image.open(io.BytesIO(jpg)).convert("RGB")
+            return Image.open(io.BytesIO(jpg)).convert("RGB")
         except Exception as e:
             # Nếu giải mã lỗi (ảnh hỏng), bỏ qua frame này
             print(f"[ManagerViewer] Lỗi giải mã JPEG: {e}")
             return None
 
+    def make_update(self, client_id: str, pdu, new_img: Image.Image, decode_ms: float = 0.0) -> Optional[FrameUpdate]:
+        """
+        Kiểm tra ảnh đã giải mã với kích thước màn hình hiện tại và tạo FrameUpdate.
+        Phải gọi theo đúng thứ tự nhận PDU (FULL đổi kích thước trước các RECT sau nó).
+        """
+        ptype = pdu.ptype
         with self.lock:
-            current_base = self.current_base_image.get(client_id)
-            
             # --- XỬ LÝ PDU FULL (LÀM MỚI TOÀN BỘ) ---
-            if ptype == "full":
+            if ptype == PDU_TYPE_FULL:
                 print(f"[Viewer] ===> NHẬN FULL FRAME! Size: {new_img.size}. Client: {client_id}")
-                self.current_base_image[client_id] = new_img
                 self.current_base_size[client_id] = new_img.size
-                return new_img.copy() 
-            
+                return FrameUpdate(client_id, pdu.seq, pdu.ts_ms, True, 0, 0, new_img, new_img.size, decode_ms)
+
             # --- XỬ LÝ PDU RECT (VÁ ẢNH) ---
-            elif ptype == "rect":
-                x, y, w, h = pdu.get("x"), pdu.get("y"), pdu.get("w"), pdu.get("h")
-                full_w, full_h = pdu.get("full_w"), pdu.get("full_h")
+            elif ptype == PDU_TYPE_RECT:
+                base_size = self.current_base_size.get(client_id)
+                full_size = (pdu.full_w, pdu.full_h)
 
-                # 1. Kiểm tra ảnh nền: NẾU THIẾU HOẶC KHÔNG KHỚP KÍCH THƯỚC -> BỎ QUA RECT
-                if current_base is None or current_base.size != (full_w, full_h):
-                    print(f"[Viewer] Bỏ qua RECT: Thiếu Base Image hoặc size thay đổi ({current_base.size if current_base else 'None'} -> {full_w}x{full_h}). Cần PDU FULL.")
+                # NẾU THIẾU ẢNH NỀN HOẶC KHÔNG KHỚP KÍCH THƯỚC -> BỎ QUA RECT
+                if base_size != full_size:
+                    print(f"[Viewer] Bỏ qua RECT: Thiếu Base Image hoặc size thay đổi ({base_size} -> {pdu.full_w}x{pdu.full_h}). Cần PDU FULL.")
                     return None # Bỏ qua frame RECT này
-                    
-                # 2. Vá (paste) vùng thay đổi lên ảnh nền
-                try:
-                    # new_img: Vùng ảnh JPEG đã được cắt
-                    current_base.paste(new_img, (x, y))
-                except ValueError as e:
-                    print(f"[Viewer] Lỗi vá ảnh: {e}. Bỏ qua frame RECT.")
-                    return None
-
-                # 3. Trả về ảnh đã vá
-                return current_base.copy()
-            
-            return current_base.copy() if current_base else None
+                return FrameUpdate(client_id, pdu.seq, pdu.ts_ms, False, pdu.x, pdu.y, new_img, full_size, decode_ms)
+
+            return None
 
     def clear_frames(self):
         with self.lock:
-            self.current_base_image.clear()
             self.current_base_size.clear()
-            
+
     def stop(self):
-        self.clear_frames()
\ No newline at end of file
+        self.clear_frames()
@@ -0,0 +1,104 @@
+# manager/manager_wall.py
+
+from typing import Dict
+from PyQt6.QtWidgets import QScrollArea, QWidget, QGridLayout, QVBoxLayout, QLabel
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtCore import Qt, QSize, pyqtSignal
+
+"""
+Màn hình tổng quan (wall view): lưới ảnh thu nhỏ của nhiều client cùng lúc.
+- Mỗi client 1 ô (ThumbnailTile) tạo khi nhận ảnh đầu tiên, xếp theo tên, tự dàn lại số cột theo bề rộng.
+- Nhấp đúp 1 ô -> promote_requested(client_id): manager mở phiên tương tác với client đó
+  (đang ở trong phiên khác thì server chuyển phiên).
+Ảnh đã được giải mã sẵn (QImage) ngoài luồng GUI; ở đây chỉ co giãn về kích thước ô.
+"""
+
+DEFAULT_TILE_SIZE = QSize(240, 135)
+
+
+class ThumbnailTile(QWidget):
+    double_clicked = pyqtSignal(str)
+
+    def __init__(self, client_id: str, tile_size: QSize, parent=None):
+        super().__init__(parent)
+        self.client_id = client_id
+        self.tile_size = tile_size
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(2, 2, 2, 2)
+        layout.setSpacing(2)
+        self.image_label = QLabel("Đang chờ ảnh...")
+        self.image_label.setFixedSize(tile_size)
+        self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.image_label.setStyleSheet("background-color: black; color: gray;")
+        self.name_label = QLabel(client_id)
+        self.name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(self.image_label)
+        layout.addWidget(self.name_label)
+        self.setToolTip(f"Nhấp đúp để điều khiển {client_id}")
+
+    def set_image(self, image: QImage):
+        pixmap = QPixmap.fromImage(image).scaled(
+            self.tile_size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+        )
+        self.image_label.setPixmap(pixmap)
+
+    def mouseDoubleClickEvent(self, event):
+        self.double_clicked.emit(self.client_id)
+        super().mouseDoubleClickEvent(event)
+
+
+class ThumbnailWall(QScrollArea):
+    promote_requested = pyqtSignal(str)
+
+    def __init__(self, tile_size: QSize = DEFAULT_TILE_SIZE, parent=None):
+        super().__init__(parent)
+        self.tile_size = tile_size
+        self.tiles: Dict[str, ThumbnailTile] = {}
+        self._columns = 0
+
+        self.container = QWidget()
+        self.grid = QGridLayout(self.container)
+        self.grid.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        self.grid.setSpacing(6)
+        self.setWidget(self.container)
+        self.setWidgetResizable(True)
+
+        self.empty_label = QLabel("Chưa có ảnh thu nhỏ nào.")
+        self.grid.addWidget(self.empty_label, 0, 0)
+
+    def update_thumbnail(self, client_id: str, image: QImage):
+        tile = self.tiles.get(client_id)
+        if tile is None:
+            tile = ThumbnailTile(client_id, self.tile_size)
+            tile.double_clicked.connect(self.promote_requested)
+            self.tiles[client_id] = tile
+            self._relayout(force=True)
+        tile.set_image(image)
+
+    def remove_thumbnail(self, client_id: str):
+        tile = self.tiles.pop(client_id, None)
+        if tile is not None:
+            self.grid.removeWidget(tile)
+            tile.deleteLater()
+            self._relayout(force=True)
+
+    def clear(self):
+        for client_id in list(self.tiles):
+            self.remove_thumbnail(client_id)
+
+    def _relayout(self, force: bool = False):
+        cell = self.tile_size.width() + self.grid.spacing() + 4
+        columns = max(1, self.viewport().width() // cell)
+        if columns == self._columns and not force:
+            return
+        self._columns = columns
+        for tile in self.tiles.values():
+            self.grid.removeWidget(tile)
+        self.empty_label.setVisible(not self.tiles)
+        for i, client_id in enumerate(sorted(self.tiles)):
+            self.grid.addWidget(self.tiles[client_id], i // columns, i % columns)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._relayout()
@@ -1,7 +1,8 @@
 # server0/server.py
 
-from server0.server_network.server_app import ServerApp
+from server0.server_network.server_app import ServerApp, AsyncServerApp
 from server0.server_constants import SERVER_HOST, SERVER_PORT, CERT_FILE, KEY_FILE
+import argparse
 import signal
 import time
 import os
@@ -9,8 +10,19 @@ import sys
 
 app = None
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PBL4 relay server")
+    parser.add_argument("--engine", choices=("thread", "asyncio"), default="thread",
+                        help="thread: 1 thread/kết nối (mặc định); asyncio: 1 event loop cho mọi kết nối")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--stats-interval", type=float, default=0,
+                        help="in thống kê độ trễ / jitter / fps các phiên mỗi N giây (0: tắt)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     global app
+    args = parse_args(argv)
     
     # --- Kiểm tra Cert/Key trước khi khởi động ---
     if not os.path.exists(CERT_FILE) or not os.path.exists(KEY_FILE):
@@ -20,10 +32,11 @@ def main():
         print("openssl req -x509 -newkey rsa:2048 -keyout server.key -out server.crt -sha256 -days 365 -nodes")
         sys.exit(1)
         
-    print("Khởi động Server...")
-    app = ServerApp(
-        host=SERVER_HOST, 
-        port=SERVER_PORT,
+    print(f"Khởi động Server (engine: {args.engine})...")
+    app_cls = AsyncServerApp if args.engine == "asyncio" else ServerApp
+    app = app_cls(
+        host=args.host, 
+        port=args.port,
         certfile=CERT_FILE,
         keyfile=KEY_FILE
     )
@@ -41,8 +54,24 @@ def main():
 
     # Giữ luồng chính hoạt động
     try:
+        last_stats = time.monotonic()
         while True:
             time.sleep(1)
+            if args.stats_interval and time.monotonic() - last_stats >= args.stats_interval:
+                last_stats = time.monotonic()
+                for session_id, s in app.session_stats().items():
+                    lat, rtt = s["latency_ms"], s["render_rtt_ms"]
+                    print(f"[Stats] {session_id}: trễ p50 {lat['p50']:.0f} / p99 {lat['p99']:.0f} ms, "
+                          f"jitter {s['jitter_ms']:.1f} ms, render RTT p50 {rtt['p50']:.0f} ms, "
+                          f"{s['fps']:.1f} fps (bỏ {s['frames_dropped']})")
+                t = app.thumbnail_stats()
+                if t["producing"]:
+                    print(f"[Stats] Ảnh thu nhỏ: {t['producing']} client đang gửi, nhận {t['received']}, "
+                          f"chuyển tiếp {t['forwarded']}, bỏ vì quá dày {t['rate_limited']}")
+                k = app.keyframe_stats()
+                if k["hits"] or k["misses"]:
+                    print(f"[Stats] Cache keyframe: {k['clients']} client, {k['bytes'] / 1e6:.1f} MB, "
+                          f"hit {k['hits']} / miss {k['misses']}, chuỗi quá dài {k['chain_overflows']}")
     except KeyboardInterrupt:
         _term(None, None)
 
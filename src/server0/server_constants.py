@@ -32,6 +32,7 @@ CHANNEL_CONTROL = 3
 CHANNEL_INPUT = 4
 CHANNEL_FILE = 5
 CHANNEL_CURSOR = 6
+CHANNEL_THUMB = 7 # [THÊM] ảnh thu nhỏ (màn hình tổng quan của manager)
 
 # Danh sách tất cả các kênh mà ServerReceiver sẽ lắng nghe
 ALL_CHANNELS = (
@@ -40,6 +41,7 @@ ALL_CHANNELS = (
     CHANNEL_INPUT,
     CHANNEL_FILE,
     CHANNEL_CURSOR,
+    CHANNEL_THUMB,
 )
 
 # --- Định nghĩa Vai trò (Role) ---
@@ -55,6 +57,11 @@ CMD_LIST_CLIENTS = "list_clients"  # Manager yêu cầu danh sách client
 CMD_CONNECT_CLIENT = "connect:"    # Manager yêu cầu kết nối: "connect:client_pc_1"
 CMD_DISCONNECT = "disconnect"      # Manager/Client báo ngắt kết nối phiên
 CMD_SECURITY_ALERT = "security_alert" # Cấu trúc: "security_alert:Loại vi phạm|Nội dung chi tiết"
+CMD_SESSION_STATS = "session_stats"  # Manager hỏi thống kê độ trễ / jitter / fps của phiên
+CMD_THUMB_SUBSCRIBE = "thumb_subscribe"     # Manager theo dõi ảnh thu nhỏ: "thumb_subscribe:[\"pc1\", \"pc2\"]" hoặc "thumb_subscribe:*"
+CMD_THUMB_UNSUBSCRIBE = "thumb_unsubscribe" # Bỏ theo dõi: "thumb_unsubscribe:[\"pc1\"]" hoặc "thumb_unsubscribe:*" (tất cả)
+CMD_INPUT_REQUEST = "input_request" # Manager trong phiên xin quyền điều khiển chuột/phím của client
+CMD_INPUT_RELEASE = "input_release" # Manager nhả quyền điều khiển
 
 # Server -> Client/Manager
 CMD_REGISTER_OK = "register_ok"   # Ví dụ: "register_ok:manager"
@@ -62,3 +69,31 @@ CMD_CLIENT_LIST_UPDATE = "client_list_update" # Gửi JSON: "client_list_update:
 CMD_SESSION_STARTED = "session_started"       # Báo phiên bắt đầu: "session_started:client_pc_1"
 CMD_SESSION_ENDED = "session_ended"           # Báo phiên kết thúc: "session_ended:client_pc_1"
 CMD_ERROR = "error"                           # Báo lỗi: "error:Client not found"
+# CMD_SESSION_STATS cũng là tên lệnh trả lời: "session_stats:{\"manager1::pc1\": {...}}"
+CMD_THUMB_START = "thumb_start" # -> client: bắt đầu gửi ảnh thu nhỏ: "thumb_start:{\"max_dimension\": 320, \"interval\": 1.0, \"quality\": 50}"
+CMD_THUMB_STOP = "thumb_stop"   # -> client: không còn manager nào theo dõi, dừng gửi ảnh thu nhỏ
+CMD_THUMB_GONE = "thumb_gone"   # -> manager: client đã ngắt kết nối, bỏ ô của nó: "thumb_gone:pc1"
+CMD_INPUT_OWNER = "input_owner" # -> mọi bên trong phiên: ai đang điều khiển: "input_owner:{\"owner\": \"...\" | null, \"is_you\": true}"
+CMD_REQUEST_REFRESH = "request_refresh" # -> client: xin FULL frame (manager mới vào phiên / manager tụt hậu)
+CMD_VIEWER_JOINED = "viewer_joined"     # -> client: manager vào xem, đã nhận ảnh từ cache của server (không cần FULL frame)
+CMD_KEYFRAME_CACHE = "keyframe_cache"   # -> client (sau register_ok): server có cache keyframe, giãn chu kỳ FULL frame: "keyframe_cache:3"
+
+# --- [THÊM] Luồng ảnh thu nhỏ (màn hình tổng quan) ---
+# Client chỉ chụp / encode ảnh thu nhỏ khi có ít nhất 1 manager theo dõi, theo thông số server gửi kèm thumb_start
+THUMB_MAX_DIMENSION = 320 # cạnh dài tối đa (px)
+THUMB_INTERVAL = 1.0      # giây giữa 2 ảnh (1 fps)
+THUMB_QUALITY = 50        # chất lượng JPEG
+
+# --- [THÊM] Phiên nhiều người xem (1 client -> N manager) ---
+SESSION_MAX_SUBSCRIBERS = 8   # số manager tối đa cùng xem 1 client
+SUBSCRIBER_LAG_FRAMES = 64    # làn video của 1 manager dồn quá số MCS frame này -> ngừng gửi RECT cho nó, chờ FULL frame
+REFRESH_MIN_INTERVAL = 1.0    # giây tối thiểu giữa 2 lần xin client gửi FULL frame
+
+# --- [THÊM] Bảng đăng ký / định tuyến của SessionManager ---
+SESSION_MANAGER_SHARDS = 16 # số shard (mỗi shard 1 lock + bảng định tuyến copy-on-write riêng)
+
+# --- [THÊM] Cache keyframe trên server (vào phiên / refresh không cần chờ client gửi FULL frame) ---
+KEYFRAME_CACHE_MAX_BYTES = 64 * 1024 * 1024 # tổng bộ nhớ cho mọi client, quá thì bỏ client ít dùng nhất (LRU)
+KEYFRAME_ENTRY_MAX_BYTES = 8 * 1024 * 1024  # 1 client: FULL frame + các RECT sau nó
+KEYFRAME_MAX_CHAIN = 48 # số PDU sau FULL frame tối đa (< SUBSCRIBER_LAG_FRAMES: phát lại không làm manager bị coi là tụt hậu)
+KEYFRAME_FULL_INTERVAL_FACTOR = 3 # client giãn chu kỳ FULL frame định kỳ bấy nhiêu lần
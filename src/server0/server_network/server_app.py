@@ -1,8 +1,12 @@
 # server0/server_network/server_app.py
 
+import asyncio
+import threading
 from server0.server_network.server_network import ServerNetwork
 from server0.server_network.server_broadcaster import ServerBroadcaster
 from server0.server_network.server_session_manager import SessionManager
+from server0.server_network.server_async_network import AsyncServerNetwork
+from server0.server_network.server_async_broadcaster import AsyncBroadcaster
 
 class ServerApp:
     def __init__(self, host="0.0.0.0", port=5000, certfile=None, keyfile=None):
@@ -46,4 +50,97 @@ class ServerApp:
         self.network.stop()
         self.session_manager.stop()
         self.broadcaster.stop()
-        print("[ServerApp] Đã dừng hoàn toàn.")
\ No newline at end of file
+        print("[ServerApp] Đã dừng hoàn toàn.")
+
+    def session_stats(self):
+        """Thống kê độ trễ / jitter / fps theo phiên (dùng cho quản trị)."""
+        return self.session_manager.session_stats()
+
+    def thumbnail_stats(self):
+        """Thống kê luồng ảnh thu nhỏ: số client đang gửi, số manager theo dõi, số ảnh nhận / chuyển tiếp."""
+        return self.session_manager.thumbnails.stats()
+
+    def keyframe_stats(self):
+        """Cache keyframe: số client đang có chuỗi phát lại, bộ nhớ, hit / miss, số lần bị bỏ."""
+        return self.session_manager.keyframe_stats()
+
+class AsyncServerApp:
+    """
+    Engine asyncio (server0 --engine asyncio): cùng giao thức, cùng SessionManager/ServerSession
+    (chạy inline trên event loop), nhưng 1 event loop thay cho thread-per-connection.
+    Event loop chạy trong 1 thread riêng để giữ nguyên giao diện start()/stop() của ServerApp.
+    """
+    def __init__(self, host="0.0.0.0", port=5000, certfile=None, keyfile=None):
+        self.broadcaster = AsyncBroadcaster()
+        self.session_manager = SessionManager(self.broadcaster, inline=True)
+        self.network = AsyncServerNetwork(
+            host=host,
+            port=port,
+            certfile=certfile,
+            keyfile=keyfile
+        )
+        self.network.set_callbacks(
+            on_connect=self.session_manager.handle_new_connection,
+            on_pdu=self.session_manager.handle_pdu,
+            on_disconnect=self.session_manager.handle_disconnection
+        )
+        self.network.set_broadcaster(self.broadcaster)
+
+        self.loop = None
+        self.loop_thread = None
+        self._stop_event = None
+        self._ready = threading.Event()
+        self._start_error = None
+
+    def start(self):
+        print("[AsyncServerApp] Đang khởi động các dịch vụ...")
+        self.loop_thread = threading.Thread(target=self._run_loop, daemon=True, name="AsyncServerLoop")
+        self.loop_thread.start()
+        self._ready.wait()
+        if self._start_error:
+            raise self._start_error
+        print("[AsyncServerApp] Server đã sẵn sàng.")
+
+    def _run_loop(self):
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            self._start_error = self._start_error or e
+            self._ready.set()
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self.session_manager.start()
+        try:
+            await self.network.start()
+        except Exception as e:
+            self._start_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        await self._stop_event.wait()
+
+        await self.network.stop()
+        self.session_manager.stop()
+        self.broadcaster.stop()
+
+    def stop(self):
+        print("[AsyncServerApp] Đang dừng các dịch vụ...")
+        if self.loop and self._stop_event and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._stop_event.set)
+        if self.loop_thread:
+            self.loop_thread.join(timeout=5)
+        print("[AsyncServerApp] Đã dừng hoàn toàn.")
+
+    def session_stats(self):
+        """Thống kê độ trễ / jitter / fps theo phiên (đọc từ thread khác event loop: chỉ đọc, có lock)."""
+        return self.session_manager.session_stats()
+
+    def thumbnail_stats(self):
+        return self.session_manager.thumbnails.stats()
+
+    def keyframe_stats(self):
+        """Cache keyframe: số client đang có chuỗi phát lại, bộ nhớ, hit / miss, số lần bị bỏ."""
+        return self.session_manager.keyframe_stats()
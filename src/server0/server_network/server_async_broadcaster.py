@@ -0,0 +1,116 @@
+# server0/server_network/server_async_broadcaster.py
+
+import asyncio
+from common_network.tpkt_writer import FrameBatch, DEFAULT_MAX_BATCH, legacy_frames
+from common_network.constants import MAX_MCS_PAYLOAD
+from common_network.stats import WriteStats
+from server0.server_network.server_broadcaster import FRAMES_PER_TURN
+from server0.server_network.server_peer_outbox import PeerOutbox
+
+class AsyncBroadcaster:
+    """
+    Bản asyncio của ServerBroadcaster (engine asyncio).
+    Mỗi peer có 1 PeerOutbox (các làn ưu tiên, giống engine thread) và 1 writer task riêng:
+    peer chậm chỉ làm đầy outbox của chính nó (video bỏ frame cũ, cursor được gộp),
+    không chặn các peer khác.
+    Các frame nhỏ của 1 lượt được gộp thành 1 lần writer.write (ít TLS record, ít syscall).
+    Cùng giao diện enqueue(target_id, channel_id, payload) để SessionManager/ServerSession dùng lại.
+    Mọi hàm phải được gọi trên event loop (SessionManager chạy inline).
+    """
+    def __init__(self):
+        self.running = True
+        self.outboxes = {} # client_id -> PeerOutbox
+        self.wakeups = {}  # client_id -> asyncio.Event (báo writer task có dữ liệu)
+        self.tasks = {}    # client_id -> writer task
+        self.write_stats = WriteStats()
+
+    def register(self, client_id: str, writer, ext_framing: bool = False):
+        self.unregister(client_id, quiet=True) # kết nối lại: bỏ writer task cũ
+        outbox = PeerOutbox(client_id, writer, ext_framing=ext_framing)
+        wakeup = asyncio.Event()
+        self.outboxes[client_id] = outbox
+        self.wakeups[client_id] = wakeup
+        self.tasks[client_id] = asyncio.get_running_loop().create_task(
+            self._writer_loop(outbox, wakeup), name=f"Writer-{client_id}"
+        )
+        print(f"[AsyncBroadcaster] Đã đăng ký {client_id}")
+
+    def unregister(self, client_id: str, quiet: bool = False):
+        outbox = self.outboxes.pop(client_id, None)
+        if outbox:
+            outbox.close()
+        self.wakeups.pop(client_id, None)
+        task = self.tasks.pop(client_id, None)
+        if task:
+            task.cancel()
+        if not quiet:
+            print(f"[AsyncBroadcaster] Đã hủy đăng ký {client_id}")
+
+    def enqueue(self, target_id: str, channel_id: int, payload):
+        """Đưa (kênh, PDU) vào outbox của người nhận"""
+        if not self.running:
+            return
+        outbox = self.outboxes.get(target_id)
+        if outbox is None:
+            return
+        if len(payload) > MAX_MCS_PAYLOAD and not outbox.ext_framing:
+            # Peer cũ (không EXTLEN32): phân mảnh lại PDU nguyên khối
+            scheduled = False
+            for frag in legacy_frames(payload):
+                scheduled = outbox.push(channel_id, frag) or scheduled
+            if scheduled:
+                self.wakeups[target_id].set()
+            return
+        if outbox.push(channel_id, payload):
+            self.wakeups[target_id].set()
+
+    def video_backlog(self, target_id: str) -> int:
+        """Số MCS frame video đang chờ gửi cho 1 peer (0 nếu không có outbox)."""
+        outbox = self.outboxes.get(target_id)
+        return outbox.video_depth() if outbox is not None else 0
+
+    def get_stats(self) -> dict:
+        """Thống kê theo peer (giống ServerBroadcaster.get_stats)."""
+        return {cid: ob.stats() for cid, ob in self.outboxes.items()}
+
+    def get_write_stats(self) -> dict:
+        return self.write_stats.snapshot()
+
+    async def _writer_loop(self, outbox: PeerOutbox, wakeup: asyncio.Event):
+        writer = outbox.sock
+        try:
+            while self.running:
+                await wakeup.wait()
+                wakeup.clear()
+                while True:
+                    batch = FrameBatch(outbox.ext_framing)
+                    for _ in range(FRAMES_PER_TURN):
+                        item = outbox.pop()
+                        if item is None:
+                            break
+                        channel_id, payload = item
+                        batch.add(channel_id, payload)
+                        outbox.mark_sent(len(payload))
+                    while batch:
+                        segments, nbytes, nframes = batch.take(DEFAULT_MAX_BATCH)
+                        for seg in segments:
+                            writer.write(seg)
+                        self.write_stats.record(nbytes, nframes, len(segments))
+                    # Chờ buffer của transport xả bớt; trong lúc chờ, PDU mới dồn vào
+                    # outbox và chịu chính sách bỏ/gộp của từng làn.
+                    await writer.drain()
+                    if not outbox.release():
+                        break
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Reader task của kết nối sẽ tự phát hiện và dọn dẹp
+            print(f"[AsyncBroadcaster] Lỗi khi gửi cho {outbox.peer_id}: {e}")
+            outbox.close()
+
+    def stop(self):
+        self.running = False
+        print("[AsyncBroadcaster] Đang dừng...")
+        for client_id in list(self.tasks.keys()):
+            self.unregister(client_id, quiet=True)
+        print("[AsyncBroadcaster] Đã dừng.")
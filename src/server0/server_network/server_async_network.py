@@ -0,0 +1,175 @@
+# server0/server_network/server_async_network.py
+
+import asyncio
+import ssl
+from collections import defaultdict
+from common_network.x224_handshake import X224Handshake
+from common_network.security_layer_tls import create_server_context
+from common_network.mcs_layer import MCSLite
+from common_network.pdu_parser import PDUParser
+from common_network.tpkt_layer import TPKTLayer
+from common_network.frame_decoder import PDUFrameDecoder
+from common_network.constants import CAP_EXTLEN32
+from server0.server_constants import ALL_CHANNELS
+
+class AsyncServerNetwork:
+    """
+    Bản asyncio của ServerNetwork (engine asyncio).
+    Giao thức không đổi: X224 (trên TCP thô) -> TLS (start_tls) -> TPKT/MCS.
+    Mỗi kết nối là 1 reader task (thay cho 1 ServerReceiver thread),
+    việc gửi do AsyncBroadcaster đảm nhận (1 writer task / peer).
+    """
+    def __init__(self, host="0.0.0.0", port=5000, max_clients=200, certfile=None, keyfile=None):
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.certfile = certfile
+        self.keyfile = keyfile
+
+        self.server = None
+        self.tls_context = None
+        self.clients = {} # cid -> writer
+        self.running = False
+
+        # Callbacks
+        self.broadcaster = None
+        self.on_connect_cb = None
+        self.on_pdu_cb = None
+        self.on_disconnect_cb = None
+
+    def set_broadcaster(self, bc):
+        self.broadcaster = bc
+
+    def set_callbacks(self, on_connect, on_pdu, on_disconnect):
+        self.on_connect_cb = on_connect
+        self.on_pdu_cb = on_pdu
+        self.on_disconnect_cb = on_disconnect
+
+    async def start(self):
+        try:
+            self.tls_context = create_server_context(self.certfile, self.keyfile)
+            print("[AsyncServerNetwork] TLS Context đã tạo.")
+
+            # Chưa bọc TLS ở đây: X224 handshake diễn ra trên TCP thô, sau đó mới start_tls
+            self.server = await asyncio.start_server(
+                self._handle_connection, self.host, self.port,
+                backlog=self.max_clients, reuse_address=True
+            )
+            self.running = True
+            print(f"[AsyncServerNetwork] Đang lắng nghe (có TLS) trên {self.host}:{self.port}")
+
+        except ssl.SSLError as e:
+            print(f"[AsyncServerNetwork] Lỗi SSL. Kiểm tra file cert/key: {e}")
+            raise
+        except Exception as e:
+            print(f"[AsyncServerNetwork] Lỗi khi khởi động: {e}")
+            raise
+
+    async def _handle_connection(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        print(f"[AsyncServerNetwork] Có kết nối thô từ {addr}")
+
+        try:
+            # --- 1. Handshake X224 (trên TCP thô) ---
+            ok, cid, caps = await X224Handshake.server_do_handshake_async(reader, writer, timeout=10)
+            if not ok or not cid:
+                print(f"[AsyncServerNetwork] Handshake X224 thất bại từ {addr}.")
+                writer.close()
+                return
+
+            # --- 2. Nâng cấp lên TLS (Python 3.11+) ---
+            await asyncio.wait_for(writer.start_tls(self.tls_context), timeout=10)
+            print(f"[AsyncServerNetwork] TLS Handshake thành công cho {cid}@{addr}")
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, OSError, ssl.SSLError) as e:
+            print(f"[AsyncServerNetwork] Lỗi handshake từ {addr}: {e}")
+            writer.close()
+            return
+
+        # --- 3. Đăng ký kết nối ---
+        self._register(cid, writer, caps)
+
+        # --- 4. Vòng lặp đọc (thay cho ServerReceiver) ---
+        try:
+            await self._read_loop(reader, cid)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, ssl.SSLError) as e:
+            if self.running:
+                print(f"[AsyncServerNetwork] {cid} mất kết nối: {e}")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if self.running:
+                print(f"[AsyncServerNetwork] Lỗi nghiêm trọng ({cid}): {e}")
+        finally:
+            self._on_reader_done(cid, writer)
+
+    async def _read_loop(self, reader, cid: str):
+        mcs = MCSLite()
+        parser = PDUParser()
+        decoders = defaultdict(PDUFrameDecoder) # { channel_id -> PDUFrameDecoder }
+
+        while self.running:
+            tpkt_body = await TPKTLayer.recv_one_async(reader)
+            for ch_id, payload in mcs.feed_view(tpkt_body):
+                if ch_id not in ALL_CHANNELS:
+                    continue
+                for pdu_bytes in decoders[ch_id].feed(payload):
+                    try:
+                        parsed = parser.parse(pdu_bytes, reassemble=False)
+                    except Exception as e:
+                        print(f"[AsyncServerNetwork] Lỗi parse ({cid}): {e}")
+                        continue
+                    parsed.client_id = cid
+                    self.on_pdu_cb(cid, parsed)
+
+    def _register(self, cid: str, writer, caps=()):
+        old_writer = self.clients.get(cid)
+        if old_writer is not None:
+            # [SỬA] Kết nối lại: dọn kết nối cũ như 1 lần ngắt kết nối (định tuyến, phiên, vai trò)
+            # trước khi báo kết nối mới. Reader cũ dừng sau đó sẽ thấy cid đã thuộc writer mới và bỏ qua.
+            print(f"[AsyncServerNetwork] {cid} kết nối lại, đóng phiên cũ.")
+            self._drop_client(cid, old_writer)
+        self.clients[cid] = writer
+
+        if self.broadcaster:
+            self.broadcaster.register(cid, writer, ext_framing=CAP_EXTLEN32 in caps)
+        if self.on_connect_cb:
+            self.on_connect_cb(cid, writer)
+
+    def _on_reader_done(self, cid: str, writer):
+        try:
+            writer.close()
+        except Exception:
+            pass
+        # Kết nối đã bị thay thế (kết nối lại) -> đã được dọn trong _register, không đụng tới kết nối mới
+        if self.clients.get(cid) is not writer:
+            return
+        if not self.running:
+            del self.clients[cid]
+            return
+        print(f"[AsyncServerNetwork] Reader cho {cid} đã dừng.")
+        self._drop_client(cid, writer)
+
+    def _drop_client(self, cid: str, writer):
+        """Đóng writer, gỡ cid khỏi Broadcaster và báo SessionManager (handle_disconnection)."""
+        try:
+            writer.close()
+        except Exception:
+            pass
+        del self.clients[cid]
+        if self.broadcaster:
+            self.broadcaster.unregister(cid)
+        if self.on_disconnect_cb:
+            self.on_disconnect_cb(cid)
+
+    async def stop(self):
+        self.running = False
+        print(f"[AsyncServerNetwork] Đang đóng {len(self.clients)} kết nối...")
+        if self.server:
+            self.server.close()
+        for writer in list(self.clients.values()):
+            try:
+                writer.close()
+            except Exception:
+                pass
+        self.clients.clear()
+        print("[AsyncServerNetwork] Đã dừng.")
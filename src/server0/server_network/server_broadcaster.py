@@ -1,69 +1,176 @@
 # server0/server_network/server_broadcaster.py
 
+import socket
 import threading
+import time
 from queue import Queue, Empty
-from common_network.tpkt_layer import TPKTLayer
+from common_network.tpkt_writer import FrameBatch, DEFAULT_MAX_BATCH, legacy_frames
+from common_network.constants import MAX_MCS_PAYLOAD
+from common_network.stats import WriteStats
+from server0.server_network.server_peer_outbox import PeerOutbox
 
-class ServerBroadcaster(threading.Thread):
+# Số worker gửi mặc định và số MCS frame tối đa 1 worker gửi cho 1 peer trong 1 lượt
+# (hết lượt thì nhường worker cho peer khác để công bằng).
+DEFAULT_WORKERS = 4
+FRAMES_PER_TURN = 32
+# [THÊM] Socket dùng chung với receiver (timeout đọc 600 s) nên sendall có thể chặn rất lâu với peer
+# ngừng đọc. Một lần ghi quá WRITE_TIMEOUT giây -> watchdog ngắt kết nối peer đó (sendall lỗi ngay,
+# worker được giải phóng; receiver của peer thấy mất kết nối và dọn dẹp như bình thường).
+WRITE_TIMEOUT = 5.0
+
+class ServerBroadcaster:
     """
-    Nhận (target_id, mcs_frame) từ queue, đóng gói TPKT và gửi đi.
-    mcs_frame: đã bao gồm (channel header + pdu payload).
+    Nhận (target_id, channel_id, payload), đưa vào PeerOutbox riêng của người nhận
+    (các làn ưu tiên control > input > cursor > file > video), và một nhóm worker thread gửi đi.
+    - Mỗi peer chỉ được 1 worker phục vụ tại 1 thời điểm (giữ thứ tự trên socket).
+    - Peer chậm chỉ giữ 1 worker và làm đầy outbox của chính nó (video bị bỏ frame cũ,
+      cursor được gộp), các peer khác vẫn được các worker còn lại phục vụ.
+    - Peer ngừng đọc hẳn (1 lần ghi quá write_timeout giây) bị ngắt kết nối bởi watchdog,
+      nên dù nhiều peer treo cùng lúc, worker không bị giữ quá write_timeout.
+    - Các frame lấy ra trong 1 lượt được gộp (FrameBatch): gói nhỏ nối thành 1 lần sendall,
+      payload lớn gửi thẳng không sao chép -> ít TLS record và syscall hơn.
+    payload: PDU nguyên vẹn (bytes hoặc memoryview trỏ vào buffer nhận).
+    Peer không hỗ trợ extended framing (EXTLEN32) nhận PDU lớn dưới dạng các fragment 64 KB.
     """
-    def __init__(self):
-        super().__init__(daemon=True, name="Broadcaster")
+    def __init__(self, workers: int = DEFAULT_WORKERS, write_timeout: float = WRITE_TIMEOUT):
         self.running = True
-        self.queue = Queue(maxsize=1024) # Giới hạn queue để tránh OOM
-        self.clients = {}  # client_id -> ssl_socket
+        self.num_workers = workers
+        self.write_timeout = write_timeout
+        self.slow_peers_dropped = 0 # số peer bị ngắt vì ghi quá write_timeout
+        self.workers = []
+        self.ready = Queue() # các PeerOutbox đang có dữ liệu chờ gửi
+        self.outboxes = {}  # client_id -> PeerOutbox
         self.lock = threading.Lock()
+        self.write_stats = WriteStats() # số lần sendall, bytes/lần, frames/lần
+
+    def start(self):
+        for i in range(self.num_workers):
+            t = threading.Thread(target=self._worker_loop, daemon=True, name=f"Broadcaster-{i}")
+            t.start()
+            self.workers.append(t)
+        threading.Thread(target=self._watchdog_loop, daemon=True, name="Broadcaster-watchdog").start()
 
-    def register(self, client_id: str, ssl_sock):
+    def register(self, client_id: str, ssl_sock, ext_framing: bool = False):
+        outbox = PeerOutbox(client_id, ssl_sock, ext_framing=ext_framing)
         with self.lock:
-            self.clients[client_id] = ssl_sock
+            old = self.outboxes.get(client_id)
+            self.outboxes[client_id] = outbox
+        if old:
+            old.close()
         print(f"[Broadcaster] Đã đăng ký {client_id}")
 
     def unregister(self, client_id: str):
         with self.lock:
-            self.clients.pop(client_id, None)
+            outbox = self.outboxes.pop(client_id, None)
+        if outbox:
+            outbox.close()
         print(f"[Broadcaster] Đã hủy đăng ký {client_id}")
 
-    def enqueue(self, target_id: str, mcs_frame: bytes):
-        """Đưa (người nhận, dữ liệu MCS) vào hàng đợi"""
+    def enqueue(self, target_id: str, channel_id: int, payload):
+        """Đưa (người nhận, kênh, PDU) vào outbox của người nhận"""
         if not self.running:
             return
-        try:
-            self.queue.put((target_id, mcs_frame), block=False)
-        except Queue.Full:
-            print(f"[Broadcaster] Hàng đợi gửi bị đầy! Bỏ qua gói tin cho {target_id}")
+        outbox = self.outboxes.get(target_id)
+        if outbox is None:
+            return
+        if len(payload) > MAX_MCS_PAYLOAD and not outbox.ext_framing:
+            # PDU nguyên khối (từ peer EXTLEN32) gửi cho peer cũ: phân mảnh lại
+            scheduled = False
+            for frag in legacy_frames(payload):
+                scheduled = outbox.push(channel_id, frag) or scheduled
+            if scheduled:
+                self.ready.put(outbox)
+            return
+        if outbox.push(channel_id, payload):
+            self.ready.put(outbox)
+
+    def video_backlog(self, target_id: str) -> int:
+        """Số MCS frame video đang chờ gửi cho 1 peer (0 nếu không có outbox)."""
+        outbox = self.outboxes.get(target_id)
+        return outbox.video_depth() if outbox is not None else 0
+
+    def get_stats(self) -> dict:
+        """Thống kê theo peer: độ sâu từng làn, số gói bị bỏ/gộp, số frame/bytes đã gửi."""
+        with self.lock:
+            outboxes = list(self.outboxes.values())
+        return {ob.peer_id: ob.stats() for ob in outboxes}
+
+    def get_write_stats(self) -> dict:
+        stats = self.write_stats.snapshot()
+        stats["slow_peers_dropped"] = self.slow_peers_dropped
+        return stats
 
-    def run(self):
+    def _worker_loop(self):
         while self.running:
             try:
-                target_id, mcs_frame = self.queue.get(timeout=0.5)
+                outbox = self.ready.get(timeout=0.5)
             except Empty:
                 continue
 
-            ssl_sock = None
+            try:
+                batch = FrameBatch(outbox.ext_framing)
+                for _ in range(FRAMES_PER_TURN):
+                    item = outbox.pop()
+                    if item is None:
+                        break
+                    channel_id, payload = item
+                    # --- Tạo header TPKT + MCS, gộp vào batch ---
+                    batch.add(channel_id, payload)
+                    outbox.mark_sent(len(payload))
+                    if batch.nbytes >= DEFAULT_MAX_BATCH:
+                        self._flush(outbox, batch)
+                self._flush(outbox, batch)
+            except Exception as e:
+                # Nếu gửi lỗi (ví dụ: client ngắt kết nối)
+                # ServerReceiver sẽ tự phát hiện và dọn dẹp
+                print(f"[Broadcaster] Lỗi khi gửi cho {outbox.peer_id}: {e}")
+                outbox.close()
+
+            if outbox.release():
+                self.ready.put(outbox) # còn dữ liệu: xếp lại cuối hàng, nhường peer khác
+
+    def _flush(self, outbox: PeerOutbox, batch: FrameBatch):
+        ssl_sock = outbox.sock
+        while batch:
+            segments, nbytes, nframes = batch.take(DEFAULT_MAX_BATCH)
+            outbox.write_started = time.monotonic()
+            try:
+                for seg in segments:
+                    ssl_sock.sendall(seg)
+            finally:
+                outbox.write_started = None
+            self.write_stats.record(nbytes, nframes, len(segments))
+
+    def _watchdog_loop(self):
+        """[THÊM] Ngắt kết nối peer có 1 lần ghi kéo dài quá write_timeout (peer ngừng đọc)."""
+        interval = max(0.05, self.write_timeout / 4)
+        while self.running:
+            time.sleep(interval)
+            now = time.monotonic()
             with self.lock:
-                ssl_sock = self.clients.get(target_id)
-
-            if ssl_sock:
-                try:
-                    # --- Đóng gói TPKT và gửi ---
-                    tpkt_packet = TPKTLayer.pack(mcs_frame)
-                    ssl_sock.sendall(tpkt_packet)
-                    
-                except Exception as e:
-                    # Nếu gửi lỗi (ví dụ: client ngắt kết nối)
-                    # ServerReceiver sẽ tự phát hiện và dọn dẹp
-                    # Chúng ta chỉ cần log lỗi
-                    print(f"[Broadcaster] Lỗi khi gửi cho {target_id}: {e}")
-                    # Không cần unregister ở đây, để Receiver/Network xử lý
+                outboxes = list(self.outboxes.values())
+            for outbox in outboxes:
+                started = outbox.write_started
+                if started is not None and now - started > self.write_timeout and not outbox.closed:
+                    self._drop_slow_peer(outbox, now - started)
+
+    def _drop_slow_peer(self, outbox: PeerOutbox, stalled: float):
+        print(f"[Broadcaster] {outbox.peer_id} không đọc dữ liệu ({stalled:.1f}s), ngắt kết nối.")
+        self.slow_peers_dropped += 1
+        outbox.close()
+        try:
+            # shutdown trên socket gốc (không qua SSLSocket.shutdown): sendall đang chặn lỗi ngay,
+            # receiver của peer nhận EOF và dọn dẹp
+            socket.socket.shutdown(outbox.sock, socket.SHUT_RDWR)
+        except (OSError, TypeError):
+            pass
 
     def stop(self):
         self.running = False
         print("[Broadcaster] Đang dừng...")
-        with self.queue.mutex:
-            self.queue.queue.clear()
         with self.lock:
-            self.clients.clear()
-        print("[Broadcaster] Đã dừng.")
\ No newline at end of file
+            outboxes = list(self.outboxes.values())
+            self.outboxes.clear()
+        for ob in outboxes:
+            ob.close()
+        print("[Broadcaster] Đã dừng.")
@@ -0,0 +1,161 @@
+# server0/server_network/server_keyframe_cache.py
+
+import struct
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from common_network.constants import PDU_TYPE_FULL, SHARE_HDR_SIZE, FRAGMENT_HDR_FMT
+from server0.server_constants import KEYFRAME_CACHE_MAX_BYTES, KEYFRAME_ENTRY_MAX_BYTES, KEYFRAME_MAX_CHAIN
+
+"""
+Cache keyframe của relay: với mỗi client, giữ FULL frame mới nhất và mọi PDU video (RECT) đến sau nó,
+đúng thứ tự nhận (kể cả các fragment). Phát lại chuỗi này cho 1 manager = đưa manager về đúng ảnh
+hiện tại của client mà không cần client chụp / encode lại FULL frame:
+- manager vào xem (phiên mới hoặc vào phiên đang có), manager xin refresh, manager hết tụt hậu.
+Giới hạn bộ nhớ:
+- 1 client: chuỗi quá max_chain PDU hoặc quá max_entry_bytes -> chuỗi "cũ" (bỏ hết, chờ FULL frame kế tiếp);
+  trong lúc đó manager mới phải chờ client gửi FULL frame như trước.
+- Tổng: quá max_bytes -> bỏ client lâu không được cập nhật / phát lại nhất (LRU).
+Dữ liệu được sao chép thành bytes khi lưu (payload nhận là memoryview trỏ vào buffer TPKT, có thể chứa
+cả PDU khác) -> đếm bộ nhớ chính xác. Thứ tự update() / snapshot() của 1 client do bên gọi đảm bảo
+(ServerSession.video_lock, hoặc feed lock của client - shard.feed_locks[client_id], lấy trong
+SessionManager.handle_pdu - khi client chưa ở trong phiên). Thread-safe.
+"""
+
+_FRAG_HDR = struct.Struct(FRAGMENT_HDR_FMT)
+
+
+def _starts_pdu(pdu) -> bool:
+    """PDU nguyên khối, hoặc fragment đầu tiên (offset 0) của 1 PDU bị phân mảnh."""
+    if not pdu.is_fragment:
+        return True
+    return _FRAG_HDR.unpack_from(pdu.raw, SHARE_HDR_SIZE)[0] == 0
+
+
+class _KeyframeEntry:
+    __slots__ = ("full_seq", "frames", "nbytes", "last_seq", "chain", "stale")
+
+    def __init__(self):
+        self.full_seq = None
+        self.frames: List[bytes] = [] # FULL frame (các fragment) + các PDU sau nó
+        self.nbytes = 0
+        self.last_seq = None
+        self.chain = 0 # số PDU sau FULL frame
+        self.stale = True # chưa có FULL frame / chuỗi đã bị bỏ
+
+
+class KeyframeCache:
+    def __init__(self, max_bytes: int = KEYFRAME_CACHE_MAX_BYTES, max_entry_bytes: int = KEYFRAME_ENTRY_MAX_BYTES,
+                 max_chain: int = KEYFRAME_MAX_CHAIN):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.max_chain = max_chain
+        self.lock = threading.Lock()
+        self.entries = OrderedDict() # client_id -> _KeyframeEntry (cuối = mới dùng nhất)
+        self.total_bytes = 0
+
+        # --- Thống kê ---
+        self.hits = 0
+        self.misses = 0
+        self.replayed_bytes = 0
+        self.chain_overflows = 0
+        self.evictions = 0
+
+    def update(self, client_id: str, pdu, data: Optional[bytes] = None) -> None:
+        """Ghi 1 PDU video (FULL / RECT / fragment của chúng) của client. data: bản sao pdu.raw nếu đã có."""
+        is_full = pdu.ptype == PDU_TYPE_FULL
+        seq = pdu.seq
+        with self.lock:
+            entry = self.entries.get(client_id)
+            if entry is None:
+                if not (is_full and _starts_pdu(pdu)):
+                    return
+                entry = self.entries[client_id] = _KeyframeEntry()
+            if is_full and _starts_pdu(pdu):
+                # FULL frame mới: bắt đầu chuỗi mới
+                self._reset(entry)
+                entry.full_seq = seq
+                entry.stale = False
+            elif entry.stale:
+                return # RECT / fragment dở của FULL khi chưa có ảnh nền
+            elif is_full:
+                if entry.chain or entry.full_seq != seq:
+                    return # fragment lạc của 1 FULL frame khác
+            else:
+                entry.chain += 1
+
+            if data is None:
+                data = bytes(pdu.raw)
+            if entry.chain > self.max_chain or entry.nbytes + len(data) > self.max_entry_bytes:
+                # Chuỗi quá dài / quá lớn: phát lại không còn rẻ hơn FULL frame mới -> bỏ, chờ FULL kế tiếp
+                self._reset(entry)
+                self.chain_overflows += 1
+                return
+            entry.frames.append(data)
+            entry.nbytes += len(data)
+            entry.last_seq = seq
+            self.total_bytes += len(data)
+            self.entries.move_to_end(client_id)
+            self._evict(client_id)
+
+    def snapshot(self, client_id: str) -> Optional[Tuple[int, List[bytes]]]:
+        """(seq của PDU cuối, [FULL frame, các PDU sau nó]) để phát lại; None nếu chưa có / chuỗi đã cũ."""
+        with self.lock:
+            entry = self.entries.get(client_id)
+            if entry is None or entry.stale or not entry.frames:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.replayed_bytes += entry.nbytes
+            self.entries.move_to_end(client_id)
+            return entry.last_seq, list(entry.frames)
+
+    def has(self, client_id: str) -> bool:
+        """Có chuỗi phát lại được cho client này không (không tính vào thống kê hit/miss)."""
+        entry = self.entries.get(client_id)
+        return entry is not None and not entry.stale
+
+    def invalidate(self, client_id: str) -> None:
+        """Có PDU video của client bị bỏ qua (không đi qua update): chuỗi không còn đúng, chờ FULL kế tiếp."""
+        with self.lock:
+            entry = self.entries.get(client_id)
+            if entry is not None:
+                self._reset(entry)
+
+    def drop(self, client_id: str) -> None:
+        with self.lock:
+            entry = self.entries.pop(client_id, None)
+            if entry is not None:
+                self.total_bytes -= entry.nbytes
+
+    def _reset(self, entry: _KeyframeEntry) -> None:
+        # Gọi khi đang giữ self.lock
+        self.total_bytes -= entry.nbytes
+        entry.frames = []
+        entry.nbytes = 0
+        entry.chain = 0
+        entry.full_seq = None
+        entry.last_seq = None
+        entry.stale = True
+
+    def _evict(self, keep: str) -> None:
+        # Gọi khi đang giữ self.lock. Bỏ client ít dùng nhất tới khi đủ chỗ (không bỏ client vừa ghi)
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            client_id = next(iter(self.entries))
+            if client_id == keep:
+                break
+            entry = self.entries.pop(client_id)
+            self.total_bytes -= entry.nbytes
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "clients": sum(1 for e in self.entries.values() if not e.stale),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "replayed_bytes": self.replayed_bytes,
+                "chain_overflows": self.chain_overflows,
+                "evictions": self.evictions,
+            }
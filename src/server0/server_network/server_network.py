@@ -6,6 +6,7 @@ import threading
 from queue import Queue, Empty
 from common_network.x224_handshake import X224Handshake
 from common_network.security_layer_tls import create_server_context, server_wrap_socket
+from common_network.constants import CAP_EXTLEN32
 from server0.server_network.server_receiver import ServerReceiver
 from server0.server_constants import TLS_VERSION
 
@@ -84,7 +85,7 @@ class ServerNetwork:
             ssl_sock = None
             try:
                 # --- 4. Handshake X224 (trên socket thô) ---
-                ok, cid = X224Handshake.server_do_handshake(raw_sock, timeout=10)
+                ok, cid, caps = X224Handshake.server_do_handshake(raw_sock, timeout=10)
                 if not ok or not cid:
                     print(f"[ServerNetwork] Handshake X224 thất bại từ {addr}.")
                     raw_sock.close()
@@ -102,7 +103,6 @@ class ServerNetwork:
                     pdu_push_callback=self.on_pdu_cb,
                     done_callback=self._on_receiver_done
                 )
-                receiver.start()
 
                 with self.lock:
                     # Đóng kết nối cũ nếu cid này đã tồn tại
@@ -114,12 +114,18 @@ class ServerNetwork:
                 
                 # Đăng ký với Broadcaster để có thể *gửi* tin
                 if self.broadcaster:
-                    self.broadcaster.register(cid, ssl_sock)
+                    # ext_framing: peer hỗ trợ PDU > 64 KB nguyên khối, nếu không Broadcaster tự phân mảnh
+                    self.broadcaster.register(cid, ssl_sock, ext_framing=CAP_EXTLEN32 in caps)
                 
                 # Báo cho SessionManager biết có client mới
                 if self.on_connect_cb:
                     self.on_connect_cb(cid, ssl_sock)
 
+                # [SỬA] Chỉ bắt đầu nhận sau khi đã đăng ký xong: nếu Receiver chạy trước,
+                # PDU "register" có thể được xử lý trước handle_new_connection (vai trò bị ghi đè
+                # thành unknown) và "register_ok" bị bỏ vì Broadcaster chưa biết cid.
+                receiver.start()
+
             except ssl.SSLError as e:
                 print(f"[ServerNetwork] Lỗi TLS Handshake: {e}")
                 if ssl_sock: ssl_sock.close()
@@ -0,0 +1,234 @@
+# server0/server_network/server_peer_outbox.py
+
+import struct
+import threading
+from collections import deque
+from typing import Optional, Tuple
+from common_network.constants import SHARE_CTRL_HDR_FMT, SHARE_HDR_SIZE, THUMB_HDR_FMT, THUMB_HDR_SIZE
+from server0.server_constants import (
+    CHANNEL_VIDEO, CHANNEL_CONTROL, CHANNEL_INPUT, CHANNEL_FILE, CHANNEL_CURSOR, CHANNEL_THUMB,
+)
+
+_SHARE_HDR = struct.Struct(SHARE_CTRL_HDR_FMT)
+_THUMB_HDR = struct.Struct(THUMB_HDR_FMT)
+
+# Các làn (lane) ưu tiên, số nhỏ = ưu tiên cao
+LANE_CONTROL = 0
+LANE_INPUT = 1
+LANE_CURSOR = 2
+LANE_FILE = 3
+LANE_VIDEO = 4
+LANE_THUMB = 5
+LANE_NAMES = ("control", "input", "cursor", "file", "video", "thumb")
+
+_CHANNEL_LANE = {
+    CHANNEL_CONTROL: LANE_CONTROL,
+    CHANNEL_INPUT: LANE_INPUT,
+    CHANNEL_CURSOR: LANE_CURSOR,
+    CHANNEL_FILE: LANE_FILE,
+    CHANNEL_VIDEO: LANE_VIDEO,
+    CHANNEL_THUMB: LANE_THUMB,
+}
+
+# Giới hạn mặc định (số MCS frame) của từng làn
+DEFAULT_INPUT_MAX = 1024
+DEFAULT_VIDEO_MAX = 256     # ~ vài frame FULL (đã phân mảnh) + các RECT
+RECENT_DROPPED_SEQ = 64     # số seq video bị bỏ gần nhất cần nhớ (để bỏ nốt các fragment còn lại)
+
+
+def _thumb_source(payload) -> bytes:
+    """Id client nguồn (bytes) của PDU THUMB, dùng làm khóa gộp."""
+    offset = SHARE_HDR_SIZE + THUMB_HDR_SIZE
+    if len(payload) < offset:
+        return b""
+    src_len = _THUMB_HDR.unpack_from(payload, SHARE_HDR_SIZE)[2]
+    return bytes(payload[offset:offset + src_len])
+
+
+class PeerOutbox:
+    """
+    Hàng đợi gửi riêng cho MỘT peer, chia làn theo mức ưu tiên:
+        control > input > cursor > file > video > thumb
+    - control: không bao giờ bỏ (gói nhỏ, ít).
+    - input: giới hạn DEFAULT_INPUT_MAX, đầy thì bỏ gói MỚI (giữ thứ tự phím/chuột đã xếp hàng).
+    - cursor: gộp (coalesce), chỉ giữ vị trí con trỏ MỚI NHẤT.
+    - file: không bỏ, không giới hạn (client đã tự giới hạn cửa sổ unacked_bytes).
+    - video: giới hạn video_max, đầy thì bỏ frame CŨ NHẤT (drop-oldest). Bỏ theo đơn vị PDU:
+      mọi fragment cùng seq với frame bị bỏ (đang chờ hoặc đến sau) cũng bị bỏ.
+    - thumb: gộp theo client nguồn, mỗi client chỉ giữ ảnh thu nhỏ MỚI NHẤT (tối đa 1 ảnh / client
+      đang chờ) -> manager chậm không làm outbox phình ra dù theo dõi nhiều client.
+    Thread-safe. Dùng chung cho ServerBroadcaster (worker pool) và AsyncBroadcaster (writer task).
+
+    Lập lịch: push() trả về True khi outbox chuyển từ "rảnh" sang "cần gửi" -> bên gọi phải
+    giao outbox cho 1 worker; release() sau mỗi lượt gửi trả về True nếu vẫn còn dữ liệu.
+    Nhờ cờ `scheduled`, tại mỗi thời điểm chỉ có 1 worker gửi cho 1 peer (giữ thứ tự trên socket).
+
+    ext_framing: peer đã đàm phán EXTLEN32 (nhận được PDU > 64 KB nguyên khối). Nếu không,
+    Broadcaster phân mảnh PDU lớn trước khi push (legacy_frames).
+    """
+    def __init__(self, peer_id: str, sock=None, video_max: int = DEFAULT_VIDEO_MAX, input_max: int = DEFAULT_INPUT_MAX,
+                 ext_framing: bool = False):
+        self.peer_id = peer_id
+        self.sock = sock # SSL socket (engine thread) hoặc StreamWriter (engine asyncio)
+        self.ext_framing = ext_framing
+        self.video_max = video_max
+        self.input_max = input_max
+        self.lock = threading.Lock()
+
+        self.control = deque()
+        self.input = deque()
+        self.cursor = None # (channel_id, payload) mới nhất
+        self.file = deque()
+        self.video = deque() # (channel_id, payload, seq)
+        self.dropped_video_seq = deque(maxlen=RECENT_DROPPED_SEQ)
+        self.thumb = {} # source -> (channel_id, payload) mới nhất, theo thứ tự đến
+
+        self.scheduled = False
+        self.closed = False
+        self.write_started = None # [THÊM] lúc worker bắt đầu ghi vào socket (None: không ghi), cho watchdog
+
+        # --- Thống kê ---
+        self.enqueued = [0] * len(LANE_NAMES)
+        self.dropped = [0] * len(LANE_NAMES)
+        self.sent_frames = 0
+        self.sent_bytes = 0
+        self.max_depth = 0
+
+    # --- Nhận PDU ---
+
+    def push(self, channel_id: int, payload) -> bool:
+        lane = _CHANNEL_LANE.get(channel_id, LANE_FILE)
+        with self.lock:
+            if self.closed:
+                return False
+            self.enqueued[lane] += 1
+
+            if lane == LANE_CONTROL:
+                self.control.append((channel_id, payload))
+            elif lane == LANE_CURSOR:
+                if self.cursor is not None:
+                    self.dropped[LANE_CURSOR] += 1 # vị trí cũ bị thay thế
+                self.cursor = (channel_id, payload)
+            elif lane == LANE_INPUT:
+                if len(self.input) >= self.input_max:
+                    self.dropped[LANE_INPUT] += 1
+                    return False
+                self.input.append((channel_id, payload))
+            elif lane == LANE_VIDEO:
+                if not self._push_video(channel_id, payload):
+                    return False
+            elif lane == LANE_THUMB:
+                source = _thumb_source(payload)
+                if self.thumb.pop(source, None) is not None:
+                    self.dropped[LANE_THUMB] += 1 # ảnh cũ của cùng client bị thay thế
+                self.thumb[source] = (channel_id, payload)
+            else:
+                self.file.append((channel_id, payload))
+
+            depth = self._depth()
+            if depth > self.max_depth:
+                self.max_depth = depth
+            if self.scheduled:
+                return False
+            self.scheduled = True
+            return True
+
+    def _push_video(self, channel_id: int, payload) -> bool:
+        """Gọi trong lock. Trả về False nếu PDU bị bỏ."""
+        seq = _SHARE_HDR.unpack_from(payload)[0] if len(payload) >= SHARE_HDR_SIZE else -1
+        if seq in self.dropped_video_seq:
+            # Fragment tiếp theo của một frame đã bị bỏ -> bỏ luôn
+            self.dropped[LANE_VIDEO] += 1
+            return False
+
+        while len(self.video) >= self.video_max:
+            # Bỏ frame cũ nhất (tất cả fragment của nó đang nằm trong làn)
+            _, _, old_seq = self.video.popleft()
+            self.dropped[LANE_VIDEO] += 1
+            self.dropped_video_seq.append(old_seq)
+            while self.video and self.video[0][2] == old_seq:
+                self.video.popleft()
+                self.dropped[LANE_VIDEO] += 1
+            if old_seq == seq:
+                self.dropped[LANE_VIDEO] += 1
+                return False
+
+        self.video.append((channel_id, payload, seq))
+        return True
+
+    # --- Lấy PDU để gửi (worker gọi) ---
+
+    def pop(self) -> Optional[Tuple[int, object]]:
+        """Lấy MCS frame kế tiếp theo thứ tự ưu tiên, None nếu rỗng."""
+        with self.lock:
+            if self.control:
+                return self.control.popleft()
+            if self.input:
+                return self.input.popleft()
+            if self.cursor is not None:
+                item, self.cursor = self.cursor, None
+                return item
+            if self.file:
+                return self.file.popleft()
+            if self.video:
+                channel_id, payload, _ = self.video.popleft()
+                return channel_id, payload
+            if self.thumb:
+                return self.thumb.pop(next(iter(self.thumb)))
+            return None
+
+    def mark_sent(self, nbytes: int) -> None:
+        # Chỉ worker đang giữ outbox (scheduled) gọi hàm này -> không cần lock
+        self.sent_frames += 1
+        self.sent_bytes += nbytes
+
+    def release(self) -> bool:
+        """Worker kết thúc 1 lượt gửi. True: vẫn còn dữ liệu, worker phải lập lịch lại outbox."""
+        with self.lock:
+            if self._depth() and not self.closed:
+                return True
+            self.scheduled = False
+            return False
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+            self.control.clear()
+            self.input.clear()
+            self.cursor = None
+            self.file.clear()
+            self.video.clear()
+            self.thumb.clear()
+
+    # --- Thống kê ---
+
+    def _depth(self) -> int:
+        return (len(self.control) + len(self.input) + (self.cursor is not None) + len(self.file) + len(self.video)
+                + len(self.thumb))
+
+    def depth(self) -> int:
+        with self.lock:
+            return self._depth()
+
+    def video_depth(self) -> int:
+        """Số MCS frame video đang chờ (đọc không lấy lock, dùng trên đường nóng để đo độ tụt hậu)."""
+        return len(self.video)
+
+    def stats(self) -> dict:
+        with self.lock:
+            depth = {
+                "control": len(self.control),
+                "input": len(self.input),
+                "cursor": int(self.cursor is not None),
+                "file": len(self.file),
+                "video": len(self.video),
+                "thumb": len(self.thumb),
+            }
+            return {
+                "depth": depth,
+                "max_depth": self.max_depth,
+                "enqueued": dict(zip(LANE_NAMES, self.enqueued)),
+                "dropped": dict(zip(LANE_NAMES, self.dropped)),
+                "sent_frames": self.sent_frames,
+                "sent_bytes": self.sent_bytes,
+            }
@@ -1,12 +1,22 @@
 # server0/server_network/server_session.py
 
+import json
+import itertools
 import threading
-from queue import Queue, Empty
+import time
+from queue import Queue, Empty, Full
 from server0.server_constants import (
     CHANNEL_VIDEO, CHANNEL_CONTROL, CHANNEL_INPUT, CHANNEL_FILE, CHANNEL_CURSOR,
-    CMD_DISCONNECT, CMD_SECURITY_ALERT # <--- [CHECK] Đảm bảo đã có CMD_SECURITY_ALERT ở constants
+    CMD_DISCONNECT, CMD_SECURITY_ALERT, CMD_ERROR, # <--- [CHECK] Đảm bảo đã có CMD_SECURITY_ALERT ở constants
+    CMD_SESSION_STATS, CMD_INPUT_REQUEST, CMD_INPUT_RELEASE, CMD_INPUT_OWNER, CMD_REQUEST_REFRESH,
+    SESSION_MAX_SUBSCRIBERS, SUBSCRIBER_LAG_FRAMES, REFRESH_MIN_INTERVAL,
 )
-from common_network.mcs_layer import MCSLite
+from common_network.constants import (
+    PDU_TYPE_CONTROL, PDU_TYPE_INPUT, PDU_TYPE_CURSOR, PDU_TYPE_FRAME_ACK, PDU_TYPE_FULL, PDU_TYPE_FILE_START,
+)
+from common_network.pdu_builder import PDUBuilder
+from common_network.pdu_records import VIDEO_PDU_TYPES
+from server0.server_network.server_session_stats import SessionStats, _seq_le
 # --- [THÊM] Import Logger để ghi lại vi phạm ---
 try:
     from server0.server_logger import ServerLogger
@@ -17,38 +27,107 @@ except ImportError:
         def log_alert(cid, v_type, v_msg):
             print(f"[LOGGER-FALLBACK] {cid} | {v_type} | {v_msg}")
 
+
+class SessionSubscriber:
+    """
+    1 manager đang xem phiên. Backpressure tính riêng cho từng manager:
+    - awaiting_full: manager chưa có ảnh nền đúng (mới vào phiên, hoặc làn video trong outbox của nó dồn quá
+      SUBSCRIBER_LAG_FRAMES) -> không gửi RECT cho nó (vá lên ảnh nền sai / bị outbox bỏ giữa chừng),
+      chỉ gửi FULL frame; FULL frame tới khi làn đã vơi thì trở lại bình thường.
+    - Quyết định gửi / bỏ đưa ra 1 lần cho mỗi seq (mọi fragment của 1 frame cùng số phận).
+    """
+    __slots__ = ("manager_id", "stats", "awaiting_full", "video_seq", "video_skip", "skipped", "lag_events",
+                 "replay_seq", "last_replay", "replays")
+
+    def __init__(self, manager_id):
+        self.manager_id = manager_id
+        self.stats = SessionStats() # độ trễ / jitter / fps mà manager này thấy
+        self.awaiting_full = True
+        self.video_seq = None
+        self.video_skip = False
+        self.skipped = 0 # số frame RECT không gửi cho manager này
+        self.lag_events = 0 # số lần tụt hậu
+        self.replay_seq = None # seq cuối của lần phát lại từ cache gần nhất (FRAME_ACK tới seq này không tính)
+        self.last_replay = 0.0
+        self.replays = 0
+
+
 class ServerSession(threading.Thread):
     """
-    Một luồng (thread) chuyên dụng để xử lý logic
-    cho 1 Manager và 1 Client ĐÃ KẾT NỐI VỚI NHAU.
+    Một luồng (thread) chuyên dụng để xử lý logic cho 1 Client (nguồn phát)
+    và các Manager đang xem nó (tối đa SESSION_MAX_SUBSCRIBERS).
+    - Video/cursor của client được encode 1 lần (ở client) và chuyển nguyên vẹn cho mọi manager:
+      cùng 1 memoryview trỏ vào buffer nhận (không bị sửa sau khi nhận), không sao chép theo số người xem.
+    - Backpressure theo từng manager (SessionSubscriber + outbox riêng): manager chậm chỉ bị bỏ frame
+      của chính nó. FRAME_ACK chỉ được chuyển cho client từ 1 manager (người điều khiển, không có thì
+      người vào phiên sớm nhất) -> tốc độ của client không bị kéo theo người xem chậm nhất.
+    - Quyền điều khiển (input, gửi file) thuộc về tối đa 1 manager: người mở phiên, hoặc người xin
+      (input_request) khi quyền đang trống. Input của những người còn lại bị bỏ.
+    - Danh sách người xem là copy-on-write (thay dict mới mỗi lần đổi) -> đường nóng đọc không cần lock.
+    - [THÊM] keyframes (KeyframeCache): mỗi PDU video được ghi vào cache trước khi chuyển đi; manager vào
+      phiên / xin refresh / hết tụt hậu được phát lại FULL frame + các RECT sau nó ngay từ server.
+      video_lock giữ thứ tự: mọi PDU video đến sau lần phát lại mới được gửi cho manager đó.
+    - inline=True (engine asyncio): không chạy thread riêng, PDU được định tuyến
+      ngay trong enqueue_pdu (trên event loop), không qua queue.
     """
-    def __init__(self, manager_id, client_id, broadcaster, done_callback):
-        self.session_id = f"{manager_id}::{client_id}"
+    def __init__(self, manager_id, client_id, broadcaster, done_callback, inline=False, keyframes=None):
+        self.session_id = client_id # [SỬA] 1 phiên / client, nhiều manager cùng xem
         super().__init__(daemon=True, name=f"Session-{self.session_id}")
         
-        self.manager_id = manager_id
         self.client_id = client_id
         self.broadcaster = broadcaster
         self.done_callback = done_callback # Báo cho SessionManager khi kết thúc
+        self.inline = inline
         
         self.pdu_queue = Queue(maxsize=4096) # Queue riêng của phiên này
         self.running = True
+        self.reason = "Unknown" # Lý do kết thúc phiên
+
+        # [THÊM] Người xem + quyền điều khiển
+        self.sub_lock = threading.Lock()
+        self.subscribers = {manager_id: SessionSubscriber(manager_id)} # manager_id -> SessionSubscriber, theo thứ tự vào phiên
+        self.controller = manager_id # manager đang giữ quyền điều khiển (None = trống)
+        self.file_peer = None # manager của lượt gửi file gần nhất (nhận các FILE PDU trả lời của client)
+        self._seq = itertools.count(1) # sequence cho PDU do chính phiên gửi
+        self._last_refresh = time.monotonic() # client vừa nhận session_started (tự gửi FULL frame)
+        self.refresh_requests = 0
+        self.input_denied = 0 # input / file của manager không giữ quyền điều khiển (bị bỏ)
+
+        # [THÊM] Cache keyframe (dùng chung, SessionManager sở hữu)
+        self.keyframes = keyframes
+        self.keyframes_closed = False # phiên đã kết thúc: không ghi vào cache nữa (SessionManager ghi tiếp)
+        self.video_lock = threading.Lock()
 
     def enqueue_pdu(self, from_id, pdu):
         """SessionManager gọi hàm này để đưa PDU vào xử lý"""
         if not self.running:
+            if pdu.ptype in VIDEO_PDU_TYPES:
+                self._lost_video() # tra phiên ngay trước khi phiên dừng
+            return
+
+        # --- [THÊM] Chế độ inline: định tuyến ngay, không qua queue/thread ---
+        if self.inline:
+            try:
+                self.route_pdu(from_id, pdu)
+            except Exception as e:
+                self.reason = f"Lỗi nghiêm trọng: {e}"
+                print(f"[ServerSession-{self.session_id}] Lỗi: {e}")
+                self.running = False
+            if not self.running:
+                self._finish()
             return
             
         # 1. Nếu PDU mới là Video/Cursor và queue đầy -> HỦY BỎ PDU MỚI (ít quan trọng hơn)
-        if pdu.get("type") in ("full", "rect") and self.pdu_queue.full(): 
+        if pdu.ptype in VIDEO_PDU_TYPES and self.pdu_queue.full(): 
+            self._lost_video()
             return # Bỏ PDU mới
 
         try:
             self.pdu_queue.put((from_id, pdu), block=False)
-        except Queue.Full:
+        except Full:
             # 2. Nếu PDU mới là Control/Input/File (quan trọng) và queue vẫn đầy,
             #  => bỏ PDU cũ nhất (có khả năng là Video/Cursor) để chèn PDU mới
-            if pdu.get("type") not in ("full", "rect"):
+            if pdu.ptype not in VIDEO_PDU_TYPES:
                 try: 
                     # Loại bỏ 1 phần tử cũ nhất
                     self.pdu_queue.get_nowait()
@@ -60,7 +139,6 @@ class ServerSession(threading.Thread):
             
     def run(self):
         print(f"[ServerSession-{self.session_id}] Đã khởi động.")
-        reason = "Unknown"
         
         try:
             while self.running:
@@ -69,97 +147,320 @@ class ServerSession(threading.Thread):
                 except Empty:
                     continue
                 
-                # --- Quy tắc chuyển tiếp (Routing) ---
-                
-                ptype = pdu.get("type")
-                raw_payload = pdu.get("_raw_payload")
-                
-                if not raw_payload:
-                    continue
-
-                if from_id == self.client_id:
-                    # --- Từ Client -> Gửi cho Manager ---
-                    target_id = self.manager_id
-                    
-                    if ptype in ("full", "rect"):
-                        # (Video) Gửi trên kênh VIDEO
-                        mcs_frame = MCSLite.build(CHANNEL_VIDEO, raw_payload)
-                    elif ptype == "cursor":
-                        # (Cursor) Gửi trên kênh CURSOR
-                        mcs_frame = MCSLite.build(CHANNEL_CURSOR, raw_payload)
-                    elif ptype == "control":
-                        # (Control) Gửi trên kênh CONTROL
-                        msg = pdu.get("message", "")
-
-                        # --- [SỬA] Xử lý các lệnh Control đặc biệt ---
-                        if msg == CMD_DISCONNECT:
-                            reason = f"Client {self.client_id} yêu cầu ngắt kết nối."
-                            self.running = False
-                        
-                        # --- [THÊM] Bắt lệnh Security Alert để ghi Log ---
-                        elif msg.startswith(CMD_SECURITY_ALERT):
-                            # msg format: "security_alert:Loại vi phạm|Chi tiết"
-                            try:
-                                # Tách nội dung sau dấu hai chấm đầu tiên
-                                content = msg.split(":", 1)[1]
-                                # Tách loại và chi tiết
-                                if "|" in content:
-                                    v_type, v_detail = content.split("|", 1)
-                                else:
-                                    v_type, v_detail = "General", content
-                                
-                                # Ghi vào file log trên Server
-                                ServerLogger.log_alert(self.client_id, v_type, v_detail)
-                                
-                                # Lưu ý: Sau khi log xong, code vẫn chạy xuống dưới 
-                                # để đóng gói mcs_frame và gửi cho Manager (Forwarding)
-                            except Exception as e:
-                                print(f"[Session] Lỗi parse alert: {e}")
-
-                        mcs_frame = MCSLite.build(CHANNEL_CONTROL, raw_payload)
-
-                    elif ptype == "input":
-                        # (Input - ví dụ: keylogger) Gửi trên kênh INPUT
-                        mcs_frame = MCSLite.build(CHANNEL_INPUT, raw_payload)
-                    else:
-                        # (File) Gửi trên kênh FILE
-                        mcs_frame = MCSLite.build(CHANNEL_FILE, raw_payload)
-                        
-                    self.broadcaster.enqueue(target_id, mcs_frame)
-                    
-                elif from_id == self.manager_id:
-                    # --- Từ Manager -> Gửi cho Client ---
-                    target_id = self.client_id
-                    
-                    if ptype == "input":
-                        # (Input) Gửi trên kênh INPUT
-                        mcs_frame = MCSLite.build(CHANNEL_INPUT, raw_payload)
-                    elif ptype == "control":
-                        # (Control) Gửi trên kênh CONTROL
-                        if pdu.get("message") == CMD_DISCONNECT:
-                            reason = f"Manager {self.manager_id} yêu cầu ngắt kết nối."
-                            self.running = False
-                        mcs_frame = MCSLite.build(CHANNEL_CONTROL, raw_payload)
-                    elif ptype != "full" and ptype != "rect" and ptype != "cursor":
-                        # (File) và các PDU khác không phải video/cursor
-                         mcs_frame = MCSLite.build(CHANNEL_FILE, raw_payload)
-                    else:
-                        continue
-                    
-                    self.broadcaster.enqueue(target_id, mcs_frame)
+                self.route_pdu(from_id, pdu)
                     
                 if not self.running:
                     break # Thoát vòng lặp
                     
         except Exception as e:
-            reason = f"Lỗi nghiêm trọng: {e}"
+            self.reason = f"Lỗi nghiêm trọng: {e}"
             print(f"[ServerSession-{self.session_id}] Lỗi: {e}")
         finally:
-            self.running = False
-            self.done_callback(self, reason)
-            print(f"[ServerSession-{self.session_id}] Đã dừng. Lý do: {reason}")
+            self._finish()
+
+    def _finish(self):
+        self.running = False
+        self.done_callback(self, self.reason)
+        print(f"[ServerSession-{self.session_id}] Đã dừng. Lý do: {self.reason}")
+
+    # --- Người xem (SessionManager gọi) ---
+
+    @property
+    def manager_ids(self):
+        return list(self.subscribers)
+
+    def add_subscriber(self, manager_id) -> bool:
+        """Thêm 1 manager vào phiên (chỉ xem), phát lại keyframe từ cache nếu có. False nếu phiên đã đủ người xem."""
+        with self.video_lock:
+            with self.sub_lock:
+                if manager_id in self.subscribers:
+                    return True
+                if len(self.subscribers) >= SESSION_MAX_SUBSCRIBERS:
+                    return False
+            sub = SessionSubscriber(manager_id)
+            self.replay_keyframe(sub)
+            with self.sub_lock:
+                subs = dict(self.subscribers)
+                subs[manager_id] = sub
+                self.subscribers = subs
+                if sub.awaiting_full:
+                    self._last_refresh = time.monotonic() # SessionManager gửi session_started -> client gửi FULL
+        return True
+
+    def replay_keyframe(self, sub) -> bool:
+        """
+        Gửi FULL frame + các PDU sau nó (từ cache) cho 1 manager. False nếu cache không có.
+        Gọi khi đang giữ video_lock (hoặc trước khi phiên nhận PDU video đầu tiên).
+        """
+        snap = self.keyframes.snapshot(self.client_id) if self.keyframes is not None else None
+        if snap is None:
+            return False
+        last_seq, frames = snap
+        for data in frames:
+            self.broadcaster.enqueue(sub.manager_id, CHANNEL_VIDEO, data)
+        # Fragment tiếp theo của PDU cuối (nếu đang dở) vẫn phải được gửi
+        sub.video_seq = last_seq
+        sub.video_skip = False
+        sub.awaiting_full = False
+        sub.replay_seq = last_seq
+        sub.last_replay = time.monotonic()
+        sub.replays += 1
+        return True
+
+    def remove_subscriber(self, manager_id) -> int:
+        """Bỏ 1 manager khỏi phiên (nhả quyền điều khiển nếu đang giữ). Trả về số người xem còn lại."""
+        with self.sub_lock:
+            if manager_id in self.subscribers:
+                subs = dict(self.subscribers)
+                del subs[manager_id]
+                self.subscribers = subs
+            released = self.controller == manager_id
+            if released:
+                self.controller = None
+            if self.file_peer == manager_id:
+                self.file_peer = None
+            remaining = len(self.subscribers)
+        if released and remaining:
+            self.announce_input_owner()
+        return remaining
+
+    def announce_input_owner(self, manager_ids=None):
+        """Báo ai đang giữ quyền điều khiển cho các manager (mặc định: tất cả, kèm client)."""
+        owner = self.controller
+        for mid in (self.manager_ids if manager_ids is None else manager_ids):
+            self._send_control(mid, f"{CMD_INPUT_OWNER}:{json.dumps({'owner': owner, 'is_you': owner == mid})}")
+        if manager_ids is None:
+            self._send_control(self.client_id, f"{CMD_INPUT_OWNER}:{json.dumps({'owner': owner, 'is_you': False})}")
+
+    def _on_input_request(self, manager_id):
+        with self.sub_lock:
+            granted = self.controller is None
+            if granted:
+                self.controller = manager_id
+        # Không được cấp (đã có người giữ): chỉ báo lại người đang giữ cho người xin
+        self.announce_input_owner(None if granted else [manager_id])
+
+    def _on_input_release(self, manager_id):
+        with self.sub_lock:
+            if self.controller != manager_id:
+                return
+            self.controller = None
+        self.announce_input_owner()
+
+    def _pacer(self, subs):
+        """Manager có FRAME_ACK được chuyển cho client: người điều khiển, không có thì người vào phiên sớm nhất."""
+        controller = self.controller
+        if controller in subs:
+            return controller
+        return next(iter(subs), None)
+
+    # --- Định tuyến ---
+
+    def route_pdu(self, from_id, pdu):
+        """
+        Quy tắc chuyển tiếp (Routing) cho 1 PDU.
+        Dùng chung cho engine thread (gọi từ run) và engine asyncio (inline).
+        Đặt self.running = False (và self.reason) khi phiên cần kết thúc.
+        """
+        ptype = pdu.ptype # số nguyên, so sánh nhanh hơn chuỗi
+        raw_payload = pdu.raw # memoryview trỏ vào buffer nhận, chuyển tiếp nguyên vẹn
+        
+        if not raw_payload:
+            return
+
+        subs = self.subscribers # bản chụp (copy-on-write), không cần lock
+        if from_id == self.client_id:
+            # --- Từ Client -> Gửi cho các Manager ---
+            if ptype in VIDEO_PDU_TYPES:
+                # (Video) Gửi trên kênh VIDEO, backpressure riêng từng manager
+                self._forward_video(pdu, raw_payload)
+                return
+            elif ptype == PDU_TYPE_CURSOR:
+                # (Cursor) Gửi trên kênh CURSOR
+                channel_id = CHANNEL_CURSOR
+            elif ptype == PDU_TYPE_CONTROL:
+                # (Control) Gửi trên kênh CONTROL
+                msg = pdu.message
+
+                # --- [SỬA] Xử lý các lệnh Control đặc biệt ---
+                if msg == CMD_DISCONNECT:
+                    self.reason = f"Client {self.client_id} yêu cầu ngắt kết nối."
+                    self.running = False
+                
+                # --- [THÊM] Bắt lệnh Security Alert để ghi Log ---
+                elif msg.startswith(CMD_SECURITY_ALERT):
+                    # msg format: "security_alert:Loại vi phạm|Chi tiết"
+                    try:
+                        # Tách nội dung sau dấu hai chấm đầu tiên
+                        content = msg.split(":", 1)[1]
+                        # Tách loại và chi tiết
+                        if "|" in content:
+                            v_type, v_detail = content.split("|", 1)
+                        else:
+                            v_type, v_detail = "General", content
+                        
+                        # Ghi vào file log trên Server
+                        ServerLogger.log_alert(self.client_id, v_type, v_detail)
+                        
+                        # Lưu ý: Sau khi log xong, code vẫn chạy xuống dưới 
+                        # để gửi PDU cho Manager (Forwarding)
+                    except Exception as e:
+                        print(f"[Session] Lỗi parse alert: {e}")
+
+                channel_id = CHANNEL_CONTROL
+
+            elif ptype == PDU_TYPE_INPUT:
+                # (Input - ví dụ: keylogger) Gửi trên kênh INPUT
+                channel_id = CHANNEL_INPUT
+            else:
+                # (File) Trả lời lượt gửi file -> chỉ manager đã gửi (chưa rõ thì gửi mọi manager)
+                channel_id = CHANNEL_FILE
+                file_peer = self.file_peer
+                if file_peer in subs:
+                    self.broadcaster.enqueue(file_peer, channel_id, raw_payload)
+                    return
+                
+            for manager_id in subs:
+                self.broadcaster.enqueue(manager_id, channel_id, raw_payload)
+            
+        elif from_id in subs:
+            # --- Từ Manager -> Gửi cho Client ---
+            target_id = self.client_id
+            
+            if ptype == PDU_TYPE_INPUT:
+                # (Input) Chỉ người giữ quyền điều khiển
+                if from_id != self.controller:
+                    self.input_denied += 1
+                    return
+                channel_id = CHANNEL_INPUT
+            elif ptype == PDU_TYPE_CONTROL:
+                # (Control) Lệnh cho server xử lý ngay, không chuyển tiếp
+                msg = pdu.message
+                if msg == CMD_SESSION_STATS:
+                    # [THÊM] Trả thống kê mà manager này thấy
+                    self._send_control(from_id, f"{CMD_SESSION_STATS}:{json.dumps(self.stats_snapshot([from_id]))}")
+                    return
+                elif msg == CMD_INPUT_REQUEST:
+                    self._on_input_request(from_id)
+                    return
+                elif msg == CMD_INPUT_RELEASE:
+                    self._on_input_release(from_id)
+                    return
+                elif msg == CMD_REQUEST_REFRESH:
+                    # [SỬA] Phát lại từ cache cho riêng manager này; cache không có thì xin client
+                    # (mọi người xem đều được xin, nhưng gộp lại: tối đa 1 lần / REFRESH_MIN_INTERVAL)
+                    with self.video_lock:
+                        served = self.replay_keyframe(subs[from_id])
+                    if not served:
+                        self._request_refresh()
+                    return
+                elif from_id != self.controller:
+                    return
+                channel_id = CHANNEL_CONTROL
+            elif ptype == PDU_TYPE_FRAME_ACK:
+                # [THÊM] Ghi thống kê rồi chuyển tiếp cho client (rate control phía client) nếu là manager dẫn nhịp
+                sub = subs[from_id]
+                if sub.replay_seq is not None:
+                    if _seq_le(pdu.last_seq, sub.replay_seq):
+                        return # frame phát lại từ cache: ts_ms cũ, không phản ánh độ trễ hiện tại
+                    sub.replay_seq = None
+                sub.stats.on_frame_ack(pdu)
+                if from_id != self._pacer(subs):
+                    return
+                channel_id = CHANNEL_CONTROL
+            elif ptype not in VIDEO_PDU_TYPES and ptype != PDU_TYPE_CURSOR:
+                # (File) Chỉ người giữ quyền điều khiển
+                if from_id != self.controller:
+                    self.input_denied += 1
+                    if ptype == PDU_TYPE_FILE_START:
+                        self._send_control(from_id, f"{CMD_ERROR}:Chỉ người đang điều khiển mới được gửi file")
+                    return
+                self.file_peer = from_id
+                channel_id = CHANNEL_FILE
+            else:
+                return
+            
+            self.broadcaster.enqueue(target_id, channel_id, raw_payload)
+
+    def _forward_video(self, pdu, raw_payload):
+        """
+        1 PDU video -> cache keyframe + mọi manager (cùng 1 buffer). Manager đang tụt hậu / chưa có ảnh nền
+        không nhận RECT; khi làn video của nó đã vơi thì được phát lại từ cache (không cần chờ FULL frame).
+        """
+        seq = pdu.seq
+        is_full = pdu.ptype == PDU_TYPE_FULL
+        waiting = False
+        with self.video_lock:
+            if self.keyframes is not None:
+                if self.keyframes_closed:
+                    # [THÊM] Phiên đã kết thúc, PDU đến sau đã được SessionManager ghi thẳng vào cache -> chuỗi có lỗ
+                    self.keyframes.invalidate(self.client_id)
+                else:
+                    self.keyframes.update(self.client_id, pdu)
+            now = None
+            for sub in self.subscribers.values(): # đọc trong video_lock: không sót người vừa vào phiên
+                if sub.video_seq != seq:
+                    # PDU (hoặc fragment đầu) của frame mới: quyết định 1 lần cho cả frame
+                    sub.video_seq = seq
+                    if self.broadcaster.video_backlog(sub.manager_id) >= SUBSCRIBER_LAG_FRAMES:
+                        if not sub.awaiting_full:
+                            sub.awaiting_full = True
+                            sub.lag_events += 1
+                    elif is_full:
+                        sub.awaiting_full = False # FULL frame đưa manager về ảnh nền đúng
+                    elif sub.awaiting_full:
+                        # Đã hết tụt hậu: phát lại từ cache (đã gồm PDU này), tối đa 1 lần / REFRESH_MIN_INTERVAL
+                        now = now or time.monotonic()
+                        if now - sub.last_replay >= REFRESH_MIN_INTERVAL and self.replay_keyframe(sub):
+                            continue
+                    sub.video_skip = sub.awaiting_full and not is_full
+                    if sub.video_skip:
+                        sub.skipped += 1
+                waiting = waiting or sub.awaiting_full
+                if sub.video_skip:
+                    continue
+                sub.stats.on_video(pdu)
+                self.broadcaster.enqueue(sub.manager_id, CHANNEL_VIDEO, raw_payload)
+        if waiting and (self.keyframes is None or not self.keyframes.has(self.client_id)):
+            # Cache không giúp được (chưa có / chuỗi đã cũ): xin client gửi FULL frame
+            self._request_refresh()
+
+    def _lost_video(self):
+        """[THÊM] 1 PDU video của client bị bỏ trước khi vào cache: chuỗi trong cache thiếu, chờ FULL frame kế tiếp."""
+        if self.keyframes is not None:
+            self.keyframes.invalidate(self.client_id)
+
+    def _request_refresh(self):
+        """Xin client gửi FULL frame, tối đa 1 lần / REFRESH_MIN_INTERVAL."""
+        now = time.monotonic()
+        if now - self._last_refresh < REFRESH_MIN_INTERVAL:
+            return
+        self._last_refresh = now
+        self.refresh_requests += 1
+        self._send_control(self.client_id, CMD_REQUEST_REFRESH)
+
+    def stats_snapshot(self, manager_ids=None) -> dict:
+        """{"manager::client" -> thống kê} của các manager đang xem (mặc định: tất cả)."""
+        subs = self.subscribers
+        controller = self.controller
+        result = {}
+        for mid in (subs if manager_ids is None else manager_ids):
+            sub = subs.get(mid)
+            if sub is None:
+                continue
+            snap = sub.stats.snapshot()
+            snap["input_control"] = mid == controller
+            snap["frames_skipped"] = sub.skipped
+            snap["lag_events"] = sub.lag_events
+            snap["keyframe_replays"] = sub.replays
+            result[f"{mid}::{self.client_id}"] = snap
+        return result
+
+    def _send_control(self, target_id, message: str):
+        seq = next(self._seq) & 0xFFFFFFFF
+        self.broadcaster.enqueue(target_id, CHANNEL_CONTROL, PDUBuilder.build_control_pdu(seq, message.encode()))
 
     def stop(self):
         self.running = False
         with self.pdu_queue.mutex:
-            self.pdu_queue.queue.clear()
\ No newline at end of file
+            self.pdu_queue.queue.clear()
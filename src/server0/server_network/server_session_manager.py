@@ -3,49 +3,85 @@
 import threading
 import json
 import time
+import itertools
+import zlib
+from contextlib import contextmanager
 from queue import Queue, Empty
 from server0.server_network.server_session import ServerSession
+from server0.server_network.server_thumbnails import ThumbnailHub
+from server0.server_network.server_keyframe_cache import KeyframeCache
 from server0.server_constants import (
     ROLE_MANAGER, ROLE_CLIENT, ROLE_UNKNOWN,
     CMD_REGISTER, CMD_LIST_CLIENTS, CMD_CONNECT_CLIENT, CMD_DISCONNECT,
     CMD_REGISTER_OK, CMD_CLIENT_LIST_UPDATE, CMD_SESSION_STARTED, CMD_SESSION_ENDED,
-    CMD_ERROR, CHANNEL_CONTROL
+    CMD_ERROR, CMD_SESSION_STATS, CMD_THUMB_SUBSCRIBE, CMD_THUMB_UNSUBSCRIBE, CHANNEL_CONTROL,
+    SESSION_MAX_SUBSCRIBERS, CMD_VIEWER_JOINED, CMD_KEYFRAME_CACHE, KEYFRAME_FULL_INTERVAL_FACTOR,
+    SESSION_MANAGER_SHARDS,
 )
 from common_network.pdu_builder import PDUBuilder
-from common_network.mcs_layer import MCSLite
+from common_network.constants import PDU_TYPE_CONTROL, PDU_TYPE_THUMB
+from common_network.pdu_records import VIDEO_PDU_TYPES
+
+# [THÊM] Lệnh do SessionManager xử lý kể cả khi người gửi đang ở trong phiên (không chuyển tiếp cho phiên):
+# đăng ký ảnh thu nhỏ, và connect (manager chuyển sang client khác = "promote" 1 ô của màn hình tổng quan)
+SESSION_MANAGER_COMMANDS = (CMD_THUMB_SUBSCRIBE, CMD_THUMB_UNSUBSCRIBE, CMD_CONNECT_CLIENT)
+
+
+class _Shard:
+    """1 phần của bảng đăng ký / định tuyến (các cid có cùng crc32(cid) % số shard)."""
+    __slots__ = ("lock", "roles", "routes", "sessions", "feed_locks")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.roles = {} # cid -> role (ghi trong lock)
+        # cid -> session (client và mọi manager đang xem nó trỏ tới cùng 1 phiên).
+        # Copy-on-write: mỗi lần đổi thay bằng dict mới (trong lock) -> luồng nhận đọc không cần lock
+        self.routes = {}
+        self.sessions = {} # session_id (= client_id) -> session, của các client thuộc shard này
+        # cid -> Lock: thứ tự giữa PDU video của client chưa có phiên (ghi vào cache) và lần mở phiên cho nó
+        self.feed_locks = {}
+
 
 class SessionManager(threading.Thread):
     """
     Quản lý việc đăng ký (client/manager) và các phiên (session) đang hoạt động.
+    - inline=True (engine asyncio): không tạo thread cho SessionManager và ServerSession,
+      PDU được xử lý ngay trong handle_pdu (trên event loop).
+    - [SỬA] Không còn 1 lock chung cho mọi kết nối: vai trò, bảng định tuyến và các phiên được chia
+      theo cid vào SESSION_MANAGER_SHARDS shard, mỗi shard 1 lock.
+      - Đường nóng (handle_pdu, mọi luồng nhận): tra phiên trong bảng copy-on-write của shard, không lấy lock.
+      - Đổi phiên (mở / vào / rời) lấy lock của các shard liên quan theo thứ tự chỉ số tăng dần
+        (thứ tự lock: shard -> feed lock của client -> session.video_lock -> KeyframeCache.lock).
+      - PDU video của client chưa có phiên chỉ lấy feed lock của chính client đó (không tranh chấp với
+        client khác hay với việc vào / rời các phiên đang chạy).
+      - Sequence tin nhắn của server: itertools.count (next() là nguyên tử) -> gửi tin không lấy lock nào.
     """
-    def __init__(self, broadcaster):
+    def __init__(self, broadcaster, inline=False, shards: int = SESSION_MANAGER_SHARDS):
         super().__init__(daemon=True, name="SessionManager")
         self.broadcaster = broadcaster
+        self.inline = inline
         self.pdu_queue = Queue() # Queue nội bộ để xử lý PDU đăng ký
         self.running = True
         
         self.builder = PDUBuilder()
-        self.seq = 0 # Bộ đếm sequence cho tin nhắn từ server
+        self._seq = itertools.count(1) # Bộ đếm sequence cho tin nhắn từ server
         
-        # { cid -> role }
-        self.clients = {} 
-        # { cid -> session }
-        self.client_session_map = {}
-        # { session_id -> session_thread }
-        self.active_sessions = {}
-        
-        self.lock = threading.Lock()
+        self.shards = [_Shard() for _ in range(max(1, shards))]
+        # [THÊM] Luồng ảnh thu nhỏ (màn hình tổng quan), độc lập với các phiên
+        self.thumbnails = ThumbnailHub(broadcaster, self._send_control_pdu)
+        # [THÊM] FULL frame mới nhất + các RECT sau nó của mỗi client (vào phiên / refresh ngay từ server)
+        self.keyframes = KeyframeCache()
 
     def start(self):
         self.running = True
-        super().start()
+        if not self.inline:
+            super().start()
         print("[SessionManager] Đã khởi động.")
 
     def stop(self):
         self.running = False
         print("[SessionManager] Đang dừng...")
-        with self.lock:
-            sessions = list(self.active_sessions.values())
+        sessions = self._all_sessions()
         
         print(f"[SessionManager] Dừng {len(sessions)} phiên đang hoạt động...")
         for s in sessions:
@@ -55,37 +91,95 @@ class SessionManager(threading.Thread):
             self.pdu_queue.queue.clear()
         print("[SessionManager] Đã dừng.")
 
+    # --- [THÊM] Bảng đăng ký / định tuyến theo shard ---
+
+    def _shard_index(self, cid) -> int:
+        return zlib.crc32(cid.encode()) % len(self.shards)
+
+    def _shard(self, cid) -> _Shard:
+        return self.shards[zlib.crc32(cid.encode()) % len(self.shards)]
+
+    def _role(self, cid):
+        """Vai trò đã đăng ký (None nếu không còn kết nối). Không lấy lock."""
+        return self._shard(cid).roles.get(cid)
+
+    def _route(self, cid):
+        """Phiên mà cid đang ở trong (None nếu không có). Không lấy lock (bảng copy-on-write)."""
+        return self._shard(cid).routes.get(cid)
+
+    @contextmanager
+    def _locked(self, *cids):
+        """Giữ lock của các shard chứa cids, lấy theo chỉ số tăng dần (không deadlock)."""
+        locks = [self.shards[i].lock for i in sorted({self._shard_index(cid) for cid in cids})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _set_route(self, cid, session):
+        # Gọi khi đang giữ lock của shard chứa cid
+        shard = self._shard(cid)
+        routes = dict(shard.routes)
+        routes[cid] = session
+        shard.routes = routes
+
+    def _drop_route(self, cid, session=None):
+        """Gỡ cid khỏi bảng định tuyến (chỉ khi còn trỏ tới session, nếu có). Gọi khi đang giữ lock của shard."""
+        shard = self._shard(cid)
+        current = shard.routes.get(cid)
+        if current is None or (session is not None and current is not session):
+            return
+        routes = dict(shard.routes)
+        del routes[cid]
+        shard.routes = routes
+
+    def _all_sessions(self):
+        sessions = []
+        for shard in self.shards:
+            with shard.lock:
+                sessions.extend(shard.sessions.values())
+        return sessions
+
     # --- Callbacks từ ServerNetwork ---
 
     def handle_new_connection(self, client_id, ssl_sock):
         """Được gọi bởi ServerNetwork khi có kết nối mới"""
-        with self.lock:
-            self.clients[client_id] = ROLE_UNKNOWN
+        shard = self._shard(client_id)
+        with shard.lock:
+            shard.roles[client_id] = ROLE_UNKNOWN
+            shard.feed_locks[client_id] = threading.Lock()
         print(f"[SessionManager] Client {client_id} đã kết nối (chưa rõ vai trò).")
 
     def handle_disconnection(self, client_id):
         """Được gọi bởi ServerNetwork khi client mất kết nối"""
         print(f"[SessionManager] Client {client_id} đã ngắt kết nối.")
-        session = None
-        role = ROLE_UNKNOWN
-        with self.lock:
-            role = self.clients.pop(client_id, ROLE_UNKNOWN)
-            # Nếu client này đang trong 1 phiên, kết thúc phiên đó
-            session = self.client_session_map.pop(client_id, None)
-            
+        shard = self._shard(client_id)
+        with shard.lock:
+            role = shard.roles.pop(client_id, ROLE_UNKNOWN)
+            shard.feed_locks.pop(client_id, None)
+            session = shard.routes.get(client_id)
+
         if session:
-            print(f"[SessionManager] Dừng phiên {session.session_id} do {client_id} ngắt kết nối.")
-            session.stop()
-            with self.lock:
-                self.active_sessions.pop(session.session_id, None)
-                # Báo cho bên còn lại biết phiên đã kết thúc
-                other_party_id = session.manager_id if client_id == session.client_id else session.client_id
-                self.client_session_map.pop(other_party_id, None)
-                self._send_control_pdu(other_party_id, f"{CMD_SESSION_ENDED}:{client_id}")
+            if client_id == session.client_id:
+                # Client (nguồn phát) ngắt kết nối: kết thúc phiên, báo cho mọi manager đang xem
+                print(f"[SessionManager] Dừng phiên {session.session_id} do {client_id} ngắt kết nối.")
+                session.reason = f"Client {client_id} ngắt kết nối."
+                session.stop()
+                self._end_session(session)
+            else:
+                # [SỬA] Manager ngắt kết nối: chỉ rời phiên, những người xem khác vẫn tiếp tục
+                self._leave_session(client_id, f"Manager {client_id} ngắt kết nối.")
 
         if role == ROLE_CLIENT:
+            self.keyframes.drop(client_id)
+            self.thumbnails.remove_client(client_id)
             # Nếu là client, cập nhật danh sách cho tất cả manager
             self._broadcast_client_list()
+        elif role == ROLE_MANAGER:
+            self.thumbnails.remove_manager(client_id)
 
     def handle_pdu(self, client_id, pdu):
         """
@@ -94,13 +188,45 @@ class SessionManager(threading.Thread):
         - Nếu là PDU điều khiển (register, connect), xử lý ngay.
         - Nếu là PDU trong phiên (input, video), chuyển cho ServerSession tương ứng.
         """
-        session = None
-        with self.lock:
-            session = self.client_session_map.get(client_id)
-            
+        ptype = pdu.ptype
+        if ptype == PDU_TYPE_THUMB:
+            # [THÊM] Ảnh thu nhỏ: chuyển cho các manager theo dõi (không thuộc phiên nào)
+            self.thumbnails.on_thumbnail(client_id, pdu)
+            return
+
+        # [SỬA] Tra phiên không lấy lock (bảng copy-on-write của shard)
+        session = self._route(client_id)
+
+        if session is None and ptype in VIDEO_PDU_TYPES:
+            # [THÊM] Client chưa có người xem: chỉ ghi vào cache keyframe (không vào queue điều khiển).
+            # Sao chép ngoài lock; kiểm tra phiên + ghi cache trong feed lock của client (mở phiên cũng giữ lock này)
+            # để không lọt PDU nào giữa lần phát lại cho manager mở phiên và PDU đầu tiên đi qua phiên
+            shard = self._shard(client_id)
+            feed_lock = shard.feed_locks.get(client_id)
+            if feed_lock is None:
+                return # đã ngắt kết nối
+            data = bytes(pdu.raw)
+            with feed_lock:
+                session = shard.routes.get(client_id)
+                if session is None:
+                    if shard.roles.get(client_id) == ROLE_CLIENT:
+                        self.keyframes.update(client_id, pdu, data)
+                    return
+
+        # [THÊM] Lệnh của SessionManager gửi từ trong phiên: không chuyển cho phiên.
+        # Manager ngắt kết nối cũng do SessionManager xử lý (chỉ manager đó rời phiên).
+        if session and ptype == PDU_TYPE_CONTROL and not pdu.is_fragment:
+            msg = pdu.message
+            if msg.startswith(SESSION_MANAGER_COMMANDS) or (msg == CMD_DISCONNECT and client_id != session.client_id):
+                session = None
+
         if session:
             # Client này đang trong 1 phiên, chuyển PDU cho luồng của phiên đó
             session.enqueue_pdu(client_id, pdu)
+        elif self.inline:
+            # Engine asyncio: xử lý PDU điều khiển ngay, không qua queue
+            if ptype == PDU_TYPE_CONTROL:
+                self._handle_control_pdu(client_id, pdu)
         else:
             # Client chưa có phiên, PDU này phải là PDU điều khiển (register/connect)
             # Đưa vào queue nội bộ của SessionManager để xử lý
@@ -113,10 +239,8 @@ class SessionManager(threading.Thread):
         while self.running:
             try:
                 client_id, pdu = self.pdu_queue.get(timeout=0.5)
-                ptype = pdu.get("type")
-                
                 # Chỉ xử lý PDU CONTROL khi chưa vào phiên
-                if ptype == "control":
+                if pdu.ptype == PDU_TYPE_CONTROL:
                     self._handle_control_pdu(client_id, pdu)
                     
             except Empty:
@@ -126,18 +250,24 @@ class SessionManager(threading.Thread):
 
     def _handle_control_pdu(self, client_id, pdu):
         """Xử lý PDU điều khiển từ client/manager chưa có phiên"""
-        msg = pdu.get("message", "")
+        msg = pdu.message
         
         # --- Xử lý Đăng ký ---
         if msg.startswith(CMD_REGISTER):
             role = msg.split(":", 1)[1].strip()
             if role in (ROLE_MANAGER, ROLE_CLIENT):
-                with self.lock:
-                    self.clients[client_id] = role
+                shard = self._shard(client_id)
+                with shard.lock:
+                    if client_id not in shard.roles:
+                        return # đã ngắt kết nối trong lúc PDU chờ xử lý
+                    shard.roles[client_id] = role
                 print(f"[SessionManager] {client_id} đăng ký vai trò: {role}")
                 self._send_control_pdu(client_id, f"{CMD_REGISTER_OK}:{role}")
                 
                 if role == ROLE_CLIENT:
+                    # [THÊM] Server giữ keyframe: client giãn chu kỳ FULL frame định kỳ
+                    self._send_control_pdu(client_id, f"{CMD_KEYFRAME_CACHE}:{KEYFRAME_FULL_INTERVAL_FACTOR}")
+                    self.thumbnails.add_client(client_id)
                     self._broadcast_client_list() # Cập nhật cho manager
                 elif role == ROLE_MANAGER:
                     self._send_client_list(client_id) # Gửi danh sách cho manager mới
@@ -146,70 +276,202 @@ class SessionManager(threading.Thread):
 
         # --- Xử lý Yêu cầu danh sách Client ---
         elif msg == CMD_LIST_CLIENTS:
-            if self.clients.get(client_id) == ROLE_MANAGER:
+            if self._role(client_id) == ROLE_MANAGER:
                 self._send_client_list(client_id)
         
         # --- Xử lý Yêu cầu Kết nối ---
         elif msg.startswith(CMD_CONNECT_CLIENT):
-            if self.clients.get(client_id) != ROLE_MANAGER:
+            if self._role(client_id) != ROLE_MANAGER:
                 self._send_control_pdu(client_id, f"{CMD_ERROR}:Chỉ manager mới được kết nối")
                 return
 
             target_cid = msg.split(":", 1)[1].strip()
             self._start_new_session(client_id, target_cid)
 
-    # --- Quản lý Phiên (Session) ---
+        # --- [THÊM] Manager rời phiên (các manager khác vẫn xem tiếp) ---
+        elif msg == CMD_DISCONNECT:
+            self._leave_session(client_id, f"Manager {client_id} yêu cầu ngắt kết nối.")
 
-    def _start_new_session(self, manager_id, client_id):
-        with self.lock:
-            if self.client_session_map.get(manager_id):
-                self._send_control_pdu(manager_id, f"{CMD_ERROR}:Bạn đã ở trong 1 phiên")
-                return
-            if self.client_session_map.get(client_id):
-                self._send_control_pdu(manager_id, f"{CMD_ERROR}:Client {client_id} đang bận")
+        # --- [THÊM] Thống kê độ trễ / jitter / fps của mọi phiên (manager chưa vào phiên) ---
+        elif msg == CMD_SESSION_STATS:
+            if self._role(client_id) == ROLE_MANAGER:
+                self._send_control_pdu(client_id, f"{CMD_SESSION_STATS}:{json.dumps(self.session_stats())}")
+
+        # --- [THÊM] Đăng ký / bỏ đăng ký ảnh thu nhỏ ("*" = mọi client) ---
+        elif msg.startswith((CMD_THUMB_SUBSCRIBE, CMD_THUMB_UNSUBSCRIBE)):
+            if self._role(client_id) != ROLE_MANAGER:
+                self._send_control_pdu(client_id, f"{CMD_ERROR}:Chỉ manager mới được theo dõi ảnh thu nhỏ")
                 return
-            if self.clients.get(client_id) != ROLE_CLIENT:
-                self._send_control_pdu(manager_id, f"{CMD_ERROR}:Client {client_id} không tồn tại")
+            cmd, _, arg = msg.partition(":")
+            try:
+                arg = arg.strip()
+                client_ids = None if arg in ("", "*") else [str(c) for c in json.loads(arg)]
+            except (ValueError, TypeError):
+                self._send_control_pdu(client_id, f"{CMD_ERROR}:Danh sách client không hợp lệ")
                 return
-        
+            if cmd == CMD_THUMB_SUBSCRIBE:
+                self.thumbnails.subscribe(client_id, client_ids)
+            else:
+                self.thumbnails.unsubscribe(client_id, client_ids)
+
+    # --- Quản lý Phiên (Session) ---
+
+    def _start_new_session(self, manager_id, client_id):
+        """
+        Manager xin xem client_id: client rảnh -> mở phiên mới (manager giữ quyền điều khiển);
+        client đang trong phiên -> [SỬA] vào phiên đó với vai trò người xem (thay cho lỗi "đang bận").
+        Manager đang ở phiên khác (promote 1 ô của màn hình tổng quan) thì rời phiên cũ trước.
+        """
+        # [SỬA] Kiểm tra sơ bộ không lấy lock, kiểm tra lại khi giữ lock của 2 shard (manager, client)
+        current = self._route(manager_id)
+        target = self._route(client_id)
+        error = None
+        if current is not None and current is target:
+            error = f"Bạn đã ở trong phiên với {client_id}"
+        elif self._role(client_id) != ROLE_CLIENT:
+            error = f"Client {client_id} không tồn tại"
+        elif target is not None and len(target.subscribers) >= SESSION_MAX_SUBSCRIBERS:
+            error = f"Client {client_id} đã có {SESSION_MAX_SUBSCRIBERS} manager đang xem"
+        if error:
+            self._send_control_pdu(manager_id, f"{CMD_ERROR}:{error}")
+            return
+
+        if current is not None:
+            print(f"[SessionManager] {manager_id} chuyển từ {current.client_id} sang {client_id}")
+            self._leave_session(manager_id, f"Manager {manager_id} chuyển sang {client_id}")
+
+        joined = session = None
+        served = False
+        with self._locked(manager_id, client_id):
+            client_shard = self._shard(client_id)
+            target = client_shard.routes.get(client_id)
+            if target is not None:
+                # --- Client đang trong phiên: vào xem cùng ---
+                if target.running and target.add_subscriber(manager_id):
+                    self._set_route(manager_id, target)
+                    joined = target
+                    served = not target.subscribers[manager_id].awaiting_full
+                else:
+                    error = f"Client {client_id} đã có {SESSION_MAX_SUBSCRIBERS} manager đang xem"
+            elif client_shard.roles.get(client_id) != ROLE_CLIENT:
+                error = f"Client {client_id} không tồn tại"
+            else:
+                session = ServerSession(manager_id, client_id, self.broadcaster, self._on_session_done,
+                                        inline=self.inline, keyframes=self.keyframes)
+                client_shard.sessions[session.session_id] = session
+                self._set_route(manager_id, session)
+                # [THÊM] Phát lại keyframe trong feed lock của client: PDU video nào đến trước đã nằm
+                # trong cache, PDU nào đến sau đi qua phiên (sau lần phát lại này)
+                with client_shard.feed_locks[client_id], session.video_lock:
+                    self._set_route(client_id, session)
+                    served = session.replay_keyframe(session.subscribers[manager_id])
+        if error:
+            self._send_control_pdu(manager_id, f"{CMD_ERROR}:{error}")
+            return
+
+        if joined is not None:
+            print(f"[SessionManager] {manager_id} vào xem phiên {joined.session_id} "
+                  f"({len(joined.subscribers)} manager, {'ảnh từ cache' if served else 'chờ FULL frame'})")
+            self._notify_session_started(manager_id, client_id, served)
+            joined.announce_input_owner([manager_id])
+            return
+
         print(f"[SessionManager] Bắt đầu phiên mới: {manager_id} <-> {client_id}")
-        session = ServerSession(manager_id, client_id, self.broadcaster, self._on_session_done)
-        session.start()
-        
-        with self.lock:
-            self.active_sessions[session.session_id] = session
-            self.client_session_map[manager_id] = session
-            self.client_session_map[client_id] = session
+        if not self.inline:
+            session.start() # PDU đến trước khi thread chạy nằm chờ trong queue của phiên
             
         # Thông báo cho cả 2 bên
+        self._notify_session_started(manager_id, client_id, served)
+        session.announce_input_owner([manager_id])
+
+    def _notify_session_started(self, manager_id, client_id, served: bool):
+        """served: manager đã nhận ảnh từ cache -> client không cần gửi FULL frame (viewer_joined thay cho session_started)."""
         self._send_control_pdu(manager_id, f"{CMD_SESSION_STARTED}:{client_id}")
-        self._send_control_pdu(client_id, f"{CMD_SESSION_STARTED}:{manager_id}")
+        if served:
+            self._send_control_pdu(client_id, f"{CMD_VIEWER_JOINED}:{manager_id}")
+        else:
+            self._send_control_pdu(client_id, f"{CMD_SESSION_STARTED}:{manager_id}") # client gửi FULL frame
+
+    def _leave_session(self, manager_id, reason):
+        """Manager rời phiên đang xem. Người xem cuối cùng rời đi -> kết thúc phiên."""
+        session = self._route(manager_id)
+        if session is None or session.client_id == manager_id:
+            return
+        with self._locked(manager_id, session.client_id):
+            if self._shard(manager_id).routes.get(manager_id) is not session:
+                return # phiên vừa đổi / kết thúc
+            last = len(session.subscribers) <= 1
+            if not last:
+                session.remove_subscriber(manager_id)
+                self._drop_route(manager_id, session)
+        if last:
+            session.reason = reason
+            session.stop()
+            self._end_session(session)
+            return
+        print(f"[SessionManager] {manager_id} rời phiên {session.session_id}: {reason}")
+        if self._role(manager_id):
+            self._send_control_pdu(manager_id, f"{CMD_SESSION_ENDED}:{session.client_id}")
 
     def _on_session_done(self, session, reason):
         """Callback được gọi bởi ServerSession khi nó kết thúc"""
         print(f"[SessionManager] Phiên {session.session_id} kết thúc. Lý do: {reason}")
-        with self.lock:
-            self.active_sessions.pop(session.session_id, None)
-            self.client_session_map.pop(session.manager_id, None)
-            self.client_session_map.pop(session.client_id, None)
+        self._end_session(session)
+
+    def _end_session(self, session):
+        """Gỡ phiên khỏi các bảng và báo cho 2 bên. Chỉ lần gọi đầu có tác dụng (phiên bị chuyển rồi mới dừng)."""
+        client_shard = self._shard(session.client_id)
+        with client_shard.lock:
+            if client_shard.sessions.get(session.session_id) is not session:
+                return
+            del client_shard.sessions[session.session_id]
+            # [THÊM] Từ đây PDU video của client ghi thẳng vào cache (handle_pdu), phiên thôi ghi
+            with session.video_lock:
+                session.keyframes_closed = True
+            if not self.inline:
+                # PDU còn trong queue của phiên bị bỏ -> chuỗi trong cache thiếu, chờ FULL frame kế tiếp
+                self.keyframes.invalidate(session.client_id)
+            # [SỬA] Gỡ client trước: từ đây không manager nào vào phiên được nữa (vào phiên giữ lock này)
+            # -> danh sách người xem đọc sau đây là cuối cùng
+            self._drop_route(session.client_id, session)
+        manager_ids = session.manager_ids
+        # Chỉ gỡ ánh xạ còn trỏ tới phiên này (manager có thể đã sang phiên mới)
+        for manager_id in manager_ids:
+            with self._shard(manager_id).lock:
+                self._drop_route(manager_id, session)
             
-        # Báo cho 2 bên (nếu họ vẫn còn kết nối)
-        if self.clients.get(session.manager_id):
-             self._send_control_pdu(session.manager_id, f"{CMD_SESSION_ENDED}:{session.client_id}")
-        if self.clients.get(session.client_id):
-             self._send_control_pdu(session.client_id, f"{CMD_SESSION_ENDED}:{session.manager_id}")
+        # Báo cho các bên (nếu họ vẫn còn kết nối)
+        for manager_id in manager_ids:
+            if self._role(manager_id):
+                self._send_control_pdu(manager_id, f"{CMD_SESSION_ENDED}:{session.client_id}")
+            if self._role(session.client_id):
+                self._send_control_pdu(session.client_id, f"{CMD_SESSION_ENDED}:{manager_id}")
+
+
+    def keyframe_stats(self):
+        return self.keyframes.stats()
 
+    def session_stats(self):
+        """{"manager::client" -> thống kê độ trễ / jitter / fps} của mọi người xem, mọi phiên (thread-safe)."""
+        stats = {}
+        for s in self._all_sessions():
+            stats.update(s.stats_snapshot())
+        return stats
 
     # --- Gửi tin nhắn Tiện ích ---
 
+    def _idle_peers(self, role):
+        """Các cid đã đăng ký vai trò role và không ở trong phiên nào (thread-safe, từng shard 1)."""
+        peers = []
+        for shard in self.shards:
+            with shard.lock:
+                routes = shard.routes
+                peers.extend(cid for cid, r in shard.roles.items() if r == role and cid not in routes)
+        return peers
+
     def _get_available_clients(self):
         """Lấy danh sách client đang rảnh (thread-safe)"""
-        available = []
-        with self.lock:
-            for cid, role in self.clients.items():
-                if role == ROLE_CLIENT and cid not in self.client_session_map:
-                    available.append(cid)
-        return available
+        return sorted(self._idle_peers(ROLE_CLIENT))
 
     def _send_client_list(self, manager_id):
         """Gửi danh sách client rảnh cho 1 manager"""
@@ -222,22 +484,13 @@ class SessionManager(threading.Thread):
         clients = self._get_available_clients()
         msg = f"{CMD_CLIENT_LIST_UPDATE}:{json.dumps(clients)}"
         
-        managers_to_notify = []
-        with self.lock:
-            for cid, role in self.clients.items():
-                if role == ROLE_MANAGER and cid not in self.client_session_map:
-                    managers_to_notify.append(cid)
-                    
-        for mid in managers_to_notify:
+        for mid in self._idle_peers(ROLE_MANAGER):
             self._send_control_pdu(mid, msg)
 
     def _send_control_pdu(self, target_id, message: str):
-        """Gửi 1 PDU CONTROL tới client/manager"""
+        """Gửi 1 PDU CONTROL tới client/manager (không lấy lock: thứ tự seq do itertools.count)"""
         if not self.broadcaster: return
         
-        with self.lock:
-            self.seq += 1
-            pdu_bytes = self.builder.build_control_pdu(self.seq, message.encode())
-        
-        mcs_frame = MCSLite.build(CHANNEL_CONTROL, pdu_bytes)
-        self.broadcaster.enqueue(target_id, mcs_frame)
\ No newline at end of file
+        seq = next(self._seq) & 0xFFFFFFFF
+        pdu_bytes = self.builder.build_control_pdu(seq, message.encode())
+        self.broadcaster.enqueue(target_id, CHANNEL_CONTROL, pdu_bytes)
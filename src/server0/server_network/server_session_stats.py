@@ -0,0 +1,121 @@
+# server0/server_network/server_session_stats.py
+
+import threading
+import time
+from collections import deque
+from common_network.stats import LatencyHistogram
+
+"""
+Thống kê độ trễ / jitter / fps của 1 phiên, cập nhật từ luồng PDU mà ServerSession chuyển tiếp:
+- on_video(pdu): frame video client -> manager (ghi thời điểm server nhận, theo seq)
+- on_frame_ack(pdu): FRAME_ACK manager -> client
+Các chỉ số:
+- latency_ms: từ lúc client chụp (ts_ms trong header) tới lúc FRAME_ACK về tới server, tức
+  chụp -> encode -> gửi -> server -> manager giải mã + hiển thị (+ đường về của ACK).
+  So sánh đồng hồ client với đồng hồ server: cần 2 máy đồng bộ giờ (NTP); mẫu âm (lệch giờ) bị bỏ
+  và đếm ở clock_skewed.
+- render_rtt_ms: server chuyển frame đi -> FRAME_ACK của frame đó về (chỉ dùng đồng hồ server, luôn đúng).
+- jitter_ms: độ biến thiên latency giữa 2 ACK liên tiếp, làm mượt như RFC 3550 (J += (|D| - J) / 16).
+- decode_ms / render_ms: do manager báo (trung bình mỗi đợt ACK).
+- fps: số frame manager hiển thị được trong FPS_WINDOW giây gần nhất.
+Chi phí trên đường nóng (mỗi frame video): 1 lần append vào deque.
+"""
+
+MAX_PENDING_FRAMES = 1024 # số frame đã chuyển tiếp nhưng chưa được ACK được ghi nhớ
+FPS_WINDOW = 5.0
+
+
+def _seq_le(a: int, b: int) -> bool:
+    """a <= b theo số thứ tự 32-bit (có quay vòng)."""
+    return ((b - a) & 0xFFFFFFFF) < 0x80000000
+
+
+class SessionStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self._pending = deque(maxlen=MAX_PENDING_FRAMES) # (seq, thời điểm server nhận - monotonic)
+        self._acks = deque() # (thời điểm nhận ACK, số frame) trong FPS_WINDOW giây gần nhất
+
+        self.latency = LatencyHistogram(max_samples=10_000)
+        self.render_rtt = LatencyHistogram(max_samples=10_000)
+        self.decode = LatencyHistogram(max_samples=10_000)
+        self.render = LatencyHistogram(max_samples=10_000)
+        self.jitter_ms = 0.0
+        self._last_latency = None
+
+        self.frames_forwarded = 0
+        self.frames_rendered = 0
+        self.frames_dropped = 0 # manager nhận được nhưng không hiển thị được
+        self.acks = 0
+        self.clock_skewed = 0
+
+    def on_video(self, pdu) -> None:
+        seq = pdu.seq
+        with self.lock:
+            # Frame bị phân mảnh đi qua server thành nhiều Fragment cùng seq: chỉ ghi fragment đầu tiên
+            if self._pending and self._pending[-1][0] == seq:
+                return
+            self._pending.append((seq, time.monotonic()))
+            self.frames_forwarded += 1
+
+    def on_frame_ack(self, ack) -> None:
+        now = time.monotonic()
+        latency = time.time() * 1000 - ack.frame_ts_ms
+        sent_at = None
+        with self.lock:
+            pending = self._pending
+            # Các frame trước last_seq đã được hiển thị (hoặc bị bỏ) cùng đợt: không còn cần nhớ
+            while pending and _seq_le(pending[0][0], ack.last_seq):
+                seq, t = pending.popleft()
+                if seq == ack.last_seq:
+                    sent_at = t
+                    break
+
+            self.acks += 1
+            self.frames_rendered += ack.frames
+            self.frames_dropped += ack.dropped
+            self._acks.append((now, ack.frames))
+            while self._acks and now - self._acks[0][0] > FPS_WINDOW:
+                self._acks.popleft()
+
+            if latency < 0:
+                self.clock_skewed += 1
+            else:
+                if self._last_latency is not None:
+                    self.jitter_ms += (abs(latency - self._last_latency) - self.jitter_ms) / 16
+                self._last_latency = latency
+
+        if latency >= 0:
+            self.latency.record(latency)
+        if sent_at is not None:
+            self.render_rtt.record((now - sent_at) * 1000)
+        self.decode.record(ack.decode_ms)
+        self.render.record(ack.render_ms)
+
+    def fps(self) -> float:
+        now = time.monotonic()
+        with self.lock:
+            frames = sum(n for t, n in self._acks if now - t <= FPS_WINDOW)
+        window = min(FPS_WINDOW, max(now - self.started, 1e-3))
+        return frames / window
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            counters = {
+                "frames_forwarded": self.frames_forwarded,
+                "frames_rendered": self.frames_rendered,
+                "frames_dropped": self.frames_dropped,
+                "acks": self.acks,
+                "clock_skewed": self.clock_skewed,
+                "jitter_ms": self.jitter_ms,
+            }
+        counters.update({
+            "uptime_s": time.monotonic() - self.started,
+            "fps": self.fps(),
+            "latency_ms": self.latency.summary(),
+            "render_rtt_ms": self.render_rtt.summary(),
+            "decode_ms": self.decode.summary(),
+            "render_ms": self.render.summary(),
+        })
+        return counters
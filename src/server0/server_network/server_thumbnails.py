@@ -0,0 +1,170 @@
+# server0/server_network/server_thumbnails.py
+
+import json
+import threading
+import time
+from typing import Callable, Iterable, Optional
+from common_network.pdu_builder import PDUBuilder
+from server0.server_constants import (
+    CHANNEL_THUMB, CMD_THUMB_START, CMD_THUMB_STOP, CMD_THUMB_GONE,
+    THUMB_MAX_DIMENSION, THUMB_INTERVAL, THUMB_QUALITY,
+)
+
+"""
+Điều phối luồng ảnh thu nhỏ (màn hình tổng quan của manager), độc lập với các phiên tương tác:
+- Manager đăng ký theo dõi 1 danh sách client hoặc "*" (mọi client, kể cả client đăng ký sau).
+  Đang ở trong phiên vẫn theo dõi được.
+- Client chỉ chụp / encode ảnh thu nhỏ khi có ít nhất 1 manager theo dõi nó (thumb_start / thumb_stop),
+  theo thông số của server (mặc định 320 px, 1 fps) -> chi phí phía client có giới hạn và bằng 0 khi không ai xem.
+- on_thumbnail: điền id client nguồn vào PDU (tạo lại 1 lần, vài KB) rồi chuyển cho mọi manager đang theo dõi.
+  Client gửi nhanh hơn interval / 2 -> bị bỏ. Ở outbox mỗi manager chỉ giữ ảnh mới nhất của mỗi client
+  (làn thumb, ưu tiên thấp nhất) -> chi phí fan-out tối đa (số client x số manager) ảnh mỗi interval.
+- Ảnh mới nhất của mỗi client được giữ lại: manager mới đăng ký thấy ngay màn hình tổng quan,
+  không phải chờ lượt chụp kế tiếp.
+Thread-safe; send_control / broadcaster được gọi ngoài lock.
+"""
+
+
+class ThumbnailHub:
+    def __init__(self, broadcaster, send_control: Callable[[str, str], None],
+                 max_dimension: int = THUMB_MAX_DIMENSION, interval: float = THUMB_INTERVAL,
+                 quality: int = THUMB_QUALITY):
+        self.broadcaster = broadcaster
+        self.send_control = send_control # send_control(target_id, message)
+        self.params = {"max_dimension": max_dimension, "interval": interval, "quality": quality}
+        self.min_spacing = interval / 2 # ảnh đến dày hơn mức này bị bỏ
+
+        self.lock = threading.Lock()
+        self.clients = set() # client đã đăng ký (đối tượng của đăng ký "*")
+        self.wildcard = set() # manager theo dõi mọi client
+        self.subscribers = {} # client_id -> set(manager_id) (đăng ký theo tên)
+        self.producing = set() # client đã được gửi thumb_start
+        self.latest = {} # client_id -> PDU THUMB (đã điền nguồn) mới nhất
+        self.last_forward = {} # client_id -> time.monotonic() lần chuyển tiếp gần nhất
+
+        # --- Thống kê ---
+        self.received = 0
+        self.forwarded = 0 # số bản gửi cho manager (1 ảnh x N manager)
+        self.rate_limited = 0
+        self.unwatched = 0 # ảnh đến khi không còn ai theo dõi (thumb_stop chưa tới client)
+
+    # --- Vòng đời client / manager (SessionManager gọi) ---
+
+    def add_client(self, client_id: str) -> None:
+        with self.lock:
+            self.clients.add(client_id)
+        self._update_production((client_id,))
+
+    def remove_client(self, client_id: str) -> None:
+        with self.lock:
+            self.clients.discard(client_id)
+            watchers = self._watchers(client_id)
+            self.subscribers.pop(client_id, None)
+            self.producing.discard(client_id)
+            self.latest.pop(client_id, None)
+            self.last_forward.pop(client_id, None)
+        for manager_id in watchers:
+            self.send_control(manager_id, f"{CMD_THUMB_GONE}:{client_id}")
+
+    def remove_manager(self, manager_id: str) -> None:
+        self.unsubscribe(manager_id, None)
+
+    # --- Đăng ký ---
+
+    def subscribe(self, manager_id: str, client_ids: Optional[Iterable[str]]) -> None:
+        """client_ids=None: mọi client (kể cả client đăng ký sau)."""
+        with self.lock:
+            if client_ids is None:
+                self.wildcard.add(manager_id)
+                targets = set(self.clients)
+            else:
+                targets = set(client_ids)
+                for cid in targets:
+                    self.subscribers.setdefault(cid, set()).add(manager_id)
+            cached = [self.latest[cid] for cid in targets if cid in self.latest]
+        # Lấp màn hình tổng quan ngay bằng ảnh đã có
+        for pdu in cached:
+            self.broadcaster.enqueue(manager_id, CHANNEL_THUMB, pdu)
+        self._update_production(targets)
+
+    def unsubscribe(self, manager_id: str, client_ids: Optional[Iterable[str]]) -> None:
+        """client_ids=None: bỏ mọi đăng ký của manager."""
+        with self.lock:
+            if client_ids is None:
+                self.wildcard.discard(manager_id)
+                targets = [cid for cid, subs in self.subscribers.items() if manager_id in subs]
+                targets += list(self.clients)
+            else:
+                targets = list(client_ids)
+            for cid in targets:
+                subs = self.subscribers.get(cid)
+                if subs is not None:
+                    subs.discard(manager_id)
+                    if not subs:
+                        del self.subscribers[cid]
+        self._update_production(targets)
+
+    def _watchers(self, client_id: str) -> set:
+        # Gọi khi đang giữ self.lock
+        watchers = set(self.subscribers.get(client_id, ()))
+        if client_id in self.clients:
+            watchers |= self.wildcard
+        return watchers
+
+    def _update_production(self, client_ids: Iterable[str]) -> None:
+        """Gửi thumb_start / thumb_stop cho các client có số người theo dõi chuyển từ 0 <-> >0."""
+        start, stop = [], []
+        with self.lock:
+            for cid in set(client_ids):
+                want = cid in self.clients and bool(self._watchers(cid))
+                if want and cid not in self.producing:
+                    self.producing.add(cid)
+                    start.append(cid)
+                elif not want and cid in self.producing:
+                    self.producing.discard(cid)
+                    stop.append(cid)
+        if start:
+            msg = f"{CMD_THUMB_START}:{json.dumps(self.params)}"
+            for cid in start:
+                self.send_control(cid, msg)
+        for cid in stop:
+            self.send_control(cid, CMD_THUMB_STOP)
+
+    # --- Đường nóng ---
+
+    def on_thumbnail(self, client_id: str, pdu) -> None:
+        """PDU THUMB từ client: điền nguồn, lưu làm ảnh mới nhất và chuyển cho các manager theo dõi."""
+        now = time.monotonic()
+        with self.lock:
+            self.received += 1
+            if client_id not in self.clients:
+                return # chưa đăng ký vai trò client
+            last = self.last_forward.get(client_id)
+            if last is not None and now - last < self.min_spacing:
+                self.rate_limited += 1
+                return
+            watchers = self._watchers(client_id)
+            if not watchers:
+                self.unwatched += 1
+                return
+            self.last_forward[client_id] = now
+        stamped = PDUBuilder.build_thumbnail_pdu(pdu.seq, pdu.jpg, pdu.width, pdu.height, client_id, pdu.ts_ms)
+        with self.lock:
+            self.latest[client_id] = stamped
+            self.forwarded += len(watchers)
+        for manager_id in watchers:
+            self.broadcaster.enqueue(manager_id, CHANNEL_THUMB, stamped)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "clients": len(self.clients),
+                "producing": len(self.producing),
+                "wildcard_managers": len(self.wildcard),
+                "subscriptions": sum(len(s) for s in self.subscribers.values()),
+                "cached_bytes": sum(len(p) for p in self.latest.values()),
+                "received": self.received,
+                "forwarded": self.forwarded,
+                "rate_limited": self.rate_limited,
+                "unwatched": self.unwatched,
+            }
@@ -0,0 +1,130 @@
+# tests/conftest.py
+
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import pytest
+
+# Mã nguồn nằm trong src/ và được import theo gói cấp cao nhất (common_network, client, ...)
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from common_network.constants import TPKT_EXT_FLAG
+from common_network.frame_decoder import PDUFrameDecoder
+from common_network.mcs_layer import MCSLite
+from common_network.pdu_parser import PDUParser
+from common_network.tpkt_layer import TPKTLayer
+from common_network.tpkt_writer import frame_header
+
+"""
+Tiện ích dùng chung cho các test:
+- McsPath: 1 chiều đi qua framing thật (TPKT + MCS) và server relay (PDUFrameDecoder + parse
+  reassemble=False, chuyển tiếp `raw`) tới đầu nhận (PDUFrameDecoder + parse) -> handler(record).
+- wait_until: chờ điều kiện (các thành phần truyền file chạy trên thread riêng).
+"""
+
+
+def split_tpkt(data):
+    """Tách chuỗi byte gồm các gói TPKT liền nhau thành danh sách body (memoryview)."""
+    view = memoryview(data)
+    bodies = []
+    pos = 0
+    while pos < len(view):
+        rsv, length = view[pos + 1], int.from_bytes(view[pos + 2:pos + 4], "big")
+        lo = int.from_bytes(view[pos + 4:pos + 6], "big") if rsv & TPKT_EXT_FLAG else 0
+        total, overhead = TPKTLayer._check_length(rsv, length, lo)
+        bodies.append(view[pos + overhead:pos + total])
+        pos += total
+    return bodies
+
+
+class _Endpoint:
+    """Bộ tách MCS + PDU của 1 đầu nhận (server relay hoặc client / manager)."""
+    def __init__(self, reassemble: bool):
+        self.reassemble = reassemble
+        self.mcs = MCSLite()
+        self.decoders = defaultdict(PDUFrameDecoder)
+        self.parser = PDUParser()
+        self.parse_errors = 0
+
+    def feed(self, wire: bytes):
+        records = []
+        for body in split_tpkt(wire):
+            for channel_id, payload in self.mcs.feed_view(body):
+                for pdu in self.decoders[channel_id].feed(payload):
+                    try:
+                        record = self.parser.parse(pdu, reassemble=self.reassemble)
+                    except ValueError:
+                        self.parse_errors += 1 # như server / manager: ghi log rồi bỏ PDU
+                        continue
+                    if record is not None:
+                        records.append((channel_id, record))
+        return records
+
+    def dropped_bytes(self) -> int:
+        return sum(d.dropped_bytes for d in self.decoders.values())
+
+
+class McsPath:
+    """
+    Đối tượng network cho FileSender / hàm send_pdu cho FileReceiver.
+    Mọi PDU đi: TPKT + MCS -> relay (tách, parse reassemble=False) -> TPKT + MCS -> đầu nhận -> handler.
+    running=False: "mất kết nối", PDU bị bỏ (bên gửi chờ kết nối lại).
+    """
+    def __init__(self, handler=None, channel_id: int = 5):
+        self.handler = handler
+        self.channel_id = channel_id
+        self.running = True
+        self.client = object()
+        self.ext_framing = False
+        self.relay = _Endpoint(reassemble=False)
+        self.dest = _Endpoint(reassemble=True)
+        self.sent = defaultdict(int) # ptype -> số PDU đã qua relay
+        self.drop = None # drop(record) -> True: bỏ PDU tại relay
+        self.lock = threading.Lock()
+
+    def send_mcs_pdu(self, channel_id: int, pdu):
+        if not self.running:
+            return
+        with self.lock:
+            delivered = []
+            for ch, record in self.relay.feed(frame_header(channel_id, len(pdu)) + bytes(pdu)):
+                if self.drop is not None and self.drop(record):
+                    continue
+                self.sent[record.ptype] += 1
+                delivered.extend(self.dest.feed(frame_header(ch, len(record.raw)) + bytes(record.raw)))
+        for _, record in delivered:
+            self.handler(record)
+
+    def send_pdu(self, pdu):
+        self.send_mcs_pdu(self.channel_id, pdu)
+
+    def dropped_bytes(self) -> int:
+        return self.relay.dropped_bytes() + self.dest.dropped_bytes()
+
+    def errors(self) -> int:
+        """Số byte bị bộ tách bỏ + số PDU parse lỗi, ở relay và đầu nhận (phải bằng 0)."""
+        return self.dropped_bytes() + self.relay.parse_errors + self.dest.parse_errors
+
+
+def wait_until(cond, timeout: float = 20.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def payload_file(tmp_path):
+    """Tạo file nội dung ngẫu nhiên: payload_file(size, name="payload.bin") -> đường dẫn."""
+    def make(size: int, name: str = "payload.bin") -> str:
+        path = tmp_path / name
+        path.write_bytes(os.urandom(size))
+        return str(path)
+    return make
@@ -0,0 +1,156 @@
+# tests/test_db.py
+
+import sqlite3
+import threading
+
+import pytest
+
+from conftest import wait_until
+from common_network.durable_queue import DurableQueue
+
+"""
+DurableQueue (SQLite WAL, ghi theo lô): push đọc được ngay, flush() mới commit,
+ack_through có hiệu lực ngay với peek, dữ liệu và id còn nguyên sau khi mở lại DB.
+Mỗi test dùng DB riêng trong tmp_path.
+"""
+
+
+@pytest.fixture
+def open_queue(tmp_path):
+    queues = []
+
+    def make(name: str = "queue.db", **kwargs):
+        kwargs.setdefault("flush_interval", 60.0) # chỉ commit khi flush() / đủ batch_bytes / close()
+        q = DurableQueue(str(tmp_path / name), **kwargs)
+        queues.append(q)
+        return q
+    yield make
+    for q in queues:
+        if q._writer.is_alive():
+            q.close()
+
+
+def _rows_on_disk(q: DurableQueue):
+    conn = sqlite3.connect(q.db_path)
+    try:
+        return conn.execute("SELECT id, task FROM queue ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def test_push_is_visible_before_commit_and_flush_commits(open_queue):
+    q = open_queue()
+    ids = q.push_many([b"a", b"b", b"c"])
+    assert ids == [1, 2, 3]
+    assert q.push(b"d") == 4
+    assert q.peek_many() == [(1, b"a"), (2, b"b"), (3, b"c"), (4, b"d")]
+    assert q.size() == 4
+    assert _rows_on_disk(q) == [] and q.commits == 0
+
+    assert q.flush(timeout=5)
+    assert _rows_on_disk(q) == [(1, b"a"), (2, b"b"), (3, b"c"), (4, b"d")]
+    assert q.commits == 1 and q.rows_written == 4 # 1 transaction cho cả lô
+    assert q.stats()["pending"] == 0
+
+
+def test_peek_many_spans_committed_rows_and_buffer(open_queue):
+    q = open_queue()
+    q.push_many([b"1", b"2", b"3"])
+    assert q.flush(timeout=5)
+    q.push_many([b"4", b"5"]) # còn trong bộ đệm
+    assert [i for i, _ in q.peek_many()] == [1, 2, 3, 4, 5]
+    assert [i for i, _ in q.peek_many(after_id=2, limit=2)] == [3, 4]
+    assert [i for i, _ in q.peek_many(after_id=3)] == [4, 5]
+    assert q.peek() == (1, b"1")
+    assert q.size() == 5
+
+
+def test_ack_through_is_immediate_and_deleted_on_flush(open_queue):
+    q = open_queue()
+    q.push_many([b"x%d" % i for i in range(5)])
+    assert q.flush(timeout=5)
+    q.ack_through(3)
+    assert q.peek_many() == [(4, b"x3"), (5, b"x4")]
+    assert q.size() == 2
+    assert len(_rows_on_disk(q)) == 5 # xóa khỏi DB đi cùng lô ghi kế tiếp
+    assert q.flush(timeout=5)
+    assert [i for i, _ in _rows_on_disk(q)] == [4, 5]
+    q.ack_through(2) # ACK lùi: không có tác dụng
+    assert q.peek()[0] == 4
+
+
+def test_acked_before_commit_is_never_written(open_queue):
+    q = open_queue()
+    q.push_many([b"a", b"b", b"c"])
+    q.ack_through(2)
+    assert q.flush(timeout=5)
+    assert _rows_on_disk(q) == [(3, b"c")]
+    assert q.rows_written == 1
+
+
+def test_pop(open_queue):
+    q = open_queue()
+    q.push_many([b"first", b"second"])
+    assert q.pop() == b"first"
+    assert q.pop() == b"second"
+    assert q.pop() is None and q.peek() is None
+
+
+def test_concurrent_pop_never_returns_an_item_twice(open_queue):
+    q = open_queue(batch_bytes=4096) # luồng nền ghi xuống DB trong lúc các luồng đang pop
+    items = [b"item-%04d" % i for i in range(2000)]
+    q.push_many(items)
+    popped = [[] for _ in range(4)]
+
+    def consume(out):
+        while True:
+            data = q.pop()
+            if data is None:
+                return
+            out.append(data)
+    threads = [threading.Thread(target=consume, args=(out,)) for out in popped]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    got = [d for out in popped for d in out]
+    assert sorted(got) == items # không trùng, không sót
+    assert q.size() == 0
+
+
+def test_reopen_keeps_unacked_items_and_ids(open_queue):
+    q = open_queue()
+    q.push_many([b"a", b"b", b"c"])
+    q.ack_through(1)
+    q.close() # ghi nốt phần đang chờ
+    q2 = open_queue()
+    assert q2.peek_many() == [(2, b"b"), (3, b"c")]
+    q2.ack_through(3)
+    assert q2.flush(timeout=5)
+    q2.close()
+    # hàng đợi rỗng nhưng id không được dùng lại (bên nhận ACK theo id)
+    q3 = open_queue()
+    assert q3.peek() is None
+    assert q3.push(b"d") == 4
+
+
+def test_flush_interval_and_batch_bytes_trigger_commit(open_queue):
+    timed = open_queue("timed.db", flush_interval=0.05)
+    timed.push(b"t")
+    assert wait_until(lambda: timed.commits == 1, timeout=5)
+    assert _rows_on_disk(timed) == [(1, b"t")]
+
+    batched = open_queue("batched.db", batch_bytes=1000)
+    batched.push(b"s" * 10)
+    batched.push(b"b" * 1000) # đủ batch_bytes -> ghi ngay, không chờ flush_interval
+    assert wait_until(lambda: batched.commits == 1, timeout=5)
+    assert len(_rows_on_disk(batched)) == 2
+
+
+def test_push_blocks_when_buffer_is_full(open_queue):
+    q = open_queue(flush_interval=0.02, max_pending_bytes=100)
+    ids = q.push_many([bytes([i]) * 60 for i in range(6)])
+    assert ids == list(range(1, 7))
+    assert q.push_waits > 0
+    assert q.flush(timeout=5)
+    assert [i for i, _ in _rows_on_disk(q)] == ids
@@ -0,0 +1,177 @@
+# tests/test_file_transfer.py
+
+import itertools
+import os
+
+import pytest
+
+from conftest import McsPath, wait_until
+from client.client_network.client_file_sender import FileSender
+from manager.manager_network.manager_file_receiver import FileReceiver
+from common_network.constants import PDU_TYPE_FILE_ACK, PDU_TYPE_FILE_CHUNK
+
+"""
+FileSender (client) -> server relay -> FileReceiver (manager) và chiều ngược lại (FILE_ACK / FILE_NAK),
+mọi PDU đi qua framing TPKT + MCS và PDUFrameDecoder thật (xem conftest.McsPath).
+"""
+
+CHUNK = 32 * 1024
+
+
+class FileLink:
+    """1 cặp FileSender / FileReceiver nối qua 2 McsPath (client -> manager, manager -> client)."""
+    def __init__(self, tmp_path, window_bytes: int = 256 * 1024, journal: str = "journal.db"):
+        self.seq = itertools.count(1)
+        self.out_dir = str(tmp_path / "recv")
+        self.to_manager = McsPath(lambda r: self.receiver.handle_pdu(r))
+        self.to_client = McsPath(self._on_client_pdu)
+        self.sender = FileSender(self.to_manager, lambda: next(self.seq), window_bytes=window_bytes,
+                                 journal_path=str(tmp_path / journal))
+        self.receiver = FileReceiver(self.to_client.send_pdu, save_dir=self.out_dir, ack_every_bytes=64 * 1024)
+        self.sender.start()
+
+    def _on_client_pdu(self, record):
+        if record.ptype == PDU_TYPE_FILE_ACK:
+            self.sender.handle_file_ack(record)
+        else:
+            self.sender.handle_file_nak(record)
+
+    def set_connected(self, up: bool):
+        self.to_manager.running = self.to_client.running = up
+
+    def received(self, path: str) -> bytes:
+        with open(os.path.join(self.out_dir, os.path.basename(path)), "rb") as f:
+            return f.read()
+
+    def errors(self) -> int:
+        return self.to_manager.errors() + self.to_client.errors()
+
+    def close(self):
+        self.sender.stop()
+        self.sender.journal.close()
+        self.receiver.close()
+
+
+@pytest.fixture
+def link(tmp_path):
+    links = []
+
+    def make(**kwargs):
+        fl = FileLink(tmp_path, **kwargs)
+        links.append(fl)
+        return fl
+    yield make
+    for fl in links:
+        fl.close()
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _cut_after_chunks(fl: FileLink, n: int):
+    """Mất kết nối sau n FILE_CHUNK (đếm tại relay)."""
+    def drop(record):
+        if record.ptype == PDU_TYPE_FILE_CHUNK and fl.to_manager.sent[PDU_TYPE_FILE_CHUNK] >= n:
+            fl.set_connected(False)
+            return True
+        return not fl.to_manager.running
+    fl.to_manager.drop = drop
+
+
+def test_resume_after_link_cut(link, payload_file):
+    path = payload_file(1_000_000)
+    fl = link()
+    _cut_after_chunks(fl, 10)
+    fl.sender.send_file(path, CHUNK).join()
+    assert wait_until(lambda: not fl.to_manager.running)
+
+    fl.to_manager.drop = None
+    fl.set_connected(True)
+    assert wait_until(lambda: fl.receiver.files_completed == 1)
+    assert fl.received(path) == _read(path)
+    # bên nhận trả lời FILE_START (có mã transfer) bằng FILE_ACK có mã transfer -> chỉ gửi phần thiếu
+    assert fl.sender.resumed_bytes > 0
+    assert fl.receiver.stats()["resumed_bytes"] > 0
+    assert fl.errors() == 0
+
+
+def test_resume_after_restart_of_both_sides(tmp_path, link, payload_file):
+    path = payload_file(1_000_000)
+    fl = link()
+    _cut_after_chunks(fl, 12)
+    fl.sender.send_file(path, CHUNK).join()
+    assert wait_until(lambda: not fl.to_manager.running)
+    received_before = fl.receiver.bytes_received
+    fl.close()
+
+    # client và manager khởi động lại: cùng journal bên gửi, cùng thư mục nhận (.part + nhật ký nhận)
+    fl2 = link()
+    assert wait_until(lambda: fl2.receiver.files_completed == 1)
+    assert fl2.received(path) == _read(path)
+    assert fl2.sender.resumed_bytes >= received_before - CHUNK
+    assert fl2.to_manager.sent[PDU_TYPE_FILE_CHUNK] < (1_000_000 - received_before) // CHUNK + 4
+    assert fl2.errors() == 0
+
+
+@pytest.mark.parametrize("stream_crc", [False, True])
+def test_transfer_with_chunk_crc(link, payload_file, stream_crc):
+    path = payload_file(700_000)
+    fl = link()
+    fl.sender.send_file(path, CHUNK, stream_crc=stream_crc, chunk_crc=True)
+    assert wait_until(lambda: fl.receiver.files_completed == 1)
+    assert fl.received(path) == _read(path)
+    assert fl.to_manager.sent[PDU_TYPE_FILE_CHUNK] == -(-700_000 // CHUNK)
+    assert fl.errors() == 0
+
+
+def test_corrupt_chunk_is_resent_alone(link, payload_file):
+    path = payload_file(700_000)
+    fl = link()
+    corrupted = []
+
+    def corrupt(record):
+        # lật 1 byte dữ liệu của chunk thứ 5 (lần gửi đầu) - CRC riêng của chunk vẫn giữ nguyên
+        if record.ptype == PDU_TYPE_FILE_CHUNK and record.offset == 4 * CHUNK and not corrupted:
+            corrupted.append(record.offset)
+            record.raw = bytearray(record.raw)
+            record.raw[26] ^= 0xFF
+        return False
+    fl.to_manager.drop = corrupt
+    fl.sender.send_file(path, CHUNK, chunk_crc=True)
+    assert wait_until(lambda: fl.receiver.files_completed == 1)
+    assert fl.received(path) == _read(path)
+    assert fl.receiver.corrupt_chunks == 1
+    assert fl.receiver.files_failed == 0
+    assert fl.sender.retransmits == 1
+    assert fl.errors() == 0
+
+
+def test_lost_chunks_are_resent_via_sack(link, payload_file):
+    path = payload_file(700_000)
+    fl = link()
+    lost = {3 * CHUNK, 7 * CHUNK}
+    sacks = []
+
+    def drop_once(record):
+        # mất lần gửi đầu của 2 chunk; các chunk sau đó tới bên nhận -> FILE_ACK kèm SACK
+        if record.ptype == PDU_TYPE_FILE_CHUNK and record.offset in lost:
+            lost.discard(record.offset)
+            return True
+        return False
+
+    def watch_ack(record):
+        if record.ptype == PDU_TYPE_FILE_ACK and record.sack:
+            sacks.append(record.sack)
+        return False
+    fl.to_manager.drop = drop_once
+    fl.to_client.drop = watch_ack
+    fl.sender.send_file(path, CHUNK)
+    assert wait_until(lambda: fl.receiver.files_completed == 1)
+    assert fl.received(path) == _read(path)
+    assert sacks and sacks[0][0][0] == 4 * CHUNK
+    # chỉ 2 chunk bị mất được gửi lại, chunk đã SACK thì không
+    assert fl.sender.retransmits == 2
+    assert fl.to_manager.sent[PDU_TYPE_FILE_CHUNK] == -(-700_000 // CHUNK)
+    assert fl.errors() == 0
@@ -0,0 +1,518 @@
+# tests/test_network.py
+
+import asyncio
+import itertools
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from conftest import split_tpkt, wait_until
+from common_network.pdu_builder import PDUBuilder
+from common_network.x224_handshake import X224Handshake, CONNECT_MAGIC, CONFIRM_MAGIC
+from common_network.tpkt_layer import TPKTLayer
+from common_network.mcs_layer import MCSLite
+from common_network import fragment_reassembler
+from common_network.fragment_reassembler import FragmentReassembler
+from common_network.tpkt_writer import TPKTWriter, frame_header, legacy_frames
+from server0.server_network.server_broadcaster import ServerBroadcaster
+from server0.server_network.server_async_broadcaster import AsyncBroadcaster
+from server0.server_network.server_async_network import AsyncServerNetwork
+from server0.server_network.server_session_manager import SessionManager
+from server0.server_constants import (
+    CHANNEL_FILE, CHANNEL_CONTROL, CHANNEL_VIDEO, CHANNEL_CURSOR,
+    CMD_REGISTER, CMD_CONNECT_CLIENT, ROLE_CLIENT, ROLE_MANAGER, ROLE_UNKNOWN,
+)
+from common_network.pdu_parser import PDUParser
+from common_network.frame_decoder import PDUFrameDecoder, pdu_total_length
+from common_network.pdu_records import (
+    FullFrame, RectFrame, Control, Input, Cursor, FrameAck, Thumbnail,
+    FileStart, FileChunk, FileEnd, FileAck, FileNak, Fragment, UnknownPDU,
+)
+from common_network.constants import (
+    FILE_CHUNK_FLAG_ACK_NOW, FILE_CHUNK_FLAG_CRC, FILE_ACK_FLAG_SACK, FILE_ACK_FLAG_RESUME,
+    FILE_START_FLAG_RESUME, FILE_TRANSFER_ID_SIZE, SHARE_CTRL_HDR_FMT, MAX_BODY_SIZE_PER_FRAGMENT,
+    TPKT_HEADER_FMT, CAP_EXTLEN32, SHARE_HDR_SIZE, TPKT_OVERHEAD, TPKT_EXT_FLAG, MCS_HDR_SIZE, MAX_MCS_PAYLOAD, MAX_EXT_TPKT_LENGTH,
+)
+
+"""
+Định dạng PDU trên đường truyền: mọi biến thể PDUBuilder (kể cả các trường theo cờ) phải
+được PDUFrameDecoder tách đúng độ dài và PDUParser đọc lại đúng các trường.
+"""
+
+TID = bytes(range(FILE_TRANSFER_ID_SIZE))
+JPG = os.urandom(3000)
+
+# (tên, PDU, lớp bản ghi, các trường cần kiểm tra, cờ)
+VARIANTS = [
+    ("full", PDUBuilder.build_full_frame_pdu(1, JPG, 1920, 1080, ts_ms=123), FullFrame,
+     {"width": 1920, "height": 1080, "jpg": JPG, "ts_ms": 123}, 0),
+    ("rect", PDUBuilder.build_rect_frame_pdu(2, JPG, 10, 20, 30, 40, 1920, 1080), RectFrame,
+     {"x": 10, "y": 20, "w": 30, "h": 40, "full_w": 1920, "full_h": 1080, "jpg": JPG}, 0),
+    ("control", PDUBuilder.build_control_pdu(3, "connect:pc-1".encode()), Control, {"message": "connect:pc-1"}, 0),
+    ("input", PDUBuilder.build_input_pdu(4, {"type": "mouse", "x": 5}), Input, {"input": {"type": "mouse", "x": 5}}, 0),
+    ("cursor", PDUBuilder.build_cursor_pdu(5, 100, 200), Cursor, {"x": 100, "y": 200, "cursor_shape": b""}, 0),
+    ("cursor-shape", PDUBuilder.build_cursor_pdu(6, 1, 2, b"\x01\x02\x03"), Cursor, {"cursor_shape": b"\x01\x02\x03"}, 0),
+    ("frame-ack", PDUBuilder.build_frame_ack_pdu(7, 99, 555, 1.5, 2.25, 30, 2), FrameAck,
+     {"last_seq": 99, "frame_ts_ms": 555, "decode_ms": 1.5, "render_ms": 2.25, "frames": 30, "dropped": 2}, 0),
+    ("thumb", PDUBuilder.build_thumbnail_pdu(8, JPG, 320, 180, source="pc-1"), Thumbnail,
+     {"width": 320, "height": 180, "source": "pc-1", "jpg": JPG}, 0),
+    ("thumb-nosource", PDUBuilder.build_thumbnail_pdu(9, JPG, 320, 180), Thumbnail, {"source": "", "jpg": JPG}, 0),
+    ("file-start", PDUBuilder.build_file_start(10, "báo cáo.pdf", 1 << 33, 32768, 0xDEADBEEF), FileStart,
+     {"filename": "báo cáo.pdf", "total_size": 1 << 33, "chunk_size": 32768, "checksum": 0xDEADBEEF, "transfer_id": b""}, 0),
+    ("file-start-resume", PDUBuilder.build_file_start(11, "a.bin", 10, 4, 0, transfer_id=TID), FileStart,
+     {"filename": "a.bin", "transfer_id": TID}, FILE_START_FLAG_RESUME),
+    ("file-chunk", PDUBuilder.build_file_chunk(12, 65536, b"x" * 100), FileChunk,
+     {"offset": 65536, "data": b"x" * 100, "crc": None}, 0),
+    ("file-chunk-ack-now", PDUBuilder.build_file_chunk(13, 0, b"y" * 10, ack_now=True), FileChunk,
+     {"data": b"y" * 10}, FILE_CHUNK_FLAG_ACK_NOW),
+    ("file-chunk-crc", PDUBuilder.build_file_chunk(14, 0, b"z" * 10, crc=0x12345678), FileChunk,
+     {"data": b"z" * 10, "crc": 0x12345678}, FILE_CHUNK_FLAG_CRC),
+    ("file-chunk-ack-now-crc", PDUBuilder.build_file_chunk(15, 8, b"w", ack_now=True, crc=0), FileChunk,
+     {"offset": 8, "data": b"w", "crc": 0}, FILE_CHUNK_FLAG_ACK_NOW | FILE_CHUNK_FLAG_CRC),
+    ("file-end", PDUBuilder.build_file_end(16, 0xCAFEBABE), FileEnd, {"checksum": 0xCAFEBABE}, 0),
+    ("file-ack", PDUBuilder.build_file_ack(17, 4096), FileAck, {"ack_offset": 4096, "sack": (), "transfer_id": b""}, 0),
+    ("file-ack-sack", PDUBuilder.build_file_ack(18, 4096, sack=[(8192, 12288), (16384, 20480)]), FileAck,
+     {"sack": ((8192, 12288), (16384, 20480))}, FILE_ACK_FLAG_SACK),
+    ("file-ack-resume", PDUBuilder.build_file_ack(19, 100, transfer_id=TID), FileAck,
+     {"ack_offset": 100, "transfer_id": TID, "sack": ()}, FILE_ACK_FLAG_RESUME),
+    ("file-ack-resume-sack", PDUBuilder.build_file_ack(20, 100, sack=[(200, 300)], transfer_id=TID), FileAck,
+     {"transfer_id": TID, "sack": ((200, 300),)}, FILE_ACK_FLAG_RESUME | FILE_ACK_FLAG_SACK),
+    ("file-nak", PDUBuilder.build_file_nak(21, 777, b"chunk_crc"), FileNak, {"offset": 777, "reason": "chunk_crc"}, 0),
+    ("file-nak-empty", PDUBuilder.build_file_nak(22, 0), FileNak, {"reason": ""}, 0),
+]
+IDS = [v[0] for v in VARIANTS]
+
+
+def _bytes(value):
+    return bytes(value) if isinstance(value, memoryview) else value
+
+
+def _check(record, cls, fields, flags):
+    assert type(record) is cls
+    assert record.flags == flags
+    for name, expected in fields.items():
+        assert _bytes(getattr(record, name)) == expected, name
+
+
+@pytest.mark.parametrize("name, pdu, cls, fields, flags", VARIANTS, ids=IDS)
+def test_builder_parser_round_trip(name, pdu, cls, fields, flags):
+    assert pdu_total_length(pdu) == len(pdu)
+    frames = PDUFrameDecoder().feed(pdu)
+    assert [bytes(f) for f in frames] == [pdu]
+    _check(PDUParser().parse(frames[0]), cls, fields, flags)
+
+
+@pytest.mark.parametrize("name, pdu, cls, fields, flags", VARIANTS, ids=IDS)
+def test_rebuild_from_record(name, pdu, cls, fields, flags):
+    # PDUBuilder.build(record) không có raw phải tạo lại đúng PDU (trừ ts_ms của loại tự điền thời gian)
+    record = PDUParser().parse(pdu)
+    record.raw = None
+    rebuilt = PDUBuilder.build(record)
+    assert len(rebuilt) == len(pdu)
+    assert rebuilt[:4] + rebuilt[12:] == pdu[:4] + pdu[12:]
+
+
+@pytest.mark.parametrize("name, pdu, cls, fields, flags", VARIANTS, ids=IDS)
+def test_truncated_pdu_is_rejected(name, pdu, cls, fields, flags):
+    assert pdu_total_length(pdu[:-1]) in (None, len(pdu))
+    assert PDUFrameDecoder().feed(pdu[:-1]) == []
+    with pytest.raises(ValueError):
+        PDUParser().parse(pdu[:-1])
+
+
+def test_decoder_splits_concatenated_stream_at_any_boundary():
+    stream = b"".join(v[1] for v in VARIANTS)
+    expected = [v[1] for v in VARIANTS]
+    for step in (1, 7, 64, 1000, len(stream)):
+        decoder = PDUFrameDecoder()
+        got = []
+        for pos in range(0, len(stream), step):
+            got.extend(bytes(f) for f in decoder.feed(stream[pos:pos + step]))
+        assert got == expected, step
+        assert decoder.pending() == 0 and decoder.dropped_bytes == 0
+
+
+def test_decoder_returns_views_into_input_without_copy():
+    stream = bytes(VARIANTS[0][1] + VARIANTS[1][1])
+    frames = PDUFrameDecoder().feed(stream)
+    assert all(isinstance(f, memoryview) and f.obj is stream for f in frames)
+
+
+def test_parser_ignores_bytes_after_frame_length():
+    pdu = PDUBuilder.build_file_ack(1, 10, sack=[(20, 30)])
+    record = PDUParser().parse(pdu + b"trailing")
+    assert bytes(record.raw) == pdu
+    assert record.sack == ((20, 30),)
+
+
+def test_unknown_type_drops_rest_of_buffer():
+    bogus = struct.pack(SHARE_CTRL_HDR_FMT, 1, 0, 200, 0) + b"\x00" * 10
+    good = PDUBuilder.build_file_end(2, 1)
+    decoder = PDUFrameDecoder()
+    assert [bytes(f) for f in decoder.feed(good + bogus)] == [good]
+    assert decoder.dropped_bytes == len(bogus)
+    assert type(PDUParser().parse(bogus)) is UnknownPDU
+
+
+def test_fragments_reassemble_through_decoder():
+    jpg = os.urandom(3 * MAX_BODY_SIZE_PER_FRAGMENT)
+    pdu = PDUBuilder.build_full_frame_pdu(42, jpg, 800, 600)
+    frags = PDUBuilder.fragmentize(pdu, MAX_BODY_SIZE_PER_FRAGMENT)
+    assert len(frags) > 1
+    relay, endpoint = PDUParser(), PDUParser()
+    record = None
+    for _, frag in frags:
+        # mỗi fragment nằm trong 1 MCS frame riêng: bộ tách trả nguyên fragment
+        (view,) = PDUFrameDecoder().feed(frag)
+        forwarded = relay.parse(view, reassemble=False)
+        assert type(forwarded) is Fragment and forwarded.ptype == pdu[12]
+        record = endpoint.parse(bytes(forwarded.raw))
+    _check(record, FullFrame, {"width": 800, "height": 600, "jpg": jpg}, 0)
+
+
+# --- X224: đàm phán capability, tương thích peer cũ ---
+
+def _baseline_server_handshake(sock):
+    """server_do_handshake của bản trước khi có capability (bỏ qua byte reserved, id = phần sau ':')."""
+    hdr = X224Handshake.recv_all(sock, 4)
+    _ver, _rsv, length = struct.unpack(TPKT_HEADER_FMT, hdr)
+    body = X224Handshake.recv_all(sock, length - 4)
+    _, rest = body.split(b":", 1)
+    resp = CONFIRM_MAGIC + b":OK"
+    sock.sendall(struct.pack(TPKT_HEADER_FMT, 0x03, 0x00, 4 + len(resp)) + resp)
+    return rest.decode(errors="ignore")
+
+
+def _baseline_client_connect(sock, client_id):
+    body = CONNECT_MAGIC + b":" + client_id.encode()
+    sock.sendall(struct.pack(TPKT_HEADER_FMT, 0x03, 0x00, 4 + len(body)) + body)
+    _ver, _rsv, length = struct.unpack(TPKT_HEADER_FMT, X224Handshake.recv_all(sock, 4))
+    return X224Handshake.recv_all(sock, length - 4)
+
+
+def _handshake(client_fn, server_fn):
+    a, b = socket.socketpair()
+    try:
+        result = {}
+        t = threading.Thread(target=lambda: result.setdefault("server", server_fn(b)))
+        t.start()
+        resp = client_fn(a)
+        t.join(5)
+        return resp, result["server"]
+    finally:
+        a.close()
+        b.close()
+
+
+def test_new_client_with_baseline_server_keeps_client_id():
+    resp, cid = _handshake(lambda s: X224Handshake.client_send_connect(s, "MyPC", caps={CAP_EXTLEN32}),
+                           _baseline_server_handshake)
+    assert cid == "MyPC"
+    assert X224Handshake.parse_caps(resp) == frozenset() # -> framing 16-bit
+
+
+def test_new_client_with_new_server_negotiates_extlen32():
+    resp, (ok, cid, caps) = _handshake(lambda s: X224Handshake.client_send_connect(s, "MyPC", caps={CAP_EXTLEN32}),
+                                       X224Handshake.server_do_handshake)
+    assert ok and cid == "MyPC"
+    assert caps == {CAP_EXTLEN32}
+    assert X224Handshake.parse_caps(resp) == {CAP_EXTLEN32}
+
+
+def test_baseline_client_with_new_server_gets_plain_confirm():
+    resp, (ok, cid, caps) = _handshake(lambda s: _baseline_client_connect(s, "OldPC"), X224Handshake.server_do_handshake)
+    assert ok and cid == "OldPC"
+    assert caps == frozenset()
+    assert resp == CONFIRM_MAGIC + b":OK"
+
+
+def test_async_server_handshake_reads_caps_from_header():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(X224Handshake.build_connect("pc-async", {CAP_EXTLEN32}))
+
+        class Writer:
+            data = b""
+            def write(self, b): self.data += b
+            async def drain(self): pass
+        writer = Writer()
+        result = await X224Handshake.server_do_handshake_async(reader, writer)
+        return result, writer.data
+    (ok, cid, caps), sent = asyncio.run(run())
+    assert ok and cid == "pc-async" and caps == {CAP_EXTLEN32}
+    assert X224Handshake.parse_caps(sent[4:]) == {CAP_EXTLEN32}
+
+
+# --- ServerBroadcaster: peer ngừng đọc không giữ worker ---
+
+def test_stalled_peers_are_disconnected_and_do_not_block_others():
+    broadcaster = ServerBroadcaster(workers=2, write_timeout=0.5)
+    broadcaster.start()
+    sockets = []
+    try:
+        chunk = PDUBuilder.build_file_chunk(1, 0, b"x" * 60000)
+        for i in range(3):
+            sock, peer = socket.socketpair()
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+            sock.settimeout(600) # như socket dùng chung với receiver (timeout đọc 600 s)
+            sockets += [sock, peer]
+            broadcaster.register(f"slow-{i}", sock)
+            for _ in range(100): # làn file không giới hạn: ~6 MB, peer không bao giờ đọc
+                broadcaster.enqueue(f"slow-{i}", CHANNEL_FILE, chunk)
+        time.sleep(0.1) # cả 2 worker đang kẹt trong sendall
+
+        sock, good = socket.socketpair()
+        sockets += [sock, good]
+        broadcaster.register("good", sock)
+        control = PDUBuilder.build_control_pdu(1, b"hello")
+        broadcaster.enqueue("good", CHANNEL_CONTROL, control)
+
+        t0 = time.monotonic()
+        body = TPKTLayer.recv_one(good, timeout=5)
+        assert time.monotonic() - t0 < 3
+        assert [bytes(p) for _, p in MCSLite().feed_view(body)] == [control]
+        assert wait_until(lambda: broadcaster.slow_peers_dropped == 3, timeout=3)
+        assert all(broadcaster.outboxes[f"slow-{i}"].closed for i in range(3))
+    finally:
+        broadcaster.stop()
+        for s in sockets:
+            s.close()
+
+
+
+# --- AsyncServerNetwork: kết nối lại cùng cid dọn phiên của kết nối cũ ---
+
+def _control(sm, cid, message: str):
+    sm.handle_pdu(cid, PDUParser().parse(PDUBuilder.build_control_pdu(1, message.encode())))
+
+
+@pytest.mark.parametrize("reconnecting", ["manager-1", "client-1"])
+def test_async_reconnect_tears_down_old_route_and_session(reconnecting):
+    async def run():
+        sm = SessionManager(AsyncBroadcaster(), inline=True)
+        net = AsyncServerNetwork()
+        net.running = True
+        net.set_broadcaster(sm.broadcaster)
+        net.set_callbacks(sm.handle_new_connection, sm.handle_pdu, sm.handle_disconnection)
+        sockets = []
+
+        async def connect(cid):
+            sock, peer = socket.socketpair()
+            sockets.extend((sock, peer))
+            _, writer = await asyncio.open_connection(sock=sock)
+            net._register(cid, writer)
+            return writer
+
+        try:
+            await connect("client-1")
+            await connect("manager-1")
+            _control(sm, "client-1", CMD_REGISTER + ROLE_CLIENT)
+            _control(sm, "manager-1", CMD_REGISTER + ROLE_MANAGER)
+            _control(sm, "manager-1", CMD_CONNECT_CLIENT + "client-1")
+            session = sm._route("manager-1")
+            assert session is not None and sm._route("client-1") is session
+
+            old_writer = net.clients[reconnecting]
+            new_writer = await connect(reconnecting)
+            assert old_writer.is_closing()
+            assert sm._route("manager-1") is None and sm._route("client-1") is None
+            assert not session.running
+            assert sm._role(reconnecting) == ROLE_UNKNOWN # kết nối mới, chờ register lại
+
+            net._on_reader_done(reconnecting, old_writer) # reader cũ dừng sau đó: không đụng kết nối mới
+            assert net.clients[reconnecting] is new_writer
+            assert sm._role(reconnecting) == ROLE_UNKNOWN
+        finally:
+            sm.broadcaster.stop()
+            await asyncio.sleep(0)
+            for s in sockets:
+                s.close()
+    asyncio.run(run())
+
+# --- Framing TPKT + MCS: dạng thường và EXTLEN32 ---
+
+def _recv_pdus(sock, count):
+    """Nhận `count` PDU hoàn chỉnh (TPKT -> MCS -> PDUFrameDecoder -> parse) từ socket."""
+    mcs, decoders, parser = MCSLite(), {}, PDUParser()
+    records, tpkts = [], 0
+    while len(records) < count:
+        body = TPKTLayer.recv_one_view(sock, timeout=5)
+        tpkts += 1
+        for ch, payload in mcs.feed_view(body):
+            for pdu in decoders.setdefault(ch, PDUFrameDecoder()).feed(payload):
+                record = parser.parse(pdu)
+                if record is not None:
+                    records.append((ch, record))
+    return records, tpkts
+
+
+def test_small_frames_use_16bit_headers_even_with_ext_framing():
+    assert frame_header(CHANNEL_CONTROL, 100, ext_framing=True) == frame_header(CHANNEL_CONTROL, 100)
+    assert len(frame_header(CHANNEL_CONTROL, 100)) == TPKT_OVERHEAD + MCS_HDR_SIZE
+
+
+def test_large_pdu_without_ext_framing_must_be_fragmented():
+    with pytest.raises(ValueError):
+        frame_header(CHANNEL_VIDEO, MAX_MCS_PAYLOAD + 1)
+    pdu = PDUBuilder.build_full_frame_pdu(1, os.urandom(200_000), 640, 480)
+    frames = legacy_frames(pdu)
+    assert len(frames) > 1 and all(len(f) <= MAX_MCS_PAYLOAD for f in frames)
+    assert legacy_frames(b"x" * 100) == [b"x" * 100]
+
+
+@pytest.mark.parametrize("ext_framing", [True, False])
+def test_writer_round_trip_large_and_small_pdus(ext_framing):
+    jpg = os.urandom(300_000)
+    full = PDUBuilder.build_full_frame_pdu(7, jpg, 1280, 720)
+    cursor = PDUBuilder.build_cursor_pdu(8, 10, 20)
+    control = PDUBuilder.build_control_pdu(9, b"ping")
+    a, b = socket.socketpair()
+    writer = TPKTWriter(a, ext_framing=ext_framing)
+    writer.start()
+    try:
+        writer.send(CHANNEL_CONTROL, control)
+        for frame in ([full] if ext_framing else legacy_frames(full)):
+            writer.send(CHANNEL_VIDEO, frame)
+        writer.send(CHANNEL_CURSOR, cursor)
+        records, tpkts = _recv_pdus(b, 3)
+    finally:
+        writer.stop()
+        a.close()
+        b.close()
+    assert [ch for ch, _ in records] == [CHANNEL_CONTROL, CHANNEL_VIDEO, CHANNEL_CURSOR]
+    assert bytes(records[1][1].jpg) == jpg
+    if ext_framing:
+        assert tpkts == 3 # PDU 300 KB đi nguyên khối trong 1 TPKT mở rộng
+
+
+def test_ext_headers_split_across_reads():
+    payload = os.urandom(MAX_MCS_PAYLOAD + 10)
+    wire = frame_header(CHANNEL_VIDEO, len(payload), ext_framing=True) + payload
+    assert wire[1] & TPKT_EXT_FLAG
+    (body,) = split_tpkt(wire)
+    mcs = MCSLite()
+    got = []
+    for pos in range(0, len(body), 3): # header MCS mở rộng (6 byte) bị cắt giữa chừng
+        got.extend(mcs.feed_view(body[pos:pos + 3]))
+    assert [(ch, bytes(p)) for ch, p in got] == [(CHANNEL_VIDEO, payload)]
+
+
+def test_ext_tpkt_length_limits():
+    with pytest.raises(ValueError):
+        TPKTLayer._check_length(TPKT_EXT_FLAG, (MAX_EXT_TPKT_LENGTH + 1) >> 16, (MAX_EXT_TPKT_LENGTH + 1) & 0xFFFF)
+    with pytest.raises(ValueError):
+        TPKTLayer._check_length(0, 3)
+    with pytest.raises(ValueError):
+        TPKTLayer.pack_ext_header(MAX_EXT_TPKT_LENGTH)
+
+
+def test_async_recv_reads_ext_tpkt():
+    payload = os.urandom(100_000)
+    wire = frame_header(CHANNEL_VIDEO, len(payload), ext_framing=True) + payload
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(wire)
+        return await TPKTLayer.recv_one_async(reader)
+    body = asyncio.run(run())
+    assert [(ch, bytes(p)) for ch, p in MCSLite().feed_view(body)] == [(CHANNEL_VIDEO, payload)]
+
+
+# --- FragmentReassembler: thứ tự, trùng lặp, hết hạn ---
+
+def _pieces(seq: int, size: int, piece: int, ptype: int = 1):
+    """PDU (header + body ngẫu nhiên) và các fragment (offset, payload) của body."""
+    body = os.urandom(size)
+    pdu = struct.pack(SHARE_CTRL_HDR_FMT, seq, 1234, ptype, 0) + body
+    return pdu, [(off, body[off:off + piece]) for off in range(0, size, piece)]
+
+
+def _feed(reasm, seq, pieces, total, ptype=1):
+    results = [reasm.add(seq, 1234, ptype, off, total, data) for off, data in pieces]
+    done = [r for r in results if r is not None]
+    return bytes(done[0]) if done else None, len(done)
+
+
+@pytest.mark.parametrize("order", ["in-order", "reversed", "shuffled"])
+def test_reassembly_any_order(order):
+    pdu, pieces = _pieces(5, 10_000, 1000)
+    if order == "reversed":
+        pieces.reverse()
+    elif order == "shuffled":
+        random.Random(3).shuffle(pieces)
+    reasm = FragmentReassembler()
+    result, completions = _feed(reasm, 5, pieces, 10_000)
+    assert result == pdu and completions == 1
+    assert len(reasm) == 0 and reasm.pending_bytes == 0
+
+
+def test_reassembly_duplicates_and_overlaps_count_once():
+    pdu, pieces = _pieces(6, 4000, 1000)
+    body = pdu[SHARE_HDR_SIZE:]
+    reasm = FragmentReassembler()
+    assert reasm.add(6, 1234, 1, 0, 4000, body[0:1000]) is None
+    assert reasm.add(6, 1234, 1, 0, 4000, body[0:1000]) is None # trùng lặp
+    assert reasm.add(6, 1234, 1, 500, 4000, body[500:2500]) is None # chồng lấn
+    assert reasm.add(6, 1234, 1, 3000, 4000, body[3000:4000]) is None
+    result = reasm.add(6, 1234, 1, 2500, 4000, body[2500:3000])
+    assert bytes(result) == pdu
+    assert reasm.duplicate_bytes == 1000 + 500
+
+
+def test_reassembly_interleaved_seqs():
+    pdu_a, pieces_a = _pieces(10, 3000, 700)
+    pdu_b, pieces_b = _pieces(11, 2000, 700, ptype=2)
+    reasm = FragmentReassembler()
+    results = {}
+    for (oa, da), (ob, db) in itertools.zip_longest(pieces_a, pieces_b, fillvalue=(None, None)):
+        if oa is not None and (r := reasm.add(10, 1234, 1, oa, 3000, da)) is not None:
+            results[10] = bytes(r)
+        if ob is not None and (r := reasm.add(11, 1234, 2, ob, 2000, db)) is not None:
+            results[11] = bytes(r)
+    assert results == {10: pdu_a, 11: pdu_b}
+
+
+def test_late_fragment_after_completion_is_ignored_but_resend_reopens():
+    pdu, pieces = _pieces(7, 3000, 1000)
+    reasm = FragmentReassembler()
+    assert _feed(reasm, 7, pieces, 3000)[0] == pdu
+    assert reasm.add(7, 1234, 1, 1000, 3000, pieces[1][1]) is None # đến muộn: bỏ, không cấp phát lại
+    assert len(reasm) == 0
+    assert _feed(reasm, 7, pieces, 3000)[0] == pdu # gửi lại từ offset 0 (relay phát lại keyframe)
+
+
+def test_incomplete_seq_expires(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(fragment_reassembler.time, "monotonic", lambda: clock[0])
+    _, pieces = _pieces(8, 3000, 1000)
+    reasm = FragmentReassembler(timeout=5.0)
+    reasm.add(8, 1234, 1, pieces[0][0], 3000, pieces[0][1])
+    assert len(reasm) == 1 and reasm.pending_bytes == 3000
+    clock[0] += 4.9
+    pdu9, pieces9 = _pieces(9, 1000, 1000)
+    assert bytes(reasm.add(9, 1234, 1, 0, 1000, pieces9[0][1])) == pdu9
+    assert len(reasm) == 1 # seq 8 chưa hết hạn
+    clock[0] += 0.2
+    reasm.add(12, 1234, 1, 0, 2000, b"x" * 1000) # mỗi lần add dọn các seq hết hạn
+    assert 8 not in reasm.pending and reasm.expired == 1
+    assert reasm.pending_bytes == 2000
+
+
+def test_reassembly_errors_and_memory_limits():
+    reasm = FragmentReassembler(max_bytes_per_seq=10_000, max_total_bytes=15_000)
+    with pytest.raises(MemoryError):
+        reasm.add(1, 0, 1, 0, 20_000, b"x")
+    reasm.add(2, 0, 1, 0, 1000, b"x" * 10)
+    with pytest.raises(ValueError):
+        reasm.add(2, 0, 1, 10, 2000, b"x" * 10) # total_len mâu thuẫn
+    reasm.add(3, 0, 1, 0, 1000, b"x" * 10)
+    with pytest.raises(ValueError):
+        reasm.add(3, 0, 1, 995, 1000, b"x" * 10) # vượt total_len
+    reasm.add(4, 0, 1, 0, 8000, b"x")
+    reasm.add(5, 0, 1, 0, 8000, b"x") # vượt max_total_bytes -> bỏ seq cũ nhất
+    assert reasm.evicted == 1 and 4 not in reasm.pending and reasm.pending_bytes == 8000
@@ -0,0 +1,111 @@
+# tests/test_screen_capture.py
+
+import numpy as np
+import pytest
+
+from client.client_delta import BGRADeltaEngine, merge_dirty_tiles, union_bbox
+
+"""
+BGRADeltaEngine trên buffer BGRA tổng hợp (không cần mss / màn hình thật):
+rect trả về theo ô, cắt theo kích thước ảnh, gộp ô gần nhau, gộp thành 1 bbox khi quá max_rects,
+và frame tham chiếu chỉ được vá ở các vùng đã trả về.
+"""
+
+W, H = 300, 200 # không chia hết cho tile 64 -> có ô lẻ ở mép phải / dưới
+TILE = 64
+
+
+def _frame(fill: int = 0x20):
+    return np.full((H, W, 4), fill, dtype=np.uint8)
+
+
+def _engine(**kwargs):
+    eng = BGRADeltaEngine(tile_size=TILE, **kwargs)
+    assert eng.update(_frame().tobytes(), W, H) == [(0, 0, W, H)] # lần đầu: toàn bộ frame
+    return eng
+
+
+def test_unchanged_frame_has_no_rects():
+    eng = _engine()
+    assert eng.update(_frame().tobytes(), W, H) == []
+    assert eng.bbox(_frame().tobytes(), W, H) is None
+
+
+def test_size_change_returns_full_frame():
+    eng = _engine()
+    small = np.zeros((100, 120, 4), dtype=np.uint8)
+    assert eng.update(small.tobytes(), 120, 100) == [(0, 0, 120, 100)]
+    assert eng.update(small.tobytes(), 120, 100) == []
+
+
+def test_distant_changes_give_tile_aligned_rects():
+    eng = _engine()
+    cur = _frame()
+    cur[5, 10] = 0xFF # ô (0, 0)
+    cur[H - 1, W - 1] = 0xFF # ô lẻ góc dưới phải -> cắt theo W, H
+    assert eng.update(cur.tobytes(), W, H) == [(0, 0, TILE, TILE), (4 * TILE, 3 * TILE, W, H)]
+    # frame tham chiếu đã được vá: gửi lại đúng frame đó -> không còn thay đổi
+    assert eng.update(cur.tobytes(), W, H) == []
+
+
+def test_vertical_run_is_one_rect():
+    eng = _engine()
+    cur = _frame()
+    cur[10:150, 70] = 0x80 # cột ô 1, hàng ô 0..2
+    assert eng.update(cur.tobytes(), W, H) == [(TILE, 0, 2 * TILE, 3 * TILE)]
+
+
+@pytest.mark.parametrize("gap, expected", [
+    (1, [(0, 0, 3 * TILE, TILE)]), # khe 1 ô sạch -> gộp
+    (0, [(0, 0, TILE, TILE), (2 * TILE, 0, 3 * TILE, TILE)]),
+])
+def test_gap_merges_runs_on_a_row(gap, expected):
+    eng = _engine(gap=gap)
+    cur = _frame()
+    cur[0, 0] = cur[0, 2 * TILE] = 0xFF
+    assert eng.update(cur.tobytes(), W, H) == expected
+
+
+def test_too_many_rects_collapse_to_union_bbox():
+    eng = _engine(gap=0, max_rects=2)
+    cur = _frame()
+    for r, c in ((0, 0), (0, 2), (2, 0), (2, 2)):
+        cur[r * TILE, c * TILE] = 0xFF
+    assert eng.update(cur.tobytes(), W, H) == [(0, 0, 3 * TILE, 3 * TILE)]
+
+
+def test_threshold_ignores_small_changes_and_alpha():
+    eng = _engine(threshold=30)
+    cur = _frame()
+    cur[:, :, :3] += 30 # lệch đúng bằng ngưỡng -> chưa đổi
+    cur[:, :, 3] = 0xFF # byte X/alpha không được xét khi threshold > 0
+    assert eng.update(cur.tobytes(), W, H) == []
+    cur[100, 200, 1] += 1 # kênh G lệch 31 so với tham chiếu
+    assert eng.update(cur.tobytes(), W, H) == [(3 * TILE, TILE, 4 * TILE, 2 * TILE)]
+
+
+def test_only_returned_regions_update_reference():
+    # thay đổi nhỏ dưới ngưỡng không được chép vào tham chiếu -> cộng dồn qua nhiều frame
+    eng = _engine(threshold=30)
+    cur = _frame()
+    cur[0, 0, 2] += 20 # dưới ngưỡng -> không trả về, tham chiếu giữ 0x20
+    assert eng.update(cur.tobytes(), W, H) == []
+    cur[0, 0, 2] += 20 # tổng lệch 40 so với tham chiếu -> giờ mới vượt ngưỡng
+    assert eng.update(cur.tobytes(), W, H) == [(0, 0, TILE, TILE)]
+
+
+def test_bbox_is_pixel_exact_and_updates_reference():
+    eng = _engine()
+    cur = _frame()
+    cur[20:31, 40:101] = 0x00
+    assert eng.bbox(cur.tobytes(), W, H) == (40, 20, 101, 31)
+    assert eng.bbox(cur.tobytes(), W, H) is None
+
+
+def test_merge_dirty_tiles_and_union_bbox():
+    grid = np.zeros((2, 3), dtype=bool)
+    grid[0, 0] = grid[1, 0] = grid[1, 2] = True
+    rects = merge_dirty_tiles(grid, 10, 25, 15, gap=0)
+    assert rects == [(0, 0, 10, 15), (20, 10, 25, 15)]
+    assert union_bbox(rects) == (0, 0, 25, 15)
+    assert union_bbox([]) is None